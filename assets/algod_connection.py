@@ -0,0 +1,130 @@
+import http.client
+import json
+import os
+import queue
+import threading
+from urllib import parse
+
+from algosdk import constants, error
+from algosdk.v2client import algod
+
+# The same environment variables that configure `algopytest`, defaulting to
+# the sandbox node so that the helpers work out of the box
+ALGOD_ADDRESS = os.environ.get("ALGOD_ADDRESS", "http://localhost:4001")
+ALGOD_TOKEN = os.environ.get("ALGOD_TOKEN", "a" * 64)
+
+# The idle HTTP connections kept alive to the node, e.g. one per request thread of `bulk_join`
+MAX_CONNECTIONS = 8
+
+# The errors of a kept-alive connection the node closed in the meantime
+_CLOSED_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+class PooledAlgodClient(algod.AlgodClient):
+    """An ``AlgodClient`` keeping its HTTP connections to the node alive between requests.
+
+    ``AlgodClient`` opens a connection with ``urlopen`` for every request. This
+    client instead takes an idle connection for a request, or opens one if
+    none is idle, and hands it back once the response is read, keeping up to
+    ``max_connections`` of them, so that threads sharing the client do not pay
+    a handshake per request. ``connections`` counts those opened.
+    """
+    def __init__(self, algod_token, algod_address, headers=None, max_connections=MAX_CONNECTIONS):
+        super().__init__(algod_token, algod_address, headers)
+        url = parse.urlsplit(algod_address)
+        self._connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._host = url.netloc
+        self._path = url.path.rstrip("/")
+        self._idle = queue.LifoQueue(max_connections)
+        self._lock = threading.Lock()
+        self.connections = 0
+
+    def _connection(self, timeout):
+        """Return an idle connection, or a new one, and whether it was used before."""
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.connections += 1
+            return self._connection_class(self._host, timeout=timeout), False
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, True
+
+    def _release(self, connection):
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format="json", timeout=30):
+        """Execute a request like ``AlgodClient.algod_request``, over a kept-alive connection."""
+        header = {"User-Agent": "py-algorand-sdk"}
+        if self.headers:
+            header.update(self.headers)
+        if headers:
+            header.update(headers)
+        if requrl not in constants.no_auth:
+            header[constants.algod_auth_header] = self.algod_token
+
+        if requrl not in constants.unversioned_paths:
+            requrl = algod.api_version_path_prefix + requrl
+        if params:
+            requrl = requrl + "?" + parse.urlencode(params)
+
+        while True:
+            connection, reused = self._connection(timeout)
+            try:
+                connection.request(method, self._path + requrl, body=data, headers=header)
+                response = connection.getresponse()
+                body = response.read()
+            except _CLOSED_CONNECTION_ERRORS:
+                connection.close()
+                # Only a connection kept alive may have been closed by the node while idle
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            break
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+
+        if response.status >= 400:
+            message, data = body.decode("utf-8"), None
+            try:
+                content = json.loads(message)
+                message, data = content["message"], content.get("data")
+            except (ValueError, KeyError, TypeError):
+                pass
+            raise error.AlgodHTTPError(message, response.status, data)
+        if response_format != "json":
+            return body
+        # Some algod responses are a 200 OK without a body
+        if response.status == 200 and not body:
+            return {}
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise error.AlgodResponseError("Failed to parse JSON response from algod") from e
+
+_algod_client = None
+
+def algod_client():
+    """Return the process-wide ``PooledAlgodClient`` connected to ``ALGOD_ADDRESS``."""
+    global _algod_client
+    if _algod_client is None:
+        _algod_client = PooledAlgodClient(ALGOD_TOKEN, ALGOD_ADDRESS)
+
+    return _algod_client
+
+def set_algod_client(client):
+    """Route every node interaction through ``client``, e.g. a ``ledger_sim.SimAlgodClient``.
+
+    Passing ``None`` restores the default connection to ``ALGOD_ADDRESS``.
+    """
+    global _algod_client
+    _algod_client = client
@@ -0,0 +1,225 @@
+"""Record every node interaction of the project, attributed to whoever made it.
+
+``instrument`` wraps the public methods of the algod client classes, both
+``AlgodClient`` and the simulator's ``SimAlgodClient``, together with the
+signing of transactions. Every call made while instrumented becomes a
+``Call`` of the ``Recorder``, with
+
+* its latency and the bytes sent and received,
+* the rounds it waited for, for ``status_after_block``, up to the last round
+  it returned: from the last round an earlier status of the same client
+  returned, or else from the round it waited after,
+* the scope it was made in, e.g. the pytest fixture or test which made it,
+  set with ``Recorder.scope``.
+
+Calls made by an instrumented method itself, such as ``send_transactions``
+sending through ``send_raw_transaction``, are part of the outer call and not
+recorded again.
+
+``Recorder.summary`` aggregates the calls per method and per scope, with a
+latency histogram, and ``Recorder.chrome_trace`` lays them out in the Chrome
+trace event format, viewable in ``chrome://tracing`` or Perfetto.
+"""
+import base64
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+import weakref
+from collections import namedtuple
+
+from algosdk import encoding, transaction
+from algosdk.v2client import algod
+
+import ledger_sim
+import multisig_signing
+
+Call = namedtuple("Call", ["method", "scope", "start", "seconds", "sent", "received", "rounds", "thread"])
+
+# The upper bounds, in seconds, of the buckets of the latency histograms
+HISTOGRAM_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+# The scope of the calls made outside of any other
+UNSCOPED = "(unscoped)"
+
+# The signing methods, which are wrapped besides the public methods of the algod clients, and their names
+_SIGNING = (
+    (transaction.Transaction, "_sign", "Transaction.sign"),
+    (transaction.MultisigTransaction, "_sign", "MultisigTransaction.sign"),
+    (multisig_signing.MultisigSigner, "sign_groups", "MultisigSigner.sign_groups"),
+)
+
+# The recorder of the methods currently wrapped
+_active = None
+
+_scope = contextvars.ContextVar("algod_instrumentation_scope", default=UNSCOPED)
+_recording = contextvars.ContextVar("algod_instrumentation_recording", default=False)
+
+def _size(value):
+    """Estimate the bytes ``value`` takes on the wire."""
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, (list, tuple)):
+        return sum(_size(item) for item in value)
+    if hasattr(value, "dictify"):
+        return len(base64.b64decode(encoding.msgpack_encode(value)))
+    if isinstance(value, dict):
+        return len(json.dumps(value, default=str))
+    return 0
+
+# The methods returning the status of the node, whose last round is kept per client
+_STATUS_METHODS = ("status", "status_after_block")
+
+class Recorder:
+    """Collects the ``Call`` of every instrumented method."""
+    def __init__(self):
+        self.calls = []
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._last_rounds = weakref.WeakKeyDictionary()
+
+    @contextlib.contextmanager
+    def scope(self, name):
+        """Attribute the calls made inside of the context to ``name``."""
+        token = _scope.set(name)
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+
+    def rounds(self, method, args, kwargs, result):
+        """Return the rounds the call of ``method`` waited for, from the status it returned.
+
+        The last round of every status is kept for its client, so that the
+        wait is measured without asking the node for its round first.
+        """
+        if method not in _STATUS_METHODS or not isinstance(result, dict) or "last-round" not in result:
+            return 0
+
+        client, last_round = args[0], result["last-round"]
+        with self._lock:
+            previous = self._last_rounds.get(client)
+            self._last_rounds[client] = last_round
+        if method != "status_after_block":
+            return 0
+
+        if previous is None:
+            previous = args[1] if len(args) > 1 else kwargs.get("block_num", last_round)
+        return max(0, last_round - previous)
+
+    def record(self, method, start, seconds, sent, received, rounds):
+        call = Call(method, _scope.get(), start - self.origin, seconds, sent, received, rounds, threading.get_ident())
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self):
+        """Return the calls aggregated per method and per scope, as JSON-serializable dicts."""
+        def aggregate(key):
+            totals = {}
+            for call in self.calls:
+                entry = totals.setdefault(key(call), {
+                    "count": 0, "seconds": 0.0, "bytes_sent": 0, "bytes_received": 0, "rounds_waited": 0,
+                    "histogram": [0] * (len(HISTOGRAM_BUCKETS) + 1),
+                })
+                entry["count"] += 1
+                entry["seconds"] += call.seconds
+                entry["bytes_sent"] += call.sent
+                entry["bytes_received"] += call.received
+                entry["rounds_waited"] += call.rounds
+                bucket = next((index for index, bound in enumerate(HISTOGRAM_BUCKETS) if call.seconds <= bound), len(HISTOGRAM_BUCKETS))
+                entry["histogram"][bucket] += 1
+            return totals
+
+        return {
+            "histogram_buckets": list(HISTOGRAM_BUCKETS),
+            "methods": aggregate(lambda call: call.method),
+            "scopes": aggregate(lambda call: call.scope),
+        }
+
+    def slowest(self, group="scopes", count=10):
+        """Return the ``count`` methods or scopes, per ``group``, which took the most time in total."""
+        entries = self.summary()[group]
+        return sorted(entries.items(), key=lambda item: -item[1]["seconds"])[:count]
+
+    def chrome_trace(self):
+        """Return the calls as a Chrome trace, with a track per thread."""
+        return {
+            "displayTimeUnit": "ms",
+            "traceEvents": [
+                {
+                    "name": call.method,
+                    "cat": call.scope,
+                    "ph": "X",
+                    "ts": call.start * 1e6,
+                    "dur": call.seconds * 1e6,
+                    "pid": 0,
+                    "tid": call.thread,
+                    "args": {"scope": call.scope, "bytes_sent": call.sent, "bytes_received": call.received, "rounds_waited": call.rounds},
+                }
+                for call in self.calls
+            ],
+        }
+
+def _wrap(function, name, recorder, local):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _recording.get():
+            return function(*args, **kwargs)
+
+        token = _recording.set(True)
+        try:
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+        finally:
+            _recording.reset(token)
+        # Signing sends nothing, and the client itself is not part of the request
+        sent = 0 if local else _size(args[1:] + tuple(kwargs.values()))
+        recorder.record(name, start, seconds, sent, _size(result), recorder.rounds(name, args, kwargs, result))
+        return result
+
+    wrapper.__instrumented__ = function
+    return wrapper
+
+def _targets():
+    """Return the ``(owner, attribute, name, local)`` of every method to wrap."""
+    targets = []
+    for cls in (algod.AlgodClient, ledger_sim.SimAlgodClient):
+        for attribute, value in vars(cls).items():
+            if inspect.isfunction(value) and not attribute.startswith("_"):
+                targets.append((cls, attribute, attribute, False))
+    for cls, attribute, name in _SIGNING:
+        targets.append((cls, attribute, name, True))
+    return targets
+
+def instrument(recorder=None):
+    """Record every node interaction and signature in ``recorder``, a new ``Recorder`` by default, which is returned."""
+    global _active
+    recorder = recorder if recorder is not None else Recorder()
+    uninstrument()
+    for owner, attribute, name, local in _targets():
+        setattr(owner, attribute, _wrap(vars(owner)[attribute], name, recorder, local))
+    _active = recorder
+    return recorder
+
+def active():
+    """Return the ``Recorder`` of the instrumented methods, or ``None``."""
+    return _active
+
+def uninstrument():
+    """Restore the methods wrapped by ``instrument``."""
+    global _active
+    _active = None
+    for owner, attribute, _, _ in _targets():
+        original = getattr(vars(owner)[attribute], "__instrumented__", None)
+        if original is not None:
+            setattr(owner, attribute, original)
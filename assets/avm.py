@@ -0,0 +1,2051 @@
+"""A pure-Python assembler and evaluator for the AVM programs in this project.
+
+``assemble`` turns the TEAL emitted by ``compileTeal`` into bytecode and
+``Program`` decodes that bytecode once so that it can be evaluated any number
+of times by ``evaluate``. The evaluator covers the opcodes PyTEAL emits for
+application programs up to version 8; all of the ledger access (state, balances,
+asset holdings, inner transactions and boxes) goes through an ``EvalContext``
+supplied by the caller, e.g. the in-process ledger of ``ledger_sim``.
+"""
+import base64
+import hashlib
+import math
+import re
+from collections import namedtuple
+
+from algosdk import encoding
+
+MAX_UINT64 = 2**64 - 1
+MAX_STRING_SIZE = 4096
+MAX_STACK_DEPTH = 1000
+MAX_CALLSTACK_DEPTH = 8
+ZERO_ADDRESS = bytes(32)
+
+# The cost of every opcode not listed here is 1
+OPCODE_BUDGET = 700
+
+TXN_FIELDS = [
+    "Sender", "Fee", "FirstValid", "FirstValidTime", "LastValid", "Note", "Lease",
+    "Receiver", "Amount", "CloseRemainderTo", "VotePK", "SelectionPK", "VoteFirst",
+    "VoteLast", "VoteKeyDilution", "Type", "TypeEnum", "XferAsset", "AssetAmount",
+    "AssetSender", "AssetReceiver", "AssetCloseTo", "GroupIndex", "TxID",
+    "ApplicationID", "OnCompletion", "ApplicationArgs", "NumAppArgs", "Accounts",
+    "NumAccounts", "ApprovalProgram", "ClearStateProgram", "RekeyTo", "ConfigAsset",
+    "ConfigAssetTotal", "ConfigAssetDecimals", "ConfigAssetDefaultFrozen",
+    "ConfigAssetUnitName", "ConfigAssetName", "ConfigAssetURL",
+    "ConfigAssetMetadataHash", "ConfigAssetManager", "ConfigAssetReserve",
+    "ConfigAssetFreeze", "ConfigAssetClawback", "FreezeAsset", "FreezeAssetAccount",
+    "FreezeAssetFrozen", "Assets", "NumAssets", "Applications", "NumApplications",
+    "GlobalNumUint", "GlobalNumByteSlice", "LocalNumUint", "LocalNumByteSlice",
+    "ExtraProgramPages", "Nonparticipation", "Logs", "NumLogs", "CreatedAssetID",
+    "CreatedApplicationID", "LastLog", "StateProofPK", "ApprovalProgramPages",
+    "NumApprovalProgramPages", "ClearStateProgramPages", "NumClearStateProgramPages",
+]
+
+GLOBAL_FIELDS = [
+    "MinTxnFee", "MinBalance", "MaxTxnLife", "ZeroAddress", "GroupSize",
+    "LogicSigVersion", "Round", "LatestTimestamp", "CurrentApplicationID",
+    "CreatorAddress", "CurrentApplicationAddress", "GroupID", "OpcodeBudget",
+    "CallerApplicationID", "CallerApplicationAddress",
+]
+
+ASSET_HOLDING_FIELDS = ["AssetBalance", "AssetFrozen"]
+
+ASSET_PARAMS_FIELDS = [
+    "AssetTotal", "AssetDecimals", "AssetDefaultFrozen", "AssetUnitName",
+    "AssetName", "AssetURL", "AssetMetadataHash", "AssetManager", "AssetReserve",
+    "AssetFreeze", "AssetClawback", "AssetCreator",
+]
+
+APP_PARAMS_FIELDS = [
+    "AppApprovalProgram", "AppClearStateProgram", "AppGlobalNumUint",
+    "AppGlobalNumByteSlice", "AppLocalNumUint", "AppLocalNumByteSlice",
+    "AppExtraProgramPages", "AppCreator", "AppAddress",
+]
+
+ACCT_PARAMS_FIELDS = ["AcctBalance", "AcctMinBalance", "AcctAuthAddr"]
+
+# Transaction fields holding byte strings; every other scalar field is a uint64
+BYTES_TXN_FIELDS = frozenset([
+    "Sender", "Note", "Lease", "Receiver", "CloseRemainderTo", "VotePK",
+    "SelectionPK", "Type", "AssetSender", "AssetReceiver", "AssetCloseTo", "TxID",
+    "ApprovalProgram", "ClearStateProgram", "RekeyTo", "ConfigAssetUnitName",
+    "ConfigAssetName", "ConfigAssetURL", "ConfigAssetMetadataHash",
+    "ConfigAssetManager", "ConfigAssetReserve", "ConfigAssetFreeze",
+    "ConfigAssetClawback", "FreezeAssetAccount", "LastLog", "StateProofPK",
+])
+
+ADDRESS_TXN_FIELDS = frozenset([
+    "Sender", "Receiver", "CloseRemainderTo", "AssetSender", "AssetReceiver",
+    "AssetCloseTo", "RekeyTo", "ConfigAssetManager", "ConfigAssetReserve",
+    "ConfigAssetFreeze", "ConfigAssetClawback", "FreezeAssetAccount",
+])
+
+ARRAY_TXN_FIELDS = {
+    "ApplicationArgs": "NumAppArgs",
+    "Accounts": "NumAccounts",
+    "Assets": "NumAssets",
+    "Applications": "NumApplications",
+    "Logs": "NumLogs",
+    "ApprovalProgramPages": "NumApprovalProgramPages",
+    "ClearStateProgramPages": "NumClearStateProgramPages",
+}
+
+TXN_TYPES = {"pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6}
+ON_COMPLETE = {
+    "NoOp": 0, "OptIn": 1, "CloseOut": 2, "ClearState": 3,
+    "UpdateApplication": 4, "DeleteApplication": 5,
+}
+NAMED_INTS = dict(TXN_TYPES, **ON_COMPLETE)
+
+# (opcode, name, immediates, cost)
+#
+# Immediate kinds: "u8" (a byte), "i8" (a signed byte), "varuint", "bytes" (a
+# length-prefixed byte string), "label" (a 2-byte branch offset), "labels" (a
+# count followed by branch offsets), "varuints" and "bytess" (constant lists)
+# and the various field enumerations
+OPCODE_SPECS = [
+    (0x00, "err", (), 1),
+    (0x01, "sha256", (), 35),
+    (0x02, "keccak256", (), 130),
+    (0x03, "sha512_256", (), 45),
+    (0x04, "ed25519verify", (), 1900),
+    (0x08, "+", (), 1),
+    (0x09, "-", (), 1),
+    (0x0a, "/", (), 1),
+    (0x0b, "*", (), 1),
+    (0x0c, "<", (), 1),
+    (0x0d, ">", (), 1),
+    (0x0e, "<=", (), 1),
+    (0x0f, ">=", (), 1),
+    (0x10, "&&", (), 1),
+    (0x11, "||", (), 1),
+    (0x12, "==", (), 1),
+    (0x13, "!=", (), 1),
+    (0x14, "!", (), 1),
+    (0x15, "len", (), 1),
+    (0x16, "itob", (), 1),
+    (0x17, "btoi", (), 1),
+    (0x18, "%", (), 1),
+    (0x19, "|", (), 1),
+    (0x1a, "&", (), 1),
+    (0x1b, "^", (), 1),
+    (0x1c, "~", (), 1),
+    (0x1d, "mulw", (), 1),
+    (0x1e, "addw", (), 1),
+    (0x1f, "divmodw", (), 20),
+    (0x20, "intcblock", ("varuints",), 1),
+    (0x21, "intc", ("u8",), 1),
+    (0x22, "intc_0", (), 1),
+    (0x23, "intc_1", (), 1),
+    (0x24, "intc_2", (), 1),
+    (0x25, "intc_3", (), 1),
+    (0x26, "bytecblock", ("bytess",), 1),
+    (0x27, "bytec", ("u8",), 1),
+    (0x28, "bytec_0", (), 1),
+    (0x29, "bytec_1", (), 1),
+    (0x2a, "bytec_2", (), 1),
+    (0x2b, "bytec_3", (), 1),
+    (0x31, "txn", ("txnf",), 1),
+    (0x32, "global", ("globalf",), 1),
+    (0x33, "gtxn", ("u8", "txnf"), 1),
+    (0x34, "load", ("u8",), 1),
+    (0x35, "store", ("u8",), 1),
+    (0x36, "txna", ("txnf", "u8"), 1),
+    (0x37, "gtxna", ("u8", "txnf", "u8"), 1),
+    (0x38, "gtxns", ("txnf",), 1),
+    (0x39, "gtxnsa", ("txnf", "u8"), 1),
+    (0x3a, "gload", ("u8", "u8"), 1),
+    (0x3b, "gloads", ("u8",), 1),
+    (0x3c, "gaid", ("u8",), 1),
+    (0x3d, "gaids", (), 1),
+    (0x3e, "loads", (), 1),
+    (0x3f, "stores", (), 1),
+    (0x40, "bnz", ("label",), 1),
+    (0x41, "bz", ("label",), 1),
+    (0x42, "b", ("label",), 1),
+    (0x43, "return", (), 1),
+    (0x44, "assert", (), 1),
+    (0x45, "bury", ("u8",), 1),
+    (0x46, "popn", ("u8",), 1),
+    (0x47, "dupn", ("u8",), 1),
+    (0x48, "pop", (), 1),
+    (0x49, "dup", (), 1),
+    (0x4a, "dup2", (), 1),
+    (0x4b, "dig", ("u8",), 1),
+    (0x4c, "swap", (), 1),
+    (0x4d, "select", (), 1),
+    (0x4e, "cover", ("u8",), 1),
+    (0x4f, "uncover", ("u8",), 1),
+    (0x50, "concat", (), 1),
+    (0x51, "substring", ("u8", "u8"), 1),
+    (0x52, "substring3", (), 1),
+    (0x53, "getbit", (), 1),
+    (0x54, "setbit", (), 1),
+    (0x55, "getbyte", (), 1),
+    (0x56, "setbyte", (), 1),
+    (0x57, "extract", ("u8", "u8"), 1),
+    (0x58, "extract3", (), 1),
+    (0x59, "extract_uint16", (), 1),
+    (0x5a, "extract_uint32", (), 1),
+    (0x5b, "extract_uint64", (), 1),
+    (0x5c, "replace2", ("u8",), 1),
+    (0x5d, "replace3", (), 1),
+    (0x60, "balance", (), 1),
+    (0x61, "app_opted_in", (), 1),
+    (0x62, "app_local_get", (), 1),
+    (0x63, "app_local_get_ex", (), 1),
+    (0x64, "app_global_get", (), 1),
+    (0x65, "app_global_get_ex", (), 1),
+    (0x66, "app_local_put", (), 1),
+    (0x67, "app_global_put", (), 1),
+    (0x68, "app_local_del", (), 1),
+    (0x69, "app_global_del", (), 1),
+    (0x70, "asset_holding_get", ("holdingf",), 1),
+    (0x71, "asset_params_get", ("assetf",), 1),
+    (0x72, "app_params_get", ("appf",), 1),
+    (0x73, "acct_params_get", ("acctf",), 1),
+    (0x78, "min_balance", (), 1),
+    (0x80, "pushbytes", ("bytes",), 1),
+    (0x81, "pushint", ("varuint",), 1),
+    (0x82, "pushbytess", ("bytess",), 1),
+    (0x83, "pushints", ("varuints",), 1),
+    (0x88, "callsub", ("label",), 1),
+    (0x89, "retsub", (), 1),
+    (0x8a, "proto", ("u8", "u8"), 1),
+    (0x8b, "frame_dig", ("i8",), 1),
+    (0x8c, "frame_bury", ("i8",), 1),
+    (0x8d, "switch", ("labels",), 1),
+    (0x8e, "match", ("labels",), 1),
+    (0x90, "shl", (), 1),
+    (0x91, "shr", (), 1),
+    (0x92, "sqrt", (), 4),
+    (0x93, "bitlen", (), 1),
+    (0x94, "exp", (), 1),
+    (0x97, "divw", (), 1),
+    (0xa0, "b+", (), 10),
+    (0xa1, "b-", (), 10),
+    (0xa2, "b/", (), 20),
+    (0xa3, "b*", (), 20),
+    (0xa4, "b<", (), 1),
+    (0xa5, "b>", (), 1),
+    (0xa6, "b<=", (), 1),
+    (0xa7, "b>=", (), 1),
+    (0xa8, "b==", (), 1),
+    (0xa9, "b!=", (), 1),
+    (0xaa, "b%", (), 20),
+    (0xab, "b|", (), 6),
+    (0xac, "b&", (), 6),
+    (0xad, "b^", (), 6),
+    (0xae, "b~", (), 4),
+    (0xaf, "bzero", (), 1),
+    (0xb0, "log", (), 1),
+    (0xb1, "itxn_begin", (), 1),
+    (0xb2, "itxn_field", ("txnf",), 1),
+    (0xb3, "itxn_submit", (), 1),
+    (0xb4, "itxn", ("txnf",), 1),
+    (0xb5, "itxna", ("txnf", "u8"), 1),
+    (0xb6, "itxn_next", (), 1),
+    (0xb7, "gitxn", ("u8", "txnf"), 1),
+    (0xb8, "gitxna", ("u8", "txnf", "u8"), 1),
+    (0xb9, "box_create", (), 1),
+    (0xba, "box_extract", (), 1),
+    (0xbb, "box_replace", (), 1),
+    (0xbc, "box_del", (), 1),
+    (0xbd, "box_len", (), 1),
+    (0xbe, "box_get", (), 1),
+    (0xbf, "box_put", (), 1),
+    (0xc0, "txnas", ("txnf",), 1),
+    (0xc1, "gtxnas", ("u8", "txnf"), 1),
+    (0xc2, "gtxnsas", ("txnf",), 1),
+    (0xc4, "gloadss", (), 1),
+    (0xc5, "itxnas", ("txnf",), 1),
+    (0xc6, "gitxnas", ("u8", "txnf"), 1),
+]
+
+OpSpec = namedtuple("OpSpec", ["opcode", "name", "immediates", "cost"])
+
+OPS_BY_NAME = {name: OpSpec(opcode, name, immediates, cost) for opcode, name, immediates, cost in OPCODE_SPECS}
+OPS_BY_CODE = {spec.opcode: spec for spec in OPS_BY_NAME.values()}
+
+FIELD_TABLES = {
+    "txnf": TXN_FIELDS,
+    "globalf": GLOBAL_FIELDS,
+    "holdingf": ASSET_HOLDING_FIELDS,
+    "assetf": ASSET_PARAMS_FIELDS,
+    "appf": APP_PARAMS_FIELDS,
+    "acctf": ACCT_PARAMS_FIELDS,
+}
+
+class AssemblyError(Exception):
+    """Raised when TEAL source cannot be assembled."""
+    def __init__(self, line_number, message):
+        super().__init__(f"{line_number}: {message}")
+        self.line_number = line_number
+
+class EvalError(Exception):
+    """Raised when a program fails; ``reason`` matches the wording of algod's ``logic eval error``."""
+    def __init__(self, reason, pc=0):
+        super().__init__(f"{reason} pc={pc}")
+        self.reason = reason
+        self.pc = pc
+
+def method_selector(signature):
+    """Return the 4-byte ARC-4 selector of the method ``signature``."""
+    return encoding.checksum(signature.encode())[:4]
+
+def encode_varuint(value):
+    """Encode ``value`` as a little-endian base-128 varuint, as used by TEAL immediates."""
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def decode_varuint(data, offset):
+    """Decode the varuint at ``offset`` of ``data``, returning the value and the following offset."""
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise EvalError("could not decode varuint", offset)
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+#
+# Assembler
+#
+
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\S+')
+
+def _tokenize(line):
+    tokens = []
+    for match in _TOKEN_RE.finditer(line):
+        token = match.group(0)
+        if token.startswith("//"):
+            break
+        tokens.append(token)
+    return tokens
+
+def _parse_string(token):
+    body = token[1:-1]
+    out = bytearray()
+    index = 0
+    while index < len(body):
+        char = body[index]
+        if char != "\\":
+            out.extend(char.encode())
+            index += 1
+            continue
+
+        escape = body[index + 1]
+        if escape == "x":
+            out.append(int(body[index + 2:index + 4], 16))
+            index += 4
+            continue
+
+        out.extend({"n": b"\n", "r": b"\r", "t": b"\t", "\\": b"\\", '"': b'"', "0": b"\x00"}[escape])
+        index += 2
+    return bytes(out)
+
+def _parse_bytes(args):
+    """Parse the operands of a ``byte`` pseudo-op, returning the value and the number of tokens consumed."""
+    first = args[0]
+    if first.startswith('"'):
+        return _parse_string(first), 1
+    if first.startswith("0x"):
+        return bytes.fromhex(first[2:]), 1
+    for prefix, decode in (("base64", base64.b64decode), ("b64", base64.b64decode), ("base32", base64.b32decode), ("b32", base64.b32decode)):
+        if first in (prefix,):
+            return decode(_pad(args[1], prefix)), 2
+        if first.startswith(prefix + "(") and first.endswith(")"):
+            return decode(_pad(first[len(prefix) + 1:-1], prefix)), 1
+    raise ValueError(f"unable to parse byte constant {first!r}")
+
+def _pad(value, prefix):
+    block = 8 if prefix.endswith("32") else 4
+    return value + "=" * (-len(value) % block)
+
+def _parse_int(token):
+    if token in NAMED_INTS:
+        return NAMED_INTS[token]
+    value = int(token, 0)
+    if not 0 <= value <= MAX_UINT64:
+        raise ValueError(f"integer {token} out of range")
+    return value
+
+def _parse_field(kind, token):
+    try:
+        return FIELD_TABLES[kind].index(token)
+    except ValueError:
+        raise ValueError(f"unknown field {token!r}") from None
+
+def _constant_operand(name, args):
+    """Return ("int"|"byte", value) for the constant pseudo-ops or ``None`` for everything else."""
+    if name == "int":
+        return "int", _parse_int(args[0])
+    if name == "byte":
+        return "byte", _parse_bytes(args)[0]
+    if name == "addr":
+        return "byte", encoding.decode_address(args[0])
+    if name == "method":
+        return "byte", method_selector(_parse_string(args[0]).decode())
+    return None
+
+def _choose_constants(values, allow_push):
+    """Pick the constants worth placing in a constant block, most frequently used first.
+
+    Like algod's assembler, a constant used only once is cheaper as a push
+    instruction than as a constant block entry.
+    """
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    ordered = sorted(counts, key=lambda value: -counts[value])
+    if allow_push:
+        ordered = [value for value in ordered if counts[value] > 1]
+    return ordered
+
+def _encode_instruction(spec, operands, labels, pc, size_only=False):
+    out = bytearray([spec.opcode])
+    for kind, operand in zip(spec.immediates, operands):
+        if kind in ("u8", "txnf", "globalf", "holdingf", "assetf", "appf", "acctf"):
+            out.append(operand)
+        elif kind == "i8":
+            out.append(operand & 0xff)
+        elif kind == "varuint":
+            out.extend(encode_varuint(operand))
+        elif kind == "bytes":
+            out.extend(encode_varuint(len(operand)) + operand)
+        elif kind == "varuints":
+            out.extend(encode_varuint(len(operand)))
+            for value in operand:
+                out.extend(encode_varuint(value))
+        elif kind == "bytess":
+            out.extend(encode_varuint(len(operand)))
+            for value in operand:
+                out.extend(encode_varuint(len(value)) + value)
+        elif kind == "label":
+            out.extend(b"\x00\x00")
+        elif kind == "labels":
+            out.append(len(operand))
+            out.extend(b"\x00\x00" * len(operand))
+
+    if size_only:
+        return out
+
+    # Branch offsets are relative to the end of the instruction
+    end = pc + len(out)
+    position = 1
+    for kind, operand in zip(spec.immediates, operands):
+        if kind == "label":
+            position = len(out) - 2
+            out[position:position + 2] = (labels[operand] - end).to_bytes(2, "big", signed=True)
+        elif kind == "labels":
+            position = len(out) - 2 * len(operand)
+            for label in operand:
+                out[position:position + 2] = (labels[label] - end).to_bytes(2, "big", signed=True)
+                position += 2
+    return out
+
+def _parse_operands(spec, args):
+    operands = []
+    for index, kind in enumerate(spec.immediates):
+        if kind == "labels":
+            operands.append(list(args[index:]))
+        elif kind == "varuints":
+            operands.append([_parse_int(arg) for arg in args[index:]])
+        elif kind == "bytess":
+            values = []
+            rest = list(args[index:])
+            while rest:
+                value, used = _parse_bytes(rest)
+                values.append(value)
+                rest = rest[used:]
+            operands.append(values)
+        elif kind == "bytes":
+            operands.append(_parse_bytes(args[index:])[0])
+        elif kind == "label":
+            operands.append(args[index])
+        elif kind in FIELD_TABLES:
+            operands.append(_parse_field(kind, args[index]))
+        elif kind in ("u8", "i8"):
+            operands.append(int(args[index], 0))
+        else:
+            operands.append(_parse_int(args[index]))
+    return operands
+
+def assemble(source, source_map=False):
+    """Assemble TEAL ``source`` into bytecode.
+
+    When ``source_map`` is set, also return a dict mapping each program counter
+    to the (0-based) source line which produced the instruction.
+    """
+    lines = source.splitlines()
+    version = 1
+    parsed = []
+    for line_number, line in enumerate(lines):
+        tokens = _tokenize(line)
+        if not tokens:
+            continue
+        if tokens[0] == "#pragma":
+            if tokens[1] == "version":
+                version = int(tokens[2])
+            continue
+        if tokens[0].startswith("#"):
+            continue
+        while tokens and tokens[0].endswith(":") and not tokens[0].startswith('"'):
+            parsed.append((line_number, "label", tokens[0][:-1]))
+            tokens = tokens[1:]
+        if tokens:
+            parsed.append((line_number, tokens[0], tokens[1:]))
+
+    # Lay out the constant blocks unless the source manages them explicitly. Like
+    # algod, the constant pseudo-ops then push their values instead.
+    explicit_ints = any(item[1] == "intcblock" for item in parsed)
+    explicit_bytes = any(item[1] == "bytecblock" for item in parsed)
+    int_values, byte_values = [], []
+    for line_number, name, args in parsed:
+        if name == "label":
+            continue
+        try:
+            constant = _constant_operand(name, args)
+        except (ValueError, IndexError) as e:
+            raise AssemblyError(line_number, str(e)) from None
+        if constant is not None:
+            (int_values if constant[0] == "int" else byte_values).append(constant[1])
+
+    allow_push = version >= 3
+    int_block = [] if explicit_ints else _choose_constants(int_values, allow_push)
+    byte_block = [] if explicit_bytes else _choose_constants(byte_values, allow_push)
+
+    # Expand the pseudo-ops into concrete instructions
+    instructions = []
+    if int_block:
+        instructions.append((None, OPS_BY_NAME["intcblock"], [int_block]))
+    if byte_block:
+        instructions.append((None, OPS_BY_NAME["bytecblock"], [byte_block]))
+
+    for line_number, name, args in parsed:
+        if name == "label":
+            instructions.append((line_number, "label", args))
+            continue
+
+        try:
+            constant = _constant_operand(name, args)
+            if constant is not None:
+                kind, value = constant
+                block = int_block if kind == "int" else byte_block
+                prefix = "intc" if kind == "int" else "bytec"
+                if value in block:
+                    index = block.index(value)
+                    if index < 4:
+                        instructions.append((line_number, OPS_BY_NAME[f"{prefix}_{index}"], []))
+                    else:
+                        instructions.append((line_number, OPS_BY_NAME[prefix], [index]))
+                else:
+                    push = "pushint" if kind == "int" else "pushbytes"
+                    instructions.append((line_number, OPS_BY_NAME[push], [value]))
+                continue
+
+            spec = OPS_BY_NAME[name]
+            instructions.append((line_number, spec, _parse_operands(spec, args)))
+        except KeyError:
+            raise AssemblyError(line_number, f"unknown opcode: {name}") from None
+        except (ValueError, IndexError) as e:
+            raise AssemblyError(line_number, str(e)) from None
+
+    # First pass: the size of every instruction is independent of the label offsets
+    labels = {}
+    pc = len(encode_varuint(version))
+    for line_number, spec, operands in instructions:
+        if spec == "label":
+            labels[operands] = pc
+            continue
+        pc += len(_encode_instruction(spec, operands, labels, pc, size_only=True))
+
+    # Second pass: emit the bytecode with the resolved branch offsets
+    bytecode = bytearray(encode_varuint(version))
+    pc_to_line = {}
+    for line_number, spec, operands in instructions:
+        if spec == "label":
+            continue
+        try:
+            encoded = _encode_instruction(spec, operands, labels, len(bytecode))
+        except KeyError as e:
+            raise AssemblyError(line_number, f"reference to undefined label {e.args[0]!r}") from None
+        if line_number is not None:
+            pc_to_line[len(bytecode)] = line_number
+        bytecode.extend(encoded)
+
+    if source_map:
+        return bytes(bytecode), pc_to_line
+    return bytes(bytecode)
+
+#
+# Decoder
+#
+
+Instruction = namedtuple("Instruction", ["pc", "spec", "operands", "size"])
+
+class Program:
+    """A decoded AVM program which can be evaluated repeatedly."""
+    def __init__(self, bytecode):
+        self.bytecode = bytes(bytecode)
+        self.version, offset = decode_varuint(self.bytecode, 0)
+        self.instructions = []
+        self.index_of_pc = {}
+
+        while offset < len(self.bytecode):
+            instruction = self._decode(offset)
+            self.index_of_pc[offset] = len(self.instructions)
+            self.instructions.append(instruction)
+            offset += instruction.size
+
+        # Resolve the branch targets to instruction indices once up front
+        self.targets = {}
+        for index, instruction in enumerate(self.instructions):
+            for kind, operand in zip(instruction.spec.immediates, instruction.operands):
+                if kind == "label":
+                    self.targets[index] = self._target(instruction, operand)
+                elif kind == "labels":
+                    self.targets[index] = [self._target(instruction, offset) for offset in operand]
+
+    def _target(self, instruction, offset):
+        pc = instruction.pc + instruction.size + offset
+        if pc == len(self.bytecode):
+            return len(self.instructions)
+        if pc not in self.index_of_pc:
+            raise EvalError("branch target is not aligned to an instruction", instruction.pc)
+        return self.index_of_pc[pc]
+
+    def _decode(self, pc):
+        data = self.bytecode
+        spec = OPS_BY_CODE.get(data[pc])
+        if spec is None:
+            raise EvalError(f"invalid opcode 0x{data[pc]:02x}", pc)
+
+        offset = pc + 1
+        operands = []
+        for kind in spec.immediates:
+            if kind in ("u8", "txnf", "globalf", "holdingf", "assetf", "appf", "acctf"):
+                operands.append(data[offset])
+                offset += 1
+            elif kind == "i8":
+                operands.append(int.from_bytes(data[offset:offset + 1], "big", signed=True))
+                offset += 1
+            elif kind == "varuint":
+                value, offset = decode_varuint(data, offset)
+                operands.append(value)
+            elif kind == "bytes":
+                length, offset = decode_varuint(data, offset)
+                operands.append(data[offset:offset + length])
+                offset += length
+            elif kind == "varuints":
+                count, offset = decode_varuint(data, offset)
+                values = []
+                for _ in range(count):
+                    value, offset = decode_varuint(data, offset)
+                    values.append(value)
+                operands.append(values)
+            elif kind == "bytess":
+                count, offset = decode_varuint(data, offset)
+                values = []
+                for _ in range(count):
+                    length, offset = decode_varuint(data, offset)
+                    values.append(data[offset:offset + length])
+                    offset += length
+                operands.append(values)
+            elif kind == "label":
+                operands.append(int.from_bytes(data[offset:offset + 2], "big", signed=True))
+                offset += 2
+            elif kind == "labels":
+                count = data[offset]
+                offset += 1
+                operands.append([
+                    int.from_bytes(data[offset + 2 * i:offset + 2 * i + 2], "big", signed=True)
+                    for i in range(count)
+                ])
+                offset += 2 * count
+
+        if offset > len(data):
+            raise EvalError(f"{spec.name} ran past the end of the program", pc)
+        return Instruction(pc, spec, operands, offset - pc)
+
+    def disassemble(self):
+        """Return a TEAL listing of the program, one ``(pc, text)`` pair per instruction."""
+        listing = []
+        for instruction in self.instructions:
+            parts = [instruction.spec.name]
+            for kind, operand in zip(instruction.spec.immediates, instruction.operands):
+                if kind in FIELD_TABLES:
+                    parts.append(FIELD_TABLES[kind][operand])
+                elif kind == "bytes":
+                    parts.append("0x" + operand.hex())
+                elif kind in ("varuints", "labels"):
+                    parts.extend(str(value) for value in operand)
+                elif kind == "bytess":
+                    parts.extend("0x" + value.hex() for value in operand)
+                else:
+                    parts.append(str(operand))
+            listing.append((instruction.pc, " ".join(parts)))
+        return listing
+
+#
+# Evaluator
+#
+
+class EvalContext:
+    """The ledger interface required by ``evaluate``.
+
+    Addresses are the raw 32-byte public keys. Lookups of missing entities return
+    ``None``. Subclasses raise ``EvalError`` to reject an operation.
+    """
+    round = 0
+    latest_timestamp = 0
+    min_txn_fee = 1000
+    min_balance = 100000
+
+    @property
+    def eval_round(self):
+        """The round the programs are evaluated in, like algod the one after the last ``round``."""
+        return self.round + 1
+
+    def app_address(self, app_id):
+        raise NotImplementedError
+
+    def app_params(self, app_id):
+        raise NotImplementedError
+
+    def global_get(self, app_id, key):
+        raise NotImplementedError
+
+    def global_put(self, app_id, key, value):
+        raise NotImplementedError
+
+    def global_del(self, app_id, key):
+        raise NotImplementedError
+
+    def opted_in(self, address, app_id):
+        raise NotImplementedError
+
+    def local_get(self, address, app_id, key):
+        raise NotImplementedError
+
+    def local_put(self, address, app_id, key, value):
+        raise NotImplementedError
+
+    def local_del(self, address, app_id, key):
+        raise NotImplementedError
+
+    def balance(self, address):
+        raise NotImplementedError
+
+    def account_min_balance(self, address):
+        raise NotImplementedError
+
+    def auth_address(self, address):
+        raise NotImplementedError
+
+    def asset_holding(self, address, asset_id):
+        raise NotImplementedError
+
+    def asset_params(self, asset_id):
+        raise NotImplementedError
+
+    def box_get(self, app_id, name):
+        raise NotImplementedError
+
+    def box_put(self, app_id, name, value):
+        raise NotImplementedError
+
+    def box_del(self, app_id, name):
+        raise NotImplementedError
+
+    def submit_inner(self, caller, transactions):
+        """Execute the inner ``transactions`` of the application ``caller``, returning their final fields."""
+        raise NotImplementedError
+
+class Budget:
+    """The opcode budget pooled across the application calls of a transaction group."""
+    def __init__(self, limit=OPCODE_BUDGET):
+        self.limit = limit
+        self.used = 0
+
+    def spend(self, cost, pc):
+        self.used += cost
+        if self.used > self.limit:
+            raise EvalError(f"dynamic cost budget exceeded, executing {self.used} / {self.limit}", pc)
+
+    @property
+    def remaining(self):
+        return self.limit - self.used
+
+class GroupState:
+    """State shared by every program evaluated in one transaction group.
+
+    Inner transaction groups share the ``budget`` of their top-level group.
+    """
+    def __init__(self, transactions, group_id=ZERO_ADDRESS, budget=None):
+        self.transactions = transactions
+        self.group_id = group_id
+        self.scratch_spaces = {}
+        if budget is None:
+            budget = Budget(OPCODE_BUDGET * sum(1 for txn in transactions if txn.get("TypeEnum") == TXN_TYPES["appl"]))
+        self.budget = budget
+
+def txn_field(txn, field, index=None):
+    """Return ``field`` of the transaction dict ``txn``, as seen by the AVM."""
+    if field in ARRAY_TXN_FIELDS:
+        values = txn.get(field, [])
+        if field == "Accounts":
+            values = [txn.get("Sender", ZERO_ADDRESS)] + list(values)
+        if index is None or index >= len(values):
+            raise EvalError(f"invalid {field} index {index}")
+        return values[index]
+
+    for array, count in ARRAY_TXN_FIELDS.items():
+        if field == count:
+            return len(txn.get(array, []))
+
+    if field == "FirstValidTime":
+        raise EvalError("FirstValidTime is not supported")
+    if field == "LastLog":
+        logs = txn.get("Logs", [])
+        return logs[-1] if logs else b""
+    if field in ADDRESS_TXN_FIELDS:
+        return txn.get(field, ZERO_ADDRESS)
+    if field in BYTES_TXN_FIELDS:
+        return txn.get(field, b"")
+    return txn.get(field, 0)
+
+def _type_name(value):
+    return "uint64" if isinstance(value, int) else "[]byte"
+
+class Evaluator:
+    """Evaluates one program for the transaction at ``group_index`` of ``group``."""
+    def __init__(self, program, ctx, group, group_index, app_id, caller_app_id=0):
+        self.program = program
+        self.ctx = ctx
+        self.group = group
+        self.group_index = group_index
+        self.txn = group.transactions[group_index]
+        self.app_id = app_id
+        self.caller_app_id = caller_app_id
+        self.stack = []
+        self.scratch = group.scratch_spaces.setdefault(group_index, [0] * 256)
+        self.callstack = []
+        self.intc = []
+        self.bytec = []
+        self.pending_inner = None
+        self.last_inner = []
+        self.inner_transactions = []
+        self.logs = []
+        self.cost = 0
+        # When set to a set, the program counters of every executed instruction are added to it
+        self.trace = None
+
+    #
+    # Stack helpers
+    #
+
+    def push(self, value, pc):
+        if isinstance(value, (bytes, bytearray)) and len(value) > MAX_STRING_SIZE:
+            raise EvalError("byte array length exceeds 4096", pc)
+        self.stack.append(value)
+        if len(self.stack) > MAX_STACK_DEPTH:
+            raise EvalError("stack overflow", pc)
+
+    def pop(self, pc):
+        if not self.stack:
+            raise EvalError("stack underflow", pc)
+        return self.stack.pop()
+
+    def pop_int(self, pc):
+        value = self.pop(pc)
+        if not isinstance(value, int):
+            raise EvalError("wanted type uint64 got []byte", pc)
+        return value
+
+    def pop_bytes(self, pc):
+        value = self.pop(pc)
+        if isinstance(value, int):
+            raise EvalError("wanted type []byte got uint64", pc)
+        return bytes(value)
+
+    #
+    # Resource resolution
+    #
+
+    def _available_accounts(self):
+        accounts = {self.txn.get("Sender", ZERO_ADDRESS), self.ctx.app_address(self.app_id)}
+        accounts.update(self.txn.get("Accounts", []))
+        for app_id in self.txn.get("Applications", []):
+            accounts.add(self.ctx.app_address(app_id))
+        return accounts
+
+    def account(self, value, pc):
+        """Resolve an account reference, an index into ``Accounts`` or an available address."""
+        if isinstance(value, int):
+            accounts = [self.txn.get("Sender", ZERO_ADDRESS)] + list(self.txn.get("Accounts", []))
+            if value >= len(accounts):
+                raise EvalError(f"invalid Account reference {value}", pc)
+            return accounts[value]
+        if len(value) != 32 or bytes(value) not in self._available_accounts():
+            raise EvalError(f"invalid Account reference {encoding.encode_address(bytes(value)) if len(value) == 32 else value!r}", pc)
+        return bytes(value)
+
+    def asset(self, value, pc):
+        """Resolve an asset reference, an index into ``Assets`` or an available asset id."""
+        assets = self.txn.get("Assets", [])
+        if value < len(assets):
+            return assets[value]
+        if value in assets:
+            return value
+        raise EvalError(f"unavailable Asset {value}", pc)
+
+    def application(self, value, pc):
+        """Resolve an application reference, an index into ``Applications`` or an available app id."""
+        applications = self.txn.get("Applications", [])
+        if value == 0:
+            return self.app_id
+        if value <= len(applications):
+            return applications[value - 1]
+        if value == self.app_id or value in applications:
+            return value
+        raise EvalError(f"unavailable App {value}", pc)
+
+    def box_name(self, name, pc):
+        if not 1 <= len(name) <= 64:
+            raise EvalError("box names must be 1 to 64 bytes long", pc)
+
+        # Every box access must be declared by one of the transactions in the group
+        for txn in self.group.transactions:
+            if txn.get("TypeEnum") != TXN_TYPES["appl"]:
+                continue
+            for app_id, box in txn.get("Boxes", []):
+                if box == name and app_id in (0, self.app_id):
+                    return bytes(name)
+        raise EvalError(f"invalid Box reference {name!r}", pc)
+
+    #
+    # Transaction field access
+    #
+
+    def group_txn(self, index, pc):
+        if index >= len(self.group.transactions):
+            raise EvalError(f"gtxn lookup TxnGroup[{index}] but it only has {len(self.group.transactions)}", pc)
+        return self.group.transactions[index]
+
+    def field(self, txn, field_index, array_index, pc):
+        name = TXN_FIELDS[field_index]
+        try:
+            value = txn_field(txn, name, array_index)
+        except EvalError as e:
+            raise EvalError(e.reason, pc) from None
+        return value
+
+    def global_field(self, field_index, pc):
+        name = GLOBAL_FIELDS[field_index]
+        ctx = self.ctx
+        if name == "MinTxnFee":
+            return ctx.min_txn_fee
+        if name == "MinBalance":
+            return ctx.min_balance
+        if name == "MaxTxnLife":
+            return 1000
+        if name == "ZeroAddress":
+            return ZERO_ADDRESS
+        if name == "GroupSize":
+            return len(self.group.transactions)
+        if name == "LogicSigVersion":
+            return 8
+        if name == "Round":
+            return ctx.eval_round
+        if name == "LatestTimestamp":
+            return ctx.latest_timestamp
+        if name == "CurrentApplicationID":
+            return self.app_id
+        if name == "CreatorAddress":
+            return ctx.app_params(self.app_id)["creator"]
+        if name == "CurrentApplicationAddress":
+            return ctx.app_address(self.app_id)
+        if name == "GroupID":
+            return self.group.group_id
+        if name == "OpcodeBudget":
+            return self.group.budget.remaining
+        if name == "CallerApplicationID":
+            return self.caller_app_id
+        if name == "CallerApplicationAddress":
+            return ctx.app_address(self.caller_app_id) if self.caller_app_id else ZERO_ADDRESS
+        raise EvalError(f"invalid global field {name}", pc)
+
+    #
+    # Inner transactions
+    #
+
+    def inner_field(self, field_index, value, pc):
+        name = TXN_FIELDS[field_index]
+        txn = self.pending_inner[-1]
+        if name in ("ApplicationArgs", "Accounts", "Assets", "Applications", "ApprovalProgramPages", "ClearStateProgramPages"):
+            txn.setdefault(name, []).append(value)
+            return
+        if name == "Type":
+            if value.decode(errors="replace") not in TXN_TYPES:
+                raise EvalError(f"{value!r} is not a valid Type for itxn_field", pc)
+            txn["Type"] = value
+            txn["TypeEnum"] = TXN_TYPES[value.decode()]
+            return
+        if name == "TypeEnum":
+            names = {number: key for key, number in TXN_TYPES.items()}
+            if value not in names:
+                raise EvalError(f"{value} is not a valid TypeEnum for itxn_field", pc)
+            txn["Type"] = names[value].encode()
+            txn["TypeEnum"] = value
+            return
+        if name in ("Sender", "Fee", "Note", "Receiver", "Amount", "CloseRemainderTo", "XferAsset",
+                    "AssetAmount", "AssetSender", "AssetReceiver", "AssetCloseTo", "RekeyTo",
+                    "ConfigAsset", "ConfigAssetTotal", "ConfigAssetDecimals", "ConfigAssetDefaultFrozen",
+                    "ConfigAssetUnitName", "ConfigAssetName", "ConfigAssetURL", "ConfigAssetMetadataHash",
+                    "ConfigAssetManager", "ConfigAssetReserve", "ConfigAssetFreeze", "ConfigAssetClawback",
+                    "FreezeAsset", "FreezeAssetAccount", "FreezeAssetFrozen", "ApplicationID",
+                    "OnCompletion", "ApprovalProgram", "ClearStateProgram", "GlobalNumUint",
+                    "GlobalNumByteSlice", "LocalNumUint", "LocalNumByteSlice", "ExtraProgramPages"):
+            if name in BYTES_TXN_FIELDS and isinstance(value, int):
+                raise EvalError(f"{name} must be []byte", pc)
+            if name not in BYTES_TXN_FIELDS and not isinstance(value, int):
+                raise EvalError(f"{name} must be uint64", pc)
+            if name in ADDRESS_TXN_FIELDS and value != ZERO_ADDRESS:
+                value = self.account(value, pc)
+            if name in ("XferAsset", "ConfigAsset", "FreezeAsset") and value and value not in self.txn.get("Assets", []):
+                raise EvalError(f"unavailable Asset {value}", pc)
+            txn[name] = bytes(value) if isinstance(value, (bytes, bytearray)) else value
+            return
+        raise EvalError(f"invalid itxn_field {name}", pc)
+
+    def submit_inner(self, pc):
+        if not self.pending_inner:
+            raise EvalError("itxn_submit without itxn_begin", pc)
+        transactions, self.pending_inner = self.pending_inner, None
+        if len(transactions) > 16:
+            raise EvalError("too many inner transactions 17 with 0 left", pc)
+        for txn in transactions:
+            if "TypeEnum" not in txn:
+                raise EvalError("Type arg not set", pc)
+        try:
+            self.last_inner = self.ctx.submit_inner(self, transactions)
+        except EvalError as e:
+            raise EvalError(e.reason, pc) from None
+        self.inner_transactions.extend(self.last_inner)
+
+    def new_inner(self):
+        # The sender defaults to the application account and the fee to whatever
+        # is left after fee pooling, which the ledger decides at submission
+        return {"Sender": self.ctx.app_address(self.app_id)}
+
+    #
+    # Main loop
+    #
+
+    def run(self):
+        """Evaluate the program, returning ``True`` when it approves."""
+        program = self.program
+        instructions = program.instructions
+        targets = program.targets
+        handlers = _HANDLERS
+        budget = self.group.budget
+        trace = self.trace
+        count = len(instructions)
+        index = 0
+
+        while index < count:
+            instruction = instructions[index]
+            spec = instruction.spec
+            pc = instruction.pc
+            if trace is not None:
+                trace.add(pc)
+            self.cost += spec.cost
+            budget.spend(spec.cost, pc)
+
+            name = spec.name
+            if name in ("bnz", "bz", "b", "callsub", "retsub", "switch", "match", "return"):
+                if name == "b":
+                    index = targets[index]
+                    continue
+                if name == "bnz":
+                    index = targets[index] if self.pop_int(pc) != 0 else index + 1
+                    continue
+                if name == "bz":
+                    index = targets[index] if self.pop_int(pc) == 0 else index + 1
+                    continue
+                if name == "callsub":
+                    if len(self.callstack) >= MAX_CALLSTACK_DEPTH * 16:
+                        raise EvalError("callsub stack overflow", pc)
+                    self.callstack.append([index + 1, len(self.stack), None, 0])
+                    index = targets[index]
+                    continue
+                if name == "retsub":
+                    if not self.callstack:
+                        raise EvalError("retsub with empty callstack", pc)
+                    return_index, height, frame, returns = self.callstack.pop()
+                    if frame is not None:
+                        # Drop the frame's arguments and locals, keeping the return values
+                        results = self.stack[len(self.stack) - returns:] if returns else []
+                        del self.stack[frame:]
+                        self.stack.extend(results)
+                    index = return_index
+                    continue
+                if name == "switch":
+                    selector = self.pop_int(pc)
+                    branches = targets[index]
+                    index = branches[selector] if selector < len(branches) else index + 1
+                    continue
+                if name == "match":
+                    branches = targets[index]
+                    value = self.pop(pc)
+                    candidates = [self.pop(pc) for _ in branches][::-1]
+                    matched = index + 1
+                    for position, candidate in enumerate(candidates):
+                        if type(candidate) is type(value) and candidate == value:
+                            matched = branches[position]
+                            break
+                    index = matched
+                    continue
+                # return
+                return self.pop_int(pc) != 0
+
+            handler = handlers.get(name)
+            if handler is None:
+                raise EvalError(f"{name} is not supported by the evaluator", pc)
+            handler(self, instruction.operands, pc)
+            index += 1
+
+        # Running off the end of the program requires a single value on the stack
+        if len(self.stack) != 1:
+            raise EvalError(f"stack len is {len(self.stack)} instead of 1", instructions[-1].pc if instructions else 0)
+        value = self.stack[0]
+        if not isinstance(value, int):
+            raise EvalError("stack finished with bytes not int", instructions[-1].pc)
+        return value != 0
+
+def _binary_int(op):
+    def handler(evaluator, operands, pc):
+        b = evaluator.pop_int(pc)
+        a = evaluator.pop_int(pc)
+        evaluator.push(op(a, b, pc), pc)
+    return handler
+
+def _checked_add(a, b, pc):
+    if a + b > MAX_UINT64:
+        raise EvalError("+ overflowed", pc)
+    return a + b
+
+def _checked_sub(a, b, pc):
+    if a < b:
+        raise EvalError("- would result negative", pc)
+    return a - b
+
+def _checked_mul(a, b, pc):
+    if a * b > MAX_UINT64:
+        raise EvalError("* overflowed", pc)
+    return a * b
+
+def _checked_div(a, b, pc):
+    if b == 0:
+        raise EvalError("/ 0", pc)
+    return a // b
+
+def _checked_mod(a, b, pc):
+    if b == 0:
+        raise EvalError("% 0", pc)
+    return a % b
+
+def _checked_exp(a, b, pc):
+    if a == 0 and b == 0:
+        raise EvalError("0^0 is undefined", pc)
+    if a > 1 and b > 64:
+        raise EvalError("exp overflowed", pc)
+    result = a ** b
+    if result > MAX_UINT64:
+        raise EvalError("exp overflowed", pc)
+    return result
+
+def _shift(op):
+    def apply(a, b, pc):
+        if b > 63:
+            raise EvalError(f"shift arg too large ({b})", pc)
+        return op(a, b) & MAX_UINT64
+    return apply
+
+def _op_equality(negate):
+    def handler(evaluator, operands, pc):
+        b = evaluator.pop(pc)
+        a = evaluator.pop(pc)
+        if isinstance(a, int) != isinstance(b, int):
+            raise EvalError(f"cannot compare ({_type_name(a)} to {_type_name(b)})", pc)
+        evaluator.push(int((a == b) != negate), pc)
+    return handler
+
+def _op_not(evaluator, operands, pc):
+    evaluator.push(int(evaluator.pop_int(pc) == 0), pc)
+
+def _op_bitnot(evaluator, operands, pc):
+    evaluator.push(evaluator.pop_int(pc) ^ MAX_UINT64, pc)
+
+def _op_hash(algorithm):
+    def handler(evaluator, operands, pc):
+        data = evaluator.pop_bytes(pc)
+        if algorithm == "sha512_256":
+            digest = encoding.checksum(data)
+        elif algorithm == "keccak256":
+            from Cryptodome.Hash import keccak
+            digest = keccak.new(data=data, digest_bits=256).digest()
+        else:
+            digest = hashlib.new(algorithm, data).digest()
+        evaluator.push(digest, pc)
+    return handler
+
+def _op_len(evaluator, operands, pc):
+    evaluator.push(len(evaluator.pop_bytes(pc)), pc)
+
+def _op_itob(evaluator, operands, pc):
+    evaluator.push(evaluator.pop_int(pc).to_bytes(8, "big"), pc)
+
+def _op_btoi(evaluator, operands, pc):
+    data = evaluator.pop_bytes(pc)
+    if len(data) > 8:
+        raise EvalError(f"btoi arg too long, got [{len(data)}]bytes", pc)
+    evaluator.push(int.from_bytes(data, "big"), pc)
+
+def _op_mulw(evaluator, operands, pc):
+    b = evaluator.pop_int(pc)
+    a = evaluator.pop_int(pc)
+    product = a * b
+    evaluator.push(product >> 64, pc)
+    evaluator.push(product & MAX_UINT64, pc)
+
+def _op_addw(evaluator, operands, pc):
+    b = evaluator.pop_int(pc)
+    a = evaluator.pop_int(pc)
+    total = a + b
+    evaluator.push(total >> 64, pc)
+    evaluator.push(total & MAX_UINT64, pc)
+
+def _op_divmodw(evaluator, operands, pc):
+    divisor_low = evaluator.pop_int(pc)
+    divisor_high = evaluator.pop_int(pc)
+    dividend_low = evaluator.pop_int(pc)
+    dividend_high = evaluator.pop_int(pc)
+    divisor = (divisor_high << 64) | divisor_low
+    if divisor == 0:
+        raise EvalError("/ 0", pc)
+    quotient, remainder = divmod((dividend_high << 64) | dividend_low, divisor)
+    for value in (quotient >> 64, quotient & MAX_UINT64, remainder >> 64, remainder & MAX_UINT64):
+        evaluator.push(value, pc)
+
+def _op_divw(evaluator, operands, pc):
+    divisor = evaluator.pop_int(pc)
+    low = evaluator.pop_int(pc)
+    high = evaluator.pop_int(pc)
+    if divisor == 0:
+        raise EvalError("/ 0", pc)
+    quotient = ((high << 64) | low) // divisor
+    if quotient > MAX_UINT64:
+        raise EvalError("divw overflow", pc)
+    evaluator.push(quotient, pc)
+
+def _op_sqrt(evaluator, operands, pc):
+    evaluator.push(math.isqrt(evaluator.pop_int(pc)), pc)
+
+def _op_bitlen(evaluator, operands, pc):
+    value = evaluator.pop(pc)
+    if isinstance(value, int):
+        evaluator.push(value.bit_length(), pc)
+    else:
+        evaluator.push(int.from_bytes(value, "big").bit_length(), pc)
+
+def _op_intcblock(evaluator, operands, pc):
+    evaluator.intc = list(operands[0])
+
+def _op_intc(index):
+    def handler(evaluator, operands, pc):
+        position = operands[0] if index is None else index
+        if position >= len(evaluator.intc):
+            raise EvalError(f"intc {position} beyond {len(evaluator.intc)} constants", pc)
+        evaluator.push(evaluator.intc[position], pc)
+    return handler
+
+def _op_bytecblock(evaluator, operands, pc):
+    evaluator.bytec = list(operands[0])
+
+def _op_bytec(index):
+    def handler(evaluator, operands, pc):
+        position = operands[0] if index is None else index
+        if position >= len(evaluator.bytec):
+            raise EvalError(f"bytec {position} beyond {len(evaluator.bytec)} constants", pc)
+        evaluator.push(evaluator.bytec[position], pc)
+    return handler
+
+def _op_pushbytes(evaluator, operands, pc):
+    evaluator.push(operands[0], pc)
+
+def _op_pushint(evaluator, operands, pc):
+    evaluator.push(operands[0], pc)
+
+def _op_pushmany(evaluator, operands, pc):
+    for value in operands[0]:
+        evaluator.push(value, pc)
+
+def _op_txn(evaluator, operands, pc):
+    evaluator.push(evaluator.field(evaluator.txn, operands[0], None, pc), pc)
+
+def _op_txna(evaluator, operands, pc):
+    evaluator.push(evaluator.field(evaluator.txn, operands[0], operands[1], pc), pc)
+
+def _op_txnas(evaluator, operands, pc):
+    index = evaluator.pop_int(pc)
+    evaluator.push(evaluator.field(evaluator.txn, operands[0], index, pc), pc)
+
+def _op_gtxn(evaluator, operands, pc):
+    txn = evaluator.group_txn(operands[0], pc)
+    evaluator.push(evaluator.field(txn, operands[1], None, pc), pc)
+
+def _op_gtxna(evaluator, operands, pc):
+    txn = evaluator.group_txn(operands[0], pc)
+    evaluator.push(evaluator.field(txn, operands[1], operands[2], pc), pc)
+
+def _op_gtxnas(evaluator, operands, pc):
+    index = evaluator.pop_int(pc)
+    txn = evaluator.group_txn(operands[0], pc)
+    evaluator.push(evaluator.field(txn, operands[1], index, pc), pc)
+
+def _op_gtxns(evaluator, operands, pc):
+    txn = evaluator.group_txn(evaluator.pop_int(pc), pc)
+    evaluator.push(evaluator.field(txn, operands[0], None, pc), pc)
+
+def _op_gtxnsa(evaluator, operands, pc):
+    txn = evaluator.group_txn(evaluator.pop_int(pc), pc)
+    evaluator.push(evaluator.field(txn, operands[0], operands[1], pc), pc)
+
+def _op_gtxnsas(evaluator, operands, pc):
+    index = evaluator.pop_int(pc)
+    txn = evaluator.group_txn(evaluator.pop_int(pc), pc)
+    evaluator.push(evaluator.field(txn, operands[0], index, pc), pc)
+
+def _op_global(evaluator, operands, pc):
+    evaluator.push(evaluator.global_field(operands[0], pc), pc)
+
+def _op_load(evaluator, operands, pc):
+    evaluator.push(evaluator.scratch[operands[0]], pc)
+
+def _op_store(evaluator, operands, pc):
+    evaluator.scratch[operands[0]] = evaluator.pop(pc)
+
+def _op_loads(evaluator, operands, pc):
+    slot = evaluator.pop_int(pc)
+    if slot > 255:
+        raise EvalError(f"invalid scratch space index {slot}", pc)
+    evaluator.push(evaluator.scratch[slot], pc)
+
+def _op_stores(evaluator, operands, pc):
+    value = evaluator.pop(pc)
+    slot = evaluator.pop_int(pc)
+    if slot > 255:
+        raise EvalError(f"invalid scratch space index {slot}", pc)
+    evaluator.scratch[slot] = value
+
+def _gload(evaluator, group_index, slot, pc):
+    if group_index >= evaluator.group_index:
+        raise EvalError(f"can't use gload on a txn at or after the current one ({group_index})", pc)
+    space = evaluator.group.scratch_spaces.get(group_index)
+    if space is None:
+        raise EvalError(f"can't use gload on non-app call txn {group_index}", pc)
+    return space[slot]
+
+def _op_gload(evaluator, operands, pc):
+    evaluator.push(_gload(evaluator, operands[0], operands[1], pc), pc)
+
+def _op_gloads(evaluator, operands, pc):
+    evaluator.push(_gload(evaluator, evaluator.pop_int(pc), operands[0], pc), pc)
+
+def _op_gloadss(evaluator, operands, pc):
+    slot = evaluator.pop_int(pc)
+    evaluator.push(_gload(evaluator, evaluator.pop_int(pc), slot, pc), pc)
+
+def _op_gaid(evaluator, operands, pc):
+    _push_created_id(evaluator, operands[0], pc)
+
+def _op_gaids(evaluator, operands, pc):
+    _push_created_id(evaluator, evaluator.pop_int(pc), pc)
+
+def _push_created_id(evaluator, group_index, pc):
+    if group_index >= evaluator.group_index:
+        raise EvalError(f"gaid can't get creatable ID of txn ahead of the current one", pc)
+    txn = evaluator.group.transactions[group_index]
+    created = txn.get("CreatedAssetID") or txn.get("CreatedApplicationID")
+    if not created:
+        raise EvalError(f"transaction {group_index} did not create an asset or application", pc)
+    evaluator.push(created, pc)
+
+def _op_err(evaluator, operands, pc):
+    raise EvalError("err opcode executed", pc)
+
+def _op_assert(evaluator, operands, pc):
+    if evaluator.pop_int(pc) == 0:
+        raise EvalError("assert failed", pc)
+
+def _op_pop(evaluator, operands, pc):
+    evaluator.pop(pc)
+
+def _op_popn(evaluator, operands, pc):
+    for _ in range(operands[0]):
+        evaluator.pop(pc)
+
+def _op_dup(evaluator, operands, pc):
+    value = evaluator.pop(pc)
+    evaluator.push(value, pc)
+    evaluator.push(value, pc)
+
+def _op_dupn(evaluator, operands, pc):
+    value = evaluator.pop(pc)
+    for _ in range(operands[0] + 1):
+        evaluator.push(value, pc)
+
+def _op_dup2(evaluator, operands, pc):
+    if len(evaluator.stack) < 2:
+        raise EvalError("stack underflow", pc)
+    evaluator.push(evaluator.stack[-2], pc)
+    evaluator.push(evaluator.stack[-2], pc)
+
+def _op_dig(evaluator, operands, pc):
+    depth = operands[0]
+    if depth >= len(evaluator.stack):
+        raise EvalError(f"dig {depth} with stack size {len(evaluator.stack)}", pc)
+    evaluator.push(evaluator.stack[-1 - depth], pc)
+
+def _op_bury(evaluator, operands, pc):
+    depth = operands[0]
+    value = evaluator.pop(pc)
+    if depth == 0 or depth > len(evaluator.stack):
+        raise EvalError(f"bury {depth} with stack size {len(evaluator.stack)}", pc)
+    evaluator.stack[-depth] = value
+
+def _op_swap(evaluator, operands, pc):
+    b = evaluator.pop(pc)
+    a = evaluator.pop(pc)
+    evaluator.push(b, pc)
+    evaluator.push(a, pc)
+
+def _op_select(evaluator, operands, pc):
+    condition = evaluator.pop_int(pc)
+    b = evaluator.pop(pc)
+    a = evaluator.pop(pc)
+    evaluator.push(b if condition != 0 else a, pc)
+
+def _op_cover(evaluator, operands, pc):
+    depth = operands[0]
+    if depth >= len(evaluator.stack):
+        raise EvalError(f"cover {depth} with stack size {len(evaluator.stack)}", pc)
+    value = evaluator.stack.pop()
+    evaluator.stack.insert(len(evaluator.stack) - depth, value)
+
+def _op_uncover(evaluator, operands, pc):
+    depth = operands[0]
+    if depth >= len(evaluator.stack):
+        raise EvalError(f"uncover {depth} with stack size {len(evaluator.stack)}", pc)
+    value = evaluator.stack.pop(len(evaluator.stack) - 1 - depth)
+    evaluator.stack.append(value)
+
+def _op_concat(evaluator, operands, pc):
+    b = evaluator.pop_bytes(pc)
+    a = evaluator.pop_bytes(pc)
+    evaluator.push(a + b, pc)
+
+def _substring(data, start, end, pc):
+    if end < start:
+        raise EvalError("substring end before start", pc)
+    if end > len(data):
+        raise EvalError("substring range beyond length of string", pc)
+    return data[start:end]
+
+def _op_substring(evaluator, operands, pc):
+    data = evaluator.pop_bytes(pc)
+    evaluator.push(_substring(data, operands[0], operands[1], pc), pc)
+
+def _op_substring3(evaluator, operands, pc):
+    end = evaluator.pop_int(pc)
+    start = evaluator.pop_int(pc)
+    data = evaluator.pop_bytes(pc)
+    evaluator.push(_substring(data, start, end, pc), pc)
+
+def _extract(data, start, length, pc):
+    if start > len(data) or start + length > len(data):
+        raise EvalError("extraction end exceeds the length of the string", pc)
+    return data[start:start + length]
+
+def _op_extract(evaluator, operands, pc):
+    data = evaluator.pop_bytes(pc)
+    start, length = operands
+    if length == 0:
+        if start > len(data):
+            raise EvalError("extraction start exceeds the length of the string", pc)
+        length = len(data) - start
+    evaluator.push(_extract(data, start, length, pc), pc)
+
+def _op_extract3(evaluator, operands, pc):
+    length = evaluator.pop_int(pc)
+    start = evaluator.pop_int(pc)
+    data = evaluator.pop_bytes(pc)
+    evaluator.push(_extract(data, start, length, pc), pc)
+
+def _op_extract_uint(width):
+    def handler(evaluator, operands, pc):
+        start = evaluator.pop_int(pc)
+        data = evaluator.pop_bytes(pc)
+        evaluator.push(int.from_bytes(_extract(data, start, width, pc), "big"), pc)
+    return handler
+
+def _replace(data, start, replacement, pc):
+    if start + len(replacement) > len(data):
+        raise EvalError("replacement end exceeds the length of the original string", pc)
+    return data[:start] + replacement + data[start + len(replacement):]
+
+def _op_replace2(evaluator, operands, pc):
+    replacement = evaluator.pop_bytes(pc)
+    data = evaluator.pop_bytes(pc)
+    evaluator.push(_replace(data, operands[0], replacement, pc), pc)
+
+def _op_replace3(evaluator, operands, pc):
+    replacement = evaluator.pop_bytes(pc)
+    start = evaluator.pop_int(pc)
+    data = evaluator.pop_bytes(pc)
+    evaluator.push(_replace(data, start, replacement, pc), pc)
+
+def _op_getbyte(evaluator, operands, pc):
+    index = evaluator.pop_int(pc)
+    data = evaluator.pop_bytes(pc)
+    if index >= len(data):
+        raise EvalError("getbyte index beyond array length", pc)
+    evaluator.push(data[index], pc)
+
+def _op_setbyte(evaluator, operands, pc):
+    value = evaluator.pop_int(pc)
+    index = evaluator.pop_int(pc)
+    data = bytearray(evaluator.pop_bytes(pc))
+    if index >= len(data):
+        raise EvalError("setbyte index beyond array length", pc)
+    if value > 255:
+        raise EvalError("setbyte value > 255", pc)
+    data[index] = value
+    evaluator.push(bytes(data), pc)
+
+def _op_getbit(evaluator, operands, pc):
+    index = evaluator.pop_int(pc)
+    target = evaluator.pop(pc)
+    if isinstance(target, int):
+        if index > 63:
+            raise EvalError("getbit index > 63 with with Uint", pc)
+        evaluator.push((target >> index) & 1, pc)
+        return
+    if index >= len(target) * 8:
+        raise EvalError("getbit index beyond byteslice", pc)
+    evaluator.push((target[index // 8] >> (7 - index % 8)) & 1, pc)
+
+def _op_setbit(evaluator, operands, pc):
+    bit = evaluator.pop_int(pc)
+    index = evaluator.pop_int(pc)
+    target = evaluator.pop(pc)
+    if bit > 1:
+        raise EvalError("setbit value > 1", pc)
+    if isinstance(target, int):
+        if index > 63:
+            raise EvalError("setbit index > 63 with Uint", pc)
+        evaluator.push((target & ~(1 << index)) | (bit << index), pc)
+        return
+    if index >= len(target) * 8:
+        raise EvalError("setbit index beyond byteslice", pc)
+    data = bytearray(target)
+    mask = 1 << (7 - index % 8)
+    data[index // 8] = (data[index // 8] & ~mask) | (mask if bit else 0)
+    evaluator.push(bytes(data), pc)
+
+def _op_bzero(evaluator, operands, pc):
+    length = evaluator.pop_int(pc)
+    if length > MAX_STRING_SIZE:
+        raise EvalError("bzero attempted to create a too large string", pc)
+    evaluator.push(bytes(length), pc)
+
+def _byte_math(op, returns_bool=False):
+    def handler(evaluator, operands, pc):
+        b = evaluator.pop_bytes(pc)
+        a = evaluator.pop_bytes(pc)
+        if len(a) > 64 or len(b) > 64:
+            raise EvalError("math attempted on large byte-array", pc)
+        x = int.from_bytes(a, "big")
+        y = int.from_bytes(b, "big")
+        result = op(x, y, pc)
+        if returns_bool:
+            evaluator.push(int(result), pc)
+        else:
+            evaluator.push(result.to_bytes(max(1, (result.bit_length() + 7) // 8), "big") if result else b"", pc)
+    return handler
+
+def _byte_bitwise(op):
+    def handler(evaluator, operands, pc):
+        b = evaluator.pop_bytes(pc)
+        a = evaluator.pop_bytes(pc)
+        width = max(len(a), len(b))
+        a = a.rjust(width, b"\x00")
+        b = b.rjust(width, b"\x00")
+        evaluator.push(bytes(op(x, y) for x, y in zip(a, b)), pc)
+    return handler
+
+def _op_bnot(evaluator, operands, pc):
+    evaluator.push(bytes(x ^ 0xff for x in evaluator.pop_bytes(pc)), pc)
+
+def _byte_sub(x, y, pc):
+    if x < y:
+        raise EvalError("byte math would have negative result", pc)
+    return x - y
+
+def _byte_div(x, y, pc):
+    if y == 0:
+        raise EvalError("division by zero", pc)
+    return x // y
+
+def _byte_mod(x, y, pc):
+    if y == 0:
+        raise EvalError("modulo by zero", pc)
+    return x % y
+
+def _op_proto(evaluator, operands, pc):
+    if not evaluator.callstack:
+        raise EvalError("proto was executed without a callsub", pc)
+    arguments, returns = operands
+    frame = evaluator.callstack[-1]
+    if len(evaluator.stack) < arguments:
+        raise EvalError(f"callsub to proto that requires {arguments} args with stack height {len(evaluator.stack)}", pc)
+    frame[2] = len(evaluator.stack) - arguments
+    frame[3] = returns
+    frame[1] = len(evaluator.stack)
+
+def _frame_position(evaluator, offset, pc):
+    if not evaluator.callstack or evaluator.callstack[-1][2] is None:
+        raise EvalError("frame_dig with empty callstack", pc)
+    base = evaluator.callstack[-1][1]
+    position = base + offset
+    if position < 0 or position >= len(evaluator.stack):
+        raise EvalError(f"frame access {offset} out of range", pc)
+    return position
+
+def _op_frame_dig(evaluator, operands, pc):
+    evaluator.push(evaluator.stack[_frame_position(evaluator, operands[0], pc)], pc)
+
+def _op_frame_bury(evaluator, operands, pc):
+    value = evaluator.pop(pc)
+    evaluator.stack[_frame_position(evaluator, operands[0], pc)] = value
+
+def _op_balance(evaluator, operands, pc):
+    address = evaluator.account(evaluator.pop(pc), pc)
+    evaluator.push(evaluator.ctx.balance(address), pc)
+
+def _op_min_balance(evaluator, operands, pc):
+    address = evaluator.account(evaluator.pop(pc), pc)
+    evaluator.push(evaluator.ctx.account_min_balance(address), pc)
+
+def _op_app_opted_in(evaluator, operands, pc):
+    app_id = evaluator.application(evaluator.pop_int(pc), pc)
+    address = evaluator.account(evaluator.pop(pc), pc)
+    evaluator.push(int(evaluator.ctx.opted_in(address, app_id)), pc)
+
+def _op_app_local_get(evaluator, operands, pc):
+    key = evaluator.pop_bytes(pc)
+    address = evaluator.account(evaluator.pop(pc), pc)
+    value = evaluator.ctx.local_get(address, evaluator.app_id, key)
+    evaluator.push(0 if value is None else value, pc)
+
+def _op_app_local_get_ex(evaluator, operands, pc):
+    key = evaluator.pop_bytes(pc)
+    app_id = evaluator.application(evaluator.pop_int(pc), pc)
+    address = evaluator.account(evaluator.pop(pc), pc)
+    value = evaluator.ctx.local_get(address, app_id, key)
+    evaluator.push(0 if value is None else value, pc)
+    evaluator.push(int(value is not None), pc)
+
+def _op_app_global_get(evaluator, operands, pc):
+    key = evaluator.pop_bytes(pc)
+    value = evaluator.ctx.global_get(evaluator.app_id, key)
+    evaluator.push(0 if value is None else value, pc)
+
+def _op_app_global_get_ex(evaluator, operands, pc):
+    key = evaluator.pop_bytes(pc)
+    app_id = evaluator.application(evaluator.pop_int(pc), pc)
+    value = evaluator.ctx.global_get(app_id, key)
+    evaluator.push(0 if value is None else value, pc)
+    evaluator.push(int(value is not None), pc)
+
+def _op_app_local_put(evaluator, operands, pc):
+    value = evaluator.pop(pc)
+    key = evaluator.pop_bytes(pc)
+    address = evaluator.account(evaluator.pop(pc), pc)
+    if len(key) > 64:
+        raise EvalError("key too long", pc)
+    evaluator.ctx.local_put(address, evaluator.app_id, key, value)
+
+def _op_app_global_put(evaluator, operands, pc):
+    value = evaluator.pop(pc)
+    key = evaluator.pop_bytes(pc)
+    if len(key) > 64:
+        raise EvalError("key too long", pc)
+    evaluator.ctx.global_put(evaluator.app_id, key, value)
+
+def _op_app_local_del(evaluator, operands, pc):
+    key = evaluator.pop_bytes(pc)
+    address = evaluator.account(evaluator.pop(pc), pc)
+    evaluator.ctx.local_del(address, evaluator.app_id, key)
+
+def _op_app_global_del(evaluator, operands, pc):
+    evaluator.ctx.global_del(evaluator.app_id, evaluator.pop_bytes(pc))
+
+def _op_asset_holding_get(evaluator, operands, pc):
+    asset_id = evaluator.asset(evaluator.pop_int(pc), pc)
+    address = evaluator.account(evaluator.pop(pc), pc)
+    holding = evaluator.ctx.asset_holding(address, asset_id)
+    if holding is None:
+        evaluator.push(0, pc)
+        evaluator.push(0, pc)
+        return
+    amount, frozen = holding
+    evaluator.push(amount if operands[0] == 0 else int(frozen), pc)
+    evaluator.push(1, pc)
+
+def _op_asset_params_get(evaluator, operands, pc):
+    asset_id = evaluator.asset(evaluator.pop_int(pc), pc)
+    params = evaluator.ctx.asset_params(asset_id)
+    if params is None:
+        evaluator.push(0, pc)
+        evaluator.push(0, pc)
+        return
+    evaluator.push(params[ASSET_PARAMS_FIELDS[operands[0]]], pc)
+    evaluator.push(1, pc)
+
+def _op_app_params_get(evaluator, operands, pc):
+    app_id = evaluator.application(evaluator.pop_int(pc), pc)
+    params = evaluator.ctx.app_params(app_id)
+    if params is None:
+        evaluator.push(0, pc)
+        evaluator.push(0, pc)
+        return
+    name = APP_PARAMS_FIELDS[operands[0]]
+    if name == "AppAddress":
+        value = evaluator.ctx.app_address(app_id)
+    else:
+        value = params[{
+            "AppApprovalProgram": "approval",
+            "AppClearStateProgram": "clear",
+            "AppGlobalNumUint": "global_ints",
+            "AppGlobalNumByteSlice": "global_bytes",
+            "AppLocalNumUint": "local_ints",
+            "AppLocalNumByteSlice": "local_bytes",
+            "AppExtraProgramPages": "extra_pages",
+            "AppCreator": "creator",
+        }[name]]
+    evaluator.push(value, pc)
+    evaluator.push(1, pc)
+
+def _op_acct_params_get(evaluator, operands, pc):
+    address = evaluator.account(evaluator.pop(pc), pc)
+    name = ACCT_PARAMS_FIELDS[operands[0]]
+    balance = evaluator.ctx.balance(address)
+    if name == "AcctBalance":
+        value = balance
+    elif name == "AcctMinBalance":
+        value = evaluator.ctx.account_min_balance(address)
+    else:
+        value = evaluator.ctx.auth_address(address) or ZERO_ADDRESS
+    evaluator.push(value, pc)
+    evaluator.push(int(balance > 0), pc)
+
+def _op_log(evaluator, operands, pc):
+    message = evaluator.pop_bytes(pc)
+    evaluator.logs.append(message)
+    if len(evaluator.logs) > 32:
+        raise EvalError("too many log calls in program. up to 32 is allowed.", pc)
+
+def _op_itxn_begin(evaluator, operands, pc):
+    if evaluator.pending_inner is not None:
+        raise EvalError("itxn_begin without itxn_submit", pc)
+    evaluator.pending_inner = [evaluator.new_inner()]
+
+def _op_itxn_next(evaluator, operands, pc):
+    if evaluator.pending_inner is None:
+        raise EvalError("itxn_next without itxn_begin", pc)
+    evaluator.pending_inner.append(evaluator.new_inner())
+
+def _op_itxn_field(evaluator, operands, pc):
+    if evaluator.pending_inner is None:
+        raise EvalError("itxn_field without itxn_begin", pc)
+    evaluator.inner_field(operands[0], evaluator.pop(pc), pc)
+
+def _op_itxn_submit(evaluator, operands, pc):
+    evaluator.submit_inner(pc)
+
+def _last_inner(evaluator, group_index, pc):
+    if not evaluator.last_inner:
+        raise EvalError("no inner transaction available", pc)
+    if group_index is None:
+        return evaluator.last_inner[-1]
+    if group_index >= len(evaluator.last_inner):
+        raise EvalError(f"gitxn {group_index} ... but last group has {len(evaluator.last_inner)}", pc)
+    return evaluator.last_inner[group_index]
+
+def _op_itxn(evaluator, operands, pc):
+    evaluator.push(evaluator.field(_last_inner(evaluator, None, pc), operands[0], None, pc), pc)
+
+def _op_itxna(evaluator, operands, pc):
+    evaluator.push(evaluator.field(_last_inner(evaluator, None, pc), operands[0], operands[1], pc), pc)
+
+def _op_itxnas(evaluator, operands, pc):
+    index = evaluator.pop_int(pc)
+    evaluator.push(evaluator.field(_last_inner(evaluator, None, pc), operands[0], index, pc), pc)
+
+def _op_gitxn(evaluator, operands, pc):
+    evaluator.push(evaluator.field(_last_inner(evaluator, operands[0], pc), operands[1], None, pc), pc)
+
+def _op_gitxna(evaluator, operands, pc):
+    evaluator.push(evaluator.field(_last_inner(evaluator, operands[0], pc), operands[1], operands[2], pc), pc)
+
+def _op_gitxnas(evaluator, operands, pc):
+    index = evaluator.pop_int(pc)
+    evaluator.push(evaluator.field(_last_inner(evaluator, operands[0], pc), operands[1], index, pc), pc)
+
+def _op_box_create(evaluator, operands, pc):
+    size = evaluator.pop_int(pc)
+    name = evaluator.box_name(evaluator.pop_bytes(pc), pc)
+    if size > 32768:
+        raise EvalError(f"box size too large: {size}, max 32768", pc)
+    existing = evaluator.ctx.box_get(evaluator.app_id, name)
+    if existing is not None:
+        if len(existing) != size:
+            raise EvalError(f"box size mismatch {len(existing)} {size}", pc)
+        evaluator.push(0, pc)
+        return
+    evaluator.ctx.box_put(evaluator.app_id, name, bytes(size))
+    evaluator.push(1, pc)
+
+def _op_box_get(evaluator, operands, pc):
+    name = evaluator.box_name(evaluator.pop_bytes(pc), pc)
+    value = evaluator.ctx.box_get(evaluator.app_id, name)
+    evaluator.push(b"" if value is None else value, pc)
+    evaluator.push(int(value is not None), pc)
+
+def _op_box_len(evaluator, operands, pc):
+    name = evaluator.box_name(evaluator.pop_bytes(pc), pc)
+    value = evaluator.ctx.box_get(evaluator.app_id, name)
+    evaluator.push(0 if value is None else len(value), pc)
+    evaluator.push(int(value is not None), pc)
+
+def _op_box_put(evaluator, operands, pc):
+    value = evaluator.pop_bytes(pc)
+    name = evaluator.box_name(evaluator.pop_bytes(pc), pc)
+    existing = evaluator.ctx.box_get(evaluator.app_id, name)
+    if existing is not None and len(existing) != len(value):
+        raise EvalError(f"attempt to box_put wrong size {len(existing)} != {len(value)}", pc)
+    evaluator.ctx.box_put(evaluator.app_id, name, value)
+
+def _op_box_del(evaluator, operands, pc):
+    name = evaluator.box_name(evaluator.pop_bytes(pc), pc)
+    existed = evaluator.ctx.box_get(evaluator.app_id, name) is not None
+    if existed:
+        evaluator.ctx.box_del(evaluator.app_id, name)
+    evaluator.push(int(existed), pc)
+
+def _op_box_extract(evaluator, operands, pc):
+    length = evaluator.pop_int(pc)
+    start = evaluator.pop_int(pc)
+    name = evaluator.box_name(evaluator.pop_bytes(pc), pc)
+    value = evaluator.ctx.box_get(evaluator.app_id, name)
+    if value is None:
+        raise EvalError(f"no such box {name!r}", pc)
+    evaluator.push(_extract(value, start, length, pc), pc)
+
+def _op_box_replace(evaluator, operands, pc):
+    replacement = evaluator.pop_bytes(pc)
+    start = evaluator.pop_int(pc)
+    name = evaluator.box_name(evaluator.pop_bytes(pc), pc)
+    value = evaluator.ctx.box_get(evaluator.app_id, name)
+    if value is None:
+        raise EvalError(f"no such box {name!r}", pc)
+    evaluator.ctx.box_put(evaluator.app_id, name, _replace(value, start, replacement, pc))
+
+def _unsupported(evaluator, operands, pc):
+    raise EvalError("signature verification is not supported by the evaluator", pc)
+
+_HANDLERS = {
+    "err": _op_err,
+    "sha256": _op_hash("sha256"),
+    "keccak256": _op_hash("keccak256"),
+    "sha512_256": _op_hash("sha512_256"),
+    "ed25519verify": _unsupported,
+    "+": _binary_int(_checked_add),
+    "-": _binary_int(_checked_sub),
+    "/": _binary_int(_checked_div),
+    "*": _binary_int(_checked_mul),
+    "<": _binary_int(lambda a, b, pc: int(a < b)),
+    ">": _binary_int(lambda a, b, pc: int(a > b)),
+    "<=": _binary_int(lambda a, b, pc: int(a <= b)),
+    ">=": _binary_int(lambda a, b, pc: int(a >= b)),
+    "&&": _binary_int(lambda a, b, pc: int(a != 0 and b != 0)),
+    "||": _binary_int(lambda a, b, pc: int(a != 0 or b != 0)),
+    "==": _op_equality(False),
+    "!=": _op_equality(True),
+    "!": _op_not,
+    "len": _op_len,
+    "itob": _op_itob,
+    "btoi": _op_btoi,
+    "%": _binary_int(_checked_mod),
+    "|": _binary_int(lambda a, b, pc: a | b),
+    "&": _binary_int(lambda a, b, pc: a & b),
+    "^": _binary_int(lambda a, b, pc: a ^ b),
+    "~": _op_bitnot,
+    "mulw": _op_mulw,
+    "addw": _op_addw,
+    "divmodw": _op_divmodw,
+    "intcblock": _op_intcblock,
+    "intc": _op_intc(None),
+    "intc_0": _op_intc(0),
+    "intc_1": _op_intc(1),
+    "intc_2": _op_intc(2),
+    "intc_3": _op_intc(3),
+    "bytecblock": _op_bytecblock,
+    "bytec": _op_bytec(None),
+    "bytec_0": _op_bytec(0),
+    "bytec_1": _op_bytec(1),
+    "bytec_2": _op_bytec(2),
+    "bytec_3": _op_bytec(3),
+    "txn": _op_txn,
+    "global": _op_global,
+    "gtxn": _op_gtxn,
+    "load": _op_load,
+    "store": _op_store,
+    "txna": _op_txna,
+    "gtxna": _op_gtxna,
+    "gtxns": _op_gtxns,
+    "gtxnsa": _op_gtxnsa,
+    "gload": _op_gload,
+    "gloads": _op_gloads,
+    "gaid": _op_gaid,
+    "gaids": _op_gaids,
+    "loads": _op_loads,
+    "stores": _op_stores,
+    "assert": _op_assert,
+    "bury": _op_bury,
+    "popn": _op_popn,
+    "dupn": _op_dupn,
+    "pop": _op_pop,
+    "dup": _op_dup,
+    "dup2": _op_dup2,
+    "dig": _op_dig,
+    "swap": _op_swap,
+    "select": _op_select,
+    "cover": _op_cover,
+    "uncover": _op_uncover,
+    "concat": _op_concat,
+    "substring": _op_substring,
+    "substring3": _op_substring3,
+    "getbit": _op_getbit,
+    "setbit": _op_setbit,
+    "getbyte": _op_getbyte,
+    "setbyte": _op_setbyte,
+    "extract": _op_extract,
+    "extract3": _op_extract3,
+    "extract_uint16": _op_extract_uint(2),
+    "extract_uint32": _op_extract_uint(4),
+    "extract_uint64": _op_extract_uint(8),
+    "replace2": _op_replace2,
+    "replace3": _op_replace3,
+    "balance": _op_balance,
+    "app_opted_in": _op_app_opted_in,
+    "app_local_get": _op_app_local_get,
+    "app_local_get_ex": _op_app_local_get_ex,
+    "app_global_get": _op_app_global_get,
+    "app_global_get_ex": _op_app_global_get_ex,
+    "app_local_put": _op_app_local_put,
+    "app_global_put": _op_app_global_put,
+    "app_local_del": _op_app_local_del,
+    "app_global_del": _op_app_global_del,
+    "asset_holding_get": _op_asset_holding_get,
+    "asset_params_get": _op_asset_params_get,
+    "app_params_get": _op_app_params_get,
+    "acct_params_get": _op_acct_params_get,
+    "min_balance": _op_min_balance,
+    "pushbytes": _op_pushbytes,
+    "pushint": _op_pushint,
+    "pushbytess": _op_pushmany,
+    "pushints": _op_pushmany,
+    "proto": _op_proto,
+    "frame_dig": _op_frame_dig,
+    "frame_bury": _op_frame_bury,
+    "shl": _binary_int(_shift(lambda a, b: a << b)),
+    "shr": _binary_int(_shift(lambda a, b: a >> b)),
+    "sqrt": _op_sqrt,
+    "bitlen": _op_bitlen,
+    "exp": _binary_int(_checked_exp),
+    "divw": _op_divw,
+    "b+": _byte_math(lambda x, y, pc: x + y),
+    "b-": _byte_math(_byte_sub),
+    "b/": _byte_math(_byte_div),
+    "b*": _byte_math(lambda x, y, pc: x * y),
+    "b<": _byte_math(lambda x, y, pc: x < y, returns_bool=True),
+    "b>": _byte_math(lambda x, y, pc: x > y, returns_bool=True),
+    "b<=": _byte_math(lambda x, y, pc: x <= y, returns_bool=True),
+    "b>=": _byte_math(lambda x, y, pc: x >= y, returns_bool=True),
+    "b==": _byte_math(lambda x, y, pc: x == y, returns_bool=True),
+    "b!=": _byte_math(lambda x, y, pc: x != y, returns_bool=True),
+    "b%": _byte_math(_byte_mod),
+    "b|": _byte_bitwise(lambda x, y: x | y),
+    "b&": _byte_bitwise(lambda x, y: x & y),
+    "b^": _byte_bitwise(lambda x, y: x ^ y),
+    "b~": _op_bnot,
+    "bzero": _op_bzero,
+    "log": _op_log,
+    "itxn_begin": _op_itxn_begin,
+    "itxn_field": _op_itxn_field,
+    "itxn_submit": _op_itxn_submit,
+    "itxn": _op_itxn,
+    "itxna": _op_itxna,
+    "itxn_next": _op_itxn_next,
+    "gitxn": _op_gitxn,
+    "gitxna": _op_gitxna,
+    "box_create": _op_box_create,
+    "box_extract": _op_box_extract,
+    "box_replace": _op_box_replace,
+    "box_del": _op_box_del,
+    "box_len": _op_box_len,
+    "box_get": _op_box_get,
+    "box_put": _op_box_put,
+    "txnas": _op_txnas,
+    "gtxnas": _op_gtxnas,
+    "gtxnsas": _op_gtxnsas,
+    "gloadss": _op_gloadss,
+    "itxnas": _op_itxnas,
+    "gitxnas": _op_gitxnas,
+}
+
+EvalResult = namedtuple("EvalResult", ["approved", "cost", "logs", "inner"])
+
+def evaluate(program, ctx, group, group_index, app_id, caller_app_id=0):
+    """Evaluate the decoded ``program`` for transaction ``group_index`` of the ``GroupState`` ``group``.
+
+    Raises ``EvalError`` when the program fails, otherwise returns an ``EvalResult``.
+    """
+    evaluator = Evaluator(program, ctx, group, group_index, app_id, caller_app_id)
+    approved = evaluator.run()
+    if evaluator.pending_inner is not None:
+        raise EvalError("itxn_begin without itxn_submit")
+    return EvalResult(approved, evaluator.cost, evaluator.logs, evaluator.inner_transactions)
@@ -0,0 +1,301 @@
+"""Measure the membership throughput of WizCoin on an in-process ledger.
+
+The benchmark deploys an instance with ``WizCoinFactory`` on a
+``ledger_sim.Ledger``, whose ASA supplies one token per member, and opts the
+members in. From that snapshot of the ledger it then measures
+
+* ``join``: every member joining through ``BulkJoiner``, once per level of
+  concurrency. For each level it records ``joins_per_second``, the ``latency_p50``/``p90``/``p99`` from submission to
+  confirmation in seconds, the ``fee_per_member`` in microAlgos and the
+  ``failure_rate``.
+* ``mix``: once everybody joined, a seeded mix of the token operations of
+  ``test_interaction.py``: transfers between accounts, freezes and clawbacks by
+  the manager. For each kind it records ``ops_per_second``, the latency
+  percentiles, the ``fee_per_op`` and the ``failure_rate``.
+
+The report is JSON, so it can be compared against a recorded baseline:
+
+    python benchmark.py --baseline wizcoin_benchmark_baseline.json
+
+Timings vary from one run and machine to the next, so they only count as
+regressions beyond ``TIMING_TOLERANCE`` and ``latency_p99`` not at all, while
+fees and failures have to match. The simulator produces a block per submitted
+group, so the joins per round are always one there and are not reported: only
+the blocks of a node, filled by many clients, tell the capacity of a round.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import algosdk
+from algosdk import transaction
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+
+from bulk_join import Joiner, bulk_join
+from deployment import WizCoinFactory
+from ledger_sim import Ledger, SimAlgodClient
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wizcoin_benchmark_baseline.json")
+
+# The number of members, as many as the tests' `TMPL_MAX_WIZCOINS`
+DEFAULT_MEMBERS = 400
+
+# The levels of concurrency, in joins in flight, the joins are measured at
+DEFAULT_CONCURRENCY = (1, 16, 128)
+
+# The number of operations of the token mix and the share of each kind
+DEFAULT_MIX_OPERATIONS = 200
+MIX = (("transfer", 2), ("freeze", 1), ("clawback", 1))
+
+# The metrics which are better when higher; all of the other metrics are better when lower
+HIGHER_IS_BETTER = frozenset(["joins_per_second", "ops_per_second"])
+
+# The metrics measured in time, and by how much they may get worse before counting as a regression:
+# a tolerance of 1.0 lets a latency double and a throughput halve
+TIMING_METRICS = frozenset(["joins_per_second", "ops_per_second", "latency_p50", "latency_p90"])
+TIMING_TOLERANCE = 1.0
+
+# The tail latency rests on a handful of samples, too few to tell a regression from noise
+UNCHECKED_METRICS = frozenset(["latency_p99"])
+
+# The microAlgos every account starts with
+FUNDS = 1_000_000_000
+
+# The most transactions in an atomic group
+MAX_GROUP_SIZE = 16
+
+def _percentile(values, fraction):
+    """Return the nearest-rank percentile of ``values`` at ``fraction``."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def _latencies(latencies):
+    return {
+        "latency_p50": _percentile(latencies, 0.5),
+        "latency_p90": _percentile(latencies, 0.9),
+        "latency_p99": _percentile(latencies, 0.99),
+    }
+
+class _Account:
+    def __init__(self):
+        self.private_key, self.address = algosdk.account.generate_account()
+        self.signer = AccountTransactionSigner(self.private_key)
+
+class _Benchmark:
+    """A WizCoin instance on a fresh ledger, with ``members`` accounts opted in to its ASA."""
+    def __init__(self, members):
+        self.manager = _Account()
+        self.members = [_Account() for _ in range(members)]
+        # The accounts which receive the transfers of the token mix
+        self.recipients = [_Account() for _ in range(max(1, members // 8))]
+
+        accounts = [self.manager] + self.members + self.recipients
+        self.ledger = Ledger({account.address: FUNDS for account in accounts})
+        self.client = SimAlgodClient(self.ledger)
+
+        report = WizCoinFactory(self.manager, total=members, client=self.client).deploy([None])
+        self.instance = report.instances[0]
+        self.app_address = algosdk.logic.get_application_address(self.instance.app_id)
+
+        # Opt every account in to the ASA, many at a time
+        params = self.client.suggested_params()
+        opting_in = self.members + self.recipients
+        for start in range(0, len(opting_in), MAX_GROUP_SIZE):
+            accounts = opting_in[start:start + MAX_GROUP_SIZE]
+            txns = transaction.assign_group_id([
+                transaction.AssetTransferTxn(account.address, params, account.address, 0, self.instance.asset_id)
+                for account in accounts
+            ])
+            self.client.send_transactions([account.signer.sign_transactions([txn], [0])[0] for account, txn in zip(accounts, txns)])
+
+    def balance(self, account):
+        return self.client.account_info(account.address)["amount"]
+
+    def join(self, concurrency):
+        """Join every member with ``concurrency`` joins in flight."""
+        balances = [self.balance(member) for member in self.members]
+        start = time.perf_counter()
+        results = bulk_join(
+            self.instance.app_id,
+            self.instance.asset_id,
+            [Joiner(member.address, member.signer) for member in self.members],
+            template_values=self.instance.template_values,
+            client=self.client,
+            max_threads=min(concurrency, 8),
+            max_in_flight=concurrency,
+        )
+        seconds = time.perf_counter() - start
+
+        joined = [
+            (member, balance)
+            for member, balance, result in zip(self.members, balances, results)
+            if result.error is None
+        ]
+        amount = self.instance.template_values["TMPL_AMOUNT"]
+        fees = [balance - self.balance(member) - amount for member, balance in joined]
+        return {
+            "joins_per_second": len(joined) / seconds,
+            **_latencies([result.latency for result in results if result.error is None]),
+            "fee_per_member": sum(fees) / len(fees) if fees else None,
+            "failure_rate": 1 - len(joined) / len(results),
+        }
+
+    def _send(self, sender, txn):
+        start = time.perf_counter()
+        txid = self.client.send_transactions(sender.signer.sign_transactions([txn], [0]))
+        transaction.wait_for_confirmation(self.client, txid, 10)
+        return time.perf_counter() - start
+
+    def mix(self, operations, seed=0):
+        """Run up to ``operations`` seeded token operations, skipping those no account is eligible for."""
+        rng = random.Random(seed)
+        asset_id = self.instance.asset_id
+        params = self.client.suggested_params()
+        kinds = [kind for kind, weight in MIX for _ in range(weight)]
+
+        holders = list(self.members)
+        frozen = set()
+        results = {kind: {"latencies": [], "fees": [], "failures": 0} for kind, _ in MIX}
+        for index in range(operations):
+            kind = rng.choice(kinds)
+            # Tells apart otherwise identical operations, such as freezing the same account twice
+            note = f"mix {index}".encode()
+            unfrozen = [holder for holder in holders if holder.address not in frozen]
+            receivers = [recipient for recipient in self.recipients if recipient.address not in frozen]
+            if kind == "transfer" and unfrozen and receivers:
+                sender = rng.choice(unfrozen)
+                receiver = rng.choice(receivers)
+                txn = transaction.AssetTransferTxn(sender.address, params, receiver.address, 1, asset_id, note=note)
+                holders.remove(sender)
+                holders.append(receiver)
+            elif kind == "freeze" and holders:
+                sender = self.manager
+                target = rng.choice(holders)
+                txn = transaction.AssetFreezeTxn(sender.address, params, asset_id, target.address, target.address not in frozen, note=note)
+                frozen.symmetric_difference_update([target.address])
+            elif kind == "clawback" and holders:
+                sender = self.manager
+                target = rng.choice(holders)
+                txn = transaction.AssetTransferTxn(sender.address, params, self.app_address, 1, asset_id, revocation_target=target.address, note=note)
+                holders.remove(target)
+            else:
+                continue
+
+            balance = self.balance(sender)
+            try:
+                results[kind]["latencies"].append(self._send(sender, txn))
+            except algosdk.error.AlgodHTTPError:
+                results[kind]["failures"] += 1
+                continue
+            results[kind]["fees"].append(balance - self.balance(sender))
+
+        report = {}
+        for kind, result in results.items():
+            count = len(result["latencies"]) + result["failures"]
+            seconds = sum(result["latencies"])
+            report[kind] = {
+                "operations": count,
+                "ops_per_second": len(result["latencies"]) / seconds if seconds else 0,
+                **_latencies(result["latencies"]),
+                "fee_per_op": sum(result["fees"]) / len(result["fees"]) if result["fees"] else None,
+                "failure_rate": result["failures"] / count if count else 0,
+            }
+        return report
+
+def benchmark(members=DEFAULT_MEMBERS, concurrency=DEFAULT_CONCURRENCY, mix_operations=DEFAULT_MIX_OPERATIONS, seed=0):
+    """Return the JSON-serializable benchmark report of ``members`` members."""
+    bench = _Benchmark(members)
+
+    # Every level starts from the same ledger, with nobody joined yet
+    report = {"members": members, "join": {}}
+    snapshot = bench.ledger.snapshot()
+    for level in concurrency:
+        report["join"][str(level)] = bench.join(level)
+        bench.ledger.restore(snapshot)
+        snapshot = bench.ledger.snapshot()
+
+    bench.join(max(concurrency))
+    report["mix"] = bench.mix(mix_operations, seed)
+    return report
+
+def _metrics(report):
+    """Yield the ``(section, name, metric, value)`` of every metric of ``report``."""
+    for section in ("join", "mix"):
+        for name, metrics in report[section].items():
+            for metric, value in metrics.items():
+                if metric != "operations":
+                    yield section, name, metric, value
+
+def regressions(report, baseline):
+    """List every metric of ``report`` which got worse than in the ``baseline`` report."""
+    messages = []
+    for section, name, metric, value in _metrics(report):
+        baseline_value = baseline.get(section, {}).get(name, {}).get(metric)
+        if value is None or baseline_value is None or metric in UNCHECKED_METRICS:
+            continue
+        tolerance = TIMING_TOLERANCE if metric in TIMING_METRICS else 0
+        if metric in HIGHER_IS_BETTER:
+            worse = value < baseline_value / (1 + tolerance)
+        else:
+            worse = value > baseline_value * (1 + tolerance)
+        if worse:
+            messages.append(f"{section} {name}: {metric} {value:.6g} is worse than baseline {baseline_value:.6g}")
+    return messages
+
+def comparison(before, after):
+    """Tabulate how every metric changed from the ``before`` report to the ``after`` report."""
+    lines = [f"{'section':<10}{'name':<10}{'metric':<18}{'before':>12}{'after':>12}{'change':>9}"]
+    for section, name, metric, value in _metrics(after):
+        before_value = before.get(section, {}).get(name, {}).get(metric)
+        if value is None or before_value is None:
+            continue
+        change = f"{(value - before_value) / before_value:+.0%}" if before_value else ""
+        lines.append(f"{section:<10}{name:<10}{metric:<18}{before_value:>12.6g}{value:>12.6g}{change:>9}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=DEFAULT_MEMBERS, help="the number of members, and WizCoins")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY, help="the levels of joins in flight to measure")
+    parser.add_argument("--mix-operations", type=int, default=DEFAULT_MIX_OPERATIONS, help="the number of operations of the token mix")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the token mix")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="fail when a metric got worse than in the report in this file")
+    parser.add_argument("--compare", help="tabulate the changes from the report in this file on stderr")
+    parser.add_argument("--update-baseline", action="store_true", help=f"record the report as the new baseline (default {DEFAULT_BASELINE})")
+    args = parser.parse_args(argv)
+
+    report = benchmark(args.members, args.concurrency, args.mix_operations, args.seed)
+    text = json.dumps(report, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print(comparison(json.load(f), report), file=sys.stderr)
+
+    if args.update_baseline:
+        with open(args.baseline or DEFAULT_BASELINE, "w") as f:
+            f.write(text + "\n")
+        return 0
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            messages = regressions(report, json.load(f))
+        for message in messages:
+            print(message, file=sys.stderr)
+        return 1 if messages else 0
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
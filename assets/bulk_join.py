@@ -0,0 +1,145 @@
+"""Join many accounts to WizCoin at once.
+
+Joining takes an atomic group of the ``join_wizcoin`` application call and
+the membership payment. Sending the groups one at a time and waiting for each
+confirmation onboards a single member per round trip. ``BulkJoiner`` instead:
+
+* builds and signs the group of every joiner of a (possibly asynchronous)
+  stream as it arrives, with the suggested parameters the ``ParamsCache``
+  holds for the current round at that time,
+* submits up to ``max_in_flight`` groups concurrently, running the requests
+  on ``max_threads`` threads sharing one algod client,
+* waits for all of the submitted groups together, through a
+  ``ConfirmationService`` following the blocks once for all of them.
+
+A failed join is reported in the ``JoinResult`` of its joiner and does not
+affect the others. Given a ``preflight.Preflight``, groups which the
+application would reject fail with a ``PreflightError`` without being sent.
+
+The algod client of ``algosdk`` is synchronous, so every request runs on one
+of the threads while the event loop keeps the others going. The threads share
+the client of ``algod_connection.algod_client``, which keeps up to
+``MAX_CONNECTIONS`` HTTP connections to the node alive between requests, as
+many as ``max_threads`` by default, so a thread does not open a connection per
+request.
+"""
+import asyncio
+import contextvars
+import functools
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import algosdk
+from algosdk import transaction
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+
+from algod_connection import MAX_CONNECTIONS, algod_client
+from confirmations import ConfirmationService
+from fee_planner import pool_fees
+from member_registry import member_box
+from method_dispatch import selector
+from params_cache import ParamsCache
+from wizcoin_smart_contract import DEFAULT_TEMPLATE_VALUES
+
+# The outcome of one join, with the seconds from its submission to its confirmation as ``latency``
+JoinResult = namedtuple("JoinResult", ["address", "txid", "confirmed_round", "error", "latency"])
+
+class Joiner(namedtuple("Joiner", ["address", "signer"])):
+    """An account to join, with the ``TransactionSigner`` signing for its ``address``."""
+    @classmethod
+    def from_account(cls, account):
+        """Return the ``Joiner`` of an account with ``address`` and ``private_key``."""
+        return cls(account.address, AccountTransactionSigner(account.private_key))
+
+async def _stream(joiners):
+    """Iterate over ``joiners``, either an iterable or an asynchronous iterable."""
+    if hasattr(joiners, "__aiter__"):
+        async for joiner in joiners:
+            yield joiner
+    else:
+        for joiner in joiners:
+            yield joiner
+
+class BulkJoiner:
+    """Joins accounts to the WizCoin membership application ``app_id`` selling ``asset_id``.
+
+    ``template_values`` are those the application was deployed with, and
+    default to ``DEFAULT_TEMPLATE_VALUES``. Every group is first checked by
+    ``preflight`` if given. The suggested parameters come from
+    ``params_cache``, which learns the rounds of the confirmations.
+    """
+    def __init__(self, app_id, asset_id, template_values=None, client=None, preflight=None, params_cache=None, confirmations=None, max_threads=MAX_CONNECTIONS, max_in_flight=256, wait_rounds=10):
+        values = dict(DEFAULT_TEMPLATE_VALUES, **(template_values or {}))
+        self.app_id = app_id
+        self.asset_id = asset_id
+        self.app_address = algosdk.logic.get_application_address(app_id)
+        self.amount = values["TMPL_AMOUNT"]
+        self.client = client if client is not None else algod_client()
+        self.preflight = preflight
+        self.params_cache = params_cache if params_cache is not None else ParamsCache(self.client)
+        self.confirmations = confirmations if confirmations is not None else ConfirmationService(self.client)
+        self.max_threads = max_threads
+        self.max_in_flight = max_in_flight
+        self.wait_rounds = wait_rounds
+
+    async def _request(self, method, *args):
+        """Call the algod ``method`` on one of the request threads."""
+        # Run in the context of the caller, like `asyncio.to_thread` does
+        call = functools.partial(contextvars.copy_context().run, method, *args)
+        return await asyncio.get_running_loop().run_in_executor(self._threads, call)
+
+    def _group(self, joiner, params):
+        """Return the join group of ``joiner``."""
+        # The application call pays the fees of the group, the inner transaction
+        # sending the membership token included
+        return transaction.assign_group_id(pool_fees([
+            transaction.ApplicationCallTxn(
+                sender=joiner.address,
+                sp=params,
+                index=self.app_id,
+                on_complete=transaction.OnComplete.NoOpOC,
+                app_args=[selector("join_wizcoin")],
+                accounts=[joiner.address],
+                foreign_assets=[self.asset_id],
+                boxes=[member_box(joiner.address)],
+            ),
+            transaction.PaymentTxn(joiner.address, params, self.app_address, self.amount),
+        ], min_fee=params.min_fee))
+
+    async def _join(self, joiner):
+        txid = None
+        try:
+            # The cache refreshes the parameters as the rounds of the confirmations go by
+            params = await self.params_cache.get_async()
+            txns = self._group(joiner, params)
+            txid = txns[0].get_txid()
+            if self.preflight is not None:
+                await self._request(self.preflight.validate, txns)
+            signed = joiner.signer.sign_transactions(txns, [0, 1])
+            submitted = time.perf_counter()
+            await self._request(self.client.send_transactions, signed)
+            info = await self.confirmations.wait_async(txns[0], self.wait_rounds)
+            self.params_cache.observe(info["confirmed-round"])
+        except Exception as e:
+            return JoinResult(joiner.address, txid, None, e, None)
+        finally:
+            self._in_flight.release()
+        return JoinResult(joiner.address, txid, info["confirmed-round"], None, time.perf_counter() - submitted)
+
+    async def join(self, joiners):
+        """Join every ``Joiner`` of ``joiners``, returning the ``JoinResult`` of each in order."""
+        self._threads = ThreadPoolExecutor(self.max_threads, thread_name_prefix="algod")
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        try:
+            joins = []
+            async for joiner in _stream(joiners):
+                await self._in_flight.acquire()
+                joins.append(asyncio.ensure_future(self._join(joiner)))
+            return await asyncio.gather(*joins)
+        finally:
+            self._threads.shutdown()
+
+def bulk_join(app_id, asset_id, joiners, **options):
+    """Join every ``Joiner`` of ``joiners`` from synchronous code, see ``BulkJoiner``."""
+    return asyncio.run(BulkJoiner(app_id, asset_id, **options).join(joiners))
@@ -5,4 +5,4 @@ def clear_program():
     return Return(Int(1))
 
 if __name__ == "__main__":
-    print(compileTeal(clear_program(), Mode.Application, version=5))
+    print(compileTeal(clear_program(), Mode.Application, version=8))
@@ -0,0 +1,273 @@
+"""An on-disk, content-addressed cache of compiled PyTEAL programs.
+
+Every entry is keyed by the TEAL version, the compiler options and a digest
+of the source files which build the program: the module of the build function
+and every module of its directory it imports from. Editing
+``wizcoin_smart_contract.py`` or ``member_registry.py`` thus automatically
+invalidates the stale entries, while a hit is found without building the AST.
+An entry stores the TEAL text and, once it has been compiled through algod,
+the program bytecode and its hash. Hence, repeated deployments skip both the
+PyTEAL build and the algod compile round trip.
+"""
+import base64
+import enum
+import hashlib
+import inspect
+import json
+import os
+import sys
+from dataclasses import dataclass
+
+import pyteal
+from pyteal import *
+
+import method_dispatch
+from compile_programs import DEFAULT_VERSION, local_dependencies
+
+def default_cache_dir():
+    """Return the directory of the default cache: ``WIZCOIN_CACHE_DIR``, or ``~/.cache/wizcoin/teal``.
+
+    The variable is read on every call, so that e.g. the tests can move the
+    cache after this module has been imported.
+    """
+    return os.environ.get("WIZCOIN_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "wizcoin", "teal")
+
+# Attributes of PyTEAL expressions which record where the expression was
+# built rather than what it computes. They must not influence the cache key.
+_IGNORED_ATTRIBUTES = frozenset(["trace", "stack_frames"])
+
+@dataclass(frozen=True)
+class CompiledProgram:
+    """A compiled program: its TEAL ``teal``, and its ``bytecode`` and ``program_hash`` once assembled by algod.
+
+    The ``assembler`` identifies the algod which produced the ``bytecode``.
+    """
+    teal: str
+    bytecode: bytes = None
+    program_hash: str = None
+    assembler: str = None
+
+def _assembler(algod_client):
+    """Identify the assembler behind ``algod_client``, so that bytecode is only reused with the same one."""
+    return getattr(algod_client, "assembler", None) or getattr(algod_client, "algod_address", "")
+
+def _source_digest(obj):
+    """Hash the contents of the source file defining ``obj``, a function or a module."""
+    try:
+        with open(inspect.getsourcefile(obj), "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except (TypeError, OSError):
+        # Programs built interactively have no source file to invalidate on
+        return ""
+
+def _build_digest(build):
+    """Hash the sources of the module defining ``build`` and of the modules of its directory it depends on.
+
+    The name, code and closure of ``build`` itself are included too, so two
+    builds defined in the same module never share an entry.
+    """
+    module = sys.modules.get(getattr(build, "__module__", None) or "")
+    path = getattr(module, "__file__", None)
+    if path is None:
+        sources = [_source_digest(build)]
+    else:
+        directory = os.path.dirname(os.path.abspath(path))
+        sources = [
+            f"{name}:{_source_digest(sys.modules[name])}"
+            for name in sorted(local_dependencies(module, directory))
+        ]
+
+    closure = [cell.cell_contents for cell in getattr(build, "__closure__", None) or ()]
+    return json.dumps([sources, ast_digest(build), ast_digest(closure)])
+
+def ast_digest(expr):
+    """Return a stable digest of the structure of the PyTEAL ``expr``.
+
+    Scratch slots allocated by PyTEAL are numbered from a process-wide counter,
+    so they are renumbered in order of appearance to keep the digest stable
+    across repeated builds of the same program.
+    """
+    digest = hashlib.sha256()
+    slot_numbers = {}
+    in_progress = set()
+
+    def feed(token):
+        digest.update(token.encode())
+        digest.update(b"\x00")
+
+    def visit(node):
+        if node is None or isinstance(node, (bool, int, float, str)):
+            feed(repr(node))
+        elif isinstance(node, (bytes, bytearray)):
+            feed(node.hex())
+        elif isinstance(node, enum.Enum):
+            feed(f"{type(node).__qualname__}.{node.name}")
+        elif isinstance(node, ScratchSlot):
+            if node.isReservedSlot:
+                feed(f"slot:{node.id}")
+            else:
+                feed(f"slot#{slot_numbers.setdefault(id(node), len(slot_numbers))}")
+        elif isinstance(node, (list, tuple)):
+            feed(f"[{len(node)}")
+            for item in node:
+                visit(item)
+        elif isinstance(node, dict):
+            feed(f"{{{len(node)}")
+            for key, value in node.items():
+                visit(key)
+                visit(value)
+        elif inspect.isfunction(node) or inspect.ismethod(node):
+            code = node.__code__
+            feed(f"fn:{node.__qualname__}:{code.co_code.hex()}:{code.co_consts!r}")
+        elif hasattr(node, "__dict__"):
+            if id(node) in in_progress:
+                feed("cycle")
+                return
+
+            in_progress.add(id(node))
+            feed(type(node).__qualname__)
+            for name, value in sorted(vars(node).items()):
+                if name in _IGNORED_ATTRIBUTES:
+                    continue
+                feed(name)
+                visit(value)
+            in_progress.discard(id(node))
+        else:
+            feed(repr(node))
+
+    visit(expr)
+    return digest.hexdigest()
+
+class ProgramCache:
+    """A size-bounded cache of ``CompiledProgram`` entries stored under ``directory``.
+
+    The least recently used entries are evicted once the cache holds more than
+    ``max_entries`` entries or ``max_bytes`` bytes. The ``directory`` defaults
+    to ``default_cache_dir()``.
+    """
+    def __init__(self, directory=None, max_entries=64, max_bytes=16 * 1024 * 1024):
+        self.directory = directory or default_cache_dir()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, build, mode, version, options, passes=()):
+        """Return the content address of the program built by ``build``, without building it."""
+        material = json.dumps([
+            pyteal.__version__ if hasattr(pyteal, "__version__") else "",
+            _build_digest(build),
+            _source_digest(method_dispatch.lower_method_dispatch),
+            [f"{teal_pass.__module__}.{teal_pass.__qualname__}:{_source_digest(teal_pass)}" for teal_pass in passes],
+            mode.name,
+            version,
+            sorted(options.items()),
+        ])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key):
+        """Return the ``CompiledProgram`` stored under ``key`` or ``None`` on a miss."""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # Mark the entry as recently used for the eviction policy
+        os.utime(path)
+
+        bytecode = entry.get("bytecode")
+        return CompiledProgram(
+            teal=entry["teal"],
+            bytecode=base64.b64decode(bytecode) if bytecode is not None else None,
+            program_hash=entry.get("program_hash"),
+            assembler=entry.get("assembler"),
+        )
+
+    def store(self, key, program):
+        """Store the ``program`` under ``key`` and evict any entries beyond the size bounds."""
+        entry = {
+            "teal": program.teal,
+            "bytecode": base64.b64encode(program.bytecode).decode() if program.bytecode is not None else None,
+            "program_hash": program.program_hash,
+            "assembler": program.assembler,
+        }
+
+        # Write atomically so that concurrent test workers never read a partial entry
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is within its bounds."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        entries.sort(reverse=True)
+        total_bytes = 0
+        for index, (_, size, name) in enumerate(entries):
+            total_bytes += size
+            if index >= self.max_entries or total_bytes > self.max_bytes:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def get(self, build, mode=Mode.Application, version=DEFAULT_VERSION, algod_client=None, passes=(), **options):
+        """Return the ``CompiledProgram`` built by the ``build`` function.
+
+        The ``options`` are forwarded to ``compileTeal`` and the method dispatch
+        is lowered to a ``match`` behind its hot methods on TEAL v8 and later.
+        The TEAL is then rewritten by each of the ``passes`` in turn. When an
+        ``algod_client`` is supplied, the program is also assembled into
+        bytecode, unless the cached entry already holds bytecode from the same
+        assembler. The program is only built on a miss.
+        """
+        key = self.key(build, mode, version, options, passes)
+
+        program = self.load(key)
+        if program is None:
+            teal = method_dispatch.compile_teal(build(), mode=mode, version=version, **options)
+            for teal_pass in passes:
+                teal = teal_pass(teal)
+            program = CompiledProgram(teal=teal)
+            self.store(key, program)
+
+        if algod_client is not None and (program.bytecode is None or program.assembler != _assembler(algod_client)):
+            response = algod_client.compile(program.teal)
+            program = CompiledProgram(
+                teal=program.teal,
+                bytecode=base64.b64decode(response["result"]),
+                program_hash=response["hash"],
+                assembler=_assembler(algod_client),
+            )
+            self.store(key, program)
+
+        return program
+
+_default_cache = None
+
+def compile_program(build, mode=Mode.Application, version=DEFAULT_VERSION, algod_client=None, passes=(), **options):
+    """Compile the program built by ``build`` through the default ``ProgramCache``.
+
+    The default cache is reopened whenever ``default_cache_dir()`` changes.
+    """
+    global _default_cache
+    if _default_cache is None or _default_cache.directory != default_cache_dir():
+        _default_cache = ProgramCache()
+
+    return _default_cache.get(build, mode=mode, version=version, algod_client=algod_client, passes=passes, **options)
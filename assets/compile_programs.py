@@ -0,0 +1,224 @@
+"""Compile the WizCoin programs into build artifacts, once or whenever their sources change.
+
+The ``__main__`` blocks of the program modules print one program each, so
+building both took two processes, each paying for importing PyTEAL and
+building the program. This entry point builds every program of ``PROGRAMS``
+in one process, at the TEAL version the tests deploy, and writes per program
+
+* ``<name>.teal``: the TEAL, with the template placeholders of the approval
+  program lowered into its leading ``intcblock`` (see ``templates.py``),
+* ``<name>.bin``: the bytecode, with the placeholders still zero,
+* ``<name>.map.json``: the source map relating the bytecode to the TEAL,
+
+and a ``manifest.json`` of the version, SHA-256 digest, program hash and
+placeholders of every program. The TEAL goes through the ``ProgramCache``,
+so an unchanged program is not even built again across runs. The bytecode is
+assembled locally with ``avm.assemble``, or by algod with ``--algod``.
+
+PyTEAL and the program modules are only imported once a build needs them.
+With ``--watch`` the process stays up with all of them loaded and polls the
+sources: when a file changes, its module is reloaded and only the programs
+depending on it are rebuilt.
+
+    python compile_programs.py --output build
+    python compile_programs.py --output build --watch
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+import types
+
+ASSETS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The TEAL version the tests deploy the programs with
+DEFAULT_VERSION = 8
+
+# Every program: the module and function building it, and whether it has template placeholders
+PROGRAMS = {
+    "approval": ("wizcoin_smart_contract", "wizcoin_membership", True),
+    "clear": ("clear_program", "clear_program", False),
+}
+
+def _local_module(value, directory):
+    """Return the module of ``directory`` which ``value`` is or was defined in, if any."""
+    if isinstance(value, types.ModuleType):
+        module = value
+    else:
+        module = sys.modules.get(getattr(value, "__module__", None) or "")
+    path = getattr(module, "__file__", None)
+    if path is None or os.path.dirname(os.path.abspath(path)) != directory:
+        return None
+    return module
+
+def local_dependencies(module, directory=ASSETS_DIR):
+    """Return the names of the modules of ``directory`` which ``module`` depends on, itself included."""
+    names = {module.__name__}
+    pending = [module]
+    while pending:
+        for value in vars(pending.pop()).values():
+            dependency = _local_module(value, directory)
+            if dependency is not None and dependency.__name__ not in names:
+                names.add(dependency.__name__)
+                pending.append(dependency)
+    return names
+
+def _write(path, data):
+    # Write atomically so that a build pipeline never picks up a partial artifact
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class ProgramBuilder:
+    """Builds the ``PROGRAMS`` at TEAL ``version`` into the artifacts of ``output``.
+
+    The bytecode is assembled by ``algod_client`` if given, and locally
+    otherwise. ``cache`` is the ``ProgramCache`` of the TEAL, by default the
+    one of ``compile_program``. Only the modules of ``source_dir`` are watched.
+    """
+    def __init__(self, output, version=DEFAULT_VERSION, algod_client=None, cache=None, programs=None, source_dir=ASSETS_DIR):
+        self.output = output
+        self.version = version
+        self.algod_client = algod_client
+        self.cache = cache
+        self.programs = dict(PROGRAMS if programs is None else programs)
+        self.source_dir = os.path.abspath(source_dir)
+        self.manifest = {}
+        # The modification time of the source of every module a program depends on
+        self.mtimes = {}
+        # The modules every program depends on, known once it was built
+        self.dependencies = {}
+        os.makedirs(self.output, exist_ok=True)
+
+    def _compile(self, build, templated):
+        from pyteal import Mode
+        from compile_cache import compile_program
+        from templates import lower_templates
+
+        passes = (lower_templates,) if templated else ()
+        if self.cache is not None:
+            return self.cache.get(build, mode=Mode.Application, version=self.version, passes=passes).teal
+        return compile_program(build, mode=Mode.Application, version=self.version, passes=passes).teal
+
+    def _assemble(self, teal):
+        """Return the bytecode, the source map and the program hash of ``teal``."""
+        if self.algod_client is not None:
+            import base64
+
+            response = self.algod_client.compile(teal, source_map=True)
+            return base64.b64decode(response["result"]), response["sourcemap"], response["hash"]
+
+        from algosdk import logic
+        import avm
+        from ledger_sim import source_map_json
+
+        bytecode, pc_to_line = avm.assemble(teal, source_map=True)
+        return bytecode, source_map_json(pc_to_line, len(bytecode)), logic.address(bytecode)
+
+    def build(self, names=None):
+        """Build the programs ``names``, by default all of them, and write their artifacts and the manifest."""
+        from templates import template_names
+
+        for name in names if names is not None else self.programs:
+            module_name, function_name, templated = self.programs[name]
+            module = importlib.import_module(module_name)
+            teal = self._compile(getattr(module, function_name), templated)
+            bytecode, source_map, program_hash = self._assemble(teal)
+
+            _write(os.path.join(self.output, f"{name}.teal"), teal.encode())
+            _write(os.path.join(self.output, f"{name}.bin"), bytecode)
+            _write(os.path.join(self.output, f"{name}.map.json"), json.dumps(source_map).encode())
+            self.manifest[name] = {
+                "version": self.version,
+                "sha256": hashlib.sha256(bytecode).hexdigest(),
+                "hash": program_hash,
+                "template": list(template_names(teal)),
+            }
+
+            self.dependencies[name] = local_dependencies(module, self.source_dir)
+            for dependency in self.dependencies[name]:
+                self.mtimes.setdefault(dependency, self._mtime(dependency))
+
+        _write(os.path.join(self.output, "manifest.json"), (json.dumps(self.manifest, indent=2, sort_keys=True) + "\n").encode())
+
+    def _mtime(self, module_name):
+        try:
+            return os.stat(sys.modules[module_name].__file__).st_mtime_ns
+        except OSError:
+            return None
+
+    def changed_modules(self):
+        """Return the names of the modules whose source changed since the last look, recording their new times."""
+        changed = set()
+        for module_name, mtime in self.mtimes.items():
+            current = self._mtime(module_name)
+            if current != mtime:
+                self.mtimes[module_name] = current
+                changed.add(module_name)
+        return changed
+
+    def rebuild(self):
+        """Reload the modules whose source changed and rebuild only the programs depending on them.
+
+        Returns the names of the programs rebuilt.
+        """
+        changed = self.changed_modules()
+        stale = [name for name in self.programs if self.dependencies.get(name, set()) & changed]
+        if not stale:
+            return []
+
+        # Reload every module depending on a changed one, after the modules it depends on
+        affected = {}
+        for name in stale:
+            for module_name in self.dependencies[name]:
+                dependencies = local_dependencies(sys.modules[module_name], self.source_dir)
+                if dependencies & changed:
+                    affected[module_name] = len(dependencies)
+        for module_name in sorted(affected, key=affected.get):
+            importlib.reload(sys.modules[module_name])
+
+        self.build(stale)
+        return stale
+
+    def watch(self, interval=0.5, log=sys.stderr):
+        """Rebuild the programs whenever their sources change, until interrupted."""
+        while True:
+            time.sleep(interval)
+            try:
+                rebuilt = self.rebuild()
+            except Exception as e:
+                # A source saved halfway is fixed by its next save
+                print(f"build failed: {type(e).__name__}: {e}", file=log)
+                continue
+            if rebuilt:
+                print(f"rebuilt {', '.join(rebuilt)}", file=log)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="build", help="the directory to write the artifacts to")
+    parser.add_argument("--version", type=int, default=DEFAULT_VERSION, help="TEAL version to compile the programs with")
+    parser.add_argument("--algod", action="store_true", help="assemble the bytecode through the algod node instead of locally")
+    parser.add_argument("--watch", action="store_true", help="keep running and rebuild the programs whose sources change")
+    parser.add_argument("--interval", type=float, default=0.5, help="the seconds between two looks at the sources in watch mode")
+    args = parser.parse_args(argv)
+
+    algod_client = None
+    if args.algod:
+        from algod_connection import algod_client as connect
+        algod_client = connect()
+
+    builder = ProgramBuilder(args.output, version=args.version, algod_client=algod_client)
+    builder.build()
+    if args.watch:
+        try:
+            builder.watch(args.interval)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
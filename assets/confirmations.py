@@ -0,0 +1,226 @@
+"""Wait for the confirmation of many transactions by following the blocks once.
+
+``algosdk.transaction.wait_for_confirmation`` polls the node for its one
+transaction every round, so many transactions in flight mean as many polling
+loops. A ``ConfirmationService`` instead follows the new blocks on a single
+thread, for as long as any transaction is pending. Per round it
+
+* reads the IDs of the transactions of the block, with ``get_block_txids``,
+* resolves the future of every pending transaction among them with its
+  pending transaction info, the result of ``wait_for_confirmation``,
+* looks up every other pending transaction on its own once, at the first
+  step after it was submitted, to resolve its future if it was confirmed
+  before the blocks read, or to fail it if the node dropped it from its pool
+  with a ``pool-error``,
+* fails the future of every transaction past its last valid round with a
+  ``TransactionExpiredError``, and that of every transaction waited for
+  longer than its ``wait_rounds`` since it was submitted with a
+  ``ConfirmationTimeoutError``, unless a last lookup finds it confirmed.
+
+Between these lookups the blocks alone settle the waits, so the requests per
+round do not grow with the transactions waited for.
+
+The blocks are read from the first valid round of the transactions waited
+for, and the IDs of the last ``history`` blocks are kept, so that a
+transaction confirmed before anyone waited for it is still found. A bare
+transaction ID has no first valid round, so only its own lookup finds it if
+it was confirmed earlier. ``submit`` returns a
+``concurrent.futures.Future``, ``wait`` blocks on it and ``wait_async``
+awaits it from a coroutine.
+
+``wait_for_confirmation`` is the drop-in replacement of the ``algosdk``
+function, using the service of the process-wide algod client.
+"""
+import asyncio
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+import algosdk
+from algosdk import error
+
+from algod_connection import algod_client
+
+# The rounds of block transaction IDs kept for transactions waited for late
+HISTORY_ROUNDS = 64
+
+class TransactionExpiredError(error.ConfirmationTimeoutError):
+    """The last valid round of a transaction passed without it being confirmed."""
+
+class _Waiter:
+    """A pending transaction with its ``future``, resolved once the transaction is confirmed."""
+    def __init__(self, first_valid, last_valid, deadline):
+        self.future = Future()
+        self.first_valid = first_valid
+        self.last_valid = last_valid
+        # The round the wait is over, if bounded
+        self.deadline = deadline
+        # Whether the transaction was looked up on its own already
+        self.looked_up = False
+
+def _bounds(txn):
+    """Return the ID and the validity window of ``txn``, a transaction, signed or not, or a transaction ID."""
+    if isinstance(txn, str):
+        return txn, None, None
+    txid = txn.get_txid()
+    txn = getattr(txn, "transaction", txn)
+    return txid, txn.first_valid_round, txn.last_valid_round
+
+class ConfirmationService:
+    """Resolves the confirmation of the transactions sent to ``client`` from the blocks it produces."""
+    def __init__(self, client=None, history=HISTORY_ROUNDS):
+        self.client = client if client is not None else algod_client()
+        self.history = history
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._follower = None
+        self.reset()
+
+    def reset(self):
+        """Forget the blocks seen, e.g. after the ledger was rolled back."""
+        with self._lock:
+            self._round = None
+            # The last round of the node as of the latest step
+            self._last = None
+            self._seen = {}
+            self._rounds = deque()
+
+    def submit(self, txn, wait_rounds=None):
+        """Return a ``Future`` of the pending transaction info of ``txn`` once confirmed.
+
+        ``txn`` is a transaction, signed or not, or a transaction ID; the
+        validity window of a transaction also bounds the wait. Unless
+        ``wait_rounds`` is ``None``, the wait fails after that many rounds
+        from now.
+        """
+        txid, first_valid, last_valid = _bounds(txn)
+        deadline = None
+        if wait_rounds is not None:
+            # While following, the round is current; otherwise the node is asked
+            with self._lock:
+                last = self._last if self._follower is not None else None
+            if last is None:
+                last = self.client.status()["last-round"]
+            deadline = last + wait_rounds
+
+        with self._lock:
+            waiter = self._pending.get(txid)
+            if waiter is None:
+                waiter = self._pending[txid] = _Waiter(first_valid, last_valid, deadline)
+            if self._follower is None:
+                # Calls of the follower are made in the context of whoever started it
+                context = contextvars.copy_context()
+                self._follower = threading.Thread(target=context.run, args=(self._follow,), name="confirmations", daemon=True)
+                self._follower.start()
+        return waiter.future
+
+    def wait(self, txn, wait_rounds=None):
+        """Return the pending transaction info of ``txn`` once confirmed, see ``submit``."""
+        return self.submit(txn, wait_rounds).result()
+
+    async def wait_async(self, txn, wait_rounds=None):
+        """Return the pending transaction info of ``txn`` once confirmed from a coroutine, see ``submit``."""
+        return await asyncio.wrap_future(self.submit(txn, wait_rounds))
+
+    def _see(self, round, txids):
+        self._rounds.append((round, txids))
+        for txid in txids:
+            self._seen[txid] = round
+        while len(self._rounds) > self.history:
+            old_round, old = self._rounds.popleft()
+            for txid in old:
+                if self._seen.get(txid) == old_round:
+                    del self._seen[txid]
+
+    def _step(self):
+        """Read the blocks up to the current round and settle the waits they decide.
+
+        Returns the current round while waits are left, otherwise ``None``.
+        """
+        last = self.client.status()["last-round"]
+        with self._lock:
+            self._last = last
+            if self._round is None or last < self._round:
+                # Start from the earliest round a pending transaction could be confirmed in
+                starts = [waiter.first_valid for waiter in self._pending.values() if waiter.first_valid is not None]
+                self._round = max(min(starts + [last]), last - self.history) - 1
+            rounds = range(self._round + 1, last + 1)
+
+        blocks = [(round, self.client.get_block_txids(round)["blockTxids"]) for round in rounds]
+
+        with self._lock:
+            for round, txids in blocks:
+                self._see(round, txids)
+            self._round = last
+            confirmed, unconfirmed = [], []
+            for txid, waiter in self._pending.items():
+                if txid in self._seen:
+                    confirmed.append(txid)
+                elif waiter.last_valid is not None and last > waiter.last_valid:
+                    unconfirmed.append((txid, TransactionExpiredError(f"transaction {txid} expired at round {waiter.last_valid}")))
+                elif waiter.deadline is not None and last >= waiter.deadline:
+                    unconfirmed.append((txid, error.ConfirmationTimeoutError(f"Wait for transaction id {txid} timed out")))
+                elif not waiter.looked_up:
+                    unconfirmed.append((txid, None))
+                else:
+                    continue
+                waiter.looked_up = True
+
+        for txid in confirmed:
+            self._settle(txid, self.client.pending_transaction_info(txid))
+        for txid, exception in unconfirmed:
+            try:
+                info = self.client.pending_transaction_info(txid)
+            except algosdk.error.AlgodHTTPError:
+                # Not known to the node yet, so it is left to the blocks
+                info = {}
+            if info.get("confirmed-round", 0) > 0:
+                self._settle(txid, info)
+            elif info.get("pool-error"):
+                self._settle(txid, exception=algosdk.error.AlgodHTTPError(f"transaction {txid}: {info['pool-error']}"))
+            elif exception is not None:
+                self._settle(txid, exception=exception)
+
+        with self._lock:
+            if self._pending:
+                return last
+            self._follower = None
+            return None
+
+    def _settle(self, txid, info=None, exception=None):
+        with self._lock:
+            waiter = self._pending.pop(txid)
+        if exception is not None:
+            waiter.future.set_exception(exception)
+        else:
+            waiter.future.set_result(info)
+
+    def _follow(self):
+        try:
+            while True:
+                last = self._step()
+                if last is None:
+                    return
+                self.client.status_after_block(last)
+        except Exception as e:
+            # Without the node there is nothing to wait on; let every waiter know
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._follower = None
+            for waiter in pending.values():
+                waiter.future.set_exception(e)
+
+_shared = None
+
+def shared_confirmations():
+    """Return the ``ConfirmationService`` of the process-wide algod client, anew whenever that client changes."""
+    global _shared
+    client = algod_client()
+    if _shared is None or _shared.client is not client:
+        _shared = ConfirmationService(client)
+    return _shared
+
+def wait_for_confirmation(txn, wait_rounds=10):
+    """Return the pending transaction info of ``txn`` once confirmed, through the shared service."""
+    return shared_confirmations().wait(txn, wait_rounds)
@@ -0,0 +1,129 @@
+"""Plan the exact fees of WizCoin groups from the inner transactions of the program.
+
+A group has to pay the minimum fee for each of its transactions, inner
+transactions included, and fee pooling lets any transaction of the group pay
+for the others. Instead of a fixed fee per transaction, the planner derives
+the minimum fee of a group and puts it on one transaction.
+
+The inner transactions each method issues are read off the PyTEAL AST of
+``wizcoin_membership()`` by ``inner_transaction_counts``: every inner
+transaction sets its ``TxnField.type_enum`` once, so a branch issues as many
+inner transactions as it sets that field, counting
+
+* the larger of the two sides of an ``If`` or the branches of a ``Cond``,
+* a loop once per iteration. The loops of the program which issue inner
+  transactions run once per account the application call references.
+
+``required_fee`` sums the fee of a group and ``pool_fees`` sets it on one of
+the transactions of the group, and zero on the others. The fees have to be
+set before the group ID is assigned and the transactions are signed.
+``method_fee`` is the fee of a lone application call, for building it with
+flat-fee suggested parameters.
+"""
+import functools
+from collections import namedtuple
+
+from algosdk import constants, transaction
+from pyteal import *
+from pyteal.ast.itxn import InnerTxnFieldExpr
+
+from method_dispatch import METHODS, selector
+from wizcoin_smart_contract import wizcoin_membership
+
+# Attributes of PyTEAL expressions which hold no subexpressions
+_IGNORED_ATTRIBUTES = frozenset(["trace", "stack_frames"])
+
+# The inner transactions of a method: ``fixed`` per call and ``per_account`` per account the call references
+InnerTransactions = namedtuple("InnerTransactions", ["fixed", "per_account"])
+
+def _subexpressions(value):
+    """Yield the PyTEAL expressions held by ``value``, an attribute of an expression."""
+    if isinstance(value, Expr):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _subexpressions(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _subexpressions(item)
+
+def _children(expr):
+    for name, value in vars(expr).items():
+        if name in _IGNORED_ATTRIBUTES or name.startswith("_"):
+            continue
+        yield from _subexpressions(value)
+
+def _total(counts):
+    return InnerTransactions(sum(count.fixed for count in counts), sum(count.per_account for count in counts))
+
+def _widest(counts):
+    """Return the count of whichever of the alternative ``counts`` issues the most inner transactions."""
+    return InnerTransactions(max(count.fixed for count in counts), max(count.per_account for count in counts))
+
+def _count(expr, in_loop=False):
+    """Count the inner transactions ``expr`` issues."""
+    if isinstance(expr, InnerTxnFieldExpr) and expr.field == TxnField.type_enum:
+        return InnerTransactions(0, 1) if in_loop else InnerTransactions(1, 0)
+    if isinstance(expr, If):
+        branches = [expr.thenBranch] + ([expr.elseBranch] if expr.elseBranch is not None else [])
+        return _total([_count(expr.cond, in_loop), _widest([_count(branch, in_loop) for branch in branches])])
+    if isinstance(expr, Cond):
+        conditions = [_count(condition, in_loop) for condition, _ in expr.args]
+        return _total(conditions + [_widest([_count(branch, in_loop) for _, branch in expr.args])])
+    if isinstance(expr, (For, While)):
+        if in_loop and any(_count(child, True).per_account for child in _children(expr)):
+            raise ValueError("inner transactions issued in nested loops cannot be counted per account")
+        in_loop = True
+    return _total([InnerTransactions(0, 0)] + [_count(child, in_loop) for child in _children(expr)])
+
+def _dispatch(expr):
+    """Return the ``Cond`` of ``method_dispatch`` in ``expr``, or ``None``."""
+    if isinstance(expr, Cond) and any(isinstance(condition, BinaryExpr) and isinstance(condition.argRight, MethodSignature) for condition, _ in expr.args):
+        return expr
+    for child in _children(expr):
+        dispatch = _dispatch(child)
+        if dispatch is not None:
+            return dispatch
+    return None
+
+@functools.lru_cache(maxsize=None)
+def inner_transaction_counts(build=wizcoin_membership):
+    """Return the ``InnerTransactions`` of every method of the program ``build`` returns, by method name."""
+    dispatch = _dispatch(build())
+    if dispatch is None:
+        raise ValueError(f"{build.__name__} has no method dispatch")
+    names = {signature: name for name, signature in METHODS.items()}
+    return {
+        names[condition.argRight.methodName]: _count(branch)
+        for condition, branch in dispatch.args
+        if isinstance(condition, BinaryExpr) and isinstance(condition.argRight, MethodSignature)
+    }
+
+def _inner_transactions(txn, counts):
+    """Return the inner transactions the WizCoin application call ``txn`` issues, zero for any other transaction."""
+    if not isinstance(txn, transaction.ApplicationCallTxn) or not txn.app_args:
+        return 0
+    for name, count in counts.items():
+        if txn.app_args[0] == selector(name):
+            return count.fixed + count.per_account * len(txn.accounts or [])
+    return 0
+
+def method_fee(name, accounts=0, min_fee=None, build=wizcoin_membership):
+    """Return the minimum fee of a call of the method ``name`` referencing ``accounts`` accounts, its inner transactions included."""
+    count = inner_transaction_counts(build)[name]
+    return (min_fee or constants.MIN_TXN_FEE) * (1 + count.fixed + count.per_account * accounts)
+
+def required_fee(txns, min_fee=None, build=wizcoin_membership):
+    """Return the minimum fee of the group ``txns``, the transactions themselves and their inner transactions."""
+    counts = inner_transaction_counts(build)
+    return (min_fee or constants.MIN_TXN_FEE) * sum(1 + _inner_transactions(txn, counts) for txn in txns)
+
+def pool_fees(txns, payer=0, min_fee=None, build=wizcoin_membership):
+    """Have the transaction at index ``payer`` of ``txns`` pay the fee of the whole group, and the others none.
+
+    Returns ``txns``, whose fees are changed in place.
+    """
+    fee = required_fee(txns, min_fee, build)
+    for index, txn in enumerate(txns):
+        txn.fee = fee if index == payer else 0
+    return txns
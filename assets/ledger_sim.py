@@ -0,0 +1,1183 @@
+"""An in-process stand-in for an Algorand node.
+
+``Ledger`` keeps accounts, assets, applications and boxes in memory and applies
+transaction groups with the same validation rules algod uses for the
+transactions in this project: fee pooling, minimum balances, ASA opt-in,
+freeze and clawback, and application calls evaluated by ``avm``.
+``SimAlgodClient`` exposes the ledger through the subset of the
+``AlgodClient`` interface that the project uses, so that any code written
+against algod runs unchanged against the simulator.
+"""
+import base64
+import copy
+import threading
+from collections import namedtuple
+
+import msgpack
+from algosdk import constants, encoding, logic, transaction
+from algosdk.error import AlgodHTTPError
+from nacl.exceptions import BadSignatureError
+from nacl.signing import VerifyKey
+
+import avm
+from avm import ZERO_ADDRESS, EvalError
+
+MIN_TXN_FEE = 1000
+MIN_BALANCE = 100000
+ASSET_MIN_BALANCE = 100000
+APP_PAGE_MIN_BALANCE = 100000
+SCHEMA_UINT_MIN_BALANCE = 28500
+SCHEMA_BYTES_MIN_BALANCE = 50000
+BOX_FLAT_MIN_BALANCE = 2500
+BOX_BYTE_MIN_BALANCE = 400
+MAX_INNER_DEPTH = 8
+MAX_TXN_LIFE = 1000
+
+GENESIS_ID = "sim-v1"
+GENESIS_HASH = base64.b64encode(encoding.checksum(b"wizcoin-ledger-sim")).decode()
+GENESIS_TIMESTAMP = 1_700_000_000
+
+_MISSING = object()
+
+# A checkpoint of a ``Ledger``: the depth of its journal mark and the round it was taken at
+Snapshot = namedtuple("Snapshot", ["depth", "round"])
+
+class LedgerError(Exception):
+    """A transaction group was rejected; ``txid`` names the offending transaction."""
+    def __init__(self, message, txid=None):
+        super().__init__(message)
+        self.message = message
+        self.txid = txid
+
+class JournaledStore:
+    """Flat key-value tables with an undo journal.
+
+    While at least one mark is open, every write records the value it
+    replaced, so rolling back to a mark costs O(changed keys).
+    """
+    def __init__(self, *names):
+        self.tables = {name: {} for name in names}
+        self.journal = []
+        self.marks = []
+
+    def get(self, table, key, default=None):
+        return self.tables[table].get(key, default)
+
+    def put(self, table, key, value):
+        entries = self.tables[table]
+        if self.marks:
+            self.journal.append((entries, key, entries.get(key, _MISSING)))
+        entries[key] = value
+
+    def delete(self, table, key):
+        entries = self.tables[table]
+        if key not in entries:
+            return
+        if self.marks:
+            self.journal.append((entries, key, entries[key]))
+        del entries[key]
+
+    def begin(self):
+        """Open a mark, returning its position in the journal."""
+        self.marks.append(len(self.journal))
+        return self.marks[-1]
+
+    def commit(self):
+        """Close the innermost mark, keeping its writes."""
+        self.marks.pop()
+        if not self.marks:
+            self.journal.clear()
+
+    def rollback(self):
+        """Close the innermost mark, undoing every write made since it was opened."""
+        mark = self.marks.pop()
+        journal = self.journal
+        while len(journal) > mark:
+            entries, key, old = journal.pop()
+            if old is _MISSING:
+                entries.pop(key, None)
+            else:
+                entries[key] = old
+        if not self.marks:
+            journal.clear()
+
+_programs = {}
+
+def _decoded_program(bytecode):
+    # Programs are immutable, so every ledger shares one decoding per bytecode
+    program = _programs.get(bytecode)
+    if program is None:
+        program = _programs[bytecode] = avm.Program(bytecode)
+    return program
+
+_app_addresses = {}
+
+def app_address(app_id):
+    """Return the raw address of the application ``app_id``."""
+    address = _app_addresses.get(app_id)
+    if address is None:
+        address = _app_addresses[app_id] = encoding.decode_address(logic.get_application_address(app_id))
+    return address
+
+def _address(value):
+    return encoding.decode_address(value) if value else ZERO_ADDRESS
+
+def _text(value):
+    if value is None:
+        return b""
+    return value.encode() if isinstance(value, str) else bytes(value)
+
+def transaction_fields(txn):
+    """Convert an ``algosdk`` transaction into the dict of TEAL transaction fields used by the ledger."""
+    fields = {
+        "Sender": encoding.decode_address(txn.sender),
+        "Fee": txn.fee,
+        "FirstValid": txn.first_valid_round,
+        "LastValid": txn.last_valid_round,
+        "Note": _text(txn.note),
+        "Lease": _text(txn.lease),
+        "RekeyTo": _address(txn.rekey_to),
+        "Type": txn.type.encode(),
+        "TypeEnum": avm.TXN_TYPES[txn.type],
+    }
+
+    if txn.type == constants.payment_txn:
+        fields["Receiver"] = _address(txn.receiver)
+        fields["Amount"] = txn.amt
+        fields["CloseRemainderTo"] = _address(txn.close_remainder_to)
+    elif txn.type == constants.assettransfer_txn:
+        fields["XferAsset"] = txn.index
+        fields["AssetAmount"] = txn.amount
+        fields["AssetReceiver"] = _address(txn.receiver)
+        fields["AssetCloseTo"] = _address(txn.close_assets_to)
+        fields["AssetSender"] = _address(txn.revocation_target)
+    elif txn.type == constants.assetconfig_txn:
+        fields["ConfigAsset"] = txn.index or 0
+        fields["ConfigAssetTotal"] = txn.total or 0
+        fields["ConfigAssetDecimals"] = txn.decimals or 0
+        fields["ConfigAssetDefaultFrozen"] = int(bool(txn.default_frozen))
+        fields["ConfigAssetUnitName"] = _text(txn.unit_name)
+        fields["ConfigAssetName"] = _text(txn.asset_name)
+        fields["ConfigAssetURL"] = _text(txn.url)
+        fields["ConfigAssetMetadataHash"] = _text(txn.metadata_hash)
+        fields["ConfigAssetManager"] = _address(txn.manager)
+        fields["ConfigAssetReserve"] = _address(txn.reserve)
+        fields["ConfigAssetFreeze"] = _address(txn.freeze)
+        fields["ConfigAssetClawback"] = _address(txn.clawback)
+    elif txn.type == constants.assetfreeze_txn:
+        fields["FreezeAsset"] = txn.index
+        fields["FreezeAssetAccount"] = _address(txn.target)
+        fields["FreezeAssetFrozen"] = int(bool(txn.new_freeze_state))
+    elif txn.type == constants.appcall_txn:
+        foreign_apps = list(txn.foreign_apps or [])
+        fields["ApplicationID"] = txn.index or 0
+        fields["OnCompletion"] = int(txn.on_complete)
+        fields["ApplicationArgs"] = list(txn.app_args or [])
+        fields["Accounts"] = [encoding.decode_address(account) for account in txn.accounts or []]
+        fields["Assets"] = list(txn.foreign_assets or [])
+        fields["Applications"] = foreign_apps
+        fields["ApprovalProgram"] = txn.approval_program or b""
+        fields["ClearStateProgram"] = txn.clear_program or b""
+        fields["GlobalNumUint"] = txn.global_schema.num_uints if txn.global_schema else 0
+        fields["GlobalNumByteSlice"] = txn.global_schema.num_byte_slices if txn.global_schema else 0
+        fields["LocalNumUint"] = txn.local_schema.num_uints if txn.local_schema else 0
+        fields["LocalNumByteSlice"] = txn.local_schema.num_byte_slices if txn.local_schema else 0
+        fields["ExtraProgramPages"] = txn.extra_pages or 0
+        fields["Boxes"] = [
+            (foreign_apps[box.app_index - 1] if box.app_index else 0, box.name)
+            for box in txn.boxes or []
+        ]
+    return fields
+
+def _signed_parts(stxn):
+    """Return the transaction of ``stxn`` and its canonical encoding."""
+    txn = stxn.transaction
+    return txn, base64.b64decode(encoding.msgpack_encode(txn))
+
+def _verify_signature(stxn, authorizer, message):
+    if isinstance(stxn, transaction.MultisigTransaction):
+        return stxn.multisig.address_bytes() == authorizer and stxn.multisig.verify(message)
+    if isinstance(stxn, transaction.SignedTransaction):
+        if stxn.signature is None:
+            return False
+        try:
+            VerifyKey(authorizer).verify(message, base64.b64decode(stxn.signature))
+        except (BadSignatureError, ValueError):
+            return False
+        return True
+    if isinstance(stxn, transaction.LogicSigTransaction):
+        # Logic signatures are not used by this project; only check the address
+        return stxn.lsig.address() == encoding.encode_address(authorizer)
+    return False
+
+class _GroupApply:
+    """Bookkeeping for one top-level transaction group while it is being applied."""
+    def __init__(self, txid, fee_credit, round):
+        self.txid = txid
+        self.fee_credit = fee_credit
+        self.round = round
+        self.inner_count = 0
+
+class Ledger(avm.EvalContext):
+    """The in-memory ledger state and the rules for applying transaction groups to it.
+
+    ``genesis`` maps the (base32) addresses of the initial accounts to their
+    balances in microAlgos. Signatures are checked unless ``verify_signatures``
+    is unset.
+    """
+    min_txn_fee = MIN_TXN_FEE
+    min_balance = MIN_BALANCE
+
+    def __init__(self, genesis=None, verify_signatures=True):
+        self.state = JournaledStore(
+            "balances", "auth", "min_balance", "holdings", "assets", "apps",
+            "globals", "global_counts", "locals", "opted_in", "boxes", "txids", "counters",
+        )
+        self.verify_signatures = verify_signatures
+        self.round = 1
+        self.blocks = {1: {"rnd": 1, "ts": GENESIS_TIMESTAMP, "txns": []}}
+        self.confirmed = {}
+        self._group = None
+        # Called with the ``avm.Evaluator`` of every approved program run, after
+        # recording the executed program counters in its ``trace``
+        self.tracer = None
+        # When set to a dict, the program counters executed by every program run,
+        # approved or rejected, are added to the set of its ``avm.Program``
+        self.coverage = None
+
+        for address, amount in (genesis or {}).items():
+            self.state.put("balances", encoding.decode_address(address), amount)
+
+    def snapshot(self):
+        """Checkpoint the accounts, assets, applications and blocks, to be rolled back with ``restore``.
+
+        The writes made after the checkpoint are journaled, so restoring costs
+        O(changed keys) rather than a copy of the whole ledger. Snapshots nest
+        and must be restored innermost first.
+        """
+        self.state.begin()
+        return Snapshot(len(self.state.marks), self.round)
+
+    def restore(self, snapshot):
+        """Roll the ledger back to ``snapshot``, discarding every block and transaction since."""
+        if len(self.state.marks) != snapshot.depth:
+            raise LedgerError("snapshots must be restored innermost first")
+        self.state.rollback()
+
+        while self.round > snapshot.round:
+            del self.blocks[self.round]
+            self.round -= 1
+        # Transactions are confirmed in round order, so the newer ones are at the end
+        while self.confirmed:
+            txid = next(reversed(self.confirmed))
+            if self.confirmed[txid]["round"] <= snapshot.round:
+                break
+            del self.confirmed[txid]
+
+    @property
+    def eval_round(self):
+        """The round of the group being applied, which it is committed in."""
+        return self._group.round if self._group is not None else self.round + 1
+
+    @property
+    def latest_timestamp(self):
+        return self.blocks[self.round]["ts"]
+
+    def fund(self, address, amount):
+        """Credit ``amount`` microAlgos to the base32 ``address`` outside of any transaction."""
+        raw = encoding.decode_address(address)
+        self.state.put("balances", raw, self.state.get("balances", raw, 0) + amount)
+
+    def advance(self, rounds=1):
+        """Produce ``rounds`` empty blocks."""
+        for _ in range(rounds):
+            self._new_block([])
+
+    def _new_block(self, entries):
+        self.round += 1
+        self.blocks[self.round] = {"rnd": self.round, "ts": GENESIS_TIMESTAMP + 3 * self.round, "txns": entries}
+        return self.round
+
+    def _next_id(self):
+        next_id = self.state.get("counters", "next_id", 1000)
+        self.state.put("counters", "next_id", next_id + 1)
+        return next_id
+
+    #
+    # EvalContext
+    #
+
+    def app_address(self, app_id):
+        return app_address(app_id)
+
+    def app_params(self, app_id):
+        return self.state.get("apps", app_id)
+
+    def global_get(self, app_id, key):
+        return self.state.get("globals", (app_id, key))
+
+    def global_put(self, app_id, key, value):
+        old = self.state.get("globals", (app_id, key))
+        self._count_state("global_counts", app_id, old, value)
+        self.state.put("globals", (app_id, key), value)
+
+    def global_del(self, app_id, key):
+        old = self.state.get("globals", (app_id, key))
+        if old is not None:
+            self._count_state("global_counts", app_id, old, None)
+            self.state.delete("globals", (app_id, key))
+
+    def _count_state(self, table, owner, old, new):
+        ints, byte_slices = self.state.get(table, owner, (0, 0))
+        for value, delta in ((old, -1), (new, 1)):
+            if value is None:
+                continue
+            if isinstance(value, int):
+                ints += delta
+            else:
+                byte_slices += delta
+        self.state.put(table, owner, (ints, byte_slices))
+
+    def opted_in(self, address, app_id):
+        return self.state.get("opted_in", (address, app_id)) is not None
+
+    def local_get(self, address, app_id, key):
+        if not self.opted_in(address, app_id):
+            raise EvalError(f"{encoding.encode_address(address)} is not opted into app {app_id}")
+        return self.state.get("locals", (address, app_id, key))
+
+    def local_put(self, address, app_id, key, value):
+        if not self.opted_in(address, app_id):
+            raise EvalError(f"{encoding.encode_address(address)} is not opted into app {app_id}")
+        old = self.state.get("locals", (address, app_id, key))
+        self._count_state("opted_in", (address, app_id), old, value)
+        self.state.put("locals", (address, app_id, key), value)
+
+    def local_del(self, address, app_id, key):
+        old = self.state.get("locals", (address, app_id, key))
+        if old is not None:
+            self._count_state("opted_in", (address, app_id), old, None)
+            self.state.delete("locals", (address, app_id, key))
+
+    def balance(self, address):
+        return self.state.get("balances", address, 0)
+
+    def account_min_balance(self, address):
+        return MIN_BALANCE + self.state.get("min_balance", address, 0)
+
+    def auth_address(self, address):
+        return self.state.get("auth", address)
+
+    def asset_holding(self, address, asset_id):
+        return self.state.get("holdings", (address, asset_id))
+
+    def asset_params(self, asset_id):
+        return self.state.get("assets", asset_id)
+
+    def box_get(self, app_id, name):
+        return self.state.get("boxes", (app_id, name))
+
+    def box_put(self, app_id, name, value):
+        if self.state.get("boxes", (app_id, name)) is None:
+            self._raise_min_balance(app_address(app_id), BOX_FLAT_MIN_BALANCE + BOX_BYTE_MIN_BALANCE * (len(name) + len(value)))
+        self.state.put("boxes", (app_id, name), bytes(value))
+
+    def box_del(self, app_id, name):
+        value = self.state.get("boxes", (app_id, name))
+        if value is not None:
+            self._raise_min_balance(app_address(app_id), -(BOX_FLAT_MIN_BALANCE + BOX_BYTE_MIN_BALANCE * (len(name) + len(value))))
+            self.state.delete("boxes", (app_id, name))
+
+    def submit_inner(self, evaluator, transactions):
+        group = self._group
+        depth = getattr(evaluator, "depth", 0) + 1
+        if depth > MAX_INNER_DEPTH:
+            raise EvalError("appl depth (9) exceeded")
+        if group.inner_count + len(transactions) > 256:
+            raise EvalError("too many inner transactions")
+
+        parent = evaluator.txn
+        caller = app_address(evaluator.app_id)
+        inner_group = avm.GroupState(transactions, budget=evaluator.group.budget)
+        for index, fields in enumerate(transactions):
+            group.inner_count += 1
+            fields.setdefault("FirstValid", parent.get("FirstValid", 0))
+            fields.setdefault("LastValid", parent.get("LastValid", 0))
+            fields["GroupIndex"] = index
+            fields["TxID"] = encoding.checksum(parent.get("TxID", b"") + group.inner_count.to_bytes(8, "big"))
+
+            # Inner transactions draw their fee from the surplus of the group first
+            if "Fee" in fields:
+                group.fee_credit += fields["Fee"] - MIN_TXN_FEE
+                if group.fee_credit < 0:
+                    raise EvalError(f"fee too small {fields}")
+            else:
+                covered = min(group.fee_credit, MIN_TXN_FEE)
+                group.fee_credit -= covered
+                fields["Fee"] = MIN_TXN_FEE - covered
+
+            sender = fields["Sender"]
+            if sender != caller and self.auth_address(sender) != caller:
+                raise EvalError(f"unauthorized inner transaction sender {encoding.encode_address(sender)}")
+
+            if fields["TypeEnum"] == avm.TXN_TYPES["appl"]:
+                inner_group.budget.limit += avm.OPCODE_BUDGET
+
+            try:
+                self._apply(fields, inner_group, index, caller_app_id=evaluator.app_id, depth=depth)
+            except LedgerError as e:
+                raise EvalError(e.message) from None
+        return transactions
+
+    #
+    # Balances
+    #
+
+    def _raise_min_balance(self, address, amount):
+        self.state.put("min_balance", address, self.state.get("min_balance", address, 0) + amount)
+
+    def _debit(self, address, amount):
+        balance = self.balance(address)
+        if balance < amount:
+            raise LedgerError(
+                f"overspend (account {encoding.encode_address(address)}, data {{_struct:{{}} Status:Offline MicroAlgos:{{Raw:{balance}}}}}, tried to spend {{{amount}}})"
+            )
+        self.state.put("balances", address, balance - amount)
+
+    def _credit(self, address, amount):
+        self.state.put("balances", address, self.balance(address) + amount)
+
+    def _check_min_balance(self, address):
+        balance = self.balance(address)
+        extra = self.state.get("min_balance", address, 0)
+        if balance == 0 and extra == 0:
+            # The account was closed or never existed
+            return
+        minimum = MIN_BALANCE + extra
+        if balance < minimum:
+            raise LedgerError(f"account {encoding.encode_address(address)} balance {balance} below min {minimum}")
+
+    #
+    # Transaction application
+    #
+
+    def submit(self, stxns):
+        """Apply the group of signed transactions ``stxns`` atomically in a new block.
+
+        Returns the ids of the transactions. Raises ``LedgerError`` if any of them is rejected.
+        """
+        self._check_group_size(len(stxns))
+        decoded = []
+        for stxn in stxns:
+            txn, encoded = _signed_parts(stxn)
+            raw_txid = encoding.checksum(constants.txid_prefix + encoded)
+            decoded.append((stxn, txn, encoded, raw_txid))
+
+        txids = [encoding._undo_padding(base64.b32encode(raw_txid).decode()) for *_, raw_txid in decoded]
+        self._check_group(decoded, txids)
+
+        group_fields = []
+        for stxn, txn, encoded, raw_txid in decoded:
+            fields = transaction_fields(txn)
+            fields["TxID"] = raw_txid
+            fields["GroupIndex"] = len(group_fields)
+            group_fields.append(fields)
+        self._apply_group(group_fields, txids, decoded[0][1].group or ZERO_ADDRESS)
+
+        next_round = self.round + 1
+        for txid in txids:
+            self.state.put("txids", txid, next_round)
+        entries = []
+        for (stxn, txn, _, _), fields, txid in zip(decoded, group_fields, txids):
+            entry = {"txid": txid, "stxn": stxn, "fields": fields, "round": next_round}
+            entries.append(entry)
+            self.confirmed[txid] = entry
+        self._new_block(entries)
+        return txids
+
+    def apply_group(self, group_fields, group_id=ZERO_ADDRESS):
+        """Apply the group of transactions ``group_fields``, given as dicts of TEAL transaction fields.
+
+        This is the evaluation of ``submit`` without the checks which need the
+        encoded transactions: signatures, validity windows, group IDs and
+        duplicate transactions. It spares building, encoding and signing the
+        ``algosdk`` transactions of groups generated by the thousand, e.g. by
+        a fuzzer, which rolls every group back with ``restore``. No block is
+        produced. A ``LedgerError`` names the rejected transaction by its
+        index in the group.
+        """
+        self._check_group_size(len(group_fields))
+        for index, fields in enumerate(group_fields):
+            fields["GroupIndex"] = index
+        self._apply_group(group_fields, [str(index) for index in range(len(group_fields))], group_id)
+
+    def _check_group_size(self, size):
+        if not size:
+            raise LedgerError("empty transaction group")
+        if size > constants.tx_group_limit:
+            raise LedgerError(f"group size {size} exceeds maximum value {constants.tx_group_limit}")
+
+    def _apply_group(self, group_fields, txids, group_id):
+        """Apply the decoded ``group_fields`` atomically, rolling every change back if one of them is rejected."""
+        # Fee pooling: the whole group must pay at least the minimum fee per transaction
+        total_fees = sum(fields.get("Fee", 0) for fields in group_fields)
+        required = MIN_TXN_FEE * len(group_fields)
+        if total_fees < required:
+            raise LedgerError(f"txgroup had {total_fees} in fees, which is less than the minimum {len(group_fields)} * {MIN_TXN_FEE}", txids[0])
+
+        group_state = avm.GroupState(group_fields, group_id=group_id)
+        next_round = self.round + 1
+
+        self.state.begin()
+        self._group = _GroupApply(txids[0], total_fees - required, next_round)
+        try:
+            for index, (fields, txid) in enumerate(zip(group_fields, txids)):
+                self._group.txid = txid
+                try:
+                    self._apply(fields, group_state, index)
+                except EvalError as e:
+                    raise LedgerError(self._logic_error(fields, e), txid) from None
+                except LedgerError as e:
+                    raise LedgerError(e.message, txid) from None
+        except BaseException:
+            self.state.rollback()
+            raise
+        else:
+            self.state.commit()
+        finally:
+            self._group = None
+
+    def _logic_error(self, fields, error):
+        app_id = fields.get("ApplicationID") or fields.get("CreatedApplicationID", 0)
+        return f"logic eval error: {error.reason} pc={error.pc}. Details: app={app_id}, pc={error.pc}"
+
+    def _check_group(self, decoded, txids):
+        next_round = self.round + 1
+        for (stxn, txn, encoded, raw_txid), txid in zip(decoded, txids):
+            if txn.genesis_hash and txn.genesis_hash != GENESIS_HASH:
+                raise LedgerError(f"genesis hash mismatch", txid)
+            if not txn.first_valid_round <= next_round <= txn.last_valid_round:
+                raise LedgerError(f"txn dead: round {next_round} outside of {txn.first_valid_round}--{txn.last_valid_round}", txid)
+            if self.state.get("txids", txid) is not None:
+                raise LedgerError("transaction already in ledger", txid)
+            if self.verify_signatures:
+                sender = encoding.decode_address(txn.sender)
+                authorizer = self.auth_address(sender) or sender
+                if not _verify_signature(stxn, authorizer, constants.txid_prefix + encoded):
+                    raise LedgerError("should have been authorized by " + encoding.encode_address(authorizer), txid)
+
+        if len(decoded) == 1 and decoded[0][1].group is None:
+            return
+
+        # Every member of the group must carry the id of exactly this group
+        unsigned = []
+        for _, txn, _, _ in decoded:
+            txn = copy.copy(txn)
+            txn.group = None
+            unsigned.append(txn)
+        group_id = transaction.calculate_group_id(unsigned)
+        for (_, txn, _, _), txid in zip(decoded, txids):
+            if txn.group != group_id:
+                raise LedgerError("transactionGroup: incomplete group", txid)
+
+    def _apply(self, fields, group_state, index, caller_app_id=0, depth=0):
+        sender = fields["Sender"]
+        self._debit(sender, fields.get("Fee", 0))
+        touched = {sender}
+
+        kind = fields["TypeEnum"]
+        if kind == avm.TXN_TYPES["pay"]:
+            self._apply_payment(fields, touched)
+        elif kind == avm.TXN_TYPES["axfer"]:
+            self._apply_asset_transfer(fields, touched)
+        elif kind == avm.TXN_TYPES["acfg"]:
+            self._apply_asset_config(fields, touched)
+        elif kind == avm.TXN_TYPES["afrz"]:
+            self._apply_asset_freeze(fields)
+        elif kind == avm.TXN_TYPES["appl"]:
+            self._apply_app_call(fields, group_state, index, caller_app_id, depth, touched)
+        else:
+            raise LedgerError(f"transaction type {fields['Type'].decode()} is not supported")
+
+        rekey_to = fields.get("RekeyTo", ZERO_ADDRESS)
+        if rekey_to != ZERO_ADDRESS:
+            if rekey_to == sender:
+                self.state.delete("auth", sender)
+            else:
+                self.state.put("auth", sender, rekey_to)
+
+        for address in touched:
+            self._check_min_balance(address)
+
+    def _apply_payment(self, fields, touched):
+        sender = fields["Sender"]
+        receiver = fields.get("Receiver", ZERO_ADDRESS)
+        amount = fields.get("Amount", 0)
+        self._debit(sender, amount)
+        self._credit(receiver, amount)
+        touched.add(receiver)
+
+        close_to = fields.get("CloseRemainderTo", ZERO_ADDRESS)
+        if close_to != ZERO_ADDRESS:
+            if self.state.get("min_balance", sender, 0):
+                raise LedgerError(f"cannot close account {encoding.encode_address(sender)} with active holdings or applications")
+            remaining = self.balance(sender)
+            self.state.put("balances", sender, 0)
+            self._credit(close_to, remaining)
+            self.state.delete("auth", sender)
+            fields["CloseRemainderAmount"] = remaining
+            touched.add(close_to)
+
+    def _apply_asset_transfer(self, fields, touched):
+        sender = fields["Sender"]
+        asset_id = fields.get("XferAsset", 0)
+        amount = fields.get("AssetAmount", 0)
+        receiver = fields.get("AssetReceiver", ZERO_ADDRESS)
+        close_to = fields.get("AssetCloseTo", ZERO_ADDRESS)
+        revocation_target = fields.get("AssetSender", ZERO_ADDRESS)
+        params = self.asset_params(asset_id)
+
+        if params is None:
+            # Holders may still close out of an asset after it was destroyed
+            if close_to != ZERO_ADDRESS and amount == 0 and self.asset_holding(sender, asset_id) is not None:
+                self.state.delete("holdings", (sender, asset_id))
+                self._raise_min_balance(sender, -ASSET_MIN_BALANCE)
+                return
+            raise LedgerError(f"asset {asset_id} does not exist or has been deleted")
+
+        if revocation_target != ZERO_ADDRESS:
+            if sender != params["AssetClawback"]:
+                raise LedgerError(
+                    f"clawback not allowed: sender {encoding.encode_address(sender)}, clawback {encoding.encode_address(params['AssetClawback'])}"
+                )
+            if close_to != ZERO_ADDRESS:
+                raise LedgerError("clawback transactions cannot close out")
+            source = revocation_target
+        else:
+            source = sender
+
+        # A zero transfer to oneself is an opt-in
+        if source == receiver and amount == 0 and revocation_target == ZERO_ADDRESS and self.asset_holding(sender, asset_id) is None:
+            self.state.put("holdings", (sender, asset_id), (0, bool(params["AssetDefaultFrozen"])))
+            self._raise_min_balance(sender, ASSET_MIN_BALANCE)
+            return
+
+        self._move_asset(asset_id, source, receiver, amount, clawback=revocation_target != ZERO_ADDRESS)
+
+        if close_to != ZERO_ADDRESS:
+            if source == params["AssetCreator"]:
+                raise LedgerError(f"cannot close asset ID in allocating account")
+            remaining = self.asset_holding(source, asset_id)[0]
+            self._move_asset(asset_id, source, close_to, remaining, clawback=False)
+            self.state.delete("holdings", (source, asset_id))
+            self._raise_min_balance(source, -ASSET_MIN_BALANCE)
+            fields["AssetClosingAmount"] = remaining
+
+    def _move_asset(self, asset_id, source, receiver, amount, clawback):
+        source_holding = self.asset_holding(source, asset_id)
+        if source_holding is None:
+            raise LedgerError(f"asset {asset_id} missing from {encoding.encode_address(source)}")
+        receiver_holding = self.asset_holding(receiver, asset_id)
+        if receiver_holding is None:
+            raise LedgerError(f"receiver error: must optin, asset {asset_id} missing from {encoding.encode_address(receiver)}")
+        if not clawback:
+            if source_holding[1]:
+                raise LedgerError(f"asset {asset_id} frozen in {encoding.encode_address(source)}")
+            if receiver_holding[1]:
+                raise LedgerError(f"asset {asset_id} frozen in {encoding.encode_address(receiver)}")
+        if source_holding[0] < amount:
+            raise LedgerError(f"underflow on subtracting {amount} from sender amount {source_holding[0]}")
+        if source == receiver:
+            return
+        self.state.put("holdings", (source, asset_id), (source_holding[0] - amount, source_holding[1]))
+        self.state.put("holdings", (receiver, asset_id), (receiver_holding[0] + amount, receiver_holding[1]))
+
+    def _apply_asset_config(self, fields, touched):
+        sender = fields["Sender"]
+        asset_id = fields.get("ConfigAsset", 0)
+        addresses = {
+            "AssetManager": fields.get("ConfigAssetManager", ZERO_ADDRESS),
+            "AssetReserve": fields.get("ConfigAssetReserve", ZERO_ADDRESS),
+            "AssetFreeze": fields.get("ConfigAssetFreeze", ZERO_ADDRESS),
+            "AssetClawback": fields.get("ConfigAssetClawback", ZERO_ADDRESS),
+        }
+
+        if asset_id == 0:
+            asset_id = self._next_id()
+            total = fields.get("ConfigAssetTotal", 0)
+            params = dict(
+                addresses,
+                AssetTotal=total,
+                AssetDecimals=fields.get("ConfigAssetDecimals", 0),
+                AssetDefaultFrozen=fields.get("ConfigAssetDefaultFrozen", 0),
+                AssetUnitName=fields.get("ConfigAssetUnitName", b""),
+                AssetName=fields.get("ConfigAssetName", b""),
+                AssetURL=fields.get("ConfigAssetURL", b""),
+                AssetMetadataHash=fields.get("ConfigAssetMetadataHash", b""),
+                AssetCreator=sender,
+            )
+            self.state.put("assets", asset_id, params)
+            self.state.put("holdings", (sender, asset_id), (total, False))
+            self._raise_min_balance(sender, ASSET_MIN_BALANCE)
+            fields["CreatedAssetID"] = asset_id
+            return
+
+        params = self.asset_params(asset_id)
+        if params is None:
+            raise LedgerError(f"asset {asset_id} does not exist or has been deleted")
+        if sender != params["AssetManager"]:
+            raise LedgerError(
+                f"this transaction should be issued by the manager. It is issued by {encoding.encode_address(sender)}, manager key {encoding.encode_address(params['AssetManager'])}"
+            )
+
+        if all(address == ZERO_ADDRESS for address in addresses.values()):
+            creator = params["AssetCreator"]
+            holding = self.asset_holding(creator, asset_id)
+            held = holding[0] if holding else 0
+            if held != params["AssetTotal"]:
+                raise LedgerError(f"cannot destroy asset: creator is holding only {held}/{params['AssetTotal']}")
+            self.state.delete("assets", asset_id)
+            self.state.delete("holdings", (creator, asset_id))
+            self._raise_min_balance(creator, -ASSET_MIN_BALANCE)
+            touched.add(creator)
+            return
+
+        for name, address in addresses.items():
+            if params[name] == ZERO_ADDRESS and address != ZERO_ADDRESS:
+                raise LedgerError(f"cannot change {name[5:].lower()} address once it has been cleared")
+        self.state.put("assets", asset_id, dict(params, **addresses))
+
+    def _apply_asset_freeze(self, fields):
+        sender = fields["Sender"]
+        asset_id = fields.get("FreezeAsset", 0)
+        target = fields.get("FreezeAssetAccount", ZERO_ADDRESS)
+        params = self.asset_params(asset_id)
+        if params is None:
+            raise LedgerError(f"asset {asset_id} does not exist or has been deleted")
+        if sender != params["AssetFreeze"]:
+            raise LedgerError(
+                f"freeze not allowed: sender {encoding.encode_address(sender)}, freeze {encoding.encode_address(params['AssetFreeze'])}"
+            )
+        holding = self.asset_holding(target, asset_id)
+        if holding is None:
+            raise LedgerError(f"asset {asset_id} not found in account {encoding.encode_address(target)}")
+        self.state.put("holdings", (target, asset_id), (holding[0], bool(fields.get("FreezeAssetFrozen", 0))))
+
+    def _app_min_balance(self, ints, byte_slices, pages=1):
+        return APP_PAGE_MIN_BALANCE * pages + SCHEMA_UINT_MIN_BALANCE * ints + SCHEMA_BYTES_MIN_BALANCE * byte_slices
+
+    def _apply_app_call(self, fields, group_state, index, caller_app_id, depth, touched):
+        sender = fields["Sender"]
+        app_id = fields.get("ApplicationID", 0)
+        on_complete = fields.get("OnCompletion", 0)
+
+        if app_id == 0:
+            app_id = self._next_id()
+            params = {
+                "creator": sender,
+                "approval": fields.get("ApprovalProgram", b""),
+                "clear": fields.get("ClearStateProgram", b""),
+                "global_ints": fields.get("GlobalNumUint", 0),
+                "global_bytes": fields.get("GlobalNumByteSlice", 0),
+                "local_ints": fields.get("LocalNumUint", 0),
+                "local_bytes": fields.get("LocalNumByteSlice", 0),
+                "extra_pages": fields.get("ExtraProgramPages", 0),
+            }
+            self.state.put("apps", app_id, params)
+            self._raise_min_balance(sender, self._app_min_balance(params["global_ints"], params["global_bytes"], 1 + params["extra_pages"]))
+            fields["CreatedApplicationID"] = app_id
+        else:
+            params = self.app_params(app_id)
+            if params is None:
+                if on_complete == avm.ON_COMPLETE["ClearState"]:
+                    self._close_local_state(sender, app_id)
+                    return
+                raise LedgerError(f"application {app_id} does not exist")
+
+        if on_complete == avm.ON_COMPLETE["ClearState"]:
+            if not self.opted_in(sender, app_id):
+                raise LedgerError(f"{encoding.encode_address(sender)} is not currently opted in to app {app_id}")
+
+            # The clear program cannot prevent clearing, so its failures are discarded
+            self.state.begin()
+            try:
+                self._run_program(params["clear"], fields, group_state, index, app_id, caller_app_id, depth)
+            except (EvalError, LedgerError):
+                self.state.rollback()
+            else:
+                self.state.commit()
+            self._close_local_state(sender, app_id)
+            return
+
+        if on_complete == avm.ON_COMPLETE["OptIn"]:
+            if self.opted_in(sender, app_id):
+                raise LedgerError(f"account {encoding.encode_address(sender)} has already opted in to app {app_id}")
+            self.state.put("opted_in", (sender, app_id), (0, 0))
+            self._raise_min_balance(sender, self._app_min_balance(params["local_ints"], params["local_bytes"]))
+
+        approved = self._run_program(params["approval"], fields, group_state, index, app_id, caller_app_id, depth)
+        if not approved:
+            raise LedgerError("transaction rejected by ApprovalProgram")
+
+        ints, byte_slices = self.state.get("global_counts", app_id, (0, 0))
+        if ints > params["global_ints"]:
+            raise LedgerError(f"store integer count {ints} exceeds schema integer count {params['global_ints']}")
+        if byte_slices > params["global_bytes"]:
+            raise LedgerError(f"store bytes count {byte_slices} exceeds schema bytes count {params['global_bytes']}")
+
+        if on_complete == avm.ON_COMPLETE["CloseOut"]:
+            self._close_local_state(sender, app_id)
+        elif on_complete == avm.ON_COMPLETE["UpdateApplication"]:
+            self.state.put("apps", app_id, dict(
+                params,
+                approval=fields.get("ApprovalProgram", b""),
+                clear=fields.get("ClearStateProgram", b""),
+            ))
+        elif on_complete == avm.ON_COMPLETE["DeleteApplication"]:
+            self.state.delete("apps", app_id)
+            self.state.delete("global_counts", app_id)
+            creator = params["creator"]
+            self._raise_min_balance(creator, -self._app_min_balance(params["global_ints"], params["global_bytes"], 1 + params["extra_pages"]))
+            touched.add(creator)
+
+    def _close_local_state(self, address, app_id):
+        if not self.opted_in(address, app_id):
+            return
+        params = self.app_params(app_id)
+        for key in [key for key in self.state.tables["locals"] if key[0] == address and key[1] == app_id]:
+            self.state.delete("locals", key)
+        self.state.delete("opted_in", (address, app_id))
+        if params is not None:
+            self._raise_min_balance(address, -self._app_min_balance(params["local_ints"], params["local_bytes"]))
+
+    def _run_program(self, bytecode, fields, group_state, index, app_id, caller_app_id, depth):
+        try:
+            program = _decoded_program(bytecode)
+        except EvalError as e:
+            raise LedgerError(f"program decode failed: {e}") from None
+
+        evaluator = avm.Evaluator(program, self, group_state, index, app_id, caller_app_id)
+        evaluator.depth = depth
+        if self.tracer is not None:
+            evaluator.trace = set()
+        elif self.coverage is not None:
+            # Without a tracer, the run adds to the coverage directly
+            evaluator.trace = self.coverage.setdefault(program, set())
+        try:
+            approved = evaluator.run()
+        finally:
+            if self.tracer is not None and self.coverage is not None:
+                self.coverage.setdefault(program, set()).update(evaluator.trace)
+        if evaluator.pending_inner is not None:
+            raise EvalError("itxn_begin without itxn_submit", program.instructions[-1].pc)
+
+        fields["Logs"] = evaluator.logs
+        fields["InnerTxns"] = evaluator.inner_transactions
+        fields["Cost"] = evaluator.cost
+        if self.tracer is not None and approved:
+            self.tracer(evaluator)
+        return approved
+
+#
+# Response formatting, mirroring algod's JSON responses
+#
+
+def _b64(value):
+    return base64.b64encode(value).decode()
+
+def _state_value(value):
+    if isinstance(value, int):
+        return {"type": 2, "uint": value, "bytes": ""}
+    return {"type": 1, "bytes": _b64(value), "uint": 0}
+
+def _asset_params_json(params):
+    result = {
+        "creator": encoding.encode_address(params["AssetCreator"]),
+        "total": params["AssetTotal"],
+        "decimals": params["AssetDecimals"],
+        "default-frozen": bool(params["AssetDefaultFrozen"]),
+        "unit-name": params["AssetUnitName"].decode(errors="replace"),
+        "name": params["AssetName"].decode(errors="replace"),
+        "url": params["AssetURL"].decode(errors="replace"),
+    }
+    for key, name in (("manager", "AssetManager"), ("reserve", "AssetReserve"), ("freeze", "AssetFreeze"), ("clawback", "AssetClawback")):
+        if params[name] != ZERO_ADDRESS:
+            result[key] = encoding.encode_address(params[name])
+    return result
+
+def _inner_json(fields):
+    """Describe an applied transaction in the shape of algod's ``pending_transaction_info``."""
+    txn = {"type": fields["Type"].decode(), "snd": encoding.encode_address(fields["Sender"]), "fee": fields.get("Fee", 0)}
+    for key, name in (("rcv", "Receiver"), ("arcv", "AssetReceiver"), ("aclose", "AssetCloseTo"), ("asnd", "AssetSender"), ("close", "CloseRemainderTo")):
+        if fields.get(name, ZERO_ADDRESS) != ZERO_ADDRESS:
+            txn[key] = encoding.encode_address(fields[name])
+    for key, name in (("amt", "Amount"), ("aamt", "AssetAmount"), ("xaid", "XferAsset"), ("apid", "ApplicationID")):
+        if fields.get(name):
+            txn[key] = fields[name]
+
+    info = {"txn": {"txn": txn}, "pool-error": ""}
+    if fields.get("CreatedAssetID"):
+        info["asset-index"] = fields["CreatedAssetID"]
+    if fields.get("CreatedApplicationID"):
+        info["application-index"] = fields["CreatedApplicationID"]
+    if fields.get("Logs"):
+        info["logs"] = [_b64(message) for message in fields["Logs"]]
+    if fields.get("InnerTxns"):
+        info["inner-txns"] = [_inner_json(inner) for inner in fields["InnerTxns"]]
+    return info
+
+# Short msgpack keys of the transaction fields, as they appear in blocks
+_BLOCK_KEYS = [
+    ("snd", "Sender"), ("fee", "Fee"), ("fv", "FirstValid"), ("lv", "LastValid"),
+    ("note", "Note"), ("lx", "Lease"), ("rekey", "RekeyTo"), ("rcv", "Receiver"),
+    ("amt", "Amount"), ("close", "CloseRemainderTo"), ("xaid", "XferAsset"),
+    ("aamt", "AssetAmount"), ("asnd", "AssetSender"), ("arcv", "AssetReceiver"),
+    ("aclose", "AssetCloseTo"), ("caid", "ConfigAsset"), ("faid", "FreezeAsset"),
+    ("fadd", "FreezeAssetAccount"), ("afrz", "FreezeAssetFrozen"), ("apid", "ApplicationID"),
+    ("apan", "OnCompletion"), ("apaa", "ApplicationArgs"), ("apat", "Accounts"),
+    ("apas", "Assets"), ("apfa", "Applications"),
+]
+
+def block_transaction(fields):
+    """Encode applied transaction ``fields`` like a ``SignedTxnInBlock`` of a msgpack block."""
+    txn = {"type": fields["Type"].decode()}
+    for key, name in _BLOCK_KEYS:
+        value = fields.get(name)
+        if value in (None, 0, b"", [], ZERO_ADDRESS):
+            continue
+        txn[key] = value
+
+    is_config = fields.get("TypeEnum") == avm.TXN_TYPES["acfg"]
+    if is_config and (fields.get("ConfigAsset", 0) == 0 or fields.get("ConfigAssetManager", ZERO_ADDRESS) != ZERO_ADDRESS):
+        txn["apar"] = {
+            key: fields[name]
+            for key, name in (
+                ("t", "ConfigAssetTotal"), ("dc", "ConfigAssetDecimals"), ("df", "ConfigAssetDefaultFrozen"),
+                ("un", "ConfigAssetUnitName"), ("an", "ConfigAssetName"), ("m", "ConfigAssetManager"),
+                ("r", "ConfigAssetReserve"), ("f", "ConfigAssetFreeze"), ("c", "ConfigAssetClawback"),
+            )
+            if fields.get(name) not in (None, 0, b"", ZERO_ADDRESS)
+        }
+
+    apply_data = {}
+    if fields.get("AssetClosingAmount"):
+        apply_data["aca"] = fields["AssetClosingAmount"]
+    if fields.get("CloseRemainderAmount"):
+        apply_data["ca"] = fields["CloseRemainderAmount"]
+    if fields.get("Logs"):
+        apply_data["lg"] = list(fields["Logs"])
+    if fields.get("InnerTxns"):
+        apply_data["itx"] = [block_transaction(inner) for inner in fields["InnerTxns"]]
+
+    entry = {"txn": txn}
+    if apply_data:
+        entry["dt"] = apply_data
+    if fields.get("CreatedAssetID"):
+        entry["caid"] = fields["CreatedAssetID"]
+    if fields.get("CreatedApplicationID"):
+        entry["apid"] = fields["CreatedApplicationID"]
+    return entry
+
+def _not_found(message):
+    return AlgodHTTPError(message, code=404)
+
+class SimAlgodClient:
+    """An ``AlgodClient`` look-alike backed by a ``Ledger``.
+
+    Errors are raised as ``AlgodHTTPError`` with algod's wording, so code
+    matching on node errors behaves the same against the simulator.
+    """
+    # Identifies the assembler which produced the bytecode of ``compile``
+    assembler = "avm-sim"
+
+    def __init__(self, ledger=None):
+        self.ledger = ledger if ledger is not None else Ledger()
+        # Like algod, apply one group at a time even when called from several threads
+        self._lock = threading.Lock()
+
+    #
+    # Transactions
+    #
+
+    def suggested_params(self, **kwargs):
+        return transaction.SuggestedParams(
+            fee=0,
+            first=self.ledger.round,
+            last=self.ledger.round + MAX_TXN_LIFE,
+            gh=GENESIS_HASH,
+            gen=GENESIS_ID,
+            flat_fee=False,
+            min_fee=MIN_TXN_FEE,
+        )
+
+    def send_transactions(self, txns, **kwargs):
+        try:
+            with self._lock:
+                txids = self.ledger.submit(list(txns))
+        except LedgerError as e:
+            raise AlgodHTTPError(f"TransactionPool.Remember: transaction {e.txid}: {e.message}", code=400) from None
+        return txids[0]
+
+    def send_transaction(self, txn, **kwargs):
+        return self.send_transactions([txn])
+
+    def send_raw_transaction(self, txn, **kwargs):
+        if isinstance(txn, str):
+            txn = base64.b64decode(txn)
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(txn)
+        stxns = [encoding.future_msgpack_decode(base64.b64encode(msgpack.packb(entry, use_bin_type=True)).decode()) for entry in unpacker]
+        return self.send_transactions(stxns)
+
+    def pending_transaction_info(self, transaction_id, **kwargs):
+        entry = self.ledger.confirmed.get(transaction_id)
+        if entry is None:
+            raise _not_found("txn does not exist")
+        info = _inner_json(entry["fields"])
+        info["txn"] = entry["stxn"].dictify() if hasattr(entry["stxn"], "dictify") else info["txn"]
+        info["confirmed-round"] = entry["round"]
+        return info
+
+    #
+    # Node status
+    #
+
+    def status(self, **kwargs):
+        return {"last-round": self.ledger.round, "time-since-last-round": 0, "catchup-time": 0, "last-version": GENESIS_ID}
+
+    def status_after_block(self, block_num, **kwargs):
+        # The simulator never waits: it produces the block being waited for
+        with self._lock:
+            if block_num >= self.ledger.round:
+                self.ledger.advance(block_num - self.ledger.round + 1)
+        return self.status()
+
+    def block_info(self, block=None, response_format="json", round_num=None, **kwargs):
+        round_number = block if block is not None else round_num
+        record = self.ledger.blocks.get(round_number)
+        if record is None:
+            raise _not_found(f"ledger does not have entry {round_number}")
+        return {"block": {
+            "rnd": record["rnd"],
+            "ts": record["ts"],
+            "txns": [block_transaction(entry["fields"]) for entry in record["txns"]],
+        }}
+
+    def get_block_txids(self, round_num, **kwargs):
+        record = self.ledger.blocks.get(round_num)
+        if record is None:
+            raise _not_found(f"ledger does not have entry {round_num}")
+        return {"blockTxids": [entry["txid"] for entry in record["txns"]]}
+
+    def compile(self, source, source_map=False, **kwargs):
+        try:
+            bytecode, pc_to_line = avm.assemble(source, source_map=True)
+        except avm.AssemblyError as e:
+            raise AlgodHTTPError(str(e), code=400) from None
+        response = {"hash": logic.address(bytecode), "result": _b64(bytecode)}
+        if source_map:
+            response["sourcemap"] = source_map_json(pc_to_line, len(bytecode))
+        return response
+
+    #
+    # Accounts, assets and applications
+    #
+
+    def account_info(self, address, **kwargs):
+        ledger = self.ledger
+        raw = encoding.decode_address(address)
+        assets = [
+            {"asset-id": asset_id, "amount": amount, "is-frozen": frozen}
+            for (holder, asset_id), (amount, frozen) in ledger.state.tables["holdings"].items()
+            if holder == raw
+        ]
+        created_assets = [
+            {"index": asset_id, "params": _asset_params_json(params)}
+            for asset_id, params in ledger.state.tables["assets"].items()
+            if params["AssetCreator"] == raw
+        ]
+        created_apps = [{"id": app_id} for app_id, params in ledger.state.tables["apps"].items() if params["creator"] == raw]
+        local_states = [{"id": app_id} for (holder, app_id) in ledger.state.tables["opted_in"] if holder == raw]
+        info = {
+            "address": address,
+            "amount": ledger.balance(raw),
+            "min-balance": ledger.account_min_balance(raw),
+            "assets": assets,
+            "created-assets": created_assets,
+            "created-apps": created_apps,
+            "apps-local-state": local_states,
+            "round": ledger.round,
+        }
+        auth = ledger.auth_address(raw)
+        if auth is not None:
+            info["auth-addr"] = encoding.encode_address(auth)
+        return info
+
+    def account_asset_info(self, address, asset_id, **kwargs):
+        holding = self.ledger.asset_holding(encoding.decode_address(address), asset_id)
+        if holding is None:
+            raise _not_found("account asset info not found")
+        return {
+            "asset-holding": {"amount": holding[0], "asset-id": asset_id, "is-frozen": holding[1]},
+            "round": self.ledger.round,
+        }
+
+    def asset_info(self, asset_id, **kwargs):
+        params = self.ledger.asset_params(asset_id)
+        if params is None:
+            raise _not_found("asset does not exist")
+        return {"index": asset_id, "params": _asset_params_json(params)}
+
+    def application_info(self, application_id, **kwargs):
+        params = self.ledger.app_params(application_id)
+        if params is None:
+            raise _not_found("application does not exist")
+        global_state = [
+            {"key": _b64(key), "value": _state_value(value)}
+            for (app_id, key), value in self.ledger.state.tables["globals"].items()
+            if app_id == application_id
+        ]
+        return {"id": application_id, "params": {
+            "creator": encoding.encode_address(params["creator"]),
+            "approval-program": _b64(params["approval"]),
+            "clear-state-program": _b64(params["clear"]),
+            "global-state-schema": {"num-uint": params["global_ints"], "num-byte-slice": params["global_bytes"]},
+            "local-state-schema": {"num-uint": params["local_ints"], "num-byte-slice": params["local_bytes"]},
+            "extra-program-pages": params["extra_pages"],
+            "global-state": global_state,
+        }}
+
+    def application_boxes(self, application_id, **kwargs):
+        names = [name for (app_id, name) in self.ledger.state.tables["boxes"] if app_id == application_id]
+        return {"boxes": [{"name": _b64(name)} for name in names]}
+
+    def application_box_by_name(self, application_id, box_name, **kwargs):
+        value = self.ledger.box_get(application_id, bytes(box_name))
+        if value is None:
+            raise _not_found("box not found")
+        return {"name": _b64(box_name), "round": self.ledger.round, "value": _b64(value)}
+
+_VLQ_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+def _vlq(value):
+    value = (-value << 1) | 1 if value < 0 else value << 1
+    out = ""
+    while True:
+        digit = value & 31
+        value >>= 5
+        out += _VLQ_CHARS[digit | (32 if value else 0)]
+        if not value:
+            return out
+
+def source_map_json(pc_to_line, size):
+    """Encode a pc-to-line map in the version 3 source map format returned by algod."""
+    mappings = []
+    last_line = 0
+    for pc in range(size):
+        line = pc_to_line.get(pc)
+        if line is None:
+            mappings.append("")
+            continue
+        mappings.append(_vlq(0) + _vlq(0) + _vlq(line - last_line) + _vlq(0))
+        last_line = line
+    return {"version": 3, "sources": [], "names": [], "mappings": ";".join(mappings)}
@@ -0,0 +1,95 @@
+"""Look up the on-chain registry of the WizCoin members.
+
+The application keeps a box per member, named after the 32-byte address of
+the member and holding the 8-byte round it joined in. ``join_wizcoin`` and
+``batch_join_wizcoin`` register the members and ``clawback_wizcoins``
+removes them, so a membership is a single box read, for other contracts and
+off-chain alike, without referencing the account or the WizCoin ASA.
+
+The WizCoin token may leave a member outside of the application, by a
+transfer or a clawback of the ASA, which leaves its box behind. Such a member
+may join again, and ``unregister_members`` lets anybody remove the box of an
+account holding no WizCoin, so that the registry follows the tokens. The
+manager may remove any box, which returns their minimum balance to the
+application before it is deleted; ``registered_members`` lists the boxes.
+
+Every box the application reads or writes has to be referenced by the
+application calls of the group, with ``member_box``. A call references at
+most ``MAX_REFERENCES`` accounts, assets, applications and boxes together.
+A member of ``batch_join_wizcoin``, ``clawback_wizcoins`` or
+``unregister_members`` takes an account and a box, and the WizCoin ASA one
+more, hence ``MAX_BATCH_SIZE`` members per call.
+
+Off-chain, ``member_since`` reads the box of one address from algod. The
+read-only ``check_registrations`` method answers for a batch of addresses in
+one call: ``check_registrations_call`` builds such a call and
+``registrations`` decodes its result.
+
+Both tell whether an address is registered, not whether it holds a WizCoin:
+a stale box counts until ``unregister_members`` removes it. A contract which
+must not admit such an account reads the WizCoin holding itself, with the
+account and the ASA among its references.
+"""
+import algosdk
+from algosdk import abi, encoding, transaction
+
+from algod_connection import algod_client
+from method_dispatch import selector
+
+# The minimum balance a box adds to the application account, per box and per byte of its name and value
+BOX_FLAT_MIN_BALANCE = 2500
+BOX_BYTE_MIN_BALANCE = 400
+
+# The minimum balance of the box of one member: a 32-byte address mapped to a uint64 round
+MEMBER_BOX_MIN_BALANCE = BOX_FLAT_MIN_BALANCE + BOX_BYTE_MIN_BALANCE * (32 + 8)
+
+# The accounts, assets, applications and boxes an application call can reference together
+MAX_REFERENCES = 8
+
+# The members of one `batch_join_wizcoin`, `clawback_wizcoins` or `unregister_members` call
+MAX_BATCH_SIZE = (MAX_REFERENCES - 1) // 2
+
+# The ARC-4 prefix of a logged return value
+RETURN_PREFIX = bytes.fromhex("151f7c75")
+
+_ADDRESSES = abi.ABIType.from_string("address[]")
+_REGISTRATIONS = abi.ABIType.from_string("bool[]")
+
+def member_box(address):
+    """Return the reference to the registry box of ``address`` for the ``boxes`` of an application call."""
+    return (0, encoding.decode_address(address))
+
+def member_since(app_id, address, client=None):
+    """Return the round ``address`` registered with the WizCoin application ``app_id`` in, or ``None`` if it has no box."""
+    client = client if client is not None else algod_client()
+    try:
+        box = client.application_box_by_name(app_id, encoding.decode_address(address))
+    except algosdk.error.AlgodHTTPError:
+        return None
+    return int.from_bytes(encoding.base64.b64decode(box["value"]), "big")
+
+def registered_members(app_id, client=None):
+    """Return the addresses of the boxes in the registry of the WizCoin application ``app_id``."""
+    client = client if client is not None else algod_client()
+    boxes = client.application_boxes(app_id)["boxes"]
+    return [encoding.encode_address(encoding.base64.b64decode(box["name"])) for box in boxes]
+
+def check_registrations_call(sender, app_id, addresses, params):
+    """Return the read-only ``check_registrations`` call of ``sender`` looking up ``addresses``."""
+    if len(addresses) > MAX_REFERENCES:
+        raise ValueError(f"a call references at most {MAX_REFERENCES} boxes, got {len(addresses)} addresses")
+    return transaction.ApplicationCallTxn(
+        sender=sender,
+        sp=params,
+        index=app_id,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=[selector("check_registrations"), _ADDRESSES.encode(list(addresses))],
+        boxes=[member_box(address) for address in addresses],
+    )
+
+def registrations(info):
+    """Return the ``bool[]`` result of a ``check_registrations`` call from its pending transaction info."""
+    result = encoding.base64.b64decode(info["logs"][-1])
+    if not result.startswith(RETURN_PREFIX):
+        raise ValueError("the last log of the call is not an ARC-4 return value")
+    return _REGISTRATIONS.decode(result[len(RETURN_PREFIX):])
@@ -0,0 +1,194 @@
+"""Keep a local table of the WizCoin members, updated incrementally from the blocks of the node.
+
+Checking membership with ``asset_balance`` costs an algod request per
+address. A ``MembershipIndexer`` instead follows the blocks and applies every
+transaction, top-level or inner, which touches the WizCoin ASA to a table of
+its holders:
+
+* asset transfers, including opt-ins, clawbacks and close-outs, e.g. the
+  inner transfer of ``join_wizcoin`` or ``relinquish_wizcoins``,
+* freezes and unfreezes,
+* the creation and destruction of the ASA.
+
+A member is any account holding WizCoins other than the application account,
+which holds the unsold reserve. The table is checkpointed to a JSON file
+together with the last processed round, so that the next ``catch_up``
+resumes right after it. Lookups never touch the node.
+
+For a complete table, the first run has to start at or before the round the
+ASA was created in.
+"""
+import argparse
+import base64
+import json
+import os
+
+from algosdk import encoding, logic
+
+from algod_connection import algod_client
+
+def _address(value):
+    """Return the base32 form of an address of a block, which may be raw, base64 or already base32."""
+    if isinstance(value, bytes):
+        return encoding.encode_address(value)
+    if encoding.is_valid_address(value):
+        return value
+    return encoding.encode_address(base64.b64decode(value))
+
+class MembershipIndexer:
+    """The holders of the WizCoin ASA ``asset_id`` sold by the application ``app_id``.
+
+    The table is checkpointed to ``checkpoint`` if given, and loaded from it
+    when it exists. Without a checkpoint, processing starts at ``start_round``.
+    """
+    def __init__(self, asset_id, app_id, checkpoint=None, start_round=1, client=None):
+        self.asset_id = asset_id
+        self.app_id = app_id
+        self.app_address = logic.get_application_address(app_id)
+        self.checkpoint = checkpoint
+        self.client = client
+
+        self.round = start_round - 1
+        self.default_frozen = False
+        # The address of every account opted in to the ASA mapped to its `[amount, frozen]`
+        self.holders = {}
+
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self._load()
+
+    def _load(self):
+        with open(self.checkpoint) as f:
+            data = json.load(f)
+        if (data["asset_id"], data["app_id"]) != (self.asset_id, self.app_id):
+            raise ValueError(f"{self.checkpoint} indexes asset {data['asset_id']} of app {data['app_id']}")
+        self.round = data["round"]
+        self.default_frozen = data["default_frozen"]
+        self.holders = data["holders"]
+
+    def save(self):
+        """Write the table and the last processed round to the checkpoint file."""
+        data = {
+            "asset_id": self.asset_id,
+            "app_id": self.app_id,
+            "round": self.round,
+            "default_frozen": self.default_frozen,
+            "holders": self.holders,
+        }
+        # Write a new file and replace the old one, so that an interrupted save keeps the last checkpoint
+        partial = f"{self.checkpoint}.partial"
+        with open(partial, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(partial, self.checkpoint)
+
+    def is_member(self, address):
+        """Whether ``address`` holds WizCoins."""
+        holding = self.holders.get(address)
+        return holding is not None and holding[0] > 0 and address != self.app_address
+
+    def is_frozen(self, address):
+        """Whether the WizCoin holding of ``address`` is frozen."""
+        holding = self.holders.get(address)
+        return holding is not None and holding[1]
+
+    def members(self):
+        """Return the addresses of the members, sorted."""
+        return sorted(address for address in self.holders if self.is_member(address))
+
+    @property
+    def member_count(self):
+        return sum(1 for address in self.holders if self.is_member(address))
+
+    def catch_up(self):
+        """Process every block up to the latest round of the node, saving a checkpoint afterwards.
+
+        Returns the number of processed rounds.
+        """
+        client = self.client if self.client is not None else algod_client()
+        last_round = client.status()["last-round"]
+        start_round = self.round
+        while self.round < last_round:
+            self.apply_block(client.block_info(self.round + 1)["block"])
+        if self.checkpoint is not None and self.round > start_round:
+            self.save()
+        return self.round - start_round
+
+    def follow(self):
+        """Keep processing the blocks as they are produced."""
+        client = self.client if self.client is not None else algod_client()
+        while True:
+            self.catch_up()
+            client.status_after_block(self.round)
+
+    def apply_block(self, block):
+        """Apply the transactions of ``block``, the next round after the last processed one."""
+        if block["rnd"] != self.round + 1:
+            raise ValueError(f"expected round {self.round + 1}, got round {block['rnd']}")
+        for entry in block.get("txns", []):
+            self._apply(entry)
+        self.round = block["rnd"]
+
+    def _apply(self, entry):
+        txn = entry["txn"]
+        kind = txn["type"]
+        if kind == "axfer" and txn.get("xaid") == self.asset_id:
+            self._apply_transfer(txn)
+        elif kind == "afrz" and txn.get("faid") == self.asset_id:
+            holding = self.holders.get(_address(txn["fadd"]))
+            if holding is not None:
+                holding[1] = bool(txn.get("afrz", False))
+        elif kind == "acfg":
+            self._apply_config(entry)
+
+        # Inner transactions are applied after the application call issuing them
+        for inner in entry.get("dt", {}).get("itx", []):
+            self._apply(inner)
+
+    def _apply_transfer(self, txn):
+        sender = _address(txn["snd"])
+        # A clawback moves the WizCoins of the asset sender instead
+        source = _address(txn["asnd"]) if "asnd" in txn else sender
+        receiver = _address(txn["arcv"]) if "arcv" in txn else None
+        amount = txn.get("aamt", 0)
+
+        if source not in self.holders:
+            # A zero transfer to oneself opts in to the ASA
+            self.holders[source] = [0, self.default_frozen]
+        if amount:
+            self.holders[source][0] -= amount
+            self.holders.setdefault(receiver, [0, self.default_frozen])[0] += amount
+
+        if "aclose" in txn:
+            closed = self.holders.pop(source)
+            self.holders.setdefault(_address(txn["aclose"]), [0, self.default_frozen])[0] += closed[0]
+
+    def _apply_config(self, entry):
+        txn = entry["txn"]
+        if entry.get("caid") == self.asset_id:
+            # The creator holds the whole supply of the new ASA
+            params = txn.get("apar", {})
+            self.default_frozen = bool(params.get("df", False))
+            self.holders = {_address(txn["snd"]): [params.get("t", 0), False]}
+        elif txn.get("caid") == self.asset_id and not txn.get("apar"):
+            # Destroyed
+            self.holders = {}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the members of a WizCoin membership application.")
+    parser.add_argument("asset_id", type=int, help="The id of the WizCoin ASA.")
+    parser.add_argument("app_id", type=int, help="The id of the membership application.")
+    parser.add_argument("--checkpoint", default="wizcoin_members.json", help="The file the table is checkpointed to.")
+    parser.add_argument("--start-round", type=int, default=1, help="The round to start at without a checkpoint.")
+    parser.add_argument("--follow", action="store_true", help="Keep following the new blocks.")
+    args = parser.parse_args()
+
+    indexer = MembershipIndexer(args.asset_id, args.app_id, args.checkpoint, args.start_round)
+    start_round = indexer.round
+    if args.follow:
+        # Every caught up round is checkpointed, so following stops at Ctrl-C
+        try:
+            indexer.follow()
+        except KeyboardInterrupt:
+            pass
+    else:
+        indexer.catch_up()
+    print(f"{indexer.member_count} members as of round {indexer.round} ({indexer.round - start_round} new rounds)")
@@ -0,0 +1,120 @@
+"""ARC-4 style method routing for the WizCoin approval program.
+
+A NoOp application call names its method with the 4-byte selector of the
+method signature in its first application argument, as in ARC-4. PyTEAL has
+no multi-way branch, so ``method_dispatch`` builds a chain of selector
+comparisons, ordered from the hottest method down. Each comparison costs 4
+opcodes, so the method at position ``k`` pays ``4 * k`` to be reached, while a
+``match`` jump table over ``n`` methods costs every one of them ``n + 2``.
+``lower_method_dispatch`` therefore keeps the comparisons of the ``HOT_METHODS``
+hottest methods in front and rewrites only the rest of every such chain of the
+compiled TEAL into a ``match``, which needs TEAL v8. A cold method then pays
+the ``4 * HOT_METHODS`` of the comparisons plus ``n + 2`` for the ``match``
+over the ``n`` cold methods: ``8 + 7 = 15`` for 5 of the 7 ``METHODS``. Per
+method at TEAL v8, as reported by ``profiler.py --hot 7`` and ``profiler.py``:
+
+    method                full chain    hot chain + match
+    join_wizcoin               4               4
+    batch_join_wizcoin         8               8
+    check_registrations       12              15
+    opt_in_wizcoin            16              15
+    clawback_wizcoins         20              15
+    unregister_members        24              15
+    relinquish_wizcoins       28              15
+
+``compile_teal`` performs both steps.
+"""
+import re
+
+from algosdk.abi import Method
+from pyteal import *
+
+# The methods of the WizCoin contract, ordered from the most to the least frequently called
+METHODS = {
+    "join_wizcoin": "join_wizcoin()void",
+    "batch_join_wizcoin": "batch_join_wizcoin()void",
+    "check_registrations": "check_registrations(address[])bool[]",
+    "opt_in_wizcoin": "opt_in_wizcoin()void",
+    "clawback_wizcoins": "clawback_wizcoins()void",
+    "unregister_members": "unregister_members()void",
+    "relinquish_wizcoins": "relinquish_wizcoins()void",
+}
+
+# `match` and `switch` were introduced in TEAL v8
+MATCH_VERSION = 8
+
+# The leading methods of `METHODS` which keep their comparison ahead of the `match`
+HOT_METHODS = 2
+
+def selector(name):
+    """Return the 4-byte selector of the WizCoin method ``name``, to be passed as the first application argument."""
+    return Method.from_signature(METHODS[name]).get_selector()
+
+def method_dispatch(branches, default):
+    """Route on the selector in the first application argument to the ``branches``.
+
+    ``branches`` is a list of ``(method name, expression)`` pairs, tried in
+    order. Calls matching none of the methods evaluate ``default``.
+    """
+    return Cond(
+        *[[Txn.application_args[0] == MethodSignature(METHODS[name]), branch] for name, branch in branches],
+        [Int(1), default],
+    )
+
+# One comparison of a selector chain: the selector, the method signature and the branch label
+_COMPARISON = re.compile(r'(?P<selector>[^\n]+)\nmethod (?P<signature>"[^"\n]*")\n==\nbnz (?P<label>\S+)\n')
+
+# The jump to the default branch of `method_dispatch`, placed right after the chain
+_DEFAULT_JUMP = re.compile(r'int 1\nbnz (?P<label>\S+)\nerr\n(?P=label):\n')
+
+def lower_method_dispatch(teal, hot=HOT_METHODS):
+    """Rewrite every chain of selector comparisons in ``teal`` into a ``match``, after its ``hot`` leading ones.
+
+    A chain is a run of ``<selector>; method "sig"; ==; bnz label`` groups which
+    all read the same selector. The first ``hot`` comparisons of a chain are
+    kept as they are, and the rest is only lowered when at least two remain.
+    When none of the methods match, ``match`` falls through to the code
+    following the chain, just like the chain itself. Programs below TEAL v8
+    are returned unchanged.
+    """
+    version = re.match(r"#pragma version (\d+)", teal)
+    if version is None or int(version.group(1)) < MATCH_VERSION:
+        return teal
+
+    lowered = []
+    position = 0
+    while position < len(teal):
+        chain = []
+        end = position
+        while True:
+            comparison = _COMPARISON.match(teal, end)
+            if comparison is None or (chain and comparison.group("selector") != chain[0].group("selector")):
+                break
+            chain.append(comparison)
+            end = comparison.end()
+
+        # Only rewrite chains which start at the beginning of a line
+        if len(chain) - hot >= 2 and (position == 0 or teal[position - 1] == "\n"):
+            lowered.extend(comparison.group(0) for comparison in chain[:hot])
+            lowered.extend(f"method {comparison.group('signature')}\n" for comparison in chain[hot:])
+            lowered.append(f"{chain[0].group('selector')}\n")
+            lowered.append(f"match {' '.join(comparison.group('label') for comparison in chain[hot:])}\n")
+            position = end
+
+            # Fall through to the default branch instead of jumping over an `err`
+            default_jump = _DEFAULT_JUMP.match(teal, position)
+            if default_jump is not None:
+                lowered.append(f"{default_jump.group('label')}:\n")
+                position = default_jump.end()
+            continue
+
+        line_end = teal.find("\n", position)
+        line_end = len(teal) if line_end == -1 else line_end + 1
+        lowered.append(teal[position:line_end])
+        position = line_end
+
+    return "".join(lowered)
+
+def compile_teal(ast, mode=Mode.Application, version=MATCH_VERSION, hot=HOT_METHODS, **options):
+    """Compile the PyTEAL ``ast`` to TEAL with its method dispatch lowered to ``match`` after the ``hot`` methods."""
+    return lower_method_dispatch(compileTeal(ast, mode=mode, version=version, **options), hot=hot)
@@ -0,0 +1,124 @@
+"""Sign many multisig transactions at once, spreading the signatures over processes.
+
+Signing a ``MultisigTransaction`` the ``algosdk`` way, one signer at a time,
+serializes the transaction again for every signature, and ed25519 signing
+keeps a single core busy once a treasury handles its members in bulk.
+``MultisigSigner`` instead
+
+* serializes every transaction once, into the bytes all of its signers sign,
+* hands out the signatures in chunks per signing key, so that a worker sets
+  up a key once for many messages, to a pool of ``processes`` processes,
+* merges the signatures returned for each transaction into its ``Multisig``,
+  alongside any it already carried.
+
+Batches of fewer than ``min_pool_signatures`` signatures are signed in
+process, where the pool would cost more than it saves. Every group comes
+back as the list of its signed transactions, ready for
+``send_transactions``.
+"""
+import base64
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from algosdk import constants, error, transaction
+from nacl.signing import SigningKey
+
+# The signatures, per signing key, handed to a worker at once
+CHUNK_SIZE = 64
+
+# A transaction of a group signed by the ``private_keys`` of the ``multisig`` account
+# it is sent from; ``txn`` is a ``Transaction``, or a partially signed ``MultisigTransaction``
+MultisigEntry = namedtuple("MultisigEntry", ["txn", "multisig", "private_keys"])
+
+def _sign_chunk(seed, messages):
+    """Return the signatures of ``messages`` by the key of ``seed``."""
+    key = SigningKey(seed)
+    return [key.sign(message).signature for message in messages]
+
+def _key_parts(private_key):
+    """Return the seed and the public key of an ``algosdk`` private key."""
+    raw = base64.b64decode(private_key)
+    return raw[:constants.key_len_bytes], raw[constants.key_len_bytes:]
+
+class MultisigSigner:
+    """Signs groups of ``MultisigEntry`` on a pool of ``processes`` processes, by default one per core."""
+    def __init__(self, processes=None, min_pool_signatures=256):
+        self.processes = processes
+        self.min_pool_signatures = min_pool_signatures
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut the process pool down."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _signatures(self, jobs):
+        """Return the signatures of ``jobs``, a dict from seed to the messages it signs, per seed."""
+        count = sum(len(messages) for messages in jobs.values())
+        if count < self.min_pool_signatures:
+            return {seed: _sign_chunk(seed, messages) for seed, messages in jobs.items()}
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.processes)
+        futures = {
+            seed: [self._pool.submit(_sign_chunk, seed, messages[start:start + CHUNK_SIZE]) for start in range(0, len(messages), CHUNK_SIZE)]
+            for seed, messages in jobs.items()
+        }
+        return {seed: [signature for future in chunks for signature in future.result()] for seed, chunks in futures.items()}
+
+    def sign_groups(self, groups):
+        """Return every group of ``groups``, each a list of ``MultisigEntry``, as a list of signed ``MultisigTransaction``.
+
+        Groups of several transactions without a group ID are assigned one.
+        Raises ``InvalidSecretKeyError`` for a key which is not one of the
+        account's and the ``Multisig`` errors of ``algosdk`` for invalid accounts.
+        """
+        signed_groups = []
+        jobs = {}
+        placements = {}
+        for group in groups:
+            txns = [getattr(entry.txn, "transaction", entry.txn) for entry in group]
+            if len(txns) > 1 and all(txn.group is None for txn in txns):
+                txns = transaction.assign_group_id(txns)
+
+            signed = []
+            for entry, txn in zip(group, txns):
+                if isinstance(entry.txn, transaction.MultisigTransaction):
+                    multisig = entry.txn.multisig
+                    subsigs = [subsig.signature for subsig in multisig.subsigs]
+                    multisig = multisig.get_multisig_account()
+                    for subsig, signature in zip(multisig.subsigs, subsigs):
+                        subsig.signature = signature
+                else:
+                    multisig = entry.multisig.get_multisig_account()
+                multisig.validate()
+                stxn = transaction.MultisigTransaction(txn, multisig)
+                signed.append(stxn)
+
+                # Serialized once for all of its signers
+                message = txn.bytes_to_sign()
+                public_keys = [subsig.public_key for subsig in multisig.subsigs]
+                for private_key in entry.private_keys:
+                    seed, public_key = _key_parts(private_key)
+                    if public_key not in public_keys:
+                        raise error.InvalidSecretKeyError
+                    jobs.setdefault(seed, []).append(message)
+                    placements.setdefault(seed, []).append((multisig, public_keys.index(public_key)))
+            signed_groups.append(signed)
+
+        for seed, signatures in self._signatures(jobs).items():
+            for (multisig, index), signature in zip(placements[seed], signatures):
+                multisig.subsigs[index].signature = signature
+        return signed_groups
+
+def sign_multisig_groups(groups, processes=None, min_pool_signatures=256):
+    """Sign ``groups`` with a ``MultisigSigner`` of its own, see ``MultisigSigner.sign_groups``."""
+    with MultisigSigner(processes, min_pool_signatures) as signer:
+        return signer.sign_groups(groups)
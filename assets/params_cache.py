@@ -0,0 +1,188 @@
+"""Serve suggested transaction parameters without asking the node for every transaction.
+
+Every transaction is built from the suggested parameters of the node, and
+fetching them anew costs a round trip per transaction. Apart from the fee
+under congestion, though, they only change with the round: the genesis, the
+minimum fee and the length of the validity window stay the same.
+``ParamsCache`` therefore fetches them once and serves copies whose
+first/last-round window starts at the current round, which it learns
+
+* from ``observe``, e.g. with the confirmed round of every sent transaction,
+* or from a background thread following the rounds with ``status_after_block``,
+  started with ``start``.
+
+The parameters are fetched again once the current round is ``refresh_rounds``
+past them, or when no round was learned for ``max_age`` seconds, since a
+stale round would push the window towards its end.
+
+``get`` serves synchronous code and ``get_async`` coroutines, fetching on a
+worker thread so that the event loop is not blocked. Both decide and serve
+from one snapshot of the parameters and the round, and a single caller
+fetches at a time, outside of the lock, so that the callers served current
+parameters never wait on the node. ``suggested_params`` is
+the drop-in replacement of ``algopytest.suggested_params`` using the cache of
+the process-wide algod client.
+"""
+import asyncio
+import copy
+import threading
+import time
+
+from algod_connection import algod_client
+
+# The rounds after which the parameters, and with them the suggested fee, are fetched again
+REFRESH_ROUNDS = 100
+
+# The seconds after which a round not followed or observed is no longer trusted
+MAX_AGE = 30
+
+class ParamsCache:
+    """Serves the suggested parameters of ``client`` for the current round."""
+    def __init__(self, client=None, refresh_rounds=REFRESH_ROUNDS, max_age=MAX_AGE):
+        self.client = client if client is not None else algod_client()
+        self.refresh_rounds = refresh_rounds
+        self.max_age = max_age
+        self.fetches = 0
+        self._lock = threading.Lock()
+        # Signalled when a fetch in progress is over
+        self._fetched = threading.Condition(self._lock)
+        self._fetching = False
+        self._follower = None
+        self._stopped = threading.Event()
+        self.reset()
+
+    @property
+    def round(self):
+        """Return the current round as far as the cache knows, or ``None`` before the first fetch."""
+        return self._round
+
+    def reset(self):
+        """Forget the parameters and the round, e.g. after the ledger was rolled back."""
+        with self._lock:
+            self._params = None
+            self._round = None
+            self._seen = 0.0
+
+    def observe(self, round):
+        """Learn that the ledger reached ``round``."""
+        with self._lock:
+            if self._round is None or round > self._round:
+                self._round = round
+            if self._round == round:
+                self._seen = time.monotonic()
+
+    def _snapshot(self):
+        """Return the parameters, the round and when it was seen, taken together under the lock."""
+        with self._lock:
+            return self._params, self._round, self._seen
+
+    def _stale(self, snapshot):
+        params, round, seen = snapshot
+        if params is None:
+            return True
+        if round - params.first >= self.refresh_rounds:
+            return True
+        # The follower keeps the round current, so only an unfollowed round goes stale
+        return self._follower is None and time.monotonic() - seen > self.max_age
+
+    def _fetch(self):
+        """Fetch the parameters unless they are current, returning the snapshot to serve.
+
+        The request is made outside of the lock, by a single caller at a time;
+        the others wait for its parameters instead of fetching their own.
+        """
+        with self._fetched:
+            while True:
+                snapshot = self._params, self._round, self._seen
+                if not self._stale(snapshot):
+                    return snapshot
+                if not self._fetching:
+                    break
+                self._fetched.wait()
+            self._fetching = True
+
+        try:
+            params = self.client.suggested_params()
+        finally:
+            with self._fetched:
+                self._fetching = False
+                self._fetched.notify_all()
+
+        seen = time.monotonic()
+        with self._lock:
+            self.fetches += 1
+            self._params = params
+            self._round = params.first
+            self._seen = seen
+        # A `reset` in the meantime does not take the fetched parameters from this caller
+        return params, params.first, seen
+
+    @staticmethod
+    def _serve(snapshot, flat_fee, fee):
+        params, round, _ = snapshot
+        params = copy.copy(params)
+        window = params.last - params.first
+        params.first = round
+        params.last = round + window
+        params.flat_fee = flat_fee
+        if fee is not None:
+            params.fee = fee
+        return params
+
+    def get(self, flat_fee=False, fee=None):
+        """Return the ``SuggestedParams`` of the current round, with the fee settings of ``algopytest.suggested_params``."""
+        snapshot = self._snapshot()
+        if self._stale(snapshot):
+            snapshot = self._fetch()
+        return self._serve(snapshot, flat_fee, fee)
+
+    async def get_async(self, flat_fee=False, fee=None):
+        """Return the ``SuggestedParams`` of the current round from a coroutine, see ``get``."""
+        snapshot = self._snapshot()
+        if self._stale(snapshot):
+            snapshot = await asyncio.to_thread(self._fetch)
+        return self._serve(snapshot, flat_fee, fee)
+
+    def _follow(self):
+        while not self._stopped.is_set():
+            try:
+                status = self.client.status_after_block(self._round if self._round is not None else 0)
+            except Exception:
+                # Let the next transaction fetch the parameters again instead of serving a stale round
+                self.reset()
+                self._stopped.wait(1)
+                continue
+            self.observe(status["last-round"])
+
+    def start(self):
+        """Follow the rounds of the node on a background thread.
+
+        Not for a ``ledger_sim.SimAlgodClient``, which produces the blocks
+        waited for instead of waiting.
+        """
+        if self._follower is None:
+            self._stopped.clear()
+            self._follower = threading.Thread(target=self._follow, name="params-follower", daemon=True)
+            self._follower.start()
+
+    def stop(self):
+        """Stop following the rounds of the node."""
+        if self._follower is not None:
+            self._stopped.set()
+            self._follower = None
+
+_shared = None
+
+def shared_params_cache():
+    """Return the ``ParamsCache`` of the process-wide algod client, anew whenever that client changes."""
+    global _shared
+    client = algod_client()
+    if _shared is None or _shared.client is not client:
+        if _shared is not None:
+            _shared.stop()
+        _shared = ParamsCache(client)
+    return _shared
+
+def suggested_params(flat_fee=False, fee=None):
+    """Return the suggested parameters of the current round from the shared cache."""
+    return shared_params_cache().get(flat_fee=flat_fee, fee=fee)
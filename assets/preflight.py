@@ -0,0 +1,276 @@
+"""Evaluate join groups locally, to reject bad joins before they reach the node.
+
+A join group which fails one of the checks of ``join_wizcoin``, e.g. by
+paying the wrong amount or joining twice, is only rejected by algod with a
+``logic eval error: assert failed`` after a full round trip. ``Preflight``
+runs the approval program of the deployed application with the ``avm``
+evaluator instead, against a cache of the application and asset state:
+
+* the global state of the application and the parameters of the WizCoin ASA
+  are loaded once, and again on ``refresh``,
+* the current round is read for every check, from a ``ParamsCache`` if one is
+  given, and the program is evaluated at the round after it, the one a node
+  would assemble the group in,
+* the WizCoin holdings are read from a ``MembershipIndexer`` if one is given,
+  and are otherwise looked up per account,
+* the boxes of the member registry are looked up per account, which is the
+  one node request checking a join costs with an indexer,
+* the Algo balances and minimum balances, which ``relinquish_wizcoins``
+  reads, are looked up per account once per evaluation, and follow the
+  payments, asset close outs and boxes of the evaluation from there.
+
+The checks of ``join_wizcoin`` carry comments, which end up in the TEAL next
+to their ``assert``. A ``Rejection`` names the failed check by its comment,
+found through the source map of the program.
+
+Only the approval program is evaluated; group-level rules such as the
+balance of the payer are still left to the node.
+"""
+from collections import namedtuple
+
+import algosdk
+from algosdk import encoding, logic
+from algosdk.source_map import SourceMap
+
+import avm
+from algod_connection import algod_client
+from ledger_sim import ASSET_MIN_BALANCE, BOX_BYTE_MIN_BALANCE, BOX_FLAT_MIN_BALANCE, transaction_fields
+from templates import compile_template
+from wizcoin_smart_contract import wizcoin_membership, DEFAULT_TEMPLATE_VALUES
+
+# A group the application would reject: the evaluator's ``reason``, the comment
+# of the failed ``assert`` if any, and the program counter it failed at
+Rejection = namedtuple("Rejection", ["reason", "assertion", "pc"])
+
+class PreflightError(Exception):
+    """A group was rejected by ``Preflight`` without being sent."""
+    def __init__(self, rejection):
+        message = f"preflight: {rejection.reason}"
+        if rejection.assertion:
+            message += f" ({rejection.assertion})"
+        super().__init__(message)
+        self.rejection = rejection
+
+def _state_value(value):
+    if value["type"] == 2:
+        return value["uint"]
+    return encoding.base64.b64decode(value["bytes"])
+
+class _PreflightContext(avm.EvalContext):
+    """The state of one evaluation, writing to copies of the cached state."""
+    def __init__(self, preflight):
+        self.preflight = preflight
+        self.round = preflight.round
+        self.latest_timestamp = preflight.latest_timestamp
+        self.globals = dict(preflight.globals)
+        # The boxes written by the evaluation, `None` for those deleted
+        self.boxes = {}
+        # The `[balance, min balance]` of the accounts read by the evaluation
+        self.accounts = {}
+
+    def app_address(self, app_id):
+        return encoding.decode_address(logic.get_application_address(app_id))
+
+    def app_params(self, app_id):
+        if app_id != self.preflight.app_id:
+            return None
+        return {"creator": self.preflight.creator}
+
+    def global_get(self, app_id, key):
+        return self.globals.get(key) if app_id == self.preflight.app_id else None
+
+    def global_put(self, app_id, key, value):
+        self.globals[key] = value
+
+    def global_del(self, app_id, key):
+        self.globals.pop(key, None)
+
+    def box_get(self, app_id, name):
+        if app_id != self.preflight.app_id:
+            return None
+        if name in self.boxes:
+            return self.boxes[name]
+        return self.preflight.box(name)
+
+    def _box_min_balance(self, name, value):
+        return BOX_FLAT_MIN_BALANCE + BOX_BYTE_MIN_BALANCE * (len(name) + len(value))
+
+    def box_put(self, app_id, name, value):
+        if self.box_get(app_id, name) is None:
+            self._account(self.app_address(app_id))[1] += self._box_min_balance(name, value)
+        self.boxes[name] = bytes(value)
+
+    def box_del(self, app_id, name):
+        value = self.box_get(app_id, name)
+        if value is not None:
+            self._account(self.app_address(app_id))[1] -= self._box_min_balance(name, value)
+        self.boxes[name] = None
+
+    def _account(self, address):
+        account = self.accounts.get(address)
+        if account is None:
+            account = self.accounts[address] = list(self.preflight.account(encoding.encode_address(address)))
+        return account
+
+    def balance(self, address):
+        return self._account(address)[0]
+
+    def account_min_balance(self, address):
+        return self._account(address)[1]
+
+    def opted_in(self, address, app_id):
+        return False
+
+    def asset_holding(self, address, asset_id):
+        if asset_id != self.preflight.asset_id:
+            return None
+        return self.preflight.holding(encoding.encode_address(address))
+
+    def asset_params(self, asset_id):
+        return self.preflight.asset_params if asset_id == self.preflight.asset_id else None
+
+    def auth_address(self, address):
+        return None
+
+    def submit_inner(self, evaluator, transactions):
+        # Check the WizCoin transfers the way the ledger would apply them
+        for txn in transactions:
+            if txn.get("XferAsset") != self.preflight.asset_id:
+                continue
+            amount = txn.get("AssetAmount", 0)
+            for address in (txn["Sender"], txn.get("AssetReceiver", avm.ZERO_ADDRESS)):
+                holding = self.asset_holding(address, self.preflight.asset_id)
+                if holding is None:
+                    raise avm.EvalError(f"{encoding.encode_address(address)} not opted in to asset {self.preflight.asset_id}")
+                if holding[1]:
+                    raise avm.EvalError(f"asset {self.preflight.asset_id} frozen in {encoding.encode_address(address)}")
+            if self.asset_holding(txn["Sender"], self.preflight.asset_id)[0] < amount:
+                raise avm.EvalError(f"underflow on subtracting {amount} from sender amount")
+
+        # Move the Algos and release the minimum balances, leaving the fees out
+        for txn in transactions:
+            sender = self._account(txn["Sender"])
+            if txn.get("CloseRemainderTo", avm.ZERO_ADDRESS) != avm.ZERO_ADDRESS:
+                self._account(txn["Receiver"])[0] += txn.get("Amount", 0)
+                self._account(txn["CloseRemainderTo"])[0] += sender[0] - txn.get("Amount", 0)
+                sender[:] = [0, 0]
+            elif txn.get("Amount", 0):
+                sender[0] -= txn["Amount"]
+                self._account(txn["Receiver"])[0] += txn["Amount"]
+            if txn.get("AssetCloseTo", avm.ZERO_ADDRESS) != avm.ZERO_ADDRESS:
+                sender[1] -= ASSET_MIN_BALANCE
+        return transactions
+
+class Preflight:
+    """Evaluates groups calling the WizCoin application ``app_id`` of the ASA ``asset_id``.
+
+    ``template_values`` are those the application was deployed with, and
+    default to ``DEFAULT_TEMPLATE_VALUES``. ``indexer``, a
+    ``MembershipIndexer`` of the application, provides the WizCoin holdings,
+    and ``params_cache``, a ``ParamsCache`` of the same node, the round.
+    """
+    def __init__(self, app_id, asset_id, template_values=None, indexer=None, client=None, version=8, params_cache=None):
+        self.app_id = app_id
+        self.asset_id = asset_id
+        self.indexer = indexer
+        self.client = client if client is not None else algod_client()
+        self.params_cache = params_cache
+        self.round = None
+
+        # The source map relates the deployed bytecode back to the comments of its checks
+        values = dict(DEFAULT_TEMPLATE_VALUES, **(template_values or {}))
+        template = compile_template(wizcoin_membership, self.client, version=version)
+        self.teal = template.source(**values).splitlines()
+        compiled = self.client.compile("\n".join(self.teal), source_map=True)
+        self.source_map = SourceMap(compiled["sourcemap"])
+
+        app = self.client.application_info(app_id)
+        self.creator = encoding.decode_address(app["params"]["creator"])
+        bytecode = encoding.base64.b64decode(app["params"]["approval-program"])
+        if bytecode != encoding.base64.b64decode(compiled["result"]):
+            raise ValueError(f"application {app_id} does not run the WizCoin program with {values}")
+        self.program = avm.Program(bytecode)
+
+        self.refresh()
+
+    def refresh(self):
+        """Reload the cached application state, asset parameters and round."""
+        app = self.client.application_info(self.app_id)
+        self.globals = {
+            encoding.base64.b64decode(entry["key"]): _state_value(entry["value"])
+            for entry in app["params"].get("global-state", [])
+        }
+        params = self.client.asset_info(self.asset_id)["params"]
+        self.asset_params = {
+            "AssetTotal": params["total"],
+            "AssetDecimals": params["decimals"],
+            "AssetDefaultFrozen": int(params.get("default-frozen", False)),
+            "AssetCreator": encoding.decode_address(params["creator"]),
+        }
+        self._follow_round()
+
+    def _follow_round(self):
+        """Catch up with the current round, as known to the params cache if any."""
+        round = self.params_cache.round if self.params_cache is not None else None
+        if round is None:
+            round = self.client.status()["last-round"]
+        if round != self.round:
+            self.round = round
+            self.latest_timestamp = self.client.block_info(round)["block"].get("ts", 0)
+
+    def holding(self, address):
+        """Return the ``(amount, frozen)`` WizCoin holding of ``address``, or ``None`` if it has not opted in."""
+        if self.indexer is not None:
+            holding = self.indexer.holders.get(address)
+            return tuple(holding) if holding is not None else None
+        try:
+            info = self.client.account_asset_info(address, self.asset_id)["asset-holding"]
+        except algosdk.error.AlgodHTTPError:
+            return None
+        return info["amount"], info.get("is-frozen", False)
+
+    def account(self, address):
+        """Return the ``(balance, min balance)`` in microAlgos of ``address``."""
+        info = self.client.account_info(address)
+        return info["amount"], info["min-balance"]
+
+    def box(self, name):
+        """Return the value of the box ``name`` of the application, or ``None`` if there is none."""
+        try:
+            box = self.client.application_box_by_name(self.app_id, name)
+        except algosdk.error.AlgodHTTPError:
+            return None
+        return encoding.base64.b64decode(box["value"])
+
+    def _assertion(self, pc):
+        """Return the comment of the ``assert`` at ``pc``, if it is one."""
+        line = self.source_map.pc_to_line.get(pc)
+        if line is None or self.teal[line].strip() != "assert" or line == 0:
+            return None
+        previous = self.teal[line - 1].strip()
+        return previous[2:].strip() if previous.startswith("//") else None
+
+    def check(self, txns):
+        """Return the ``Rejection`` of the group ``txns``, signed or not, or ``None`` if the application approves it."""
+        txns = [getattr(txn, "transaction", txn) for txn in txns]
+        fields = [transaction_fields(txn) for txn in txns]
+        group = avm.GroupState(fields, group_id=txns[0].group or avm.ZERO_ADDRESS)
+        self._follow_round()
+        ctx = _PreflightContext(self)
+
+        for index, txn in enumerate(fields):
+            if txn["TypeEnum"] != avm.TXN_TYPES["appl"] or txn["ApplicationID"] != self.app_id:
+                continue
+            try:
+                approved = avm.Evaluator(self.program, ctx, group, index, self.app_id).run()
+            except avm.EvalError as e:
+                return Rejection(e.reason, self._assertion(e.pc), e.pc)
+            if not approved:
+                return Rejection("rejected by ApprovalProgram", None, None)
+        return None
+
+    def validate(self, txns):
+        """Raise ``PreflightError`` if the application would reject the group ``txns``."""
+        rejection = self.check(txns)
+        if rejection is not None:
+            raise PreflightError(rejection)
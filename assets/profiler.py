@@ -0,0 +1,310 @@
+"""Report what each branch of the WizCoin approval program costs.
+
+The profiler deploys the program on an in-process ``ledger_sim.Ledger`` and
+drives every branch once with its worst-case inputs, e.g. a full batch for
+``batch_join_wizcoin``, ``clawback_wizcoins`` and ``unregister_members``. For
+each branch it records
+
+* ``size``: the bytes of bytecode the branch executes, dispatch included,
+* ``static_cost``: the opcode cost of those instructions, each counted once,
+* ``dynamic_cost``: the opcode cost actually spent, loop iterations included,
+* ``inner_transactions``: the number of inner transactions issued.
+
+The report is JSON, so it can be compared against a recorded baseline:
+
+    python profiler.py --baseline wizcoin_profile_baseline.json
+
+and ``--compare`` tabulates the changes from an earlier report, e.g. to
+measure an optimization of the program. ``--hot`` sets how many methods keep
+their selector comparison ahead of the dispatch ``match``, so that the cost of
+every method under two dispatches is compared at the same TEAL version:
+
+    python profiler.py --hot 6 --output chain.json
+    python profiler.py --compare chain.json
+"""
+import argparse
+import json
+import os
+import sys
+
+import algosdk
+from algosdk import transaction
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+from pyteal import Mode
+
+from ledger_sim import Ledger, SimAlgodClient
+from fee_planner import pool_fees
+from member_registry import MAX_BATCH_SIZE, MEMBER_BOX_MIN_BALANCE, check_registrations_call, member_box
+from method_dispatch import HOT_METHODS, compile_teal, selector
+from templates import TemplateProgram, lower_templates
+from wizcoin_smart_contract import wizcoin_membership, DEFAULT_TEMPLATE_VALUES
+from clear_program import clear_program
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wizcoin_profile_baseline.json")
+
+# The metrics of a branch compared against the baseline
+METRICS = ("size", "static_cost", "dynamic_cost", "inner_transactions")
+
+# The members an application call can reference, with their registry boxes, which bounds a batch join
+BATCH_SIZE = MAX_BATCH_SIZE
+
+TOTAL_WIZCOINS = 400
+
+class ProfileError(Exception):
+    pass
+
+class _Deployment:
+    """The WizCoin contract deployed on a fresh simulated ledger, recording the runs of its approval program."""
+    def __init__(self, approval, clear, template_values):
+        self.keys = {}
+        for name in ["manager"] + [f"user{index}" for index in range(1, BATCH_SIZE + 2)]:
+            private_key, address = algosdk.account.generate_account()
+            self.keys[name] = (private_key, address)
+
+        self.ledger = Ledger({address: 1_000_000_000_000 for _, address in self.keys.values()})
+        self.runs = []
+        self.ledger.tracer = self.runs.append
+        self.client = SimAlgodClient(self.ledger)
+        self.template_values = template_values
+        self.approval = self.assemble(approval)
+        self.clear = self.assemble(clear)
+        self.app_id = None
+        self.asset_id = None
+
+    def assemble(self, teal):
+        template = TemplateProgram(teal, algosdk.encoding.base64.b64decode(self.client.compile(teal)["result"]))
+        return template.instantiate(**self.template_values).bytecode
+
+    def address(self, name):
+        return self.keys[name][1]
+
+    def app_address(self):
+        return algosdk.logic.get_application_address(self.app_id)
+
+    def params(self):
+        return self.client.suggested_params()
+
+    def send(self, *txns):
+        """Sign and send the ``(signer name, transaction)`` pairs as one group.
+
+        The first transaction pays the fees of the whole group. Returns the
+        ``pending_transaction_info`` of the first transaction along with the
+        ``avm.Evaluator`` of every program run by the group.
+        """
+        self.runs.clear()
+        pool_fees([txn for _, txn in txns])
+        if len(txns) > 1:
+            transaction.assign_group_id([txn for _, txn in txns])
+        signed = [AccountTransactionSigner(self.keys[name][0]).sign_transactions([txn], [0])[0] for name, txn in txns]
+        txid = self.client.send_transactions(signed)
+        info = self.client.pending_transaction_info(txid)
+        return info, list(self.runs)
+
+    def call(self, sender, method, on_complete=transaction.OnComplete.NoOpOC, **kwargs):
+        return transaction.ApplicationCallTxn(
+            sender=self.address(sender),
+            sp=self.params(),
+            index=self.app_id,
+            on_complete=on_complete,
+            app_args=[selector(method)] if method is not None else None,
+            foreign_assets=[self.asset_id],
+            **kwargs,
+        )
+
+    def pay_in(self, member):
+        return transaction.PaymentTxn(
+            self.address(member),
+            self.params(),
+            self.app_address(),
+            self.template_values["TMPL_AMOUNT"],
+            note=member.encode(),
+        )
+
+def _scenarios(deployment):
+    """Drive every branch of the program in turn, yielding the branch name with its run of the approval program."""
+    manager = "manager"
+
+    info, _ = deployment.send((manager, transaction.AssetConfigTxn(
+        deployment.address(manager), deployment.params(),
+        total=TOTAL_WIZCOINS, decimals=0, default_frozen=False, unit_name="WizToken", asset_name="WizCoin",
+        manager=deployment.address(manager), reserve=deployment.address(manager),
+        freeze=deployment.address(manager), clawback=deployment.address(manager),
+    )))
+    deployment.asset_id = info["asset-index"]
+
+    info, runs = deployment.send((manager, transaction.ApplicationCreateTxn(
+        deployment.address(manager), deployment.params(), transaction.OnComplete.NoOpOC,
+        deployment.approval, deployment.clear,
+        transaction.StateSchema(1, 1), transaction.StateSchema(0, 0),
+        app_args=[deployment.asset_id],
+    )))
+    deployment.app_id = info["application-index"]
+    yield "init", runs
+
+    deployment.send((manager, transaction.PaymentTxn(deployment.address(manager), deployment.params(), deployment.app_address(), 200_000 + BATCH_SIZE * MEMBER_BOX_MIN_BALANCE)))
+    yield "opt_in_wizcoin", deployment.send((manager, deployment.call(manager, "opt_in_wizcoin")))[1]
+
+    deployment.send((manager, transaction.AssetTransferTxn(
+        deployment.address(manager), deployment.params(), deployment.app_address(), TOTAL_WIZCOINS, deployment.asset_id,
+    )))
+    members = [f"user{index}" for index in range(1, BATCH_SIZE + 2)]
+    for member in members:
+        deployment.send((member, transaction.AssetTransferTxn(
+            deployment.address(member), deployment.params(), deployment.address(member), 0, deployment.asset_id,
+        )))
+
+    yield "opt_in", deployment.send(("user1", deployment.call("user1", None, on_complete=transaction.OnComplete.OptInOC)))[1]
+    yield "close_out", deployment.send(("user1", deployment.call("user1", None, on_complete=transaction.OnComplete.CloseOutOC)))[1]
+
+    yield "join_wizcoin", deployment.send(
+        ("user1", deployment.call(
+            "user1", "join_wizcoin", accounts=[deployment.address("user1")], boxes=[member_box(deployment.address("user1"))],
+        )),
+        ("user1", deployment.pay_in("user1")),
+    )[1]
+
+    batch = members[1:]
+    yield "batch_join_wizcoin", deployment.send(
+        (manager, deployment.call(
+            manager, "batch_join_wizcoin",
+            accounts=[deployment.address(member) for member in batch],
+            boxes=[member_box(deployment.address(member)) for member in batch],
+        )),
+        *[(member, deployment.pay_in(member)) for member in batch],
+    )[1]
+
+    # Every account of the deployment, the members and the manager
+    yield "check_registrations", deployment.send(
+        (manager, check_registrations_call(deployment.address(manager), deployment.app_id, [address for _, address in deployment.keys.values()], deployment.params())),
+    )[1]
+
+    # Clawing back takes the application to be the clawback of the asset
+    deployment.send((manager, transaction.AssetConfigTxn(
+        deployment.address(manager), deployment.params(), index=deployment.asset_id,
+        manager=deployment.address(manager), reserve=deployment.address(manager),
+        freeze=deployment.address(manager), clawback=deployment.app_address(),
+    )))
+    yield "clawback_wizcoins", deployment.send(
+        (manager, deployment.call(
+            manager, "clawback_wizcoins",
+            accounts=[deployment.address(member) for member in batch],
+            boxes=[member_box(deployment.address(member)) for member in batch],
+        )),
+    )[1]
+
+    # The batch boxes are gone with the clawback, that of the first member is left
+    unregistered = members[:BATCH_SIZE]
+    yield "unregister_members", deployment.send(
+        (manager, deployment.call(
+            manager, "unregister_members",
+            accounts=[deployment.address(member) for member in unregistered],
+            boxes=[member_box(deployment.address(member)) for member in unregistered],
+        )),
+    )[1]
+
+    yield "update", deployment.send((manager, transaction.ApplicationUpdateTxn(
+        deployment.address(manager), deployment.params(), deployment.app_id, deployment.approval, deployment.clear,
+    )))[1]
+    yield "relinquish_wizcoins", deployment.send(
+        (manager, deployment.call(manager, "relinquish_wizcoins", accounts=[deployment.app_address()])),
+    )[1]
+    yield "delete", deployment.send((manager, transaction.ApplicationDeleteTxn(
+        deployment.address(manager), deployment.params(), deployment.app_id,
+    )))[1]
+
+def _branch_report(run):
+    instructions = {instruction.pc: instruction for instruction in run.program.instructions}
+    executed = [instructions[pc] for pc in run.trace]
+    return {
+        "size": sum(instruction.size for instruction in executed),
+        "static_cost": sum(instruction.spec.cost for instruction in executed),
+        "dynamic_cost": run.cost,
+        "inner_transactions": len(run.inner_transactions),
+    }
+
+def profile(build=wizcoin_membership, version=8, hot=HOT_METHODS):
+    """Return the JSON-serializable profile of the approval program built by ``build``, dispatching ``hot`` methods first."""
+    approval = lower_templates(compile_teal(build(), mode=Mode.Application, version=version, hot=hot))
+    clear = compile_teal(clear_program(), mode=Mode.Application, version=version)
+    deployment = _Deployment(approval, clear, DEFAULT_TEMPLATE_VALUES)
+
+    branches = {}
+    for name, runs in _scenarios(deployment):
+        if len(runs) != 1:
+            raise ProfileError(f"expected a single run of the approval program for {name}, got {len(runs)}")
+        branches[name] = _branch_report(runs[0])
+
+    return {
+        "program": {"version": version, "size": len(deployment.approval)},
+        "branches": branches,
+    }
+
+def regressions(report, baseline):
+    """List every metric of ``report`` which grew past the ``baseline`` report."""
+    messages = []
+    size, baseline_size = report["program"]["size"], baseline["program"]["size"]
+    if size > baseline_size:
+        messages.append(f"program: size {size} > baseline {baseline_size}")
+
+    for name, metrics in report["branches"].items():
+        baseline_metrics = baseline["branches"].get(name)
+        if baseline_metrics is None:
+            continue
+        for metric in METRICS:
+            if metrics[metric] > baseline_metrics[metric]:
+                messages.append(f"{name}: {metric} {metrics[metric]} > baseline {baseline_metrics[metric]}")
+    return messages
+
+def comparison(before, after):
+    """Tabulate how every metric changed from the ``before`` report to the ``after`` report."""
+    lines = [f"{'branch':<24}{'metric':<20}{'before':>8}{'after':>8}{'change':>8}"]
+    rows = [("program", "size", before["program"]["size"], after["program"]["size"])]
+    for name, metrics in after["branches"].items():
+        before_metrics = before["branches"].get(name)
+        if before_metrics is None:
+            continue
+        rows.extend((name, metric, before_metrics[metric], metrics[metric]) for metric in METRICS)
+
+    for name, metric, before_value, after_value in rows:
+        lines.append(f"{name:<24}{metric:<20}{before_value:>8}{after_value:>8}{after_value - before_value:>+8}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--version", type=int, default=8, help="TEAL version to compile the program with")
+    parser.add_argument("--hot", type=int, default=HOT_METHODS, help="the methods dispatched by comparison ahead of the match")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="fail when a branch grew past the report in this file")
+    parser.add_argument("--compare", help="tabulate the changes from the report in this file on stderr")
+    parser.add_argument("--update-baseline", action="store_true", help=f"record the report as the new baseline (default {DEFAULT_BASELINE})")
+    args = parser.parse_args(argv)
+
+    report = profile(version=args.version, hot=args.hot)
+    text = json.dumps(report, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print(comparison(json.load(f), report), file=sys.stderr)
+
+    if args.update_baseline:
+        with open(args.baseline or DEFAULT_BASELINE, "w") as f:
+            f.write(text + "\n")
+        return 0
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            messages = regressions(report, json.load(f))
+        for message in messages:
+            print(message, file=sys.stderr)
+        return 1 if messages else 0
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Revoke the WizCoin membership of many accounts at once.
+
+Revoking a member with a clawback transfer from the manager costs a
+transaction per member. The ``clawback_wizcoins`` method of the application
+instead claws back the tokens of every account its call references in one
+inner group, once the application is the clawback of the WizCoin ASA.
+
+Besides the WizCoin ASA, a call references every account it revokes along
+with its box in the member registry, so it revokes at most ``MAX_ACCOUNTS``
+accounts. ``revocation_groups`` splits a revocation list of any length into calls of
+``MAX_ACCOUNTS`` accounts, and those calls into atomic groups of up to
+``MAX_GROUP_SIZE``. The first call of a group pays the fees of the whole
+group, inner transactions included, as planned by ``fee_planner``, and the
+others pay none.
+``revoke_members`` sends every group without waiting, and then waits for all
+of them together through a ``ConfirmationService``.
+"""
+from algosdk import constants, transaction
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+
+from algod_connection import algod_client
+from confirmations import ConfirmationService
+from fee_planner import pool_fees
+from member_registry import MAX_BATCH_SIZE, member_box
+from method_dispatch import selector
+from params_cache import ParamsCache
+
+# The accounts a `clawback_wizcoins` call can revoke
+MAX_ACCOUNTS = MAX_BATCH_SIZE
+
+# The transactions of an atomic group
+MAX_GROUP_SIZE = constants.tx_group_limit
+
+def _chunks(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def revocation_groups(manager_address, app_id, asset_id, addresses, params):
+    """Return the unsigned groups of ``clawback_wizcoins`` calls revoking every one of ``addresses``.
+
+    Addresses listed more than once are revoked once.
+    """
+    groups = []
+    for calls in _chunks(_chunks(list(dict.fromkeys(addresses)), MAX_ACCOUNTS), MAX_GROUP_SIZE):
+        txns = []
+        for accounts in calls:
+            txns.append(transaction.ApplicationCallTxn(
+                sender=manager_address,
+                sp=params,
+                index=app_id,
+                on_complete=transaction.OnComplete.NoOpOC,
+                app_args=[selector("clawback_wizcoins")],
+                accounts=accounts,
+                foreign_assets=[asset_id],
+                boxes=[member_box(address) for address in accounts],
+            ))
+        # The first call pays for the whole group, the clawbacks of every call included
+        pool_fees(txns, min_fee=params.min_fee)
+        if len(txns) > 1:
+            transaction.assign_group_id(txns)
+        groups.append(txns)
+    return groups
+
+def revoke_members(manager, app_id, asset_id, addresses, client=None, params_cache=None, confirmations=None, wait_rounds=10):
+    """Revoke the WizCoin membership of ``addresses`` as ``manager``, an account with ``address`` and ``private_key``.
+
+    Returns the pending transaction info of the first call of every group,
+    once all of them are confirmed.
+    """
+    client = client if client is not None else algod_client()
+    params_cache = params_cache if params_cache is not None else ParamsCache(client)
+    confirmations = confirmations if confirmations is not None else ConfirmationService(client)
+    signer = AccountTransactionSigner(manager.private_key)
+
+    futures = []
+    for txns in revocation_groups(manager.address, app_id, asset_id, addresses, params_cache.get()):
+        client.send_transactions(signer.sign_transactions(txns, list(range(len(txns)))))
+        futures.append(confirmations.submit(txns[0], wait_rounds))
+
+    infos = [future.result() for future in futures]
+    if infos:
+        params_cache.observe(max(info["confirmed-round"] for info in infos))
+    return infos
@@ -0,0 +1,164 @@
+"""Hoist repeated global state reads of a PyTEAL program into scratch slots.
+
+Every ``App.globalGet(Bytes(...))`` costs a ``byte`` and an ``app_global_get``,
+whereas reading a scratch slot costs a single ``load``. Hence, loading a
+global once into a scratch slot pays off for a key read at least four times
+on the same path, or read inside a loop.
+
+``hoist_global_reads`` treats every branch of a ``Cond`` or ``If`` as a
+separate path, since only one of them runs per invocation. Within a path, a
+global which is read often enough and never written is loaded at the start
+of the path and every read of it is replaced with its scratch slot. Shared
+subexpressions, e.g. the ``is_manager`` check, are copied before rewriting so
+that other paths keep reading the global directly.
+
+Reads of transaction fields, such as ``Txn.application_args.length()``, are a
+single opcode just like the scratch ``load`` replacing them, so they are never
+worth hoisting and are left alone.
+"""
+import copy
+
+from pyteal import *
+
+# Attributes of PyTEAL expressions which hold no subexpressions
+_IGNORED_ATTRIBUTES = frozenset(["trace", "stack_frames"])
+
+# Reads inside a loop are counted this many times, as a loop runs at least twice when it matters
+LOOP_WEIGHT = 2
+
+# The opcodes of `byte <key>; app_global_get` which a hoisted read replaces with one `load`
+READ_COST = 2
+
+def _children(expr):
+    """Yield the ``(attribute, value)`` pairs of ``expr`` which may hold subexpressions."""
+    for name, value in vars(expr).items():
+        if name in _IGNORED_ATTRIBUTES or name.startswith("_"):
+            continue
+        yield name, value
+
+def _map(value, transform):
+    """Apply ``transform`` to every expression held by ``value``, copying containers only when something changed."""
+    if isinstance(value, Expr):
+        return transform(value)
+    if isinstance(value, (list, tuple)):
+        mapped = [_map(item, transform) for item in value]
+        if all(new is old for new, old in zip(mapped, value)):
+            return value
+        return type(value)(mapped)
+    if isinstance(value, dict):
+        mapped = {key: _map(item, transform) for key, item in value.items()}
+        if all(mapped[key] is item for key, item in value.items()):
+            return value
+        return mapped
+    return value
+
+def _map_children(expr, transform):
+    """Return ``expr`` with ``transform`` applied to its subexpressions, copied if any of them changed."""
+    changes = {}
+    for name, value in _children(expr):
+        mapped = _map(value, transform)
+        if mapped is not value:
+            changes[name] = mapped
+
+    if not changes:
+        return expr
+    expr = copy.copy(expr)
+    for name, value in changes.items():
+        setattr(expr, name, value)
+    return expr
+
+def _global_key(expr, field):
+    """Return the constant key accessed by ``expr`` if it is an ``App`` expression of ``field``."""
+    if not isinstance(expr, App) or expr.field != field:
+        return None
+    key = expr.args[0]
+    if not isinstance(key, Bytes):
+        return None
+    return (key.base, key.byte_str)
+
+def _global_accesses(expr, reads, writes, weight=1):
+    """Count the reads of every constant global key in ``expr`` and collect the written keys.
+
+    ``reads`` maps every key to its weighted number of reads and one of its read expressions.
+    """
+    read_key = _global_key(expr, AppField.globalGet)
+    if read_key is not None:
+        count, _ = reads.get(read_key, (0, expr))
+        reads[read_key] = (count + weight, expr)
+        return
+
+    for field in (AppField.globalPut, AppField.globalDel):
+        write_key = _global_key(expr, field)
+        if write_key is not None:
+            writes.add(write_key)
+        elif isinstance(expr, App) and expr.field == field:
+            # A write to a computed key might overwrite any global
+            writes.add(None)
+
+    if isinstance(expr, (For, While)):
+        weight *= LOOP_WEIGHT
+
+    def visit(child):
+        _global_accesses(child, reads, writes, weight)
+        return child
+    _map_children(expr, visit)
+
+def _worth_hoisting(reads):
+    """Whether ``reads`` reads cost more than one read, a ``store`` and ``reads`` scratch ``load``s."""
+    return READ_COST * reads > READ_COST + 1 + reads
+
+def _hoist_path(expr):
+    """Hoist the global reads of ``expr``, one path of the program."""
+    if isinstance(expr, Cond):
+        return _hoist_cond(expr)
+    if isinstance(expr, If):
+        return _hoist_if(expr)
+
+    reads, writes = {}, set()
+    _global_accesses(expr, reads, writes)
+    hoisted = {
+        key: (ScratchVar(TealType.anytype), read)
+        for key, (count, read) in reads.items()
+        if _worth_hoisting(count) and key not in writes and None not in writes
+    }
+    if not hoisted:
+        # Look for separate paths deeper inside of `expr`
+        return _map_children(expr, _hoist_path)
+
+    def replace(child):
+        key = _global_key(child, AppField.globalGet)
+        if key in hoisted:
+            return hoisted[key][0].load()
+        return _map_children(child, replace)
+
+    return Seq(
+        *[slot.store(read) for slot, read in hoisted.values()],
+        replace(expr),
+    )
+
+def _hoist_cond(expr):
+    expr = copy.copy(expr)
+    expr.args = [[condition, _hoist_path(branch)] for condition, branch in expr.args]
+    return expr
+
+def _hoist_if(expr):
+    expr = copy.copy(expr)
+    expr.thenBranch = _hoist_path(expr.thenBranch)
+    if expr.elseBranch is not None:
+        expr.elseBranch = _hoist_path(expr.elseBranch)
+    return expr
+
+def hoist_global_reads(expr):
+    """Return ``expr`` with its repeated global state reads loaded once per path into scratch slots."""
+    return _hoist_path(expr)
+
+if __name__ == "__main__":
+    import functools
+
+    import profiler
+    from wizcoin_smart_contract import wizcoin_membership
+
+    # Report the opcode costs of the WizCoin program without and with the hoisting
+    before = profiler.profile(build=functools.partial(wizcoin_membership, hoist_reads=False))
+    after = profiler.profile(build=wizcoin_membership)
+    print(profiler.comparison(before, after))
@@ -0,0 +1,147 @@
+"""Compile a program once with ``TMPL_`` placeholders and patch in the values per deployment.
+
+``lower_templates`` gathers the integer placeholders of a PyTEAL program,
+e.g. ``Tmpl.Int("TMPL_AMOUNT")``, into an explicit ``intcblock`` at the start
+of the TEAL. Since every branch offset of the AVM is relative and the constant
+block precedes all of the code, the values can later be patched into the
+bytecode without reassembling: only the block is re-encoded and the code after
+it shifts as a whole.
+
+A ``TemplateProgram`` holds the assembled bytecode, and ``instantiate``
+produces the ``CompiledProgram`` of one deployment with the values filled
+in, including its program hash, with no PyTEAL build or algod round trip.
+"""
+import re
+from dataclasses import dataclass
+
+from algosdk import logic
+from pyteal import Mode
+
+import avm
+from compile_cache import CompiledProgram, compile_program
+
+# The comment line recording the placeholders held by the leading `intcblock`
+_TEMPLATE_COMMENT = "// template"
+
+_INT_CONSTANT = re.compile(r"^int (\S+)$")
+
+def _int_value(token):
+    """Return the value of an ``int`` operand or ``None`` for a placeholder."""
+    if token.startswith("TMPL_"):
+        return None
+    if token in avm.TXN_TYPES:
+        return avm.TXN_TYPES[token]
+    if token in avm.ON_COMPLETE:
+        return avm.ON_COMPLETE[token]
+    return int(token, 0)
+
+def lower_templates(teal):
+    """Rewrite ``teal`` so that its ``TMPL_`` integer placeholders live in a leading ``intcblock``.
+
+    The placeholders take the first entries of the block, holding zero until
+    instantiated, followed by the other integer constants used more than once.
+    Programs without placeholders are returned unchanged.
+    """
+    lines = teal.splitlines()
+    operands = [match.group(1) for match in map(_INT_CONSTANT.match, lines) if match is not None]
+    names = list(dict.fromkeys(operand for operand in operands if operand.startswith("TMPL_")))
+    if not names:
+        return teal
+
+    # Algod pushes every `int` of a program with an explicit `intcblock`, so the
+    # constants worth an entry are given one right away
+    counts = {}
+    for operand in operands:
+        value = _int_value(operand)
+        if value is not None:
+            counts[value] = counts.get(value, 0) + 1
+    constants = sorted((value for value, count in counts.items() if count > 1), key=lambda value: -counts[value])
+    block = [0] * len(names) + constants
+
+    def reference(index):
+        return f"intc_{index}" if index < 4 else f"intc {index}"
+
+    lowered = []
+    for line in lines:
+        match = _INT_CONSTANT.match(line)
+        if match is not None:
+            operand = match.group(1)
+            value = _int_value(operand)
+            if value is None:
+                line = reference(names.index(operand))
+            elif value in constants:
+                line = reference(len(names) + constants.index(value))
+        lowered.append(line)
+
+        if line.startswith("#pragma version"):
+            lowered.append(f"intcblock {' '.join(str(value) for value in block)}")
+            lowered.append(f"{_TEMPLATE_COMMENT} {' '.join(names)}")
+
+    return "\n".join(lowered) + "\n"
+
+def template_names(teal):
+    """Return the placeholders held by the leading ``intcblock`` of the lowered ``teal``."""
+    for line in teal.splitlines():
+        if line.startswith(_TEMPLATE_COMMENT):
+            return tuple(line.split()[2:])
+    return ()
+
+@dataclass(frozen=True)
+class TemplateProgram:
+    """The assembled ``bytecode`` of a lowered ``teal`` whose placeholders are still to be filled in."""
+    teal: str
+    bytecode: bytes
+
+    @property
+    def names(self):
+        return template_names(self.teal)
+
+    def _intcblock(self):
+        """Return the leading ``intcblock`` instruction, which must precede any branch."""
+        for instruction in avm.Program(self.bytecode).instructions:
+            if instruction.spec.name == "intcblock":
+                return instruction
+            if instruction.spec.name != "bytecblock":
+                break
+        raise ValueError("the program has no leading intcblock to patch")
+
+    def _check_values(self, values):
+        missing = set(self.names) - set(values)
+        if missing:
+            raise ValueError(f"no value for the template placeholders {', '.join(sorted(missing))}")
+
+    def source(self, **values):
+        """Return the TEAL with the placeholders set to ``values``, which assembles to the bytecode of ``instantiate``."""
+        self._check_values(values)
+        names = self.names
+        lines = self.teal.splitlines()
+        for index, line in enumerate(lines):
+            if line.startswith("intcblock"):
+                constants = line.split()[1:]
+                constants[:len(names)] = [str(values[name]) for name in names]
+                lines[index] = f"intcblock {' '.join(constants)}"
+                break
+        return "\n".join(lines) + "\n"
+
+    def instantiate(self, **values):
+        """Return the ``CompiledProgram`` with the placeholders set to ``values``, keyed by placeholder name."""
+        self._check_values(values)
+        names = self.names
+        if not names:
+            return CompiledProgram(teal=self.teal, bytecode=self.bytecode, program_hash=logic.address(self.bytecode))
+
+        block = self._intcblock()
+        constants = [values[name] for name in names] + block.operands[0][len(names):]
+
+        patched = bytearray([block.spec.opcode])
+        patched.extend(avm.encode_varuint(len(constants)))
+        for value in constants:
+            patched.extend(avm.encode_varuint(value))
+        bytecode = self.bytecode[:block.pc] + bytes(patched) + self.bytecode[block.pc + block.size:]
+
+        return CompiledProgram(teal=self.teal, bytecode=bytecode, program_hash=logic.address(bytecode))
+
+def compile_template(build, algod_client, mode=Mode.Application, version=8, **options):
+    """Return the ``TemplateProgram`` of the program built by ``build``, assembled once through the compile cache."""
+    program = compile_program(build, mode=mode, version=version, algod_client=algod_client, passes=(lower_templates,), **options)
+    return TemplateProgram(teal=program.teal, bytecode=program.bytecode)
@@ -0,0 +1,781 @@
+"""Fuzz the WizCoin approval program with randomized transaction groups.
+
+The fuzzer deploys the program on an in-process ``ledger_sim.Ledger``, next
+to a cast of accounts in every state a group may find them in: the manager,
+users who opted in to the WizCoin ASA, a frozen one, one who is a member
+already, a former member who passed its WizCoin on, the holder it passed it
+on to, one who never opted in and one too poor to pay for a membership.
+Every case is applied to this state with ``Ledger.apply_group`` and rolled
+back with ``restore``, in O(changed keys). Groups are described
+as tuples of ``Txn`` and only lowered to transaction fields when applied,
+with no ``algosdk`` transaction to build, encode or sign, so a process runs
+thousands of cases per second and ``--jobs`` spreads them over processes.
+
+A case is either one of the valid groups of ``_TEMPLATES``, e.g. a join or a
+full batch join, which the program must accept, or a case of the corpus
+with a few random mutations: transactions dropped, duplicated, reordered or
+inserted, e.g. freezing an account or passing a WizCoin on to another, their
+senders, receivers, amounts, fees, methods, arguments and references changed,
+or one of their actors recast as another throughout. A case reaching program
+counters no case reached before joins the corpus.
+
+Every accepted group is checked against the invariants of the membership:
+
+* an account only becomes a member, or a member again after its WizCoin left
+  it, by paying the registration amount to the application in the same
+  group, and its box holds the round it joined in,
+* the application only issues a WizCoin to an account holding none at that
+  point of the group, so that no member holds more than one WizCoin,
+* unless the manager calls the application, a group issues exactly one
+  WizCoin to every new member and no other inner transaction, leaves the
+  Algos of the application as they were but for the payments it received,
+  removes only the boxes of accounts holding no WizCoin and does not change
+  the global state.
+
+A case breaking an invariant, crashing the evaluation or rejected although
+valid is a failure, and ``shrink`` reduces it to a minimal group failing the
+same way. Every arm of the ``Cond`` expressions of the program, the method
+dispatch included, is tracked for coverage.
+
+    python wizcoin_fuzzer.py --seconds 60 --jobs 4 --require-coverage
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import re
+import sys
+import time
+from collections import Counter, namedtuple
+
+from algosdk import encoding
+from pyteal import Mode
+
+import avm
+from fee_planner import method_fee
+from ledger_sim import Ledger, LedgerError, MIN_TXN_FEE, app_address
+from member_registry import MAX_BATCH_SIZE, MAX_REFERENCES, MEMBER_BOX_MIN_BALANCE
+from method_dispatch import METHODS, compile_teal, selector
+from templates import TemplateProgram, lower_templates
+from wizcoin_smart_contract import wizcoin_membership, DEFAULT_TEMPLATE_VALUES
+from clear_program import clear_program
+
+# One transaction of a case. Accounts are named after the ``ACTORS``, or
+# "app" for the application. ``amount`` is the frozen flag of a freeze, and
+# an ``args`` item is raw bytes, a tuple of names for an ABI ``address[]``
+# or "wizcoin" for the ID of the WizCoin ASA.
+Txn = namedtuple(
+    "Txn",
+    ["type", "sender", "fee", "receiver", "amount", "method", "on_complete", "args", "accounts", "boxes", "assets", "app"],
+    defaults=[0, None, 0, None, "NoOp", (), (), (), ("wizcoin",), "wizcoin"],
+)
+
+# The result of applying a case: whether it was accepted, the error rejecting it and the ``Failure`` it revealed
+Outcome = namedtuple("Outcome", ["accepted", "error", "failure"])
+Failure = namedtuple("Failure", ["kind", "message"])
+
+# The users who can join, in the order a shrunk case prefers them
+USERS = ("user1", "user2", "user3", "user4")
+ACTORS = ("manager",) + USERS + ("member", "frozen", "outsider", "poor", "former", "holder")
+
+# The actors holding the WizCoin ASA, who can be clawed back
+HOLDERS = USERS + ("member", "frozen", "poor", "former", "holder")
+
+RICH_BALANCE = 1_000_000_000_000
+POOR_BALANCE = 300_000
+
+TOTAL_WIZCOINS = 400
+
+# The transactions of a group, like algod
+MAX_GROUP_SIZE = 16
+
+# The cases of the corpus kept for mutation
+MAX_CORPUS = 512
+
+_ON_COMPLETE_NAMES = {value: name for name, value in avm.ON_COMPLETE.items()}
+_METHOD_NAMES = {signature: name for name, signature in METHODS.items()}
+
+_LABEL = re.compile(r"^(\S+):$")
+_METHOD = re.compile(r'^method "([^"]*)"$')
+
+# Instructions after which a condition of a ``Cond`` cannot continue
+_BLOCK_ENDS = ("bnz", "bz", "b", "return", "err", "match", "switch", "retsub", "callsub")
+
+def _int_value(line, intcblock):
+    """Return the integer ``line`` pushes, or ``None``."""
+    tokens = line.split()
+    if tokens[0].startswith("intc_"):
+        return intcblock[int(tokens[0][5:])]
+    if tokens[0] == "intc":
+        return intcblock[int(tokens[1])]
+    if tokens[0] in ("int", "pushint"):
+        return avm.NAMED_INTS[tokens[1]] if tokens[1] in avm.NAMED_INTS else int(tokens[1], 0)
+    return None
+
+def _arm_name(condition, label, intcblock):
+    """Name the arm of a ``Cond`` taken when the TEAL lines of ``condition`` leave a non-zero value."""
+    for line in condition:
+        match = _METHOD.match(line)
+        if match is not None:
+            return _METHOD_NAMES.get(match.group(1), label)
+    if len(condition) == 1 and _int_value(condition[0], intcblock) == 1:
+        return "default"
+    if len(condition) == 3 and condition[0].startswith("txn ") and condition[2] == "==":
+        field, value = condition[0].split()[1], _int_value(condition[1], intcblock)
+        if value is not None:
+            return f"{field} == {_ON_COMPLETE_NAMES[value] if field == 'OnCompletion' else value}"
+    return label
+
+def cond_arms(teal, pc_to_line):
+    """Return the first program counter of every arm of the ``Cond`` expressions of ``teal``, by arm name.
+
+    ``pc_to_line`` is the source map of the assembled ``teal``. A ``Cond``
+    compiles to a chain of conditions, each followed by a ``bnz`` to its arm,
+    ending in an ``err``. A ``match`` of ``method_dispatch`` branches to the
+    arm of each of its methods and falls through to the default arm, after the
+    selector comparisons of the hot methods kept in front of it.
+    """
+    lines = [line.strip() for line in teal.splitlines()]
+    intcblock = []
+    for line in lines:
+        if line.startswith("intcblock"):
+            intcblock = [int(value) for value in line.split()[1:]]
+            break
+
+    # The arms start at the instruction following their label
+    line_pcs = {}
+    for pc, line in sorted(pc_to_line.items(), reverse=True):
+        line_pcs[line] = pc
+    instruction_lines = sorted(line_pcs)
+    label_pcs = {}
+    for number, line in enumerate(lines):
+        label = _LABEL.match(line)
+        if label is not None:
+            following = next((other for other in instruction_lines if other > number), None)
+            if following is not None:
+                label_pcs[label.group(1)] = line_pcs[following]
+
+    arms = {}
+    for number, line in enumerate(lines):
+        if line == "err":
+            chain = []
+            end = number - 1
+            while end >= 0 and lines[end].startswith("bnz "):
+                start = end
+                while start > 0 and lines[start - 1] and not _LABEL.match(lines[start - 1]) and lines[start - 1].split()[0] not in _BLOCK_ENDS:
+                    start -= 1
+                chain.append((lines[start:end], lines[end].split()[1]))
+                end = start - 1
+            for condition, label in reversed(chain):
+                arms[_arm_name(condition, label, intcblock)] = label_pcs[label]
+        elif line.startswith("match "):
+            signatures = []
+            for previous in reversed(lines[:number - 1]):
+                match = _METHOD.match(previous)
+                if match is None:
+                    break
+                signatures.insert(0, match.group(1))
+            branches = list(zip(signatures, line.split()[1:]))
+
+            # Each hot method is a `<selector>; method "sig"; ==; bnz label` in front of the table
+            end = number - 2 - len(signatures)
+            while end >= 3 and lines[end].startswith("bnz ") and lines[end - 1] == "==" and _METHOD.match(lines[end - 2]):
+                branches.insert(0, (_METHOD.match(lines[end - 2]).group(1), lines[end].split()[1]))
+                end -= 4
+            for signature, label in branches:
+                arms[_METHOD_NAMES.get(signature, label)] = label_pcs[label]
+            default = _LABEL.match(lines[number + 1]) if number + 1 < len(lines) else None
+            if default is not None:
+                arms["default"] = label_pcs[default.group(1)]
+    return arms
+
+def repro(case):
+    """Return the source of the ``Txn`` of every transaction of ``case``, leaving out the default fields."""
+    lines = []
+    for txn in case:
+        fields = [repr(txn.type), repr(txn.sender)]
+        for name, default in Txn._field_defaults.items():
+            value = getattr(txn, name)
+            if value != default:
+                fields.append(f"{name}={value!r}")
+        lines.append(f"Txn({', '.join(fields)})")
+    return lines
+
+def _complexity(case):
+    """Return the key ordering cases from the simplest: the fewest transactions, then fields set, items and units."""
+    names = ACTORS + ("app",)
+    fields = items = units = 0
+    for txn in case:
+        fields += sum(getattr(txn, field) != default for field, default in Txn._field_defaults.items())
+        items += len(txn.accounts) + len(txn.boxes) + len(txn.assets) + len(txn.args)
+        units += txn.fee + txn.amount + names.index(txn.sender) + (names.index(txn.receiver) if txn.receiver in names else 0)
+    return (len(case), fields, items, units)
+
+def _recast(txn, cast):
+    """Return ``txn`` with the actors of ``cast`` replaced by theirs, wherever they appear."""
+    def actor(name):
+        return cast.get(name, name) if isinstance(name, str) else name
+    return txn._replace(
+        sender=actor(txn.sender), receiver=actor(txn.receiver),
+        accounts=tuple(map(actor, txn.accounts)), boxes=tuple(map(actor, txn.boxes)),
+        args=tuple(tuple(map(actor, arg)) if isinstance(arg, tuple) else arg for arg in txn.args),
+    )
+
+def _itob(value):
+    return value.to_bytes(8, "big")
+
+class Fuzzer:
+    """The WizCoin program built by ``build``, deployed with ``template_values`` on a ledger to fuzz it on."""
+    def __init__(self, build=wizcoin_membership, template_values=DEFAULT_TEMPLATE_VALUES, version=8):
+        self.build = build
+        self.amount = template_values["TMPL_AMOUNT"]
+
+        teal = lower_templates(compile_teal(build(), mode=Mode.Application, version=version))
+        template = TemplateProgram(teal, avm.assemble(teal))
+        source = template.source(**template_values)
+        self.approval, pc_to_line = avm.assemble(source, source_map=True)
+        self.clear = avm.assemble(compile_teal(clear_program(), mode=Mode.Application, version=version))
+        self.arms = cond_arms(source, pc_to_line)
+        self.instructions = len(avm.Program(self.approval).instructions)
+
+        self.addresses = {name: index.to_bytes(32, "big") for index, name in enumerate(ACTORS, start=1)}
+        self.ledger = Ledger({
+            encoding.encode_address(address): POOR_BALANCE if name == "poor" else RICH_BALANCE
+            for name, address in self.addresses.items()
+        })
+        self._deploy()
+        self.names = {address: name for name, address in self.addresses.items()}
+
+        # The state every case starts from, and what the invariants compare against
+        self.baseline = self._state()
+
+        self.covered = set()
+        self.arm_hits = dict.fromkeys(self.arms, 0)
+
+    #
+    # Deployment
+    #
+
+    def _setup(self, *case):
+        outcome = self.run(case, keep=True)
+        if not outcome.accepted:
+            raise LedgerError(f"fuzzer setup failed: {outcome.error}")
+
+    def _configure(self, asset_id=0, clawback="manager", **fields):
+        """Create the asset of the manager, or reconfigure ``asset_id``, returning its ID."""
+        manager = self.addresses["manager"]
+        fields = dict(
+            fields, Sender=manager, Fee=MIN_TXN_FEE, TypeEnum=avm.TXN_TYPES["acfg"], Type=b"acfg", ConfigAsset=asset_id,
+            ConfigAssetManager=manager, ConfigAssetReserve=manager, ConfigAssetFreeze=manager, ConfigAssetClawback=self.addresses[clawback],
+        )
+        self.ledger.apply_group([fields])
+        return fields.get("CreatedAssetID", asset_id)
+
+    def _deploy(self):
+        self.asset_id = self._configure(ConfigAssetTotal=TOTAL_WIZCOINS, ConfigAssetUnitName=b"WizToken", ConfigAssetName=b"WizCoin")
+        self.other_asset_id = self._configure(ConfigAssetTotal=TOTAL_WIZCOINS, ConfigAssetName=b"Other")
+
+        fields = [self._fields(Txn("appl", "manager", fee=MIN_TXN_FEE, app="new", args=("wizcoin",)))]
+        self.ledger.apply_group(fields)
+        self.app_id = fields[0]["CreatedApplicationID"]
+        self.addresses["app"] = app_address(self.app_id)
+
+        self._setup(Txn("pay", "manager", fee=MIN_TXN_FEE, receiver="app", amount=1_000_000 + 16 * MEMBER_BOX_MIN_BALANCE))
+        self._setup(*self._opt_in_wizcoin(None))
+        self._setup(Txn("axfer", "manager", fee=MIN_TXN_FEE, receiver="app", amount=TOTAL_WIZCOINS - len(ACTORS)))
+        for name in HOLDERS:
+            self._setup(Txn("axfer", name, fee=MIN_TXN_FEE, receiver=name))
+
+        # The application claws the tokens of revoked members back
+        self._configure(self.asset_id, clawback="app")
+
+        self._setup(Txn("afrz", "manager", fee=MIN_TXN_FEE, receiver="frozen", amount=1))
+        self._setup(Txn("appl", "user1", fee=MIN_TXN_FEE, on_complete="OptIn", assets=()))
+        self._setup(*self._join("member"))
+        # A WizCoin passed on leaves a stale box behind, and a holder who is no member
+        self._setup(*self._join("former"))
+        self._setup(Txn("axfer", "former", fee=MIN_TXN_FEE, receiver="holder", amount=1))
+
+        # The cases run in a round of their own, after the members registered
+        self.ledger.advance()
+
+    #
+    # Evaluation
+    #
+
+    def _fields(self, txn):
+        """Lower ``txn`` into the dict of its TEAL transaction fields."""
+        addresses = self.addresses
+        fields = {
+            "Sender": addresses[txn.sender],
+            "Fee": txn.fee,
+            "FirstValid": self.ledger.round,
+            "LastValid": self.ledger.round + 1000,
+            "Type": txn.type.encode(),
+            "TypeEnum": avm.TXN_TYPES[txn.type],
+        }
+        # Without a receiver, the transaction goes to the zero address
+        receiver = addresses[txn.receiver] if txn.receiver is not None else avm.ZERO_ADDRESS
+        if txn.type == "pay":
+            fields["Receiver"] = receiver
+            fields["Amount"] = txn.amount
+        elif txn.type == "axfer":
+            fields["XferAsset"] = self.asset_id
+            fields["AssetReceiver"] = receiver
+            fields["AssetAmount"] = txn.amount
+        elif txn.type == "afrz":
+            fields["FreezeAsset"] = self.asset_id
+            fields["FreezeAssetAccount"] = receiver
+            fields["FreezeAssetFrozen"] = txn.amount
+        elif txn.type == "appl":
+            args = [selector(txn.method)] if txn.method is not None else []
+            for arg in txn.args:
+                if arg == "wizcoin":
+                    arg = _itob(self.asset_id)
+                elif isinstance(arg, tuple):
+                    # An ABI `address[]`: the number of addresses followed by the addresses
+                    arg = len(arg).to_bytes(2, "big") + b"".join(addresses[name] for name in arg)
+                args.append(arg)
+            on_complete = avm.ON_COMPLETE[txn.on_complete]
+            fields["ApplicationID"] = 0 if txn.app == "new" else self.app_id
+            fields["OnCompletion"] = on_complete
+            fields["ApplicationArgs"] = args
+            fields["Accounts"] = [addresses[name] for name in txn.accounts]
+            fields["Assets"] = [self.asset_id if asset == "wizcoin" else self.other_asset_id for asset in txn.assets]
+            fields["Boxes"] = [(0, addresses[name]) for name in txn.boxes]
+            if txn.app == "new" or on_complete == avm.ON_COMPLETE["UpdateApplication"]:
+                fields["ApprovalProgram"] = self.approval
+                fields["ClearStateProgram"] = self.clear
+            if txn.app == "new":
+                fields["GlobalNumUint"] = 1
+                fields["GlobalNumByteSlice"] = 1
+        return fields
+
+    def run(self, case, valid=False, keep=False):
+        """Apply the group ``case`` and check the invariants, returning its ``Outcome``.
+
+        A ``valid`` case must be accepted. Unless ``keep`` is set, the changes
+        are rolled back; the deployment keeps them, unchecked.
+        """
+        fields = [self._fields(txn) for txn in case]
+        coverage = self.ledger.coverage = {}
+        snapshot = self.ledger.snapshot()
+        try:
+            try:
+                self.ledger.apply_group(fields)
+            except LedgerError as e:
+                failure = Failure("valid group rejected", e.message) if valid else None
+                return Outcome(False, e.message, failure)
+            except Exception as e:
+                return Outcome(False, str(e), Failure(f"crash: {type(e).__name__}", str(e)))
+            return Outcome(True, None, None if keep else self._check(case, fields))
+        finally:
+            self.ledger.coverage = None
+            if keep:
+                self.ledger.state.commit()
+            else:
+                self.ledger.restore(snapshot)
+                self._cover(coverage)
+
+    def _cover(self, coverage):
+        """Record the program counters of the approval program reached by one case."""
+        for program, pcs in coverage.items():
+            if program.bytecode != self.approval:
+                continue
+            for name, pc in self.arms.items():
+                if pc in pcs:
+                    self.arm_hits[name] += 1
+            self.covered |= pcs
+
+    def _state(self):
+        ledger = self.ledger
+        return {
+            "boxes": {name: ledger.box_get(self.app_id, address) for name, address in self.addresses.items()},
+            "wizcoins": {name: (ledger.asset_holding(address, self.asset_id) or (0,))[0] for name, address in self.addresses.items()},
+            "app_balance": ledger.balance(self.addresses["app"]),
+            "globals": {key: ledger.global_get(self.app_id, key) for key in (b"manager", b"ASA_id")},
+        }
+
+    def _check(self, case, fields):
+        """Return the ``Failure`` of the accepted group ``case`` breaking an invariant, if any."""
+        state = self._state()
+        before, after = self.baseline["boxes"], state["boxes"]
+        # A box written anew is a member joining again, after its WizCoin left it
+        joined = [name for name in after if after[name] is not None and after[name] != before[name]]
+        removed = [name for name in after if after[name] is None and before[name] is not None]
+        paid = Counter(txn.sender for txn in case if txn.type == "pay" and txn.receiver == "app" and txn.amount == self.amount)
+
+        for name in joined:
+            if not paid[name]:
+                return Failure("unpaid membership", f"{name} joined without paying {self.amount} to the application")
+            if after[name] != _itob(self.ledger.eval_round):
+                return Failure("registration round", f"the box of {name} holds {after[name].hex()}, not round {self.ledger.eval_round}")
+
+        doubled, emptied = self._follow_wizcoins(fields)
+        if doubled:
+            return Failure("double membership", f"a WizCoin issued to {', '.join(doubled)}, holding one already")
+
+        if any(txn.type == "appl" and txn.sender == "manager" for txn in case):
+            return None
+
+        # Anybody may remove the stale box of an account holding no WizCoin
+        revoked = [name for name in removed if name not in emptied]
+        if revoked:
+            return Failure("unauthorized revocation", f"{', '.join(revoked)} removed from the registry without the manager")
+
+        issued = []
+        for inner in (inner for txn_fields in fields for inner in txn_fields.get("InnerTxns", ())):
+            if inner["TypeEnum"] != avm.TXN_TYPES["axfer"] or inner.get("XferAsset") != self.asset_id or inner.get("AssetAmount") != 1:
+                return Failure("unexpected inner transaction", f"inner {inner['Type'].decode()} transaction issued without the manager")
+            issued.append(self.names.get(inner["AssetReceiver"], inner["AssetReceiver"].hex()))
+        if sorted(issued) != sorted(joined):
+            return Failure("tokens without membership", f"WizCoins issued to {sorted(issued)} for the new members {sorted(joined)}")
+
+        received = sum(txn.amount for txn in case if txn.type == "pay" and txn.receiver == "app")
+        if state["app_balance"] != self.baseline["app_balance"] + received:
+            return Failure("application funds moved", f"the application balance changed by {state['app_balance'] - self.baseline['app_balance']}, having received {received}")
+
+        if state["globals"] != self.baseline["globals"]:
+            return Failure("global state changed", "the global state changed without the manager")
+        return None
+
+    def _follow_wizcoins(self, fields):
+        """Follow the WizCoin transfers of the group in order.
+
+        Returns the accounts issued a WizCoin while holding one, and the set of
+        the accounts holding none when one of the application calls runs.
+        """
+        held = Counter(self.baseline["wizcoins"])
+        doubled = []
+        emptied = set()
+        for txn_fields in fields:
+            if txn_fields["TypeEnum"] == avm.TXN_TYPES["appl"]:
+                emptied.update(name for name, amount in held.items() if not amount)
+            transfers = [txn_fields] if txn_fields["TypeEnum"] == avm.TXN_TYPES["axfer"] else []
+            transfers += [inner for inner in txn_fields.get("InnerTxns", ()) if inner["TypeEnum"] == avm.TXN_TYPES["axfer"]]
+            for transfer in transfers:
+                if transfer.get("XferAsset") != self.asset_id:
+                    continue
+                source = self.names.get(transfer.get("AssetSender") or transfer["Sender"])
+                receiver = self.names.get(transfer["AssetReceiver"])
+                amount = transfer.get("AssetAmount", 0)
+                # The WizCoins leaving the reserve of the application are issued on a join
+                if source == "app" and receiver != "app" and amount and held[receiver]:
+                    doubled.append(receiver)
+                held[source] -= amount
+                held[receiver] += amount
+        return doubled, emptied
+
+    #
+    # Generation
+    #
+
+    def _pooled(self, case):
+        """Have the first transaction of ``case`` pay the minimum fee of the whole group, and the others none."""
+        fee = 0
+        for txn in case:
+            if txn.type == "appl" and txn.method is not None and txn.app != "new":
+                fee += method_fee(txn.method, len(txn.accounts), build=self.build)
+            else:
+                fee += MIN_TXN_FEE
+        return tuple(txn._replace(fee=fee if index == 0 else 0) for index, txn in enumerate(case))
+
+    def _join(self, name):
+        return self._pooled([
+            Txn("appl", name, method="join_wizcoin", accounts=(name,), boxes=(name,)),
+            Txn("pay", name, receiver="app", amount=self.amount),
+        ])
+
+    def _batch_join(self, rng):
+        members = tuple(rng.sample(USERS, rng.randint(1, MAX_BATCH_SIZE)))
+        sender = rng.choice(("manager",) + members)
+        return self._pooled(
+            [Txn("appl", sender, method="batch_join_wizcoin", accounts=members, boxes=members)]
+            + [Txn("pay", name, receiver="app", amount=self.amount) for name in members]
+        )
+
+    def _check_registrations(self, rng):
+        names = tuple(rng.sample(ACTORS + ("app",), rng.randint(0, MAX_REFERENCES)))
+        return self._pooled([Txn("appl", rng.choice(USERS), method="check_registrations", args=(names,), boxes=names, assets=())])
+
+    def _clawback(self, rng):
+        revoked = tuple(rng.sample(HOLDERS, rng.randint(1, MAX_BATCH_SIZE)))
+        return self._pooled([Txn("appl", "manager", method="clawback_wizcoins", accounts=revoked, boxes=revoked)])
+
+    def _unregister_members(self, rng):
+        sender = rng.choice(("manager",) + USERS)
+        # Only the manager may remove the box of an account holding a WizCoin
+        names = ACTORS + ("app",) if sender == "manager" else USERS + ("frozen", "outsider", "poor", "former")
+        unregistered = tuple(rng.sample(names, rng.randint(1, MAX_BATCH_SIZE)))
+        return self._pooled([Txn("appl", sender, method="unregister_members", accounts=unregistered, boxes=unregistered)])
+
+    def _random_join(self, rng):
+        # A former member may join again
+        return self._join(rng.choice(USERS + ("former",)))
+
+    def _opt_in_wizcoin(self, rng):
+        return self._pooled([Txn("appl", "manager", method="opt_in_wizcoin")])
+
+    def _relinquish_wizcoins(self, rng):
+        return self._pooled([Txn("appl", "manager", method="relinquish_wizcoins", accounts=("app",))])
+
+    def _lifecycle(self, rng):
+        return self._pooled([rng.choice([
+            Txn("appl", "user2", on_complete="OptIn", assets=()),
+            Txn("appl", "user1", on_complete="CloseOut", assets=()),
+            Txn("appl", "user1", on_complete="ClearState", assets=()),
+            Txn("appl", "manager", on_complete="UpdateApplication", assets=()),
+            Txn("appl", "manager", on_complete="DeleteApplication", assets=()),
+            Txn("appl", rng.choice(USERS), app="new", args=("wizcoin",), assets=()),
+        ])])
+
+    def valid_case(self, rng):
+        """Return a random valid case, which the program must accept."""
+        return rng.choice(_TEMPLATES)(self, rng)
+
+    def _random_txn(self, rng):
+        kind = rng.choice(("pay", "pay", "axfer", "afrz", "appl", "appl"))
+        sender = rng.choice(ACTORS)
+        if kind == "appl":
+            method = rng.choice(list(METHODS) + [None])
+            accounts = tuple(rng.sample(ACTORS + ("app",), rng.randint(0, MAX_BATCH_SIZE)))
+            return Txn("appl", sender, method=method, accounts=accounts, boxes=accounts,
+                       on_complete=rng.choice(list(avm.ON_COMPLETE)) if rng.random() < 0.2 else "NoOp")
+        if kind == "afrz":
+            return Txn("afrz", rng.choice(("manager", sender)), receiver=rng.choice(ACTORS), amount=rng.randint(0, 1))
+        amount = self.amount if kind == "pay" and rng.random() < 0.5 else rng.randint(0, 3)
+        return Txn(kind, sender, receiver=rng.choice(ACTORS + ("app",)), amount=amount)
+
+    def _mutate(self, rng, case):
+        """Return ``case`` with one random mutation."""
+        case = list(case)
+        index = rng.randrange(len(case))
+        txn = case[index]
+        mutation = rng.randrange(15)
+        if mutation == 0 and len(case) > 1:
+            del case[index]
+        elif mutation == 1 and len(case) < MAX_GROUP_SIZE:
+            case.insert(rng.randrange(len(case) + 1), txn)
+        elif mutation == 2:
+            other = rng.randrange(len(case))
+            case[index], case[other] = case[other], case[index]
+        elif mutation == 3 and len(case) < MAX_GROUP_SIZE:
+            case.insert(rng.randrange(len(case) + 1), self._random_txn(rng))
+        elif mutation == 4 and len(case) < MAX_GROUP_SIZE:
+            # Freeze or unfreeze an account in the middle of the group
+            frozen = Txn("afrz", "manager", fee=MIN_TXN_FEE, receiver=rng.choice(HOLDERS), amount=rng.randint(0, 1))
+            case.insert(rng.randrange(len(case) + 1), frozen)
+        elif mutation == 5:
+            case[index] = txn._replace(sender=rng.choice(ACTORS))
+        elif mutation == 6:
+            case[index] = txn._replace(receiver=rng.choice(ACTORS + ("app",)))
+        elif mutation == 7:
+            amount = rng.choice((0, 1, self.amount - 1, self.amount + 1, 2 * self.amount, rng.randrange(2 * self.amount)))
+            case[index] = txn._replace(amount=amount)
+        elif mutation == 8:
+            # Move some of the fees of the group around, or add or take some
+            fee = rng.choice((0, MIN_TXN_FEE, txn.fee - MIN_TXN_FEE, txn.fee + MIN_TXN_FEE, rng.randrange(10 * MIN_TXN_FEE)))
+            case[index] = txn._replace(fee=max(fee, 0))
+        elif mutation == 9:
+            case[index] = txn._replace(method=rng.choice(list(METHODS) + [None]))
+        elif mutation == 10:
+            field = rng.choice(("accounts", "boxes", "assets", "args"))
+            values = list(getattr(txn, field))
+            choices = {"accounts": ACTORS + ("app",), "boxes": ACTORS + ("app",), "assets": ("wizcoin", "other")}.get(field)
+            if values and rng.random() < 0.5:
+                del values[rng.randrange(len(values))]
+            elif choices is not None:
+                values.insert(rng.randrange(len(values) + 1), rng.choice(choices))
+            else:
+                values.append(rng.choice((b"", rng.randbytes(rng.randint(1, 40)), tuple(rng.sample(ACTORS, 2)))))
+            case[index] = txn._replace(**{field: tuple(values)})
+        elif mutation == 11:
+            # Create a new application instead of calling the deployed one, or the other way around
+            case[index] = txn._replace(app="wizcoin" if txn.app == "new" else "new")
+        elif mutation == 12 and len(case) < MAX_GROUP_SIZE:
+            # Pass a WizCoin on to another account in the middle of the group
+            sender = rng.choice(HOLDERS)
+            transfer = Txn("axfer", sender, fee=MIN_TXN_FEE, receiver=rng.choice([name for name in ACTORS if name != sender]), amount=1)
+            case.insert(rng.randrange(len(case) + 1), transfer)
+        elif mutation == 13:
+            # Cast another actor in the part of one of the case, e.g. of the joiner throughout a join
+            cast = {rng.choice([txn.sender for txn in case]): rng.choice(ACTORS)}
+            case = [_recast(txn, cast) for txn in case]
+        else:
+            case[index] = txn._replace(on_complete=rng.choice(list(avm.ON_COMPLETE)))
+        return tuple(case)
+
+    #
+    # Shrinking
+    #
+
+    def _simplifications(self, case):
+        """Yield the cases one step simpler than ``case``: a transaction or an item less, or a field closer to its default."""
+        for index in range(len(case)):
+            yield case[:index] + case[index + 1:]
+
+        for index, txn in enumerate(case):
+            candidates = [txn._replace(**{field: default}) for field, default in Txn._field_defaults.items() if getattr(txn, field) != default]
+            for field in ("accounts", "boxes", "assets", "args"):
+                values = getattr(txn, field)
+                candidates.extend(txn._replace(**{field: values[:item] + values[item + 1:]}) for item in range(len(values)))
+            for field in ("fee", "amount"):
+                value = getattr(txn, field)
+                candidates.extend(txn._replace(**{field: simpler}) for simpler in (0, value // 2) if simpler < value)
+            for field in ("sender", "receiver"):
+                value = getattr(txn, field)
+                if value in ACTORS:
+                    candidates.extend(txn._replace(**{field: name}) for name in ACTORS[:ACTORS.index(value)])
+            for candidate in candidates:
+                yield case[:index] + (candidate,) + case[index + 1:]
+
+    def shrink(self, case, kind):
+        """Return the simplest case found failing with the ``Failure`` of ``kind`` like ``case`` does."""
+        shrinking = True
+        while shrinking:
+            shrinking = False
+            for candidate in self._simplifications(case):
+                # Only ever stepping to a simpler case, the shrinking ends
+                if not candidate or _complexity(candidate) >= _complexity(case):
+                    continue
+                failure = self.run(candidate).failure
+                if failure is not None and failure.kind == kind:
+                    case = candidate
+                    shrinking = True
+                    break
+        return case
+
+    #
+    # Fuzzing
+    #
+
+    def fuzz(self, cases=None, seconds=None, seed=0):
+        """Run ``cases`` random cases, or as many as fit in ``seconds``, and return the JSON-serializable report."""
+        if cases is None and seconds is None:
+            raise ValueError("give the number of cases or the seconds to fuzz for")
+        rng = random.Random(seed)
+        corpus = [template(self, rng) for template in _TEMPLATES for _ in range(4)]
+        failures = {}
+        accepted = count = 0
+        start = time.perf_counter()
+
+        while (cases is None or count < cases) and (seconds is None or time.perf_counter() - start < seconds):
+            valid = rng.random() < 0.1
+            if valid:
+                case = self.valid_case(rng)
+            else:
+                case = rng.choice(corpus)
+                for _ in range(rng.randint(1, 4)):
+                    case = self._mutate(rng, case)
+
+            covered = len(self.covered)
+            outcome = self.run(case, valid)
+            count += 1
+            accepted += outcome.accepted
+            if len(self.covered) > covered:
+                if len(corpus) < MAX_CORPUS:
+                    corpus.append(case)
+                else:
+                    corpus[rng.randrange(MAX_CORPUS)] = case
+
+            failure = outcome.failure
+            if failure is not None and failure.kind not in failures:
+                # A valid case is only valid as a whole, so there is nothing to shrink it to
+                shrunk = case if valid else self.shrink(case, failure.kind)
+                failures[failure.kind] = {
+                    "kind": failure.kind,
+                    "message": failure.message if valid else self.run(shrunk).failure.message,
+                    "case": repro(case),
+                    "shrunk": repro(shrunk),
+                }
+
+        elapsed = time.perf_counter() - start
+        return {
+            "seed": seed,
+            "cases": count,
+            "accepted": accepted,
+            "seconds": round(elapsed, 3),
+            "cases_per_second": round(count / elapsed) if elapsed else 0,
+            "coverage": {
+                "arms": dict(self.arm_hits),
+                "instructions": [len(self.covered), self.instructions],
+            },
+            "failures": list(failures.values()),
+        }
+
+# The generators of the valid cases, given the ``Fuzzer`` and its random generator
+_TEMPLATES = [
+    Fuzzer._random_join,
+    Fuzzer._batch_join,
+    Fuzzer._check_registrations,
+    Fuzzer._opt_in_wizcoin,
+    Fuzzer._clawback,
+    Fuzzer._unregister_members,
+    Fuzzer._relinquish_wizcoins,
+    Fuzzer._lifecycle,
+]
+
+def _fuzz_job(args):
+    cases, seconds, seed = args
+    fuzzer = Fuzzer()
+    return fuzzer.fuzz(cases=cases, seconds=seconds, seed=seed), sorted(fuzzer.covered)
+
+def merge(reports):
+    """Merge the reports of parallel fuzzing jobs, given with the program counters each of them covered."""
+    covered = set()
+    merged = None
+    for report, pcs in reports:
+        covered.update(pcs)
+        if merged is None:
+            merged = dict(report, seed=[report["seed"]], failures=[])
+            merged["coverage"] = {"arms": Counter(), "instructions": report["coverage"]["instructions"]}
+        else:
+            merged["seed"].append(report["seed"])
+            for key in ("cases", "accepted"):
+                merged[key] += report[key]
+            merged["seconds"] = max(merged["seconds"], report["seconds"])
+        merged["coverage"]["arms"].update(report["coverage"]["arms"])
+        kinds = {failure["kind"] for failure in merged["failures"]}
+        merged["failures"].extend(failure for failure in report["failures"] if failure["kind"] not in kinds)
+
+    merged["cases_per_second"] = round(merged["cases"] / merged["seconds"]) if merged["seconds"] else 0
+    merged["coverage"] = {"arms": dict(merged["coverage"]["arms"]), "instructions": [len(covered), merged["coverage"]["instructions"][1]]}
+    return merged
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", type=int, help="the number of cases every job runs")
+    parser.add_argument("--seconds", type=float, help="the seconds every job runs for (default 10 without --cases)")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the first job, the next jobs taking the following seeds")
+    parser.add_argument("--jobs", type=int, default=1, help="the number of processes fuzzing in parallel")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--require-coverage", action="store_true", help="fail when an arm of a Cond was never reached")
+    args = parser.parse_args(argv)
+
+    seconds = 10 if args.cases is None and args.seconds is None else args.seconds
+    jobs = [(args.cases, seconds, args.seed + job) for job in range(args.jobs)]
+    if args.jobs == 1:
+        report = merge([_fuzz_job(jobs[0])])
+    else:
+        with multiprocessing.Pool(args.jobs) as pool:
+            report = merge(pool.map(_fuzz_job, jobs))
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for failure in report["failures"]:
+        print(f"{failure['kind']}: {failure['message']}", file=sys.stderr)
+        for line in failure["shrunk"]:
+            print(f"    {line}", file=sys.stderr)
+    uncovered = [name for name, hits in report["coverage"]["arms"].items() if not hits]
+    if args.require_coverage and uncovered:
+        print(f"arms never reached: {', '.join(uncovered)}", file=sys.stderr)
+        return 1
+    return 1 if report["failures"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,15 +2,50 @@
 import base64
 from pyteal import *
 
-tmpl_double_fee = Int(2000)
-tmpl_amount = Int(50_000_000)
+from method_dispatch import method_dispatch, compile_teal
+from state_hoisting import hoist_global_reads
+from templates import lower_templates
+
+# The membership price. Its value is patched into the bytecode of every
+# deployment (see `templates.py`).
+tmpl_amount = Tmpl.Int("TMPL_AMOUNT")
+
+# The template values of the default membership tier
+DEFAULT_TEMPLATE_VALUES = {
+    "TMPL_AMOUNT": 50_000_000,
+}
 
 var_manager = Bytes("manager")
 var_ASA_id = Bytes("ASA_id")
 
-def wizcoin_membership():
+# The member registry keeps a box per member, named after the 32-byte address
+# of the member and holding the round it joined in. Other contracts check a
+# membership with a single box read, see `member_registry.py`.
+def register_member(address):
+    return App.box_put(address, Itob(Global.round()))
+
+# The WizCoin token tells the members apart, not the box: a member whose token
+# left it, by a transfer or a clawback of the ASA, keeps a stale box, which is
+# registered anew when it joins again. Only a box registered in the current
+# round stops a join, that of an account listed twice in the same batch.
+def check_not_member(holding, registration):
+    return Seq([
+        holding,
+        Assert(holding.hasValue(), comment="payer opted in to WizCoin"),
+        Assert(holding.value() == Int(0), comment="payer is not a member yet"),
+        registration,
+        Assert(
+            Or(Not(registration.hasValue()), Btoi(registration.value()) < Global.round()),
+            comment="payer did not register in this round",
+        ),
+    ])
+
+def wizcoin_membership(hoist_reads=True):
     """
     This smart contract issues WizCoin membership ASAs.
+
+    Unless ``hoist_reads`` is unset, the global state reads repeated along
+    a path are loaded once into scratch slots.
     """
     # Checks if the sender of the current transaction invoking this
     # smart contract is the manager
@@ -55,6 +90,10 @@ def wizcoin_membership():
     # Pass in the smart contract address as an account to get our own WizCoin balance.
     # This operation must be performed as an inner transaction; the smart
     # contract has no explicit private key to opt in otherwise.
+    # The boxes of the member registry keep their minimum balance locked, so the
+    # Algo balance is only closed out once no member is registered anymore, e.g.
+    # after the manager removed all of them with `unregister_members`.
+    app_address = Global.current_application_address()
     relinquish_wizcoins = Seq([
         # Sanity checks        
         Assert(is_manager),
@@ -70,13 +109,22 @@ def wizcoin_membership():
             TxnField.asset_close_to: App.globalGet(var_manager),
             TxnField.xfer_asset: App.globalGet(var_ASA_id),
         }),
-        InnerTxnBuilder.Next(),
-        InnerTxnBuilder.SetFields({
-            TxnField.type_enum: TxnType.Payment,
-            TxnField.amount: Int(0),
-            TxnField.receiver: App.globalGet(var_manager),
-            TxnField.close_remainder_to: App.globalGet(var_manager),
-        }),
+        InnerTxnBuilder.Submit(),
+        InnerTxnBuilder.Begin(),
+        If(MinBalance(app_address) == Global.min_balance()).Then(
+            InnerTxnBuilder.SetFields({
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.amount: Int(0),
+                TxnField.receiver: App.globalGet(var_manager),
+                TxnField.close_remainder_to: App.globalGet(var_manager),
+            }),
+        ).Else(
+            InnerTxnBuilder.SetFields({
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.amount: Balance(app_address) - MinBalance(app_address),
+                TxnField.receiver: App.globalGet(var_manager),
+            }),
+        ),
         InnerTxnBuilder.Submit(),
         
         Approve(),        
@@ -84,29 +132,31 @@ def wizcoin_membership():
 
     # Code block invoked when joining WizCoin. This application call is given
     # one argument and one supplied account. The argument is the "join_wizcoin"
-    # used by the control flow below. The supplied account (Int(1)) is used
-    # to verify that the receiver does not hold any WizCoin token already
+    # used by the control flow below. The supplied account (Int(1)) receives
+    # the WizCoin token, so it must hold none yet, and its box in the member
+    # registry is written with the round it joined in
     app_call_txn = Gtxn[0]
     pay_in_txn = Gtxn[1]    
-    asset_balance = AssetHolding.balance(Int(1), App.globalGet(var_ASA_id))
+    payer_holding = AssetHolding.balance(Int(1), App.globalGet(var_ASA_id))
+    payer_registration = App.box_get(pay_in_txn.sender())
     join_wizcoin = Seq([
         # Sanity checks
-        Assert(Global.group_size() == Int(2)),        
-        Assert(Txn.application_args.length() == Int(1)),
-        Assert(Txn.accounts.length() == Int(1)),
+        Assert(Global.group_size() == Int(2), comment="join group of two transactions"),
+        Assert(Txn.application_args.length() == Int(1), comment="one application argument"),
+        Assert(Txn.accounts.length() == Int(1), comment="one supplied account"),
         
         # Check that the `pay_in_txn` is the correct amount
         # and is sent to the smart contract
-        Assert(pay_in_txn.type_enum() == TxnType.Payment),
-        Assert(pay_in_txn.fee() >= tmpl_double_fee),
-        Assert(pay_in_txn.amount() == tmpl_amount),
-        Assert(pay_in_txn.receiver() == Global.current_application_address()),
+        Assert(pay_in_txn.type_enum() == TxnType.Payment, comment="second transaction is a payment"),
+        # The fees are pooled, so any of the two transactions may pay for the group
+        Assert(app_call_txn.fee() + pay_in_txn.fee() >= Global.min_txn_fee() * Int(3), comment="group fees cover the inner transaction"),
+        Assert(pay_in_txn.amount() == tmpl_amount, comment="payment of the registration amount"),
+        Assert(pay_in_txn.receiver() == Global.current_application_address(), comment="payment to the application"),
 
         # Perform some checks before issuing the WizCoin token
-        Assert(app_call_txn.accounts[1] == pay_in_txn.sender()),
-        asset_balance,
-        Assert(asset_balance.hasValue()),
-        Assert(asset_balance.value() == Int(0)),
+        Assert(app_call_txn.accounts[1] == pay_in_txn.sender(), comment="supplied account is the payer"),
+        check_not_member(payer_holding, payer_registration),
+        register_member(pay_in_txn.sender()),
 
         # Issue the WizCoin token as an inner transaction
         InnerTxnBuilder.Begin(),
@@ -121,21 +171,201 @@ def wizcoin_membership():
         Approve(),
     ])
 
+    # Code block invoked when several accounts join WizCoin at once. This application
+    # call must be the first transaction of the group and every following transaction
+    # is the membership payment of the account supplied at the same position in
+    # `Txn.accounts`. All of the WizCoin tokens are issued in a single inner group.
+    batch_size = Global.group_size() - Int(1)
+    member_index = ScratchVar(TealType.uint64)
+    group_fees = ScratchVar(TealType.uint64)
+    member_pay_in_txn = Gtxn[member_index.load()]
+    member_account = Txn.accounts[member_index.load()]
+    member_holding = AssetHolding.balance(member_index.load(), App.globalGet(var_ASA_id))
+    member_registration = App.box_get(member_account)
+    batch_join_wizcoin = Seq([
+        # Sanity checks
+        Assert(Txn.group_index() == Int(0)),
+        Assert(batch_size >= Int(1)),
+        Assert(Txn.application_args.length() == Int(1)),
+        Assert(Txn.accounts.length() == batch_size),
+
+        group_fees.store(Txn.fee()),
+        InnerTxnBuilder.Begin(),
+        For(
+            member_index.store(Int(1)),
+            member_index.load() <= batch_size,
+            member_index.store(member_index.load() + Int(1)),
+        ).Do(Seq([
+            # Check that the `member_pay_in_txn` is the correct amount
+            # and is sent to the smart contract
+            Assert(member_pay_in_txn.type_enum() == TxnType.Payment),
+            group_fees.store(group_fees.load() + member_pay_in_txn.fee()),
+            Assert(member_pay_in_txn.amount() == tmpl_amount),
+            Assert(member_pay_in_txn.receiver() == Global.current_application_address()),
+
+            # Perform some checks before issuing the WizCoin token. The tokens
+            # are only issued once the loop is over, so an account listed twice
+            # in the same batch is told by the box registered for its first listing
+            Assert(member_account == member_pay_in_txn.sender()),
+            check_not_member(member_holding, member_registration),
+            register_member(member_account),
+
+            # Add the WizCoin token of this member to the inner transaction group
+            If(member_index.load() > Int(1)).Then(InnerTxnBuilder.Next()),
+            InnerTxnBuilder.SetFields({
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: App.globalGet(var_ASA_id),
+                TxnField.asset_receiver: member_pay_in_txn.sender(),
+                TxnField.asset_amount: Int(1),
+            }),
+        ])),
+        InnerTxnBuilder.Submit(),
+
+        # The fees are pooled, so they need to cover the group and an inner transaction per member
+        Assert(group_fees.load() >= Global.min_txn_fee() * (Global.group_size() + batch_size)),
+
+        Approve(),
+    ])
+
+    # Code block invoked when the manager revokes the membership of the supplied accounts,
+    # e.g. of an expiring cohort. All of their WizCoin tokens are clawed back into the
+    # smart contract, the reserve, in a single inner group, and their boxes are removed
+    # from the member registry. This requires the smart contract to be the clawback of
+    # the WizCoin ASA. The inner transactions pay no fee of their own, so the fees are
+    # pooled in the outer transactions.
+    revoked_index = ScratchVar(TealType.uint64)
+    revoked_asset_balance = AssetHolding.balance(revoked_index.load(), App.globalGet(var_ASA_id))
+    clawback_wizcoins = Seq([
+        # Sanity checks
+        Assert(is_manager),
+        Assert(Txn.application_args.length() == Int(1)),
+        Assert(Txn.accounts.length() >= Int(1)),
+
+        InnerTxnBuilder.Begin(),
+        For(
+            revoked_index.store(Int(1)),
+            revoked_index.load() <= Txn.accounts.length(),
+            revoked_index.store(revoked_index.load() + Int(1)),
+        ).Do(Seq([
+            revoked_asset_balance,
+            Assert(revoked_asset_balance.hasValue()),
+            Pop(App.box_delete(Txn.accounts[revoked_index.load()])),
+
+            # Add the clawback of this account to the inner transaction group
+            If(revoked_index.load() > Int(1)).Then(InnerTxnBuilder.Next()),
+            InnerTxnBuilder.SetFields({
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: App.globalGet(var_ASA_id),
+                TxnField.asset_sender: Txn.accounts[revoked_index.load()],
+                TxnField.asset_receiver: Global.current_application_address(),
+                TxnField.asset_amount: revoked_asset_balance.value(),
+                TxnField.fee: Int(0),
+            }),
+        ])),
+        InnerTxnBuilder.Submit(),
+
+        Approve(),
+    ])
+
+    # Code block invoked to remove the supplied accounts from the member registry,
+    # which returns the minimum balance of their boxes to the application. Anybody
+    # may remove the stale box of an account holding no WizCoin anymore, so that
+    # the registry follows the tokens transferred or clawed back outside of the
+    # application. The manager may remove any box, e.g. to empty the registry
+    # before relinquishing the WizCoins and deleting the application.
+    unregistered_index = ScratchVar(TealType.uint64)
+    unregistered_asset_balance = AssetHolding.balance(unregistered_index.load(), App.globalGet(var_ASA_id))
+    unregister_members = Seq([
+        # Sanity checks
+        Assert(Txn.application_args.length() == Int(1)),
+        Assert(Txn.accounts.length() >= Int(1)),
+
+        For(
+            unregistered_index.store(Int(1)),
+            unregistered_index.load() <= Txn.accounts.length(),
+            unregistered_index.store(unregistered_index.load() + Int(1)),
+        ).Do(Seq([
+            # An account which is not opted in to the WizCoin ASA holds none either
+            unregistered_asset_balance,
+            Assert(Or(is_manager, unregistered_asset_balance.value() == Int(0)), comment="unregistered account holds no WizCoin"),
+            Pop(App.box_delete(Txn.accounts[unregistered_index.load()])),
+        ])),
+
+        Approve(),
+    ])
+
+    # Code block invoked to look up the registration of a batch of addresses, e.g. by
+    # other contracts gating on WizCoin. The second argument is the ABI encoded
+    # `address[]` and the ABI return value logged is the `bool[]` of whether each
+    # of the addresses has a box in the member registry. Nothing is written. A box
+    # outlives a WizCoin transferred or clawed back outside of the application until
+    # `unregister_members` removes it, so a registration is not a proof of holding
+    # the token; reading that takes the account and the ASA as references.
+    checked_count = ScratchVar(TealType.uint64)
+    checked_index = ScratchVar(TealType.uint64)
+    registrations = ScratchVar(TealType.bytes)
+    checked_box = App.box_length(Extract(Txn.application_args[1], Int(2) + checked_index.load() * Int(32), Int(32)))
+    check_registrations = Seq([
+        # Sanity checks
+        Assert(Txn.application_args.length() == Int(2)),
+        checked_count.store(ExtractUint16(Txn.application_args[1], Int(0))),
+        Assert(Len(Txn.application_args[1]) == Int(2) + checked_count.load() * Int(32)),
+
+        # A `bool[]` packs its elements as bits, starting from the most significant one
+        registrations.store(BytesZero((checked_count.load() + Int(7)) / Int(8))),
+        For(
+            checked_index.store(Int(0)),
+            checked_index.load() < checked_count.load(),
+            checked_index.store(checked_index.load() + Int(1)),
+        ).Do(Seq([
+            checked_box,
+            registrations.store(SetBit(registrations.load(), checked_index.load(), checked_box.hasValue())),
+        ])),
+        Log(Concat(
+            Bytes("base16", "151f7c75"),
+            Extract(Itob(checked_count.load()), Int(6), Int(2)),
+            registrations.load(),
+        )),
+
+        Approve(),
+    ])
+
     # TODO: Add a block where the manager can withdraw the ALGOs sent to this smart contract
     
-    # Control flow logic of the smart contract
-    program = Cond(
-        [Txn.application_id() == Int(0), init_contract],
+    # Control flow logic of the smart contract. NoOp calls are by far the most
+    # frequent, so they are routed on their method selector before any of the
+    # lifecycle checks. The contract is created with a NoOp call matching none
+    # of the methods.
+    lifecycle = Cond(
+        [Txn.application_id() == Int(0), Reject()],
         [Txn.on_completion() == OnComplete.DeleteApplication, Return(is_manager)],
         [Txn.on_completion() == OnComplete.UpdateApplication, Return(is_manager)],
         [Txn.on_completion() == OnComplete.OptIn, Approve()],
         [Txn.on_completion() == OnComplete.CloseOut, Approve()],
-        [Txn.application_args[0] == Bytes("opt_in_wizcoin"), opt_in_wizcoin],        
-        [Txn.application_args[0] == Bytes("join_wizcoin"), join_wizcoin],
-        [Txn.application_args[0] == Bytes("relinquish_wizcoins"), relinquish_wizcoins],
     )
+    # `OnComplete.NoOp` is zero, so testing the `on_completion` alone tells NoOp calls apart
+    program = If(Txn.on_completion()).Then(lifecycle).Else(
+        method_dispatch(
+            [
+                ("join_wizcoin", join_wizcoin),
+                ("batch_join_wizcoin", batch_join_wizcoin),
+                ("check_registrations", check_registrations),
+                ("opt_in_wizcoin", opt_in_wizcoin),
+                ("clawback_wizcoins", clawback_wizcoins),
+                ("unregister_members", unregister_members),
+                ("relinquish_wizcoins", relinquish_wizcoins),
+            ],
+            default=Seq([
+                Assert(Txn.application_id() == Int(0)),
+                init_contract,
+            ]),
+        )
+    )
+
+    if hoist_reads:
+        program = hoist_global_reads(program)
 
     return program
     
 if __name__ == "__main__":
-    print(compileTeal(wizcoin_membership(), mode=Mode.Application, version=5))
+    print(lower_templates(compile_teal(wizcoin_membership(), mode=Mode.Application, version=8)))
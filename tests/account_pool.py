@@ -0,0 +1,183 @@
+"""A pool of pre-funded accounts shared out between the tests of a session.
+
+Tests which need users of their own, e.g. through ``user1_in`` or
+``multisig_account_in``, draw them from an ``AccountPool`` instead of the
+fixed ``user1``…``user4`` accounts, and hand them back once the test is over.
+Since no two running tests hold the same account, they never collide on
+balances or opt-in state.
+
+Under pytest-xdist every worker gets a disjoint shard of the pool: the
+accounts are derived from a seed and their index, and worker ``k`` of
+``n`` takes the indices ``k``, ``k + n``, ``k + 2n``, … The shard is topped up
+front by the ``funder`` with a few atomic groups of payments, all of them
+submitted before waiting for any to be confirmed. Every account is topped up
+again when it is acquired, since the fees and minimum balances of the tests
+holding it drain its funds, and the shard is closed out back to the ``funder``
+at the end of the session.
+
+The seed is secret, since anybody knowing it could rebuild the keys and drain
+the accounts: ``pool_seed`` takes it from ``WIZCOIN_POOL_SEED``, or otherwise
+from a local file kept out of git, generated at random on first use. As it is
+the same across the runs of a checkout, the accounts left funded by an
+interrupted run are reused by the next one.
+"""
+import hashlib
+import os
+import secrets
+from collections import deque
+from contextlib import contextmanager
+
+import algosdk
+from algosdk import transaction
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+from nacl.signing import SigningKey
+
+from algopytest import AlgoUser
+
+import algod_connection
+from confirmations import shared_confirmations
+
+# The number of accounts of every worker's shard
+POOL_SIZE = 32
+
+# The microAlgos given to every account, enough for a registration and funding a multisig account
+POOL_FUNDS = 200_000_000
+
+# The most transactions in an atomic group
+MAX_GROUP_SIZE = 16
+
+# The minimum balance of an account holding no assets, applications or boxes
+MIN_ACCOUNT_BALANCE = 100_000
+
+# The local file of the seed of the pool accounts, shared by all of the workers and runs
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".account_pool_seed")
+
+def xdist_worker():
+    """Return the index and the number of the pytest-xdist workers, or ``(0, 1)`` outside of xdist."""
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+    count = int(os.environ.get("PYTEST_XDIST_WORKER_COUNT", "1"))
+    return int(worker[len("gw"):]), count
+
+def pool_seed(path=SEED_FILE):
+    """Return the seed of the pool accounts from ``WIZCOIN_POOL_SEED``, or from ``path``, created with a random seed if missing."""
+    seed = os.environ.get("WIZCOIN_POOL_SEED")
+    if seed:
+        return seed
+    if not os.path.exists(path):
+        # Every worker may get here; only the first link of a complete file wins
+        temporary = f"{path}.{os.getpid()}"
+        descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(temporary, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(temporary)
+    with open(path) as f:
+        return f.read().strip()
+
+def derive_account(seed, index):
+    """Return the ``(private_key, address)`` of the pool account ``index`` of the run ``seed``."""
+    signing_key = SigningKey(hashlib.sha512(f"wizcoin account pool/{seed}/{index}".encode()).digest()[:32])
+    private_key = algosdk.encoding.base64.b64encode(bytes(signing_key) + bytes(signing_key.verify_key)).decode()
+    return private_key, algosdk.account.address_from_private_key(private_key)
+
+class AccountPool:
+    """The shard of pool accounts of one worker, funded by ``funder``.
+
+    ``worker`` and ``workers`` default to those of the running pytest-xdist
+    worker, and ``seed`` to ``pool_seed()``.
+    """
+    def __init__(self, funder, size=POOL_SIZE, funds=POOL_FUNDS, worker=None, workers=None, seed=None):
+        if worker is None or workers is None:
+            worker, workers = xdist_worker()
+        if seed is None:
+            seed = pool_seed()
+
+        self.funder = funder
+        self.funds = funds
+        self.accounts = [derive_account(seed, index) for index in range(worker, size * workers, workers)]
+        self.free = deque(self.accounts)
+
+    def _send_groups(self, client, payments):
+        """Submit the ``(txn, private key of its sender)`` pairs in atomic groups of up to ``MAX_GROUP_SIZE`` and wait for all of them."""
+        futures = []
+        for start in range(0, len(payments), MAX_GROUP_SIZE):
+            group = payments[start:start + MAX_GROUP_SIZE]
+            txns = [txn for txn, _ in group]
+            if len(txns) > 1:
+                transaction.assign_group_id(txns)
+            client.send_transactions([
+                AccountTransactionSigner(private_key).sign_transactions([txn], [0])[0]
+                for txn, private_key in group
+            ])
+            futures.append(shared_confirmations().submit(txns[0], 10))
+
+        for future in futures:
+            future.result()
+
+    def _top_ups(self, client, params, addresses):
+        """Return the payments from the ``funder`` bringing each of the ``addresses`` back to ``funds`` microAlgos."""
+        payments = []
+        for address in addresses:
+            missing = self.funds - client.account_info(address)["amount"]
+            if missing > 0:
+                payments.append(transaction.PaymentTxn(self.funder.address, params, address, missing))
+        return payments
+
+    def fund(self):
+        """Top every account of the shard up to ``funds`` microAlgos, in groups of up to ``MAX_GROUP_SIZE`` payments."""
+        client = algod_connection.algod_client()
+        params = client.suggested_params()
+        payments = self._top_ups(client, params, [address for _, address in self.accounts])
+        self._send_groups(client, [(txn, self.funder.private_key) for txn in payments])
+
+    def close(self):
+        """Hand the funds of every account of the shard back to the ``funder``.
+
+        Accounts holding nothing are closed out, the others keep their minimum
+        balance.
+        """
+        client = algod_connection.algod_client()
+        params = client.suggested_params()
+
+        refunds = []
+        for private_key, address in self.accounts:
+            info = client.account_info(address)
+            if info["min-balance"] <= MIN_ACCOUNT_BALANCE:
+                if info["amount"] == 0:
+                    continue
+                txn = transaction.PaymentTxn(address, params, self.funder.address, 0, close_remainder_to=self.funder.address)
+            else:
+                txn = transaction.PaymentTxn(address, params, self.funder.address, 0)
+                txn.amt = info["amount"] - info["min-balance"] - txn.fee
+                if txn.amt <= 0:
+                    continue
+            refunds.append((txn, private_key))
+        self._send_groups(client, refunds)
+
+    def acquire(self, name=None):
+        """Take an account out of the pool, topped up to ``funds``, as an ``AlgoUser`` called ``name``."""
+        if not self.free:
+            raise RuntimeError(f"all {len(self.accounts)} accounts of the pool are in use")
+        private_key, address = self.free.popleft()
+
+        client = algod_connection.algod_client()
+        payments = self._top_ups(client, client.suggested_params(), [address])
+        self._send_groups(client, [(txn, self.funder.private_key) for txn in payments])
+        return AlgoUser(address, private_key, name)
+
+    def release(self, user):
+        """Hand the ``user`` taken with ``acquire`` back to the pool."""
+        self.free.append((user.private_key, user.address))
+
+    @contextmanager
+    def account(self, name=None):
+        """Hold an account of the pool for the duration of the context."""
+        user = self.acquire(name)
+        try:
+            yield user
+        finally:
+            self.release(user)
@@ -0,0 +1,88 @@
+"""A pytest plugin reporting where the node interactions of the suite spend their time.
+
+With ``--algod-profile`` every algod call and signature of the session is
+recorded by ``algod_instrumentation`` and attributed to the fixture whose
+setup, or the test whose call or teardown, made it. At the end of the session
+the slowest fixtures and tests and the slowest kinds of calls are printed.
+``--algod-profile-json`` additionally writes the aggregated calls to a JSON
+file and ``--algod-trace`` writes every call to a Chrome trace.
+"""
+import json
+
+import pytest
+
+import algod_instrumentation
+
+_recorder_key = pytest.StashKey()
+
+# The number of the slowest scopes and methods printed at the end of the session
+SLOWEST = 10
+
+def pytest_addoption(parser):
+    group = parser.getgroup("algod-profile", "node interaction profiling")
+    group.addoption("--algod-profile", action="store_true", help="Record the time spent in node interactions per fixture and test.")
+    group.addoption("--algod-profile-json", metavar="PATH", help="Write the recorded calls, aggregated per method and scope, to a JSON file.")
+    group.addoption("--algod-trace", metavar="PATH", help="Write every recorded call to a Chrome trace file.")
+
+def _recorder(config):
+    return config.stash.get(_recorder_key, None)
+
+def pytest_configure(config):
+    if config.getoption("--algod-profile") or config.getoption("--algod-profile-json") or config.getoption("--algod-trace"):
+        config.stash[_recorder_key] = algod_instrumentation.instrument()
+
+def pytest_unconfigure(config):
+    if _recorder(config) is not None:
+        algod_instrumentation.uninstrument()
+
+def _scoped(config, name):
+    recorder = _recorder(config)
+    if recorder is None:
+        return None
+    return recorder.scope(name)
+
+@pytest.hookimpl(wrapper=True)
+def pytest_fixture_setup(fixturedef, request):
+    scope = _scoped(request.config, f"fixture {fixturedef.argname}")
+    if scope is None:
+        return (yield)
+    with scope:
+        return (yield)
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    scope = _scoped(item.config, item.nodeid)
+    if scope is None:
+        return (yield)
+    with scope:
+        return (yield)
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_teardown(item, nextitem):
+    scope = _scoped(item.config, f"{item.nodeid} (teardown)")
+    if scope is None:
+        return (yield)
+    with scope:
+        return (yield)
+
+def pytest_terminal_summary(terminalreporter, config):
+    recorder = _recorder(config)
+    if recorder is None:
+        return
+
+    for group, title in (("scopes", "fixtures and tests"), ("methods", "calls")):
+        terminalreporter.write_sep("=", f"slowest {title} in node interactions")
+        for name, entry in recorder.slowest(group, SLOWEST):
+            terminalreporter.write_line(
+                f"{entry['seconds']:9.4f}s {entry['count']:6d} calls {entry['bytes_sent'] + entry['bytes_received']:10d} bytes "
+                f"{entry['rounds_waited']:5d} rounds  {name}"
+            )
+
+    path = config.getoption("--algod-profile-json")
+    if path:
+        with open(path, "w") as f:
+            json.dump(recorder.summary(), f, indent=2, sort_keys=True)
+    path = config.getoption("--algod-trace")
+    if path:
+        with open(path, "w") as f:
+            json.dump(recorder.chrome_trace(), f)
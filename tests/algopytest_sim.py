@@ -0,0 +1,291 @@
+"""A drop-in replacement for the parts of ``algopytest`` used by this test suite.
+
+Running the suite with ``--ledger=sim`` installs this module in place of
+``algopytest`` and points ``algod_connection`` at a ``SimAlgodClient``, so that
+every test evaluates the WizCoin programs in-process against a
+``ledger_sim.Ledger`` instead of waiting for rounds on a node. The ledger lives
+for the whole session; ``conftest`` rolls it back to a snapshot after every
+test.
+"""
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+
+import algosdk
+import pytest
+from algosdk import transaction
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+from pyteal import Mode, compileTeal
+
+import algod_connection
+import params_cache
+from confirmations import wait_for_confirmation
+from ledger_sim import Ledger, SimAlgodClient
+from multisig_signing import MultisigEntry, sign_multisig_groups
+
+# The balance given to every account of the session at genesis
+INITIAL_FUNDS = 1_000_000_000_000
+
+class AlgoUser:
+    """An account with its ``address`` and ``private_key``."""
+    def __init__(self, address, private_key=None, name=None):
+        self.address = address
+        self.private_key = private_key
+        self.name = name
+
+    def __repr__(self):
+        return f"AlgoUser({self.name or self.address})"
+
+class SmartContractAccount(AlgoUser):
+    """The account of the application ``app_id``."""
+    def __init__(self, app_id):
+        super().__init__(algosdk.logic.get_application_address(app_id))
+        self.app_id = app_id
+
+class MultisigAccount(AlgoUser):
+    """A multi-signature account of the ``owner_accounts``."""
+    def __init__(self, version, threshold, owner_accounts):
+        self.attributes = transaction.Multisig(version, threshold, [owner.address for owner in owner_accounts])
+        self.owner_accounts = owner_accounts
+        super().__init__(self.attributes.address())
+
+TxnElem = namedtuple("TxnElem", ["txn", "signer"])
+
+_txn_elems_context = []
+
+class TxnElemsContext:
+    """Inside this context the transaction functions return ``TxnElem`` objects instead of sending."""
+    def __enter__(self):
+        _txn_elems_context.append(True)
+        return self
+
+    def __exit__(self, *exc_info):
+        _txn_elems_context.pop()
+
+def _client():
+    return algod_connection.algod_client()
+
+def _address(account):
+    if account is None:
+        return None
+    return account if isinstance(account, str) else account.address
+
+def _single_signer(account):
+    signer = AccountTransactionSigner(account.private_key)
+
+    def sign(txn):
+        return signer.sign_transactions([txn], [0])[0]
+    return sign
+
+def _send(signed_txns):
+    client = _client()
+    client.send_transactions(signed_txns)
+    info = wait_for_confirmation(signed_txns[0], 10)
+    # Let the next transactions be valid from the round this one moved the ledger to
+    params_cache.shared_params_cache().observe(info["confirmed-round"])
+    return info
+
+def _dispatch(txn, sender):
+    """Return a ``TxnElem`` inside a ``TxnElemsContext``, otherwise sign, send and confirm ``txn``."""
+    signer = _single_signer(sender) if getattr(sender, "private_key", None) else None
+    if _txn_elems_context:
+        return TxnElem(txn, signer)
+    return _send([signer(txn)])
+
+def suggested_params(flat_fee=False, fee=None):
+    return params_cache.suggested_params(flat_fee=flat_fee, fee=fee)
+
+def _params(params):
+    return params if params is not None else suggested_params()
+
+def create_app(owner, approval_program, clear_program, local_bytes=0, local_ints=0, global_bytes=0, global_ints=0, app_args=None, extra_pages=0, version=5, params=None):
+    client = _client()
+    approval = client.compile(compileTeal(approval_program, mode=Mode.Application, version=version))
+    clear = client.compile(compileTeal(clear_program, mode=Mode.Application, version=version))
+    txn = transaction.ApplicationCreateTxn(
+        sender=owner.address,
+        sp=_params(params),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=algosdk.encoding.base64.b64decode(approval["result"]),
+        clear_program=algosdk.encoding.base64.b64decode(clear["result"]),
+        global_schema=transaction.StateSchema(global_ints, global_bytes),
+        local_schema=transaction.StateSchema(local_ints, local_bytes),
+        app_args=app_args,
+        extra_pages=extra_pages,
+    )
+    return _dispatch(txn, owner)["application-index"]
+
+def call_app(sender, app_id, on_complete=transaction.OnComplete.NoOpOC, app_args=None, accounts=None, foreign_apps=None, foreign_assets=None, boxes=None, params=None):
+    txn = transaction.ApplicationCallTxn(
+        sender=sender.address,
+        sp=_params(params),
+        index=app_id,
+        on_complete=on_complete,
+        app_args=app_args,
+        accounts=[_address(account) for account in accounts] if accounts else None,
+        foreign_apps=foreign_apps,
+        foreign_assets=foreign_assets,
+        boxes=boxes,
+    )
+    return _dispatch(txn, sender)
+
+def delete_app(owner, app_id, params=None):
+    txn = transaction.ApplicationDeleteTxn(owner.address, _params(params), app_id)
+    return _dispatch(txn, owner)
+
+def destroy_asset(sender, asset_id, params=None):
+    txn = transaction.AssetConfigTxn(sender.address, _params(params), index=asset_id, strict_empty_address_check=False)
+    return _dispatch(txn, sender)
+
+@contextmanager
+def create_asset(sender, manager, reserve, freeze, clawback, asset_name, total, decimals, unit_name, default_frozen, url=None, metadata_hash=None, params=None):
+    """Create an asset and destroy it when the context exits."""
+    txn = transaction.AssetConfigTxn(
+        sender=sender.address,
+        sp=_params(params),
+        total=total,
+        default_frozen=default_frozen,
+        unit_name=unit_name,
+        asset_name=asset_name,
+        manager=_address(manager),
+        reserve=_address(reserve),
+        freeze=_address(freeze),
+        clawback=_address(clawback),
+        url=url,
+        metadata_hash=metadata_hash,
+        decimals=decimals,
+        strict_empty_address_check=False,
+    )
+    asset_id = _send([_single_signer(sender)(txn)])["asset-index"]
+
+    yield asset_id
+
+    destroy_asset(sender, asset_id)
+
+def update_asset(sender, asset_id, manager, reserve, freeze, clawback, params=None):
+    txn = transaction.AssetConfigTxn(
+        sender=sender.address,
+        sp=_params(params),
+        index=asset_id,
+        manager=_address(manager),
+        reserve=_address(reserve),
+        freeze=_address(freeze),
+        clawback=_address(clawback),
+        strict_empty_address_check=False,
+    )
+    return _dispatch(txn, sender)
+
+def freeze_asset(sender, target, new_freeze_state, asset_id, params=None):
+    txn = transaction.AssetFreezeTxn(sender.address, _params(params), asset_id, _address(target), new_freeze_state)
+    return _dispatch(txn, sender)
+
+def transfer_asset(sender, receiver, amount, asset_id, revocation_target=None, close_assets_to=None, params=None):
+    txn = transaction.AssetTransferTxn(
+        sender=sender.address,
+        sp=_params(params),
+        receiver=_address(receiver),
+        amt=amount,
+        index=asset_id,
+        close_assets_to=_address(close_assets_to),
+        revocation_target=_address(revocation_target),
+    )
+    return _dispatch(txn, sender)
+
+def opt_in_asset(sender, asset_id, params=None):
+    return transfer_asset(sender, sender, 0, asset_id, params=params)
+
+def close_out_asset(sender, asset_id, receiver, params=None):
+    return transfer_asset(sender, receiver, 0, asset_id, close_assets_to=receiver, params=params)
+
+def payment_transaction(sender, receiver, amount, note=None, close_remainder_to=None, params=None):
+    txn = transaction.PaymentTxn(
+        sender=sender.address,
+        sp=_params(params),
+        receiver=_address(receiver),
+        amt=amount,
+        close_remainder_to=_address(close_remainder_to),
+        note=note,
+    )
+    return _dispatch(txn, sender)
+
+def multisig_transaction(multisig_account, transaction, signing_accounts):
+    def sign(txn):
+        # The transaction is serialized once for all of the signing accounts
+        entry = MultisigEntry(txn, multisig_account.attributes, [account.private_key for account in signing_accounts])
+        return sign_multisig_groups([[entry]])[0][0]
+
+    if _txn_elems_context:
+        return TxnElem(transaction.txn, sign)
+    return _send([sign(transaction.txn)])
+
+def group_transaction(*transactions):
+    txns = transaction.assign_group_id([elem.txn for elem in transactions])
+    return _send([elem.signer(txn) for elem, txn in zip(transactions, txns)])
+
+def asset_balance(account, asset_id):
+    """Return the balance of ``asset_id`` held by ``account`` or ``None`` if it has not opted in."""
+    try:
+        info = _client().account_asset_info(_address(account), asset_id)
+    except algosdk.error.AlgodHTTPError:
+        return None
+    return info["asset-holding"]["amount"]
+
+def asset_info(asset_id):
+    """Return the asset ``asset_id`` in the format of the indexer, with cleared addresses as the zero address."""
+    info = _client().asset_info(asset_id)
+    params = dict(info["params"])
+    for role in ("manager", "reserve", "freeze", "clawback"):
+        params.setdefault(role, algosdk.constants.ZERO_ADDRESS)
+    return {"asset": {"index": asset_id, "params": params}}
+
+def application_global_state(app_id, address_fields=None):
+    """Return the global state of ``app_id``, decoding the keys in ``address_fields`` as addresses."""
+    address_fields = address_fields or []
+    state = {}
+    for entry in _client().application_info(app_id)["params"].get("global-state", []):
+        key = algosdk.encoding.base64.b64decode(entry["key"]).decode()
+        value = entry["value"]
+        if value["type"] == 2:
+            state[key] = value["uint"]
+            continue
+        raw = algosdk.encoding.base64.b64decode(value["bytes"])
+        state[key] = algosdk.encoding.encode_address(raw) if key in address_fields else raw
+    return state
+
+def install():
+    """Make ``import algopytest`` resolve to this module."""
+    sys.modules["algopytest"] = sys.modules[__name__]
+
+def _new_user(name):
+    private_key, address = algosdk.account.generate_account()
+    return AlgoUser(address, private_key, name)
+
+# The accounts provided by the `algopytest` plugin
+
+@pytest.fixture(scope="session")
+def owner():
+    return _new_user("owner")
+
+@pytest.fixture(scope="session")
+def user1():
+    return _new_user("user1")
+
+@pytest.fixture(scope="session")
+def user2():
+    return _new_user("user2")
+
+@pytest.fixture(scope="session")
+def user3():
+    return _new_user("user3")
+
+@pytest.fixture(scope="session")
+def user4():
+    return _new_user("user4")
+
+@pytest.fixture(scope="session", autouse=True)
+def sim_ledger(owner, user1, user2, user3, user4):
+    """Give the session a ledger in which its accounts are funded."""
+    ledger = Ledger({user.address: INITIAL_FUNDS for user in (owner, user1, user2, user3, user4)})
+    algod_connection.set_algod_client(SimAlgodClient(ledger))
+    yield ledger
+    algod_connection.set_algod_client(None)
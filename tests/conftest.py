@@ -1,6 +1,40 @@
+import importlib.util
+import os
+import sys
+
 import algosdk
+import algosdk.atomic_transaction_composer
 import pytest
 from pytest import fixture
+
+def _selected_ledger():
+    """Return the ledger backend chosen with ``--ledger`` or ``WIZCOIN_LEDGER``.
+
+    The choice has to be known before ``algopytest`` is imported below, which
+    is earlier than pytest parses the command line options. Without a choice,
+    the suite runs against a node, or against the simulator when ``algopytest``
+    is not installed.
+    """
+    for index, arg in enumerate(sys.argv):
+        if arg.startswith("--ledger="):
+            return arg.split("=", 1)[1]
+        if arg == "--ledger" and index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    default = "node" if importlib.util.find_spec("algopytest") is not None else "sim"
+    return os.environ.get("WIZCOIN_LEDGER", default)
+
+LEDGER = _selected_ledger()
+
+# Profiles the node interactions of the suite with `--algod-profile`
+pytest_plugins = ["algod_profiling"]
+
+if LEDGER == "sim":
+    import algopytest_sim
+    algopytest_sim.install()
+
+    # Provide the accounts of the `algopytest` plugin along with the ledger of the session
+    from algopytest_sim import owner, user1, user2, user3, user4, sim_ledger
+
 from algopytest import (
     AlgoUser,
     SmartContractAccount,
@@ -8,11 +42,9 @@ from algopytest import (
     create_app,
     call_app,
     delete_app,
-    create_asset,
     destroy_asset,    
     transfer_asset,
     update_asset,
-    suggested_params,
     payment_transaction,
     opt_in_asset,
     close_out_asset,
@@ -21,51 +53,168 @@ from algopytest import (
     TxnElemsContext,
 )
 
+from account_pool import AccountPool
+from algod_connection import algod_client
+from compile_cache import compile_program
+from confirmations import shared_confirmations, wait_for_confirmation
+from fee_planner import method_fee, pool_fees
+from member_registry import MAX_BATCH_SIZE, MEMBER_BOX_MIN_BALANCE, member_box, registered_members
+from method_dispatch import selector
+from params_cache import shared_params_cache, suggested_params
+from teardown_scheduler import TeardownScheduler
+from templates import compile_template
 from wizcoin_smart_contract import wizcoin_membership
 from clear_program import clear_program
 
 pytest.TMPL_MAX_WIZCOINS = 400
 pytest.TMPL_REGISTRATION_AMOUNT = 50_000_000
 
-@fixture
-def wizcoin_asset_id(owner):
+def pytest_addoption(parser):
+    parser.addoption(
+        "--ledger",
+        choices=["node", "sim"],
+        default=LEDGER,
+        help="Run against a real algod node or the in-process ledger simulator.",
+    )
+
+def deployment_scope(fixture_name, config):
+    """Share the WizCoin deployment across the session when its ledger is restored after every test.
+
+    A node cannot be rolled back, so there every test deploys its own.
+    """
+    return "session" if config.getoption("--ledger") == "sim" else "function"
+
+@fixture(scope="session", autouse=True)
+def program_cache_dir(tmp_path_factory):
+    """Keep the compiled programs of the session out of the user's cache, unless ``WIZCOIN_CACHE_DIR`` is set."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        if not os.environ.get("WIZCOIN_CACHE_DIR"):
+            monkeypatch.setenv("WIZCOIN_CACHE_DIR", str(tmp_path_factory.mktemp("teal")))
+        yield os.environ["WIZCOIN_CACHE_DIR"]
+
+@fixture(autouse=True)
+def ledger_checkpoint(request):
+    """Under the simulator, roll the ledger back after every test to the state right after the deployment."""
+    if LEDGER != "sim":
+        yield
+        return
+
+    ledger = request.getfixturevalue("sim_ledger")
+    request.getfixturevalue("account_pool")
+    request.getfixturevalue("smart_contract_id")
+    snapshot = ledger.snapshot()
+    yield
+    ledger.restore(snapshot)
+    # The rounds of the test are undone along with its transactions
+    shared_params_cache().reset()
+    shared_confirmations().reset()
+
+@fixture(scope="session", autouse=True)
+def params_follower():
+    """On a node, keep the shared suggested parameters valid by following its rounds.
+
+    The simulator has no rounds to wait for: the helpers report the round of
+    every transaction they confirm instead.
+    """
+    if LEDGER == "sim":
+        yield
+        return
+
+    cache = shared_params_cache()
+    cache.start()
+    yield
+    cache.stop()
+
+@fixture(scope=deployment_scope)
+def teardown_scheduler():
+    """Collect the cleanup of the fixtures set up after this one and submit it in batched atomic groups."""
+    scheduler = TeardownScheduler()
+    yield scheduler
+    scheduler.run()
+
+def _send_and_confirm(owner, txn):
+    """Sign ``txn`` as ``owner`` and return its pending transaction info once confirmed."""
+    client = algod_client()
+    signer = algosdk.atomic_transaction_composer.AccountTransactionSigner(owner.private_key)
+    signed = signer.sign_transactions([txn], [0])[0]
+    client.send_transaction(signed)
+
+    info = wait_for_confirmation(signed, 10)
+    shared_params_cache().observe(info["confirmed-round"])
+    return info
+
+@fixture(scope=deployment_scope)
+def wizcoin_asset_id(owner, teardown_scheduler):
     # Create the WizCoin asset
-    with create_asset(
-        sender=owner,
-        manager=owner,
-        reserve=owner,
-        freeze=owner,
-        clawback=owner,
-        asset_name="WizCoin",
+    txn = algosdk.transaction.AssetConfigTxn(
+        sender=owner.address,
+        sp=suggested_params(),
         total=pytest.TMPL_MAX_WIZCOINS,
-        decimals=0,
-        unit_name="WizToken",
         default_frozen=False,
-    ) as asset_id:
-        yield asset_id
+        unit_name="WizToken",
+        asset_name="WizCoin",
+        manager=owner.address,
+        reserve=owner.address,
+        freeze=owner.address,
+        clawback=owner.address,
+        decimals=0,
+    )
+    asset_id = _send_and_confirm(owner, txn)["asset-index"]
+
+    # Destroyed last, once every holding of it has been returned
+    teardown_scheduler.add(lambda: [destroy_asset(owner, asset_id)], "destroy WizCoin")
+    return asset_id
+
+def create_cached_app(owner, approval_program, clear_program, global_bytes=0, global_ints=0, app_args=None, version=8, template_values=None):
+    """Create an application from the programs built by ``approval_program`` and ``clear_program``.
+
+    The programs are looked up in the compile cache, so an unchanged smart contract
+    skips both the PyTEAL build and the algod compile round trip. The ``TMPL_``
+    placeholders of the approval program are patched in from ``template_values``.
+    """
+    client = algod_client()
+    approval = compile_template(approval_program, client, version=version).instantiate(**(template_values or {}))
+    clear = compile_program(clear_program, version=version, algod_client=client)
+
+    txn = algosdk.transaction.ApplicationCreateTxn(
+        sender=owner.address,
+        sp=suggested_params(),
+        on_complete=algosdk.transaction.OnComplete.NoOpOC,
+        approval_program=approval.bytecode,
+        clear_program=clear.bytecode,
+        global_schema=algosdk.transaction.StateSchema(global_ints, global_bytes),
+        local_schema=algosdk.transaction.StateSchema(0, 0),
+        app_args=app_args,
+    )
+    return _send_and_confirm(owner, txn)["application-index"]
     
-@fixture
-def smart_contract_id(owner, wizcoin_asset_id):
-    app_id = create_app(
+@fixture(scope=deployment_scope)
+def smart_contract_id(owner, wizcoin_asset_id, teardown_scheduler):
+    app_id = create_cached_app(
         owner,
-        approval_program=wizcoin_membership(), 
-        clear_program=clear_program(),
+        approval_program=wizcoin_membership,
+        clear_program=clear_program,
         global_bytes=1,
         global_ints=1,
         app_args=[wizcoin_asset_id],
-        version=6,
+        version=8,
+        template_values={
+            "TMPL_AMOUNT": pytest.TMPL_REGISTRATION_AMOUNT,
+        },
     )
 
-    # Twice the minimum fee to also cover the transaction fee of the ASA transfer inner transaction
-    params = suggested_params(flat_fee=True, fee=2000)
+    # The fee of the call also covers the opt-in inner transaction
+    params = suggested_params(flat_fee=True, fee=method_fee("opt_in_wizcoin"))
     smart_contract_account = SmartContractAccount(app_id)
         
     # Raise the minimum balance of the smart contract, in order to even be able to
-    # opt-in to the WizCoin ASA. The minimum balance is 200000 microAlgos.
+    # opt-in to the WizCoin ASA. The minimum balance is 200000 microAlgos. The
+    # registry boxes of the first members are paid for ahead of their payments,
+    # which the application call writing the boxes comes before.
     payment_transaction(
         sender=owner,
         receiver=smart_contract_account,
-        amount=200000,
+        amount=200000 + MAX_BATCH_SIZE * MEMBER_BOX_MIN_BALANCE,
     )
         
     # Opt in the smart contract to the WizCoin ASA via an application call. This application
@@ -73,7 +222,7 @@ def smart_contract_id(owner, wizcoin_asset_id):
     call_app(
         sender=owner,
         app_id=app_id,
-        app_args=["opt_in_wizcoin"],
+        app_args=[selector("opt_in_wizcoin")],
         foreign_assets=[wizcoin_asset_id],
         params=params,
     )
@@ -96,44 +245,87 @@ def smart_contract_id(owner, wizcoin_asset_id):
         freeze=owner,
         clawback=owner,
     )
-        
-    yield app_id
 
-    # Relinquish all of the WizCoins back to the manager, so that that manager can destroy the WizCoin ASA
-    call_app(
-        sender=owner,
-        app_id=app_id,
-        app_args=["relinquish_wizcoins"],
-        accounts=[smart_contract_account],            
-        foreign_assets=[wizcoin_asset_id],
-        params=params,
-    )
+    # Remove the members left in the registry, which returns the minimum balance
+    # of their boxes, then relinquish all of the WizCoins back to the manager,
+    # so that that manager can destroy the WizCoin ASA
+    def unregister_calls():
+        members = registered_members(app_id)
+        return [
+            call_app(
+                sender=owner,
+                app_id=app_id,
+                app_args=[selector("unregister_members")],
+                accounts=[AlgoUser(address) for address in batch],
+                foreign_assets=[wizcoin_asset_id],
+                boxes=[member_box(address) for address in batch],
+                params=suggested_params(flat_fee=True, fee=method_fee("unregister_members")),
+            )
+            for batch in (members[start:start + MAX_BATCH_SIZE] for start in range(0, len(members), MAX_BATCH_SIZE))
+        ]
 
-    delete_app(owner, app_id)
+    teardown_scheduler.add(
+        lambda: unregister_calls() + [
+            call_app(
+                sender=owner,
+                app_id=app_id,
+                app_args=[selector("relinquish_wizcoins")],
+                accounts=[smart_contract_account],
+                foreign_assets=[wizcoin_asset_id],
+                params=suggested_params(flat_fee=True, fee=method_fee("relinquish_wizcoins")),
+            ),
+            delete_app(owner, app_id),
+        ],
+        "unregister the members, relinquish WizCoins and delete the application",
+    )
+        
+    return app_id
 
-def opt_in_user(owner, user, wizcoin_asset_id):
+def opt_in_user(owner, user, wizcoin_asset_id, teardown_scheduler):
     """Opt-in the ``user`` to the ``wizcoin_asset_id`` ASA."""
     opt_in_asset(user, wizcoin_asset_id)
+
+    # Clean up by closing out of WizCoin and sending the remaining balance to `owner`,
+    # unless the ledger is rolled back anyway
+    if LEDGER != "sim":
+        teardown_scheduler.add(lambda: [close_out_asset(user, wizcoin_asset_id, owner)], f"close out {user.name}")
     
     # The test runs here    
     yield user
     
-    # Clean up by closing out of WizCoin and sending the remaining balance to `owner`    
-    close_out_asset(user, wizcoin_asset_id, owner)
-    
+@fixture(scope="session")
+def account_pool(owner):
+    """Return the funded shard of pool accounts of this pytest-xdist worker, closed out at the end of the session."""
+    pool = AccountPool(owner)
+    pool.fund()
+    yield pool
+    # The simulated ledger is gone along with the session
+    if LEDGER != "sim":
+        pool.close()
+
 @fixture
-def user1_in(owner, user1, wizcoin_asset_id):
-    """Create a ``user1`` fixture that has already opted in to ``wizcoin_asset_id``."""
-    yield from opt_in_user(owner, user1, wizcoin_asset_id)
+def user1_in(owner, account_pool, wizcoin_asset_id, teardown_scheduler):
+    """Create a ``user1`` fixture from the account pool that has already opted in to ``wizcoin_asset_id``."""
+    with account_pool.account("user1") as user1:
+        yield from opt_in_user(owner, user1, wizcoin_asset_id, teardown_scheduler)
 
 @fixture
-def user2_in(owner, user2, wizcoin_asset_id):
-    """Create a ``user2`` fixture that has already opted in to ``wizcoin_asset_id``."""
-    yield from opt_in_user(owner, user2, wizcoin_asset_id)
+def user2_in(owner, account_pool, wizcoin_asset_id, teardown_scheduler):
+    """Create a ``user2`` fixture from the account pool that has already opted in to ``wizcoin_asset_id``."""
+    with account_pool.account("user2") as user2:
+        yield from opt_in_user(owner, user2, wizcoin_asset_id, teardown_scheduler)
 
 @fixture
-def multisig_account_in(owner, user3, user4, wizcoin_asset_id):
-    """Create a multisig account with owners ``user3`` and ``user4`` that is opted in to ``wizcoin_asset_id``."""
+def multisig_account_in(owner, account_pool, wizcoin_asset_id, teardown_scheduler):
+    """Create a multisig account with owners ``user3`` and ``user4`` that is opted in to ``wizcoin_asset_id``.
+
+    Both owners are drawn from the account pool.
+    """
+    with account_pool.account("user3") as user3, account_pool.account("user4") as user4:
+        yield from opt_in_multisig(owner, user3, user4, wizcoin_asset_id, teardown_scheduler)
+
+def opt_in_multisig(owner, user3, user4, wizcoin_asset_id, teardown_scheduler):
+    """Opt-in a multisig account of ``user3`` and ``user4`` to the ``wizcoin_asset_id`` ASA."""
     signing_accounts = [user3, user4]
     multisig_account = MultisigAccount(
         version=1,
@@ -148,6 +340,26 @@ def multisig_account_in(owner, user3, user4, wizcoin_asset_id):
         amount=100_000_000,
     )
 
+    # The ledger is rolled back to before the account was funded under the simulator
+    cleanup = LEDGER != "sim"
+    if cleanup:
+        # Return the remaining balance of `multisig_account` back to `user3`, once it has opted out
+        teardown_scheduler.add(
+            lambda: [
+                multisig_transaction(
+                    multisig_account=multisig_account,
+                    transaction=payment_transaction(
+                        sender=multisig_account,
+                        receiver=user3,
+                        amount=0,
+                        close_remainder_to=user3,
+                    ),
+                    signing_accounts=signing_accounts,
+                ),
+            ],
+            "close the multisig account",
+        )
+
     # Opt the `multisig_account` into the `wizcoin_asset_id`
     with TxnElemsContext():
         opt_in_txn = opt_in_asset(multisig_account, wizcoin_asset_id)
@@ -158,59 +370,47 @@ def multisig_account_in(owner, user3, user4, wizcoin_asset_id):
         signing_accounts=signing_accounts,
     )
 
-    yield multisig_account
-
-    # Opt the `multisig_account` out of the `wizcoin_asset_id`
-    with TxnElemsContext():
-        close_out_txn = close_out_asset(multisig_account, wizcoin_asset_id, owner)
-    
-    multisig_transaction(
-        multisig_account=multisig_account,
-        transaction=close_out_txn,
-        signing_accounts=signing_accounts,
-    )
-
-    # Return the remaining balance of `multisig_account` back to `user3`
-    with TxnElemsContext():
-        payment_txn = payment_transaction(
-            sender=multisig_account,
-            receiver=user3,
-            amount=0,
-            close_remainder_to=user3,
+    if cleanup:
+        # Opt the `multisig_account` out of the `wizcoin_asset_id`
+        teardown_scheduler.add(
+            lambda: [
+                multisig_transaction(
+                    multisig_account=multisig_account,
+                    transaction=close_out_asset(multisig_account, wizcoin_asset_id, owner),
+                    signing_accounts=signing_accounts,
+                ),
+            ],
+            "close out the multisig account",
         )
+
+    yield multisig_account
     
-    multisig_transaction(
-        multisig_account=multisig_account,        
-        transaction=payment_txn,
-        signing_accounts=signing_accounts,
-    )
-    
-@fixture
+@fixture(scope=deployment_scope)
 def smart_contract_account(smart_contract_id):
     """Return an ``SmartContractAccount`` representing the address of the ``smart_contract_id``."""
     return SmartContractAccount(smart_contract_id)
     
 def join_member(owner, user_in, smart_contract_account, wizcoin_asset_id, smart_contract_id):
     """Grant the ``user`` membership into WizCoin."""
-    # Twice the minimum fee to also cover the transaction fee of the ASA transfer inner transaction    
-    params = suggested_params(flat_fee=True, fee=2000)
-
     with TxnElemsContext():
         txn0 = call_app(
             sender=user_in,
             app_id=smart_contract_id,
-            app_args=["join_wizcoin"],
+            app_args=[selector("join_wizcoin")],
             accounts=[user_in],
             foreign_assets=[wizcoin_asset_id],
+            boxes=[member_box(user_in.address)],
         )
 
         txn1 = payment_transaction(
             sender=user_in,
             receiver=smart_contract_account,
             amount=pytest.TMPL_REGISTRATION_AMOUNT,
-            params=params, 
         )
-    
+
+    # The application call pays the fees of the group, the ASA transfer inner transaction included
+    pool_fees([txn0.txn, txn1.txn])
+
     # Send the group transaction with the application call and the membership payment
     group_transaction(txn0, txn1)
 
@@ -225,14 +425,12 @@ def user1_member(owner, user1_in, smart_contract_account, wizcoin_asset_id, smar
 @fixture
 def user2_member(owner, user2_in, smart_contract_account, wizcoin_asset_id, smart_contract_id):
     """Create a ``user2_member`` fixture which is already a member of WizCoin."""
-    yield from join_member(owner, user1_in, smart_contract_account, wizcoin_asset_id, smart_contract_id)    
+    yield from join_member(owner, user2_in, smart_contract_account, wizcoin_asset_id, smart_contract_id)    
 
 @fixture
-def multisig_account_member(owner, multisig_account_in, user3, user4, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+def multisig_account_member(owner, multisig_account_in, smart_contract_account, wizcoin_asset_id, smart_contract_id):
     """Create a ``multisig_account_member`` fixture which is already a member of WizCoin."""
-    # Twice the minimum fee to also cover the transaction fee of the ASA transfer inner transaction
-    params = suggested_params(flat_fee=True, fee=2000)
-    signing_accounts = [user3, user4]
+    signing_accounts = multisig_account_in.owner_accounts
 
     with TxnElemsContext():
         # Create a multisig transaction which calls the application on behalf of the multi-signature account
@@ -241,9 +439,10 @@ def multisig_account_member(owner, multisig_account_in, user3, user4, smart_cont
             transaction=call_app(
                 sender=multisig_account_in,
                 app_id=smart_contract_id,
-                app_args=["join_wizcoin"],
+                app_args=[selector("join_wizcoin")],
                 accounts=[multisig_account_in],
-                foreign_assets=[wizcoin_asset_id],            
+                foreign_assets=[wizcoin_asset_id],
+                boxes=[member_box(multisig_account_in.address)],
             ),
             signing_accounts=signing_accounts,
         )
@@ -255,11 +454,13 @@ def multisig_account_member(owner, multisig_account_in, user3, user4, smart_cont
                 sender=multisig_account_in,
                 receiver=smart_contract_account,
                 amount=pytest.TMPL_REGISTRATION_AMOUNT,
-                params=params,
             ),
             signing_accounts=signing_accounts,
         )
-    
+
+    # The application call pays the fees of the group, the ASA transfer inner transaction included
+    pool_fees([txn0.txn, txn1.txn])
+
     # Send the group transaction with the application call and the membership payment
     group_transaction(txn0, txn1)
 
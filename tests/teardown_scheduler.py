@@ -0,0 +1,102 @@
+"""Tear the fixtures of a test down in as few atomic groups as possible.
+
+Cleaning up after a test, e.g. closing out its users, relinquishing the
+WizCoins and deleting the application, took a transaction and a round per
+step. Instead, the fixtures ``add`` their cleanup to a ``TeardownScheduler``
+as they are set up, and ``run`` submits all of it at once when the scheduler
+itself is torn down.
+
+A unit of cleanup builds the transactions undoing one fixture, in their
+order. The units run in the reverse order they were added, just like pytest
+tears fixtures down, so that e.g. the WizCoin ASA is only destroyed after
+every holding of it has been closed out. Since the transactions of an atomic
+group are applied in order, whole units are packed into groups of up to
+``MAX_GROUP_SIZE`` transactions and every group costs a single round.
+
+A test failing midway can leave the ledger in a state some cleanup no longer
+applies to, e.g. an account which already closed out. One failing unit
+rejects its whole group, so the units of a rejected group are retried one at
+a time, each built again for a group of its own, and the cleanup carries on
+past the units which fail. The failures are raised together as a
+``TeardownError`` once everything else has been cleaned up.
+"""
+from algosdk import constants
+
+from algopytest import TxnElemsContext, group_transaction
+
+# The transactions of an atomic group
+MAX_GROUP_SIZE = constants.tx_group_limit
+
+class TeardownError(Exception):
+    """Some of the cleanup failed; ``failures`` lists the ``(name, exception)`` of each failed step."""
+    def __init__(self, failures):
+        super().__init__("teardown failed: " + "; ".join(f"{name}: {error}" for name, error in failures))
+        self.failures = failures
+
+class TeardownScheduler:
+    """Collects the cleanup of fixtures and runs it in batched atomic groups."""
+    def __init__(self):
+        self.units = []
+
+    def add(self, build, name):
+        """Schedule the cleanup ``build``, which returns the ``TxnElem`` of its transactions in order.
+
+        ``build`` runs inside a ``TxnElemsContext`` at teardown, so it
+        builds the transactions from the state of the ledger at that time.
+        """
+        self.units.append((build, name))
+
+    @staticmethod
+    def _build(build):
+        with TxnElemsContext():
+            return list(build())
+
+    @staticmethod
+    def _submit(elems):
+        """Submit ``elems`` in as few groups as they fit in."""
+        for start in range(0, len(elems), MAX_GROUP_SIZE):
+            group_transaction(*elems[start:start + MAX_GROUP_SIZE])
+
+    def _groups(self, failures):
+        """Return every unit, newest first, with its transactions, packed into groups of ``(build, name, elems)``.
+
+        A unit is never split across groups, unless it does not fit in one on its own.
+        """
+        groups = [[]]
+        size = 0
+        for build, name in reversed(self.units):
+            try:
+                elems = self._build(build)
+            except Exception as e:
+                failures.append((name, e))
+                continue
+            if size + len(elems) > MAX_GROUP_SIZE and groups[-1]:
+                groups.append([])
+                size = 0
+            groups[-1].append((build, name, elems))
+            size += len(elems)
+        return [group for group in groups if group]
+
+    def run(self):
+        """Submit all of the scheduled cleanup, raising a ``TeardownError`` for whatever failed."""
+        failures = []
+        groups = self._groups(failures)
+        self.units = []
+
+        for group in groups:
+            try:
+                self._submit([elem for _, _, elems in group for elem in elems])
+                continue
+            except Exception:
+                pass
+
+            # Apply whatever cleanup still applies, with transactions built anew
+            # for groups, fees and validity of their own
+            for build, name, _ in group:
+                try:
+                    self._submit(self._build(build))
+                except Exception as e:
+                    failures.append((name, e))
+
+        if failures:
+            raise TeardownError(failures)
@@ -0,0 +1,65 @@
+from algopytest import AlgoUser, payment_transaction
+
+import algod_connection
+from account_pool import AccountPool, pool_seed
+
+def test_worker_shards_are_disjoint(owner):
+    shards = [AccountPool(owner, size=8, worker=worker, workers=3, seed="run") for worker in range(3)]
+    addresses = [{address for _, address in shard.accounts} for shard in shards]
+
+    assert all(len(shard) == 8 for shard in addresses)
+    assert not (addresses[0] & addresses[1] or addresses[0] & addresses[2] or addresses[1] & addresses[2])
+
+    # Every worker of the run derives the same accounts
+    assert shards[1].accounts == AccountPool(owner, size=8, worker=1, workers=3, seed="run").accounts
+
+def test_pool_is_funded_and_recycled(owner):
+    pool = AccountPool(owner, size=20, funds=1_000_000, seed="funded")
+    pool.fund()
+
+    client = algod_connection.algod_client()
+    assert all(client.account_info(address)["amount"] == 1_000_000 for _, address in pool.accounts)
+
+    with pool.account("first") as first:
+        assert isinstance(first, AlgoUser)
+        second = pool.acquire("second")
+        assert second.address != first.address
+    pool.release(second)
+
+    # Released accounts return to the back of the pool
+    assert list(pool.free)[-2:] == [(first.private_key, first.address), (second.private_key, second.address)]
+
+def test_pool_is_topped_up_and_closed_out(owner):
+    pool = AccountPool(owner, size=2, funds=1_000_000, seed="closed")
+    pool.fund()
+    client = algod_connection.algod_client()
+    funder_balance = client.account_info(owner.address)["amount"]
+
+    # The fees spent while holding an account are made up for on its next acquisition
+    with pool.account("spender") as spender:
+        payment_transaction(sender=spender, receiver=owner, amount=300_000)
+    assert client.account_info(spender.address)["amount"] < 1_000_000
+    with pool.account("spender") as spender:
+        assert client.account_info(spender.address)["amount"] == 1_000_000
+
+    # A second funding of the same accounts only tops them up
+    pool.fund()
+    assert all(client.account_info(address)["amount"] == 1_000_000 for _, address in pool.accounts)
+
+    pool.close()
+    assert all(client.account_info(address)["amount"] == 0 for _, address in pool.accounts)
+    # Nothing was lost but the fees
+    assert client.account_info(owner.address)["amount"] > funder_balance
+
+def test_pool_seed_is_random_and_kept(tmp_path, monkeypatch):
+    monkeypatch.delenv("WIZCOIN_POOL_SEED", raising=False)
+    path = tmp_path / "seed"
+
+    seed = pool_seed(path)
+    # Generated on first use, readable by its owner only, and the same on every use after
+    assert len(seed) == 64 and (path.stat().st_mode & 0o777) == 0o600
+    assert pool_seed(path) == seed
+    assert pool_seed(tmp_path / "other") != seed
+
+    monkeypatch.setenv("WIZCOIN_POOL_SEED", "from the environment")
+    assert pool_seed(path) == "from the environment"
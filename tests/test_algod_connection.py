@@ -0,0 +1,69 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from algosdk import error
+
+from algod_connection import PooledAlgodClient
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        if self.path == "/node/v2/status":
+            status, body = 200, {"last-round": 7}
+        else:
+            status, body = 404, {"message": "not found"}
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_requests_reuse_a_connection(server):
+    client = PooledAlgodClient("a" * 64, f"http://127.0.0.1:{server.server_port}/node")
+
+    for _ in range(5):
+        assert client.status() == {"last-round": 7}
+    assert client.connections == server.connections == 1
+
+def test_threads_share_the_pooled_connections(server):
+    client = PooledAlgodClient("a" * 64, f"http://127.0.0.1:{server.server_port}/node", max_connections=4)
+
+    with ThreadPoolExecutor(4) as threads:
+        rounds = list(threads.map(lambda _: client.status()["last-round"], range(40)))
+    assert rounds == [7] * 40
+    assert client.connections == server.connections <= 4
+
+def test_errors_are_raised_as_algod_errors(server):
+    client = PooledAlgodClient("a" * 64, f"http://127.0.0.1:{server.server_port}/node")
+
+    with pytest.raises(error.AlgodHTTPError, match="not found") as e:
+        client.block_info(1)
+    assert e.value.code == 404
+    # The connection stays alive after an error response
+    assert client.status() == {"last-round": 7}
+    assert server.connections == 1
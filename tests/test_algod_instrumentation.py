@@ -0,0 +1,76 @@
+import algosdk
+from algosdk import transaction
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+
+import algod_instrumentation
+from ledger_sim import Ledger, SimAlgodClient
+
+def test_records_calls_per_scope():
+    private_key, address = algosdk.account.generate_account()
+    client = SimAlgodClient(Ledger({address: 10_000_000}))
+
+    previous = algod_instrumentation.active()
+    recorder = algod_instrumentation.instrument()
+    try:
+        with recorder.scope("fixture funded"):
+            txn = transaction.PaymentTxn(address, client.suggested_params(), address, 0)
+            # `send_transaction` sends through `send_transactions`, which is not recorded separately
+            client.send_transaction(AccountTransactionSigner(private_key).sign_transactions([txn], [0])[0])
+        with recorder.scope("test"):
+            client.status_after_block(client.status()["last-round"] + 2)
+    finally:
+        if previous is not None:
+            algod_instrumentation.instrument(previous)
+        else:
+            algod_instrumentation.uninstrument()
+
+    assert [(call.method, call.scope) for call in recorder.calls] == [
+        ("suggested_params", "fixture funded"),
+        ("Transaction.sign", "fixture funded"),
+        ("send_transaction", "fixture funded"),
+        ("status", "test"),
+        ("status_after_block", "test"),
+    ]
+
+    summary = recorder.summary()
+    assert summary["scopes"]["fixture funded"]["count"] == 3
+    assert summary["methods"]["send_transaction"]["bytes_sent"] > 0
+    # From the round of the payment to the one after the block waited for
+    assert summary["methods"]["status_after_block"]["rounds_waited"] == 3
+    assert sum(summary["methods"]["status"]["histogram"]) == 1
+
+    trace = recorder.chrome_trace()["traceEvents"]
+    assert [event["name"] for event in trace] == [call.method for call in recorder.calls]
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in trace)
+
+    # Uninstrumented calls go unrecorded
+    client.status()
+    assert len(recorder.calls) == 5
+
+class _StatusCountingClient(SimAlgodClient):
+    statuses = 0
+
+    def status(self, **kwargs):
+        self.statuses += 1
+        return super().status(**kwargs)
+
+def test_waits_are_measured_without_extra_requests():
+    client = _StatusCountingClient(Ledger({}))
+    start = client.status()["last-round"]
+
+    previous = algod_instrumentation.active()
+    recorder = algod_instrumentation.instrument()
+    try:
+        # Without an earlier status, the wait counts from the round waited after
+        client.status_after_block(start + 1)
+        # The status returned above is where the next wait starts
+        client.status_after_block(start + 4)
+    finally:
+        if previous is not None:
+            algod_instrumentation.instrument(previous)
+        else:
+            algod_instrumentation.uninstrument()
+
+    assert [call.rounds for call in recorder.calls] == [1, 3]
+    # The status read before instrumenting, and the one each wait returns
+    assert client.statuses == 3
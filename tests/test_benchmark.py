@@ -0,0 +1,44 @@
+import copy
+
+import benchmark
+
+def test_benchmark_report():
+    report = benchmark.benchmark(members=16, concurrency=(1, 4), mix_operations=24)
+
+    assert sorted(report["join"]) == ["1", "4"]
+    for metrics in report["join"].values():
+        assert metrics["failure_rate"] == 0
+        # The application call and the payment covering the inner transaction
+        assert metrics["fee_per_member"] == 3000
+        assert metrics["latency_p50"] <= metrics["latency_p90"] <= metrics["latency_p99"]
+
+    assert sorted(report["mix"]) == ["clawback", "freeze", "transfer"]
+    assert 0 < sum(metrics["operations"] for metrics in report["mix"].values()) <= 24
+    for metrics in report["mix"].values():
+        assert metrics["failure_rate"] == 0
+        assert metrics["fee_per_op"] in (None, 1000)
+
+def test_regressions_tolerate_timing_noise():
+    report = benchmark.benchmark(members=8, concurrency=(2,), mix_operations=8)
+    noisy = copy.deepcopy(report)
+    noisy["join"]["2"]["latency_p50"] *= 1.5
+    noisy["join"]["2"]["latency_p99"] *= 10
+    pricier = copy.deepcopy(report)
+    pricier["join"]["2"]["fee_per_member"] += 1000
+
+    assert benchmark.regressions(noisy, report) == []
+    assert benchmark.regressions(pricier, report) == ["join 2: fee_per_member 4000 is worse than baseline 3000"]
+
+def test_regressions_flag_throughput_drops():
+    report = benchmark.benchmark(members=8, concurrency=(2,), mix_operations=8)
+    slower = copy.deepcopy(report)
+    slower["join"]["2"]["joins_per_second"] *= 0.6
+    halved = copy.deepcopy(report)
+    halved["join"]["2"]["joins_per_second"] *= 0.4
+
+    # Within the tolerance, the throughput may drop to half of the baseline
+    assert benchmark.regressions(slower, report) == []
+    assert benchmark.regressions(halved, report) == [
+        f"join 2: joins_per_second {halved['join']['2']['joins_per_second']:.6g} "
+        f"is worse than baseline {report['join']['2']['joins_per_second']:.6g}"
+    ]
@@ -0,0 +1,69 @@
+import asyncio
+
+import algosdk
+
+from algopytest import asset_balance, opt_in_asset, payment_transaction
+
+import algod_connection
+from bulk_join import BulkJoiner, Joiner, bulk_join
+from params_cache import ParamsCache
+
+def test_bulk_join(account_pool, wizcoin_asset_id, smart_contract_id):
+    accounts = [account_pool.acquire(f"joiner {index}") for index in range(12)]
+    try:
+        # Every account but the last one opts in to the WizCoin ASA beforehand
+        for account in accounts[:-1]:
+            opt_in_asset(account, wizcoin_asset_id)
+
+        results = bulk_join(
+            smart_contract_id,
+            wizcoin_asset_id,
+            [Joiner.from_account(account) for account in accounts],
+            max_threads=4,
+        )
+    finally:
+        for account in accounts:
+            account_pool.release(account)
+
+    assert [result.address for result in results] == [account.address for account in accounts]
+    for account, result in zip(accounts[:-1], results):
+        assert result.error is None and result.confirmed_round > 0
+        assert asset_balance(account, wizcoin_asset_id) == 1
+
+    # The failure of one joiner is reported without affecting the others
+    assert isinstance(results[-1].error, algosdk.error.AlgodHTTPError)
+    assert results[-1].confirmed_round is None
+
+def test_bulk_join_accepts_async_streams(account_pool, wizcoin_asset_id, smart_contract_id):
+    with account_pool.account("first") as first, account_pool.account("second") as second:
+        async def joiners():
+            for account in (first, second):
+                opt_in_asset(account, wizcoin_asset_id)
+                yield Joiner.from_account(account)
+
+        results = asyncio.run(BulkJoiner(smart_contract_id, wizcoin_asset_id, max_in_flight=1).join(joiners()))
+
+        assert [result.error for result in results] == [None, None]
+        assert asset_balance(second, wizcoin_asset_id) == 1
+
+def test_bulk_join_builds_each_group_for_its_round(account_pool, wizcoin_asset_id, smart_contract_id):
+    client = algod_connection.algod_client()
+    cache = ParamsCache(client)
+    with account_pool.account("first") as first, account_pool.account("second") as second:
+        async def joiners():
+            opt_in_asset(first, wizcoin_asset_id)
+            yield Joiner.from_account(first)
+            while asset_balance(first, wizcoin_asset_id) == 0:
+                await asyncio.sleep(0.01)
+
+            # The ledger moves on while the stream waits for its next joiner
+            for _ in range(3):
+                payment_transaction(sender=second, receiver=second, amount=0)
+            opt_in_asset(second, wizcoin_asset_id)
+            cache.observe(client.status()["last-round"])
+            yield Joiner.from_account(second)
+
+        results = asyncio.run(BulkJoiner(smart_contract_id, wizcoin_asset_id, params_cache=cache, max_in_flight=1).join(joiners()))
+
+    first_valid = [client.pending_transaction_info(result.txid)["txn"]["txn"]["fv"] for result in results]
+    assert first_valid[1] >= first_valid[0] + 4
@@ -0,0 +1,61 @@
+from pyteal import *
+
+import compile_cache
+from compile_cache import ProgramCache, ast_digest
+from wizcoin_smart_contract import wizcoin_membership
+from clear_program import clear_program
+
+def test_ast_digest_is_stable():
+    # Scratch slots are renumbered, so two separate builds share a digest
+    assert ast_digest(wizcoin_membership()) == ast_digest(wizcoin_membership())
+    assert ast_digest(wizcoin_membership()) != ast_digest(clear_program())
+
+builds = []
+
+def build():
+    builds.append(None)
+    return wizcoin_membership()
+
+def test_cache_hit_skips_build(tmp_path):
+    builds.clear()
+    cache = ProgramCache(str(tmp_path))
+    program = cache.get(build, version=8)
+
+    assert program.teal.startswith("#pragma version 8")
+    assert program.bytecode is None
+    assert len(builds) == 1
+
+    # A second lookup is served from disk with the identical TEAL, without building the program
+    assert cache.get(build, version=8) == program
+    assert len(builds) == 1
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # A different TEAL version is a different entry
+    assert cache.get(build, version=9).teal.startswith("#pragma version 9")
+    assert len(list(tmp_path.iterdir())) == 2
+    assert len(builds) == 2
+
+def test_key_follows_the_sources(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    key = cache.key(wizcoin_membership, Mode.Application, 8, {})
+
+    assert cache.key(wizcoin_membership, Mode.Application, 8, {}) == key
+    assert cache.key(clear_program, Mode.Application, 8, {}) != key
+    assert cache.key(wizcoin_membership, Mode.Application, 8, {"assembleConstants": True}) != key
+
+def test_cache_eviction(tmp_path):
+    cache = ProgramCache(str(tmp_path), max_entries=1)
+    cache.get(wizcoin_membership, version=8)
+    cache.get(clear_program)
+
+    # Only the most recently used entry survives
+    assert len(list(tmp_path.iterdir())) == 1
+    assert "#pragma version 8\nint 1\nreturn" in cache.get(clear_program).teal
+
+def test_default_cache_follows_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("WIZCOIN_CACHE_DIR", str(tmp_path))
+
+    program = compile_cache.compile_program(clear_program)
+    assert program.teal.startswith("#pragma version 8")
+    assert ProgramCache().directory == str(tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+
+from algosdk import logic
+
+import avm
+from compile_cache import ProgramCache
+from compile_programs import ProgramBuilder, local_dependencies
+
+def test_build_writes_the_artifacts(tmp_path):
+    builder = ProgramBuilder(str(tmp_path / "build"), cache=ProgramCache(str(tmp_path / "cache")))
+    builder.build()
+
+    with open(tmp_path / "build" / "manifest.json") as f:
+        manifest = json.load(f)
+    assert sorted(manifest) == ["approval", "clear"]
+    assert manifest["approval"]["template"] == ["TMPL_AMOUNT"]
+    assert manifest["clear"]["template"] == []
+
+    for name, entry in manifest.items():
+        teal = (tmp_path / "build" / f"{name}.teal").read_text()
+        bytecode = (tmp_path / "build" / f"{name}.bin").read_bytes()
+        assert teal.startswith("#pragma version 8")
+        assert entry["version"] == 8
+        assert bytecode == avm.assemble(teal)
+        assert entry["hash"] == logic.address(bytecode)
+        assert json.loads((tmp_path / "build" / f"{name}.map.json").read_text())["version"] == 3
+
+    # The approval program depends on the modules rewriting it, the clear program on none
+    assert {"wizcoin_smart_contract", "method_dispatch", "templates"} <= builder.dependencies["approval"]
+    assert builder.dependencies["clear"] == {"clear_program"}
+
+PROGRAM = '''from pyteal import *
+from {helper} import amount
+
+def program():
+    return Return(Int({value}) == amount())
+'''
+
+def _write_source(path, source, mtime):
+    path.write_text(source)
+    # Source edits within the resolution of the file times still count as changes
+    os.utime(path, ns=(mtime, mtime))
+
+def test_rebuild_only_the_changed_program(tmp_path, monkeypatch):
+    sources = tmp_path / "sources"
+    sources.mkdir()
+    _write_source(sources / "watched_helper.py", "from pyteal import *\n\ndef amount():\n    return Int(1)\n", 1)
+    _write_source(sources / "watched_first.py", PROGRAM.format(helper="watched_helper", value=1), 1)
+    _write_source(sources / "watched_second.py", "from pyteal import *\n\ndef program():\n    return Approve()\n", 1)
+    monkeypatch.syspath_prepend(str(sources))
+    for name in ("watched_helper", "watched_first", "watched_second"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    builder = ProgramBuilder(
+        str(tmp_path / "build"),
+        cache=ProgramCache(str(tmp_path / "cache")),
+        programs={"first": ("watched_first", "program", False), "second": ("watched_second", "program", False)},
+        source_dir=str(sources),
+    )
+    builder.build()
+    assert builder.rebuild() == []
+    assert local_dependencies(sys.modules["watched_first"], str(sources)) == {"watched_first", "watched_helper"}
+
+    # A changed helper rebuilds the program importing from it with the new helper
+    _write_source(sources / "watched_helper.py", "from pyteal import *\n\ndef amount():\n    return Int(2)\n", 2)
+    assert builder.rebuild() == ["first"]
+    assert "int 2" in (tmp_path / "build" / "first.teal").read_text()
+
+    _write_source(sources / "watched_second.py", "from pyteal import *\n\ndef program():\n    return Reject()\n", 3)
+    assert builder.rebuild() == ["second"]
+    assert "int 0" in (tmp_path / "build" / "second.teal").read_text()
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+from collections import Counter
+
+import pytest
+from algosdk import error, transaction
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+
+import algod_connection
+from confirmations import ConfirmationService, TransactionExpiredError
+from params_cache import suggested_params
+
+def _payments(sender, receiver, count):
+    return [transaction.PaymentTxn(sender.address, suggested_params(), receiver.address, amount) for amount in range(count)]
+
+def _signed(sender, txns):
+    return AccountTransactionSigner(sender.private_key).sign_transactions(txns, list(range(len(txns))))
+
+def test_confirmations_of_many_transactions(user1, user2):
+    client = algod_connection.algod_client()
+    service = ConfirmationService(client)
+
+    # Sent in rounds of their own before anyone waits for them
+    *signed, last = _signed(user1, _payments(user1, user2, 6))
+    for stxn in signed:
+        client.send_transaction(stxn)
+
+    futures = [service.submit(stxn, wait_rounds=10) for stxn in signed]
+    rounds = [future.result(timeout=10)["confirmed-round"] for future in futures]
+    assert rounds == sorted(rounds) and len(set(rounds)) == 5
+
+    # A transaction ID alone is found as well
+    txid = client.send_transaction(last)
+    assert service.wait(txid, wait_rounds=10)["confirmed-round"] == client.status()["last-round"]
+
+def test_confirmations_from_coroutines(user1, user2):
+    client = algod_connection.algod_client()
+    service = ConfirmationService(client)
+    signed = _signed(user1, _payments(user1, user2, 3))
+
+    async def send_and_wait(stxn):
+        client.send_transaction(stxn)
+        return await service.wait_async(stxn, wait_rounds=10)
+
+    async def all_of_them():
+        return await asyncio.gather(*(send_and_wait(stxn) for stxn in signed))
+
+    assert all(info["confirmed-round"] > 0 for info in asyncio.run(all_of_them()))
+
+def test_unconfirmed_transactions_fail(user1, user2):
+    service = ConfirmationService(algod_connection.algod_client())
+    expiring, waiting = _payments(user1, user2, 2)
+    expiring.last_valid_round = expiring.first_valid_round + 2
+
+    # Neither is ever sent
+    expired = service.submit(expiring)
+    timed_out = service.submit(waiting.get_txid(), wait_rounds=3)
+
+    with pytest.raises(TransactionExpiredError):
+        expired.result(timeout=10)
+    with pytest.raises(error.ConfirmationTimeoutError):
+        timed_out.result(timeout=10)
+
+class _GatedClient:
+    """Delegates to ``client``, holding the first status request of the follower until ``gate`` is set."""
+    def __init__(self, client, pool_errors=()):
+        self.client = client
+        self.pool_errors = set(pool_errors)
+        self.gate = threading.Event()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def status(self, **kwargs):
+        if threading.current_thread().name == "confirmations":
+            self.gate.wait(10)
+        return self.client.status(**kwargs)
+
+    def pending_transaction_info(self, txid, **kwargs):
+        if txid in self.pool_errors:
+            return {"confirmed-round": 0, "pool-error": "overspend"}
+        return self.client.pending_transaction_info(txid, **kwargs)
+
+def test_wait_rounds_count_from_the_submission(user1, user2):
+    client = _GatedClient(algod_connection.algod_client())
+    service = ConfirmationService(client)
+    [payment] = _payments(user1, user2, 1)
+
+    start = client.status()["last-round"]
+    timed_out = service.submit(payment.get_txid(), wait_rounds=3)
+    # The rounds go by before the follower takes its first step
+    client.status_after_block(start + 2)
+    client.gate.set()
+
+    with pytest.raises(error.ConfirmationTimeoutError):
+        timed_out.result(timeout=10)
+    assert client.status()["last-round"] == start + 3
+
+def test_pool_errors_fail_every_wait(user1, user2):
+    [payment] = _payments(user1, user2, 1)
+    client = _GatedClient(algod_connection.algod_client(), pool_errors=[payment.get_txid()])
+    client.gate.set()
+    service = ConfirmationService(client)
+
+    # A transaction with a validity window fails as soon as the node drops it
+    with pytest.raises(error.AlgodHTTPError, match="overspend"):
+        service.wait(payment)
+
+class _CountingClient(_GatedClient):
+    """A ``_GatedClient`` counting the transactions looked up by the follower."""
+    def __init__(self, client):
+        super().__init__(client)
+        self.lookups = Counter()
+
+    def pending_transaction_info(self, txid, **kwargs):
+        if threading.current_thread().name == "confirmations":
+            self.lookups[txid] += 1
+        return super().pending_transaction_info(txid, **kwargs)
+
+def test_waits_look_transactions_up_once(user1, user2):
+    client = _CountingClient(algod_connection.algod_client())
+    service = ConfirmationService(client)
+    payments = _payments(user1, user2, 5)
+
+    # Never sent, so each of them is waited for over several rounds
+    futures = [service.submit(payment.get_txid(), wait_rounds=4) for payment in payments]
+    client.gate.set()
+    for future in futures:
+        with pytest.raises(error.ConfirmationTimeoutError):
+            future.result(timeout=10)
+
+    # Once after the submission and once more when the wait times out, whatever the rounds in between
+    assert client.lookups == {payment.get_txid(): 2 for payment in payments}
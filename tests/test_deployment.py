@@ -3,12 +3,21 @@ import algosdk
 
 from algopytest import (
     AlgoUser,
+    SmartContractAccount,
     application_global_state,    
     create_asset,
     asset_balance,
     asset_info,
+    call_app,
+    delete_app,
+    destroy_asset,
 )
 
+from deployment import WizCoinFactory
+from fee_planner import method_fee
+from method_dispatch import selector
+from params_cache import suggested_params
+
 def test_initialization(owner, smart_contract_account, wizcoin_asset_id, smart_contract_id):
     # Make sure the manager and asset-id were correctly recorded
     state = application_global_state(
@@ -39,3 +48,33 @@ def test_opt_in_wizcoin(user1_in, wizcoin_asset_id):
 def test_multisig_opt_in_wizcoin(multisig_account_in, wizcoin_asset_id):
     # When the `asset_balance` is `0`, that means that the `multisig_account_in` has opted-in, but is not yet a member
     assert asset_balance(multisig_account_in, wizcoin_asset_id) == 0    
+
+def test_factory_deploys_independent_instances(owner):
+    report = WizCoinFactory(owner, total=pytest.TMPL_MAX_WIZCOINS).deploy([None, {"TMPL_AMOUNT": 10_000_000}])
+
+    assert [stage.name for stage in report.stages] == ["create_asset", "create_app", "fund_and_transfer_reserve"]
+    assert [instance.template_values["TMPL_AMOUNT"] for instance in report.instances] == [pytest.TMPL_REGISTRATION_AMOUNT, 10_000_000]
+    assert len({instance.app_id for instance in report.instances}) == 2
+
+    for instance in report.instances:
+        smart_contract_account = SmartContractAccount(instance.app_id)
+        state = application_global_state(instance.app_id, address_fields=['manager'])
+
+        assert state['ASA_id'] == instance.asset_id
+        assert state['manager'] == owner.address
+        assert asset_info(instance.asset_id)['asset']['params']['reserve'] == smart_contract_account.address
+        assert asset_balance(smart_contract_account, instance.asset_id) == pytest.TMPL_MAX_WIZCOINS
+
+    # Tear down the instances like the `smart_contract_id` fixture does
+    params = suggested_params(flat_fee=True, fee=method_fee("relinquish_wizcoins"))
+    for instance in report.instances:
+        call_app(
+            sender=owner,
+            app_id=instance.app_id,
+            app_args=[selector("relinquish_wizcoins")],
+            accounts=[SmartContractAccount(instance.app_id)],
+            foreign_assets=[instance.asset_id],
+            params=params,
+        )
+        delete_app(owner, instance.app_id)
+        destroy_asset(owner, instance.asset_id)
@@ -0,0 +1,58 @@
+import algosdk
+import pytest
+
+from algopytest import TxnElemsContext, asset_balance, call_app, group_transaction, payment_transaction
+
+from fee_planner import InnerTransactions, inner_transaction_counts, method_fee, pool_fees, required_fee
+from member_registry import member_box
+from method_dispatch import METHODS, selector
+
+def test_inner_transaction_counts():
+    counts = inner_transaction_counts()
+
+    assert sorted(counts) == sorted(METHODS)
+    assert counts["join_wizcoin"] == InnerTransactions(1, 0)
+    assert counts["batch_join_wizcoin"] == InnerTransactions(0, 1)
+    assert counts["check_registrations"] == InnerTransactions(0, 0)
+    assert counts["clawback_wizcoins"] == InnerTransactions(0, 1)
+    # The asset close-out along with either the payment or the close-out of the Algo balance
+    assert counts["relinquish_wizcoins"] == InnerTransactions(2, 0)
+
+    assert method_fee("batch_join_wizcoin", accounts=3) == 4000
+    assert method_fee("relinquish_wizcoins", min_fee=2000) == 6000
+
+def _join_group(user, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    with TxnElemsContext():
+        return [
+            call_app(
+                sender=user,
+                app_id=smart_contract_id,
+                app_args=[selector("join_wizcoin")],
+                accounts=[user],
+                foreign_assets=[wizcoin_asset_id],
+                boxes=[member_box(user.address)],
+            ),
+            payment_transaction(
+                sender=user,
+                receiver=smart_contract_account,
+                amount=pytest.TMPL_REGISTRATION_AMOUNT,
+            ),
+        ]
+
+@pytest.mark.parametrize("payer", [0, 1])
+def test_pooled_fees_pay_for_the_join(payer, user1_in, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    txns = _join_group(user1_in, smart_contract_account, wizcoin_asset_id, smart_contract_id)
+    pool_fees([elem.txn for elem in txns], payer=payer)
+
+    assert [elem.txn.fee for elem in txns] == [3000 if index == payer else 0 for index in range(2)]
+    group_transaction(*txns)
+    assert asset_balance(user1_in, wizcoin_asset_id) == 1
+
+def test_underpaid_join_is_rejected(user1_in, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    txns = _join_group(user1_in, smart_contract_account, wizcoin_asset_id, smart_contract_id)
+    pool_fees([elem.txn for elem in txns])
+
+    # Enough for the two transactions of the group, but not for the inner transaction
+    txns[0].txn.fee = required_fee([elem.txn for elem in txns]) - 1000
+    with pytest.raises(algosdk.error.AlgodHTTPError, match=r'transaction .*: logic eval error: assert failed'):
+        group_transaction(*txns)
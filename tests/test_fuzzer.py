@@ -0,0 +1,126 @@
+import random
+
+import pytest
+from pyteal import Assert, Expr, Int
+
+import wizcoin_fuzzer
+from wizcoin_fuzzer import Fuzzer, Txn, merge, repro
+from wizcoin_smart_contract import wizcoin_membership
+
+ARMS = [
+    "ApplicationID == 0",
+    "OnCompletion == DeleteApplication",
+    "OnCompletion == UpdateApplication",
+    "OnCompletion == OptIn",
+    "OnCompletion == CloseOut",
+    "join_wizcoin",
+    "batch_join_wizcoin",
+    "check_registrations",
+    "opt_in_wizcoin",
+    "clawback_wizcoins",
+    "unregister_members",
+    "relinquish_wizcoins",
+    "default",
+]
+
+@pytest.fixture(scope="module")
+def fuzzer():
+    return Fuzzer()
+
+def without_assert(comment):
+    """Return a build of the program missing the assertion commented ``comment``."""
+    def build():
+        program = wizcoin_membership()
+        pending = [program]
+        while pending:
+            expr = pending.pop()
+            if isinstance(expr, Assert) and expr.comment == comment:
+                expr.cond = [Int(1)]
+            for name, value in vars(expr).items():
+                if name in ("trace", "stack_frames") or name.startswith("_"):
+                    continue
+                # The arms of a `Cond` are lists of the condition and the branch
+                values = [value]
+                while values:
+                    item = values.pop()
+                    if isinstance(item, Expr):
+                        pending.append(item)
+                    elif isinstance(item, (list, tuple)):
+                        values.extend(item)
+        return program
+    return build
+
+def test_cond_arms(fuzzer):
+    assert sorted(fuzzer.arms) == sorted(ARMS)
+    # Every arm starts at a distinct instruction
+    assert len(set(fuzzer.arms.values())) == len(ARMS)
+
+def test_valid_cases_accepted(fuzzer):
+    rng = random.Random(0)
+    for template in wizcoin_fuzzer._TEMPLATES:
+        for _ in range(10):
+            case = template(fuzzer, rng)
+            assert fuzzer.run(case, valid=True) == (True, None, None), repro(case)
+
+def test_cases_roll_back(fuzzer):
+    member = fuzzer._join("user1")
+
+    assert fuzzer.run(member).accepted
+    # The membership of the first run is gone, so the same group is accepted again
+    assert fuzzer.run(member).accepted
+    assert fuzzer.ledger.box_get(fuzzer.app_id, fuzzer.addresses["user1"]) is None
+
+def test_rejected_cases(fuzzer):
+    join = fuzzer._join("user1")
+
+    assert "assert failed" in fuzzer.run((join[0], join[1]._replace(amount=1))).error
+    assert "assert failed" in fuzzer.run(fuzzer._join("member")).error
+    assert "frozen" in fuzzer.run(fuzzer._join("frozen")).error
+    # A valid case which is rejected is a failure
+    assert fuzzer.run(join[:1], valid=True).failure.kind == "valid group rejected"
+
+def test_fuzz_covers_every_arm():
+    report = Fuzzer().fuzz(cases=3000, seed=1)
+
+    assert report["cases"] == 3000
+    assert report["failures"] == []
+    assert all(report["coverage"]["arms"][name] > 0 for name in ARMS)
+    covered, total = report["coverage"]["instructions"]
+    assert 0 < covered <= total
+
+def test_shrinks_failure_to_minimal_repro():
+    fuzzer = Fuzzer(build=without_assert("payment of the registration amount"))
+    report = fuzzer.fuzz(cases=3000, seed=1)
+
+    [failure] = report["failures"]
+    assert failure["kind"] == "unpaid membership"
+
+    # The repro is a join paying nothing, down to the fields the join cannot do without
+    shrunk = [eval(line, {"Txn": Txn}) for line in failure["shrunk"]]
+    assert len(shrunk) == 2
+    call, payment = shrunk
+    assert call.method == "join_wizcoin" and call.accounts == call.boxes == (payment.sender,)
+    assert payment == Txn("pay", payment.sender, receiver="app")
+    assert fuzzer.run(tuple(shrunk)).failure.kind == "unpaid membership"
+
+def test_finds_double_membership(fuzzer):
+    broken = Fuzzer(build=without_assert("payer is not a member yet"))
+    report = broken.fuzz(cases=3000, seed=1)
+
+    failures = {failure["kind"]: failure for failure in report["failures"]}
+    assert "double membership" in failures
+
+    # The holder of the WizCoin passed on by a former member joins on top of it
+    shrunk = tuple(eval(line, {"Txn": Txn}) for line in failures["double membership"]["shrunk"])
+    assert shrunk[0].accounts == ("holder",)
+    assert broken.run(shrunk).failure.kind == "double membership"
+    assert not fuzzer.run(shrunk).accepted
+
+def test_merge():
+    reports = [Fuzzer().fuzz(cases=50, seed=seed) for seed in (0, 1)]
+    merged = merge([(report, [seed]) for seed, report in enumerate(reports)])
+
+    assert merged["seed"] == [0, 1]
+    assert merged["cases"] == 100
+    assert merged["coverage"]["instructions"][0] == 2
+    assert merged["coverage"]["arms"]["join_wizcoin"] == sum(report["coverage"]["arms"]["join_wizcoin"] for report in reports)
@@ -6,7 +6,6 @@ from algopytest import (
     asset_info,
     transfer_asset,
     freeze_asset,
-    suggested_params,
     TxnElemsContext,
     call_app,
     payment_transaction,
@@ -14,6 +13,10 @@ from algopytest import (
     update_asset,
 )
 
+from fee_planner import pool_fees
+from member_registry import member_box
+from method_dispatch import selector
+
 @pytest.mark.parametrize(
     "member_name",
     [
@@ -54,30 +57,96 @@ def test_join_wizcoin_membership_raises(
     # Retrieve the respective `call_app_user` and `payment_user` fixtures by name
     call_app_user = request.getfixturevalue(call_app_user_name)
     payment_user = request.getfixturevalue(payment_user_name)
-    
-    # Twice the minimum fee to also cover the transaction fee of the ASA transfer inner transaction    
-    params = suggested_params(flat_fee=True, fee=2000)
 
     with TxnElemsContext():
         txn0 = call_app(
             sender=call_app_user,
             app_id=smart_contract_id,
-            app_args=["join_wizcoin"],
+            app_args=[selector("join_wizcoin")],
             accounts=[call_app_user],
             foreign_assets=[wizcoin_asset_id],
+            boxes=[member_box(call_app_user.address)],
         )
 
         txn1 = payment_transaction(
             sender=payment_user,
             receiver=smart_contract_account,
             amount=payment_amount,
-            params=params,
         )
-        
+    pool_fees([txn0.txn, txn1.txn])
+
     # Send the group transaction which should fail
     with pytest.raises(algosdk.error.AlgodHTTPError, match=r'transaction .*: logic eval error: assert failed'):
         group_transaction(txn0, txn1)
         
+def batch_join_group(sender, members, smart_contract_id, smart_contract_account, wizcoin_asset_id, payment_amount=None):
+    """Build the group in which all of the ``members`` join WizCoin through one ``batch_join_wizcoin`` call.
+
+    The ``sender`` of the call pays the fees of the whole group.
+    """
+    payment_amount = pytest.TMPL_REGISTRATION_AMOUNT if payment_amount is None else payment_amount
+
+    with TxnElemsContext():
+        txns = [
+            call_app(
+                sender=sender,
+                app_id=smart_contract_id,
+                app_args=[selector("batch_join_wizcoin")],
+                accounts=members,
+                foreign_assets=[wizcoin_asset_id],
+                boxes=[member_box(member.address) for member in members],
+            )
+        ]
+        for position, member in enumerate(members, start=1):
+            # The note keeps the payments of an account listed twice distinct transactions
+            txns.append(
+                payment_transaction(
+                    sender=member,
+                    receiver=smart_contract_account,
+                    amount=payment_amount,
+                    note=f"batch member {position}".encode(),
+                )
+            )
+
+    pool_fees([elem.txn for elem in txns])
+    return txns
+
+def test_batch_join_wizcoin_membership(owner, user1_in, user2_in, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    group_transaction(*batch_join_group(owner, [user1_in, user2_in], smart_contract_id, smart_contract_account, wizcoin_asset_id))
+
+    # Verify that every member of the batch owns 1 WizCoin membership token
+    assert asset_balance(user1_in, wizcoin_asset_id) == 1
+    assert asset_balance(user2_in, wizcoin_asset_id) == 1
+
+@pytest.mark.parametrize(
+    "member_names, payment_amount",
+    [
+        # WizCoin under-payment by one of the members
+        (["user1_in", "user2_in"], pytest.TMPL_REGISTRATION_AMOUNT - 1),
+        # Already a member of WizCoin
+        (["user2_in", "user1_member"], pytest.TMPL_REGISTRATION_AMOUNT),
+        # The same account joining twice in one batch
+        (["user1_in", "user1_in"], pytest.TMPL_REGISTRATION_AMOUNT),
+    ]
+)
+def test_batch_join_wizcoin_membership_raises(
+        member_names,
+        payment_amount,
+        owner,
+        smart_contract_account,
+        wizcoin_asset_id,
+        smart_contract_id,
+        request
+):
+    # Retrieve the respective `member` fixtures by name
+    members = [request.getfixturevalue(member_name) for member_name in member_names]
+
+    txns = batch_join_group(owner, members, smart_contract_id, smart_contract_account, wizcoin_asset_id, payment_amount)
+
+    # Send the group transaction which should fail
+    with pytest.raises(algosdk.error.AlgodHTTPError, match=r'transaction .*: logic eval error: assert failed'):
+        group_transaction(*txns)
+
 def test_transfer_wizcoin_membership(user1_member, user2_in, wizcoin_asset_id):
     # Transfer the membership token from `user1_member` to `user2_in`
     transfer_asset(
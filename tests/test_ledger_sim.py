@@ -0,0 +1,125 @@
+import pytest
+import algosdk
+from algosdk import transaction
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+
+import avm
+import ledger_sim
+from ledger_sim import Ledger, SimAlgodClient
+
+def sign(account, txn):
+    return AccountTransactionSigner(account[0]).sign_transactions([txn], [0])[0]
+
+@pytest.fixture
+def accounts():
+    return [algosdk.account.generate_account() for _ in range(2)]
+
+@pytest.fixture
+def client(accounts):
+    return SimAlgodClient(Ledger({address: 10_000_000 for _, address in accounts}))
+
+def test_assemble_round_trip():
+    source = "#pragma version 6\nint 7\nint 7\n+\npushbytes 0x0102\nlen\n==\nbnz done\nerr\ndone:\nint 1\nreturn"
+    program = avm.Program(avm.assemble(source))
+
+    assert program.version == 6
+    assert [text for _, text in program.disassemble()][:3] == ["intcblock 7", "intc_0", "intc_0"]
+
+def test_payment_and_min_balance(client, accounts):
+    sender, receiver = accounts
+    params = client.suggested_params()
+
+    # Paying out more than the minimum balance allows is rejected without changing any state
+    txn = transaction.PaymentTxn(sender[1], params, receiver[1], 9_950_000)
+    with pytest.raises(algosdk.error.AlgodHTTPError, match="below min 100000"):
+        client.send_transaction(sign(sender, txn))
+
+    assert client.account_info(sender[1])["amount"] == 10_000_000
+
+    txn = transaction.PaymentTxn(sender[1], params, receiver[1], 1_000_000)
+    client.send_transaction(sign(sender, txn))
+
+    assert client.account_info(sender[1])["amount"] == 8_999_000
+    assert client.account_info(receiver[1])["amount"] == 11_000_000
+
+def test_failed_group_rolls_back(client, accounts):
+    sender, receiver = accounts
+    params = client.suggested_params()
+
+    # The first payment is valid on its own but the overspending second one sinks the whole group
+    txns = transaction.assign_group_id([
+        transaction.PaymentTxn(sender[1], params, receiver[1], 1_000_000),
+        transaction.PaymentTxn(receiver[1], params, sender[1], 100_000_000),
+    ])
+    with pytest.raises(algosdk.error.AlgodHTTPError, match="overspend"):
+        client.send_transactions([sign(sender, txns[0]), sign(receiver, txns[1])])
+
+    assert client.account_info(sender[1])["amount"] == 10_000_000
+    assert client.account_info(receiver[1])["amount"] == 10_000_000
+
+def test_wrong_signer_rejected(client, accounts):
+    sender, receiver = accounts
+    txn = transaction.PaymentTxn(sender[1], client.suggested_params(), receiver[1], 1)
+
+    with pytest.raises(algosdk.error.AlgodHTTPError, match="should have been authorized"):
+        client.send_transaction(sign(receiver, txn))
+
+def test_snapshot_restore(client, accounts):
+    sender, receiver = accounts
+    ledger = client.ledger
+    snapshot = ledger.snapshot()
+
+    txn = transaction.PaymentTxn(sender[1], client.suggested_params(), receiver[1], 1_000_000)
+    txid = client.send_transaction(sign(sender, txn))
+    assert ledger.state.journal
+
+    ledger.restore(snapshot)
+
+    # The payment, its block and its confirmation are gone, so it can even be sent again
+    assert client.account_info(sender[1])["amount"] == 10_000_000
+    assert client.status()["last-round"] == snapshot.round
+    assert txid not in ledger.confirmed
+    assert not ledger.state.journal
+
+    client.send_transaction(sign(sender, txn))
+    assert client.account_info(receiver[1])["amount"] == 11_000_000
+
+def test_snapshots_restore_innermost_first(client):
+    ledger = client.ledger
+    outer = ledger.snapshot()
+    ledger.snapshot()
+
+    with pytest.raises(ledger_sim.LedgerError, match="innermost first"):
+        ledger.restore(outer)
+
+def test_apply_group(client, accounts):
+    (_, sender), (_, receiver) = accounts
+    ledger = client.ledger
+    raw_sender, raw_receiver = algosdk.encoding.decode_address(sender), algosdk.encoding.decode_address(receiver)
+    payment = {"Sender": raw_sender, "Fee": 1000, "Type": b"pay", "TypeEnum": avm.TXN_TYPES["pay"], "Receiver": raw_receiver, "Amount": 1_000_000}
+
+    # No block is produced and nothing needs to be signed
+    ledger.apply_group([dict(payment)])
+    assert ledger.balance(raw_receiver) == 11_000_000
+    assert client.status()["last-round"] == 1
+
+    # The rejected transaction is named by its index in the group
+    with pytest.raises(ledger_sim.LedgerError, match="overspend") as e:
+        ledger.apply_group([dict(payment), dict(payment, Amount=100_000_000)])
+    assert e.value.txid == "1"
+    assert ledger.balance(raw_receiver) == 11_000_000
+
+def test_coverage_of_rejected_runs(client, accounts):
+    (_, sender), _ = accounts
+    ledger = client.ledger
+    ledger.coverage = {}
+    program = avm.assemble("#pragma version 8\nint 1\nint 0\n/\nreturn")
+    create = {"Sender": algosdk.encoding.decode_address(sender), "Fee": 1000, "Type": b"appl", "TypeEnum": avm.TXN_TYPES["appl"], "ApprovalProgram": program, "ClearStateProgram": program}
+
+    with pytest.raises(ledger_sim.LedgerError, match="logic eval error"):
+        ledger.apply_group([create])
+
+    # The instructions up to the failing division are covered, and not the `return` after it
+    [(decoded, pcs)] = ledger.coverage.items()
+    assert decoded.bytecode == program
+    assert sorted(pcs) == [instruction.pc for instruction in decoded.instructions[:3]]
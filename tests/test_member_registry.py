@@ -0,0 +1,115 @@
+import algosdk
+import pytest
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+
+from algopytest import transfer_asset, TxnElemsContext, call_app, payment_transaction, group_transaction
+
+import algod_connection
+from confirmations import wait_for_confirmation
+from fee_planner import method_fee, pool_fees
+from member_registry import MAX_REFERENCES, check_registrations_call, member_box, member_since, registrations, registered_members
+from method_dispatch import selector
+from params_cache import suggested_params
+
+def test_joining_registers_the_member(user1_member, user2_in, smart_contract_id):
+    client = algod_connection.algod_client()
+
+    # The box holds the round of the join, which is at most the current round
+    assert 0 < member_since(smart_contract_id, user1_member.address) <= client.status()["last-round"]
+    assert member_since(smart_contract_id, user2_in.address) is None
+
+def test_box_holds_the_confirmed_round(user1_in, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    info = join(user1_in, smart_contract_account, wizcoin_asset_id, smart_contract_id)
+
+    # The program reads the round being assembled, which the join is confirmed in
+    assert member_since(smart_contract_id, user1_in.address) == info["confirmed-round"]
+
+def test_check_registrations(owner, user1_member, user2_in, multisig_account_member, smart_contract_id):
+    client = algod_connection.algod_client()
+    addresses = [user1_member.address, user2_in.address, multisig_account_member.address, owner.address]
+
+    txn = check_registrations_call(owner.address, smart_contract_id, addresses, suggested_params())
+    client.send_transaction(AccountTransactionSigner(owner.private_key).sign_transactions([txn], [0])[0])
+
+    assert registrations(wait_for_confirmation(txn)) == [True, False, True, False]
+
+def check_registrations(sender, addresses, smart_contract_id):
+    client = algod_connection.algod_client()
+    txn = check_registrations_call(sender.address, smart_contract_id, addresses, suggested_params())
+    client.send_transaction(AccountTransactionSigner(sender.private_key).sign_transactions([txn], [0])[0])
+    return registrations(wait_for_confirmation(txn))
+
+def test_check_registrations_references_a_box_per_address(owner, smart_contract_id):
+    addresses = [algosdk.account.generate_account()[1] for _ in range(MAX_REFERENCES + 1)]
+
+    with pytest.raises(ValueError):
+        check_registrations_call(owner.address, smart_contract_id, addresses, suggested_params())
+
+def join(user, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    with TxnElemsContext():
+        txns = [
+            call_app(
+                sender=user,
+                app_id=smart_contract_id,
+                app_args=[selector("join_wizcoin")],
+                accounts=[user],
+                foreign_assets=[wizcoin_asset_id],
+                boxes=[member_box(user.address)],
+            ),
+            payment_transaction(
+                sender=user,
+                receiver=smart_contract_account,
+                amount=pytest.TMPL_REGISTRATION_AMOUNT,
+            ),
+        ]
+    pool_fees([elem.txn for elem in txns])
+    group_transaction(*txns)
+    return wait_for_confirmation(txns[0].txn)
+
+def unregister(sender, members, wizcoin_asset_id, smart_contract_id):
+    call_app(
+        sender=sender,
+        app_id=smart_contract_id,
+        app_args=[selector("unregister_members")],
+        accounts=members,
+        foreign_assets=[wizcoin_asset_id],
+        boxes=[member_box(member.address) for member in members],
+        params=suggested_params(flat_fee=True, fee=method_fee("unregister_members")),
+    )
+
+def test_registry_follows_the_token(user1_member, user2_in, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    client = algod_connection.algod_client()
+    transfer_asset(sender=user1_member, receiver=user2_in, amount=1, asset_id=wizcoin_asset_id)
+
+    # Receiving a WizCoin does not make a member, yet it keeps its holder from joining
+    with pytest.raises(algosdk.error.AlgodHTTPError, match=r'transaction .*: logic eval error: assert failed'):
+        join(user2_in, smart_contract_account, wizcoin_asset_id, smart_contract_id)
+    assert member_since(smart_contract_id, user2_in.address) is None
+
+    # Having passed its token on, the first member may join again
+    joined = member_since(smart_contract_id, user1_member.address)
+    join(user1_member, smart_contract_account, wizcoin_asset_id, smart_contract_id)
+    assert member_since(smart_contract_id, user1_member.address) > joined
+    assert client.account_asset_info(user1_member.address, wizcoin_asset_id)["asset-holding"]["amount"] == 1
+
+def test_anybody_unregisters_a_stale_member(owner, user1_member, user2_member, wizcoin_asset_id, smart_contract_id):
+    # The manager claws the token back with the ASA, outside of the application
+    transfer_asset(sender=owner, receiver=owner, amount=1, asset_id=wizcoin_asset_id, revocation_target=user1_member)
+    assert sorted(registered_members(smart_contract_id)) == sorted([user1_member.address, user2_member.address])
+    # Its registration outlives the token until the box is removed
+    assert check_registrations(owner, [user1_member.address, user2_member.address], smart_contract_id) == [True, True]
+
+    # The box of a member holding its token stays
+    with pytest.raises(algosdk.error.AlgodHTTPError, match=r'logic eval error: assert failed'):
+        unregister(user2_member, [user1_member, user2_member], wizcoin_asset_id, smart_contract_id)
+
+    unregister(user2_member, [user1_member], wizcoin_asset_id, smart_contract_id)
+    assert registered_members(smart_contract_id) == [user2_member.address]
+
+    assert check_registrations(owner, [user1_member.address, user2_member.address], smart_contract_id) == [False, True]
+
+def test_manager_unregisters_any_member(owner, user1_member, wizcoin_asset_id, smart_contract_id):
+    unregister(owner, [user1_member], wizcoin_asset_id, smart_contract_id)
+
+    assert member_since(smart_contract_id, user1_member.address) is None
+    assert registered_members(smart_contract_id) == []
@@ -0,0 +1,43 @@
+from algopytest import (
+    asset_balance,
+    close_out_asset,
+    freeze_asset,
+    transfer_asset,
+)
+
+from membership_indexer import MembershipIndexer
+
+def test_indexer_matches_the_ledger(owner, user1_member, user2_in, multisig_account_member, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    indexer = MembershipIndexer(wizcoin_asset_id, smart_contract_id)
+    indexer.catch_up()
+
+    assert indexer.members() == sorted([user1_member.address, multisig_account_member.address])
+    assert indexer.member_count == 2
+    assert not indexer.is_member(smart_contract_account.address)
+    for account in (owner, user1_member, user2_in, multisig_account_member, smart_contract_account):
+        assert indexer.holders[account.address][0] == asset_balance(account, wizcoin_asset_id)
+
+def test_indexer_resumes_from_checkpoint(owner, user1_member, user2_in, smart_contract_account, wizcoin_asset_id, smart_contract_id, tmp_path):
+    checkpoint = str(tmp_path / "members.json")
+    indexer = MembershipIndexer(wizcoin_asset_id, smart_contract_id, checkpoint)
+    indexer.catch_up()
+    assert indexer.is_member(user1_member.address)
+
+    freeze_asset(sender=owner, target=user1_member, new_freeze_state=True, asset_id=wizcoin_asset_id)
+    transfer_asset(
+        sender=owner,
+        receiver=smart_contract_account,
+        revocation_target=user1_member,
+        amount=1,
+        asset_id=wizcoin_asset_id,
+    )
+    close_out_asset(user2_in, wizcoin_asset_id, owner)
+
+    # Only the three new rounds are processed
+    resumed = MembershipIndexer(wizcoin_asset_id, smart_contract_id, checkpoint)
+    assert resumed.catch_up() == 3
+
+    assert not resumed.is_member(user1_member.address)
+    assert resumed.is_frozen(user1_member.address)
+    assert user2_in.address not in resumed.holders
+    assert resumed.member_count == 0
@@ -0,0 +1,79 @@
+from pyteal import *
+
+from method_dispatch import compile_teal, lower_method_dispatch, method_dispatch, selector
+from wizcoin_smart_contract import wizcoin_membership
+
+CHAIN = """#pragma version 8
+txna ApplicationArgs 0
+method "a()void"
+==
+bnz l2
+txna ApplicationArgs 0
+method "b()void"
+==
+bnz l1
+int 1
+bnz l0
+err
+l0:
+int 0
+return
+l1:
+int 1
+return
+l2:
+int 1
+return
+"""
+
+def test_lower_method_dispatch_to_match():
+    lowered = lower_method_dispatch(CHAIN, hot=0)
+
+    assert lowered.splitlines()[:6] == [
+        "#pragma version 8",
+        'method "a()void"',
+        'method "b()void"',
+        "txna ApplicationArgs 0",
+        "match l2 l1",
+        "l0:",
+    ]
+
+    # Before TEAL v8 there is no `match` to lower to
+    assert lower_method_dispatch(CHAIN.replace("version 8", "version 6"), hot=0) == CHAIN.replace("version 8", "version 6")
+    # A single method left after the hot ones is not worth a jump table
+    assert lower_method_dispatch(CHAIN, hot=1) == CHAIN
+
+def test_wizcoin_membership_dispatches_hot_methods_first():
+    lines = compile_teal(wizcoin_membership(), version=8).splitlines()
+
+    # NoOp calls reach the hottest method after a single check of the `on_completion`
+    assert lines[1] == "txn OnCompletion"
+    assert lines[3:11] == [
+        "txna ApplicationArgs 0",
+        'method "join_wizcoin()void"',
+        "==",
+        f"bnz {lines[6].split()[1]}",
+        "txna ApplicationArgs 0",
+        'method "batch_join_wizcoin()void"',
+        "==",
+        f"bnz {lines[10].split()[1]}",
+    ]
+    # The colder methods share a single jump table
+    assert lines[11:17] == [
+        'method "check_registrations(address[])bool[]"',
+        'method "opt_in_wizcoin()void"',
+        'method "clawback_wizcoins()void"',
+        'method "unregister_members()void"',
+        'method "relinquish_wizcoins()void"',
+        "txna ApplicationArgs 0",
+    ]
+    assert lines[17].startswith("match ")
+    assert sum(line.startswith("match ") for line in lines) == 1
+
+def test_method_dispatch_default():
+    program = method_dispatch([("join_wizcoin", Approve())], default=Reject())
+    teal = compile_teal(program, version=8)
+
+    # A single method is not worth a jump table
+    assert "match" not in teal
+    assert len(selector("join_wizcoin")) == 4
@@ -0,0 +1,52 @@
+import pytest
+from algosdk import error, transaction
+from algosdk.atomic_transaction_composer import MultisigTransactionSigner
+
+from algopytest import MultisigAccount, payment_transaction
+
+import algod_connection
+from multisig_signing import MultisigEntry, MultisigSigner, sign_multisig_groups
+from params_cache import suggested_params
+
+def _payments(multisig_account, receiver, count):
+    return [transaction.PaymentTxn(multisig_account.address, suggested_params(), receiver.address, amount) for amount in range(count)]
+
+def test_signatures_match_algosdk(user1, user2, user3):
+    multisig_account = MultisigAccount(version=1, threshold=2, owner_accounts=[user1, user2])
+    keys = [user1.private_key, user2.private_key]
+    groups = [[MultisigEntry(txn, multisig_account.attributes, keys)] for txn in _payments(multisig_account, user3, 6)]
+
+    # Signed in process and on the pool alike
+    with MultisigSigner(processes=2, min_pool_signatures=0) as signer:
+        pooled = signer.sign_groups(groups)
+    local = sign_multisig_groups(groups)
+
+    expected = [
+        MultisigTransactionSigner(multisig_account.attributes.get_multisig_account(), keys).sign_transactions([group[0].txn], [0])[0]
+        for group in groups
+    ]
+    for signed in (pooled, local):
+        assert [group[0].dictify() for group in signed] == [stxn.dictify() for stxn in expected]
+
+def test_signed_groups_are_ready_to_send(user1, user2, user3):
+    multisig_account = MultisigAccount(version=1, threshold=2, owner_accounts=[user1, user2])
+    payment_transaction(sender=user1, receiver=multisig_account, amount=10_000_000)
+
+    # Each owner contributes a signature of its own, merged with the one already there
+    first, second = _payments(multisig_account, user3, 2)
+    partial = sign_multisig_groups([[MultisigEntry(first, multisig_account.attributes, [user1.private_key]), MultisigEntry(second, multisig_account.attributes, [user1.private_key])]])[0]
+    group = sign_multisig_groups([[MultisigEntry(stxn, None, [user2.private_key]) for stxn in partial]])[0]
+
+    assert first.group is not None and first.group == second.group
+    assert all(subsig.signature for stxn in group for subsig in stxn.multisig.subsigs)
+
+    client = algod_connection.algod_client()
+    txid = client.send_transactions(group)
+    assert transaction.wait_for_confirmation(client, txid, 10)["confirmed-round"] > 0
+
+def test_foreign_key_is_rejected(user1, user2, user3):
+    multisig_account = MultisigAccount(version=1, threshold=1, owner_accounts=[user1, user2])
+    txn = _payments(multisig_account, user3, 1)[0]
+
+    with pytest.raises(error.InvalidSecretKeyError):
+        sign_multisig_groups([[MultisigEntry(txn, multisig_account.attributes, [user3.private_key])]])
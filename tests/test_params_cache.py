@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+from algopytest import payment_transaction
+
+import algod_connection
+from ledger_sim import MAX_TXN_LIFE
+from params_cache import ParamsCache, shared_params_cache, suggested_params
+
+def test_params_follow_the_observed_round():
+    client = algod_connection.algod_client()
+    cache = ParamsCache(client, refresh_rounds=5)
+    start = client.status()["last-round"]
+
+    params = cache.get(flat_fee=True, fee=2000)
+    assert (params.first, params.last) == (start, start + MAX_TXN_LIFE)
+    assert (params.flat_fee, params.fee) == (True, 2000)
+
+    # A later round moves the window without a round trip
+    cache.observe(start + 3)
+    params = cache.get()
+    assert (params.first, params.last) == (start + 3, start + 3 + MAX_TXN_LIFE)
+    assert not params.flat_fee
+    assert cache.fetches == 1
+
+    # An earlier round, e.g. reported late by another sender, does not move it back
+    cache.observe(start + 1)
+    assert cache.get().first == start + 3
+
+    # The parameters are fetched again after `refresh_rounds`
+    client.status_after_block(start + 5)
+    cache.observe(start + 6)
+    assert cache.get().first == start + 6
+    assert cache.fetches == 2
+
+def test_params_from_coroutines():
+    cache = ParamsCache(algod_connection.algod_client())
+
+    async def concurrently():
+        return await asyncio.gather(*(cache.get_async(flat_fee=True, fee=1000 * index) for index in range(8)))
+
+    params = asyncio.run(concurrently())
+    assert [p.fee for p in params] == [1000 * index for index in range(8)]
+    assert cache.fetches == 1
+
+def test_shared_params_track_sent_transactions(user1, user2):
+    before = suggested_params()
+    fetches = shared_params_cache().fetches
+    payment_transaction(sender=user1, receiver=user2, amount=1)
+
+    # The helpers report the round of every transaction they confirm
+    assert suggested_params().first == algod_connection.algod_client().status()["last-round"] > before.first
+    assert shared_params_cache().fetches == fetches
+
+class _SlowClient:
+    """Delegates to ``client``, holding the requests for suggested parameters until ``release`` is set."""
+    def __init__(self, client):
+        self.client = client
+        self.requested = threading.Event()
+        self.release = threading.Event()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def suggested_params(self, **kwargs):
+        self.requested.set()
+        self.release.wait(10)
+        return self.client.suggested_params(**kwargs)
+
+def test_fetch_outside_the_lock():
+    client = _SlowClient(algod_connection.algod_client())
+    cache = ParamsCache(client)
+    start = client.status()["last-round"]
+    served = []
+    fetching = threading.Thread(target=lambda: served.append(cache.get()))
+    fetching.start()
+    client.requested.wait(10)
+
+    # The round is learned and forgotten while the node is slow to answer
+    observing = threading.Thread(target=cache.observe, args=(start + 1,))
+    observing.start()
+    observing.join(1)
+    assert not observing.is_alive()
+    cache.reset()
+
+    client.release.set()
+    fetching.join(10)
+    assert served[0].first == start
+    assert cache.fetches == 1
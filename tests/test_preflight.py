@@ -0,0 +1,135 @@
+import pytest
+import algosdk
+
+from algopytest import (
+    call_app,
+    payment_transaction,
+    group_transaction,
+    transfer_asset,
+    TxnElemsContext,
+)
+
+from algod_connection import algod_client
+from bulk_join import Joiner, bulk_join
+from membership_indexer import MembershipIndexer
+from fee_planner import method_fee, pool_fees
+from member_registry import member_box
+from method_dispatch import selector
+from params_cache import suggested_params
+from preflight import Preflight, PreflightError
+
+def join_group(call_app_user, payment_user, payment_amount, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    with TxnElemsContext():
+        txns = [
+            call_app(
+                sender=call_app_user,
+                app_id=smart_contract_id,
+                app_args=[selector("join_wizcoin")],
+                accounts=[call_app_user],
+                foreign_assets=[wizcoin_asset_id],
+                boxes=[member_box(call_app_user.address)],
+            ),
+            payment_transaction(
+                sender=payment_user,
+                receiver=smart_contract_account,
+                amount=payment_amount,
+            ),
+        ]
+    pool_fees([elem.txn for elem in txns])
+    return txns
+
+@pytest.mark.parametrize(
+    "call_app_user_name, payment_user_name, payment_amount, assertion",
+    [
+        ("user1_in", "user1_in", pytest.TMPL_REGISTRATION_AMOUNT, None),
+        ("user1_in", "user1_in", pytest.TMPL_REGISTRATION_AMOUNT + 1, "payment of the registration amount"),
+        ("user1_in", "user1_in", pytest.TMPL_REGISTRATION_AMOUNT - 1, "payment of the registration amount"),
+        ("user1_in", "user2_in", pytest.TMPL_REGISTRATION_AMOUNT, "supplied account is the payer"),
+        ("user1_member", "user1_member", pytest.TMPL_REGISTRATION_AMOUNT, "payer is not a member yet"),
+    ]
+)
+def test_preflight_agrees_with_the_node(
+        call_app_user_name,
+        payment_user_name,
+        payment_amount,
+        assertion,
+        wizcoin_asset_id,
+        smart_contract_account,
+        smart_contract_id,
+        request
+):
+    call_app_user = request.getfixturevalue(call_app_user_name)
+    payment_user = request.getfixturevalue(payment_user_name)
+    txns = join_group(call_app_user, payment_user, payment_amount, smart_contract_account, wizcoin_asset_id, smart_contract_id)
+
+    rejection = Preflight(smart_contract_id, wizcoin_asset_id).check([elem.txn for elem in txns])
+
+    if assertion is None:
+        assert rejection is None
+        group_transaction(*txns)
+    else:
+        assert (rejection.reason, rejection.assertion) == ("assert failed", assertion)
+        with pytest.raises(algosdk.error.AlgodHTTPError, match=f"assert failed pc={rejection.pc}"):
+            group_transaction(*txns)
+
+def test_preflight_follows_the_round(user1_in, user2_in, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    # Set up before the rounds the member joins and passes its WizCoin on in
+    preflight = Preflight(smart_contract_id, wizcoin_asset_id)
+    group_transaction(*join_group(user1_in, user1_in, pytest.TMPL_REGISTRATION_AMOUNT, smart_contract_account, wizcoin_asset_id, smart_contract_id))
+    transfer_asset(sender=user1_in, receiver=user2_in, amount=1, asset_id=wizcoin_asset_id)
+
+    # Joining again is judged at the round the node would confirm it in
+    txns = join_group(user1_in, user1_in, pytest.TMPL_REGISTRATION_AMOUNT, smart_contract_account, wizcoin_asset_id, smart_contract_id)
+    assert preflight.check([elem.txn for elem in txns]) is None
+    assert preflight.round == algod_client().status()["last-round"]
+    group_transaction(*txns)
+
+def test_bulk_join_skips_rejected_joins(user1_member, user2_in, wizcoin_asset_id, smart_contract_id):
+    indexer = MembershipIndexer(wizcoin_asset_id, smart_contract_id)
+    indexer.catch_up()
+    last_round = algod_client().status()["last-round"]
+
+    results = bulk_join(
+        smart_contract_id,
+        wizcoin_asset_id,
+        [Joiner.from_account(user1_member), Joiner.from_account(user2_in)],
+        preflight=Preflight(smart_contract_id, wizcoin_asset_id, indexer=indexer),
+    )
+
+    assert isinstance(results[0].error, PreflightError)
+    assert results[0].error.rejection.assertion == "payer is not a member yet"
+    assert results[1].error is None
+
+    # Only the join of `user2_in` reached the ledger
+    assert algod_client().status()["last-round"] == last_round + 1
+
+@pytest.mark.parametrize("sender_name, approved", [("owner", True), ("user1_in", False)])
+def test_preflight_relinquish_wizcoins(sender_name, approved, user1_member, smart_contract_account, wizcoin_asset_id, smart_contract_id, request):
+    sender = request.getfixturevalue(sender_name)
+    with TxnElemsContext():
+        txn = call_app(
+            sender=sender,
+            app_id=smart_contract_id,
+            app_args=[selector("relinquish_wizcoins")],
+            accounts=[smart_contract_account],
+            foreign_assets=[wizcoin_asset_id],
+            params=suggested_params(flat_fee=True, fee=method_fee("relinquish_wizcoins")),
+        )
+
+    # The payout reads the balance and the minimum balance of the application, which holds a member box
+    rejection = Preflight(smart_contract_id, wizcoin_asset_id).check([txn.txn])
+
+    if approved:
+        assert rejection is None
+    else:
+        # Only the manager may relinquish the WizCoins
+        assert rejection.reason == "assert failed"
+        with pytest.raises(algosdk.error.AlgodHTTPError, match=f"assert failed pc={rejection.pc}"):
+            call_app(
+                sender=sender,
+                app_id=smart_contract_id,
+                app_args=[selector("relinquish_wizcoins")],
+                accounts=[smart_contract_account],
+                foreign_assets=[wizcoin_asset_id],
+                params=suggested_params(flat_fee=True, fee=method_fee("relinquish_wizcoins")),
+            )
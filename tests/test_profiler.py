@@ -0,0 +1,86 @@
+import copy
+import json
+
+import method_dispatch
+
+import profiler
+from method_dispatch import HOT_METHODS, METHODS
+
+BRANCHES = [
+    "init",
+    "delete",
+    "update",
+    "opt_in",
+    "close_out",
+    "opt_in_wizcoin",
+    "join_wizcoin",
+    "batch_join_wizcoin",
+    "check_registrations",
+    "clawback_wizcoins",
+    "unregister_members",
+    "relinquish_wizcoins",
+]
+
+def test_profile_covers_every_branch():
+    report = profiler.profile()
+
+    assert sorted(report["branches"]) == sorted(BRANCHES)
+    assert report["branches"]["join_wizcoin"]["inner_transactions"] == 1
+    assert report["branches"]["batch_join_wizcoin"]["inner_transactions"] == profiler.BATCH_SIZE
+    assert report["branches"]["clawback_wizcoins"]["inner_transactions"] == profiler.BATCH_SIZE
+    assert report["branches"]["unregister_members"]["inner_transactions"] == 0
+    assert report["branches"]["relinquish_wizcoins"]["inner_transactions"] == 2
+
+    # Only the batch branches loop, so they are the only ones spending more than their static cost
+    looping = ("batch_join_wizcoin", "check_registrations", "clawback_wizcoins", "unregister_members")
+    for name, metrics in report["branches"].items():
+        if name not in looping:
+            assert metrics["dynamic_cost"] == metrics["static_cost"]
+    for name in looping:
+        assert report["branches"][name]["dynamic_cost"] > report["branches"][name]["static_cost"]
+
+def test_profile_within_baseline():
+    with open(profiler.DEFAULT_BASELINE) as f:
+        baseline = json.load(f)
+
+    assert profiler.regressions(profiler.profile(), baseline) == []
+
+def test_regressions_reports_grown_branches():
+    report = profiler.profile()
+    grown = copy.deepcopy(report)
+    grown["branches"]["join_wizcoin"]["dynamic_cost"] += 1
+
+    assert profiler.regressions(report, grown) == []
+    assert profiler.regressions(grown, report) == [
+        f"join_wizcoin: dynamic_cost {grown['branches']['join_wizcoin']['dynamic_cost']} "
+        f"> baseline {report['branches']['join_wizcoin']['dynamic_cost']}"
+    ]
+
+def test_hot_methods_cost_no_more_than_the_chain():
+    # Both dispatches at the same TEAL version, differing only in the `match` of the colder methods
+    chain = profiler.profile(hot=len(METHODS))["branches"]
+    lowered = profiler.profile()["branches"]
+
+    for name in list(METHODS)[:HOT_METHODS]:
+        assert lowered[name]["dynamic_cost"] == chain[name]["dynamic_cost"]
+    # Every method behind the first cold one is cheaper through the jump table
+    for name in list(METHODS)[HOT_METHODS + 1:]:
+        assert lowered[name]["dynamic_cost"] < chain[name]["dynamic_cost"]
+
+def test_dispatch_costs_match_the_documented_table():
+    chain = profiler.profile(hot=len(METHODS))["branches"]
+    lowered = profiler.profile()["branches"]
+
+    # The rows of the table in the docstring of `method_dispatch`: method, full chain, hot chain + match
+    rows = {}
+    for line in method_dispatch.__doc__.splitlines():
+        fields = line.split()
+        if len(fields) == 3 and fields[0] in METHODS:
+            rows[fields[0]] = (int(fields[1]), int(fields[2]))
+
+    assert list(rows) == list(METHODS)
+    for position, name in enumerate(METHODS, 1):
+        # A chain reaches the method at position `k` after `k` comparisons of 4 opcodes
+        full, lowered_cost = rows[name]
+        assert full == 4 * position
+        assert lowered_cost - full == lowered[name]["static_cost"] - chain[name]["static_cost"]
@@ -0,0 +1,73 @@
+import algosdk
+import pytest
+
+from algopytest import asset_balance, call_app, opt_in_asset, update_asset
+
+from bulk_join import Joiner, bulk_join
+from fee_planner import method_fee
+from member_registry import member_box, member_since
+from method_dispatch import selector
+from params_cache import suggested_params
+from revocation import MAX_ACCOUNTS, MAX_GROUP_SIZE, revocation_groups, revoke_members
+
+def _grant_clawback(owner, smart_contract_account, wizcoin_asset_id):
+    update_asset(
+        sender=owner,
+        asset_id=wizcoin_asset_id,
+        manager=owner,
+        reserve=smart_contract_account,
+        freeze=owner,
+        clawback=smart_contract_account,
+    )
+
+def test_revocation_groups_are_maximal():
+    addresses = [algosdk.account.generate_account()[1] for _ in range(MAX_ACCOUNTS * MAX_GROUP_SIZE + 6)]
+    params = suggested_params()
+    groups = revocation_groups(addresses[0], 1, 2, addresses + addresses[:3], params)
+
+    assert [len(group) for group in groups] == [MAX_GROUP_SIZE, 2]
+    assert [account for group in groups for txn in group for account in txn.accounts] == addresses
+
+    # The first call of a group pays for every call and clawback of the group
+    assert [txn.fee for txn in groups[0]] == [params.min_fee * (MAX_GROUP_SIZE + MAX_ACCOUNTS * MAX_GROUP_SIZE)] + [0] * (MAX_GROUP_SIZE - 1)
+    assert [txn.fee for txn in groups[1]] == [params.min_fee * (2 + 6), 0]
+    assert groups[1][0].group == groups[1][1].group is not None
+
+def test_revoke_members(owner, account_pool, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    members = [account_pool.acquire(f"member {index}") for index in range(MAX_ACCOUNTS + 3)]
+    try:
+        for member in members:
+            opt_in_asset(member, wizcoin_asset_id)
+        bulk_join(smart_contract_id, wizcoin_asset_id, [Joiner.from_account(member) for member in members])
+        reserve = asset_balance(smart_contract_account, wizcoin_asset_id)
+
+        _grant_clawback(owner, smart_contract_account, wizcoin_asset_id)
+        infos = revoke_members(owner, smart_contract_id, wizcoin_asset_id, [member.address for member in members])
+    finally:
+        for member in members:
+            account_pool.release(member)
+
+    # Two calls in a single group
+    assert len(infos) == 1
+    assert len(infos[0]["inner-txns"]) == MAX_ACCOUNTS
+    assert all(asset_balance(member, wizcoin_asset_id) == 0 for member in members)
+    assert asset_balance(smart_contract_account, wizcoin_asset_id) == reserve + len(members)
+
+    # Their boxes are gone from the member registry
+    assert all(member_since(smart_contract_id, member.address) is None for member in members)
+
+def test_clawback_wizcoins_is_manager_only(owner, user1_member, smart_contract_account, wizcoin_asset_id, smart_contract_id):
+    _grant_clawback(owner, smart_contract_account, wizcoin_asset_id)
+
+    with pytest.raises(algosdk.error.AlgodHTTPError, match=r'transaction .*: logic eval error: assert failed'):
+        call_app(
+            sender=user1_member,
+            app_id=smart_contract_id,
+            app_args=[selector("clawback_wizcoins")],
+            accounts=[user1_member],
+            foreign_assets=[wizcoin_asset_id],
+            boxes=[member_box(user1_member.address)],
+            params=suggested_params(flat_fee=True, fee=method_fee("clawback_wizcoins", accounts=1)),
+        )
+
+    assert asset_balance(user1_member, wizcoin_asset_id) == 1
@@ -0,0 +1,50 @@
+from pyteal import *
+
+from state_hoisting import hoist_global_reads
+
+manager = App.globalGet(Bytes("manager"))
+is_manager = Txn.sender() == manager
+
+def compile_program(program):
+    return compileTeal(program, mode=Mode.Application, version=8)
+
+def test_hoist_global_reads_once_per_path():
+    often = Seq([Assert(is_manager), Assert(is_manager), Assert(is_manager), Return(is_manager)])
+    rarely = Return(is_manager)
+    program = Cond(
+        [Txn.application_args.length() == Int(1), often],
+        [Int(1), rarely],
+    )
+
+    teal = compile_program(hoist_global_reads(program))
+
+    # The four reads of `often` share one load while the shared `is_manager` of `rarely` is left as is
+    assert teal.count("app_global_get") == 2
+    assert compile_program(program).count("app_global_get") == 5
+
+def test_hoist_global_reads_inside_loops():
+    index = ScratchVar(TealType.uint64)
+    program = Seq([
+        For(index.store(Int(0)), index.load() < Int(3), index.store(index.load() + Int(1))).Do(Seq([
+            Assert(Len(manager) == Int(32)),
+            Assert(manager != Global.zero_address()),
+        ])),
+        Approve(),
+    ])
+
+    teal = compile_program(hoist_global_reads(program))
+    loop = teal[teal.index("main_l1:"):]
+
+    assert teal.count("app_global_get") == 1
+    assert "app_global_get" not in loop
+
+def test_written_globals_are_not_hoisted():
+    program = Seq([
+        Assert(is_manager),
+        App.globalPut(Bytes("manager"), Txn.accounts[1]),
+        Assert(is_manager),
+        Assert(is_manager),
+        Return(is_manager),
+    ])
+
+    assert compile_program(hoist_global_reads(program)).count("app_global_get") == 4
@@ -0,0 +1,63 @@
+import pytest
+
+from algopytest import asset_balance, close_out_asset, opt_in_asset
+
+import algod_connection
+from teardown_scheduler import TeardownError, TeardownScheduler
+
+def _close_out(scheduler, user, asset_id, owner):
+    scheduler.add(lambda: [close_out_asset(user, asset_id, owner)], f"close out {user.name}")
+
+def test_cleanup_runs_newest_first_in_one_group(owner, account_pool, wizcoin_asset_id):
+    client = algod_connection.algod_client()
+    scheduler = TeardownScheduler()
+    with account_pool.account("first") as first, account_pool.account("second") as second:
+        # Closing out depends on the opt-in scheduled after it
+        for user in (first, second):
+            _close_out(scheduler, user, wizcoin_asset_id, owner)
+            scheduler.add(lambda user=user: [opt_in_asset(user, wizcoin_asset_id)], f"opt in {user.name}")
+
+        start = client.status()["last-round"]
+        scheduler.run()
+
+        assert client.status()["last-round"] == start + 1
+        assert asset_balance(first, wizcoin_asset_id) is None
+        assert asset_balance(second, wizcoin_asset_id) is None
+    assert scheduler.units == []
+
+def test_failed_cleanup_does_not_stop_the_rest(owner, account_pool, wizcoin_asset_id):
+    scheduler = TeardownScheduler()
+    with account_pool.account("opted_in") as opted_in, account_pool.account("not_opted_in") as not_opted_in:
+        opt_in_asset(opted_in, wizcoin_asset_id)
+        _close_out(scheduler, opted_in, wizcoin_asset_id, owner)
+        _close_out(scheduler, not_opted_in, wizcoin_asset_id, owner)
+        scheduler.add(lambda: 1 / 0, "broken")
+
+        with pytest.raises(TeardownError) as info:
+            scheduler.run()
+
+        assert [name for name, _ in info.value.failures] == ["broken", "close out not_opted_in"]
+        assert asset_balance(opted_in, wizcoin_asset_id) is None
+
+def test_rejected_group_retries_its_units_rebuilt(owner, account_pool, wizcoin_asset_id):
+    scheduler = TeardownScheduler()
+    builds = []
+    def close_out(user):
+        builds.append(user.name)
+        return [close_out_asset(user, wizcoin_asset_id, owner)]
+
+    with account_pool.account("closed") as closed, account_pool.account("held") as held:
+        for user in (closed, held):
+            opt_in_asset(user, wizcoin_asset_id)
+            scheduler.add(lambda user=user: close_out(user), f"close out {user.name}")
+
+        # The test closes out midway, so the cleanup scheduled for it no longer applies
+        close_out_asset(closed, wizcoin_asset_id, owner)
+
+        with pytest.raises(TeardownError) as info:
+            scheduler.run()
+
+        assert [name for name, _ in info.value.failures] == ["close out closed"]
+        assert asset_balance(held, wizcoin_asset_id) is None
+        # Both units of the rejected group were built again for their retry
+        assert builds == ["held", "closed", "held", "closed"]
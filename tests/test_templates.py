@@ -0,0 +1,40 @@
+import pytest
+from algosdk import logic
+from pyteal import *
+
+import avm
+from templates import TemplateProgram, lower_templates
+
+def priced_program():
+    return Seq([
+        Assert(Gtxn[1].amount() == Tmpl.Int("TMPL_AMOUNT")),
+        Assert(Gtxn[1].fee() >= Tmpl.Int("TMPL_FEE")),
+        If(Txn.application_args.length() == Int(1)).Then(Approve()),
+        Return(Gtxn[1].amount() > Tmpl.Int("TMPL_AMOUNT")),
+    ])
+
+def test_instantiate_matches_assembling_the_values():
+    teal = lower_templates(compileTeal(priced_program(), mode=Mode.Application, version=8))
+    template = TemplateProgram(teal, avm.assemble(teal))
+
+    assert template.names == ("TMPL_AMOUNT", "TMPL_FEE")
+
+    # Values which need longer varuints than the placeholders shift all of the code after the block
+    program = template.instantiate(TMPL_AMOUNT=50_000_000, TMPL_FEE=2000)
+    expected = avm.assemble(teal.replace("intcblock 0 0", "intcblock 50000000 2000", 1))
+
+    assert program.bytecode == expected
+    assert avm.assemble(template.source(TMPL_AMOUNT=50_000_000, TMPL_FEE=2000)) == expected
+    assert program.program_hash == logic.address(expected)
+
+def test_instantiate_requires_every_value():
+    teal = lower_templates(compileTeal(priced_program(), mode=Mode.Application, version=8))
+    template = TemplateProgram(teal, avm.assemble(teal))
+
+    with pytest.raises(ValueError, match="TMPL_FEE"):
+        template.instantiate(TMPL_AMOUNT=1)
+
+def test_programs_without_placeholders_are_unchanged():
+    teal = compileTeal(Approve(), mode=Mode.Application, version=8)
+
+    assert lower_templates(teal) == teal